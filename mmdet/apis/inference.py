@@ -83,6 +83,8 @@ def _prepare_data(img, img_transform, cfg, device):
             scale_factor=scale_factor,
             flip=False)
     ]
+    if img_transform.img_norm_cfg is not None:
+        img_meta[0]['img_norm_cfg'] = img_transform.img_norm_cfg
     return dict(img=[img], img_meta=[img_meta])
 
 
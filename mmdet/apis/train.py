@@ -141,7 +141,8 @@ def _dist_train(model, dataset, cfg, validate=False):
             dataset,
             cfg.data.imgs_per_gpu,
             cfg.data.workers_per_gpu,
-            dist=True)
+            dist=True,
+            contiguous=cfg.data.get('contiguous', False))
     ]
     # put model on gpus
     model = MMDistributedDataParallel(model.cuda())
@@ -195,7 +196,8 @@ def _non_dist_train(model, dataset, cfg, validate=False):
             cfg.data.imgs_per_gpu,
             cfg.data.workers_per_gpu,
             cfg.gpus,
-            dist=False)
+            dist=False,
+            contiguous=cfg.data.get('contiguous', False))
     ]
     # put model on gpus
     model = MMDataParallel(model, device_ids=range(cfg.gpus)).cuda()
@@ -213,6 +215,9 @@ def _non_dist_train(model, dataset, cfg, validate=False):
         optimizer_config = cfg.optimizer_config
     runner.register_training_hooks(cfg.lr_config, optimizer_config,
                                    cfg.checkpoint_config, cfg.log_config)
+    if cfg.data.get('contiguous', False):
+        # ContiguousVideoSampler shuffles its chunks based on the epoch
+        runner.register_hook(DistSamplerSeedHook())
 
     if cfg.resume_from:
         runner.resume(cfg.resume_from)
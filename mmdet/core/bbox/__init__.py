@@ -8,6 +8,7 @@ from .transforms import (bbox2delta, delta2bbox, bbox_flip, bbox_mapping,
                          bbox_mapping_back, bbox2roi, roi2bbox, bbox2result,
                          distance2bbox)
 from .bbox_target import bbox_target
+from .det_results import DetResults, ImageDetResults, is_det_results_dir
 
 __all__ = [
     'bbox_overlaps', 'BaseAssigner', 'MaxIoUAssigner', 'AssignResult',
@@ -16,5 +17,6 @@ __all__ = [
     'SamplingResult', 'build_assigner', 'build_sampler', 'assign_and_sample',
     'bbox2delta', 'delta2bbox', 'bbox_flip', 'bbox_mapping',
     'bbox_mapping_back', 'bbox2roi', 'roi2bbox', 'bbox2result',
-    'distance2bbox', 'bbox_target'
+    'distance2bbox', 'bbox_target', 'DetResults', 'ImageDetResults',
+    'is_det_results_dir'
 ]
@@ -0,0 +1,211 @@
+import os.path as osp
+
+import mmcv
+import numpy as np
+
+
+class ImageDetResults(object):
+    """Lazy view of the detections of one image of :class:`DetResults`.
+
+    ``view[cls]`` is the (n, 5) array of the class, as in the list returned by
+    :func:`bbox2result`.
+    """
+
+    def __init__(self, results, idx):
+        self.results = results
+        start, stop = results.img_offsets[idx:idx + 2]
+        self.start = int(start)
+        self.stop = int(stop)
+
+    def __len__(self):
+        return self.results.num_classes
+
+    def __getitem__(self, cls):
+        if cls < 0:
+            cls += len(self)
+        if not 0 <= cls < len(self):
+            raise IndexError('class index out of range')
+        labels = self.results.labels[self.start:self.stop]
+        lo, hi = np.searchsorted(labels, [cls, cls + 1]) + self.start
+        return self.results.get_dets(lo, hi)
+
+    def __iter__(self):
+        for cls in range(len(self)):
+            yield self[cls]
+
+
+class DetResults(object):
+    """Detection results of a whole test set stored in flat arrays.
+
+    The detections are sorted by image, then by class, and the detections of
+    image ``i`` are the rows ``img_offsets[i]:img_offsets[i + 1]``. Indexing
+    gives lazy per-image views, so ``results[i][cls]`` works as with the
+    list of per-class arrays of every image.
+
+    Args:
+        images (ndarray): (n, ) image index of every detection.
+        labels (ndarray): (n, ) class index of every detection, starting
+            from 0.
+        bboxes (ndarray): (n, 4) boxes.
+        scores (ndarray): (n, ) scores.
+        num_images (int): number of images.
+        num_classes (int): number of classes, without the background.
+    """
+
+    columns = ('images', 'labels', 'bboxes', 'scores')
+
+    def __init__(self, images, labels, bboxes, scores, num_images,
+                 num_classes):
+        assert len(images) == len(labels) == len(bboxes) == len(scores)
+        self.images = images
+        self.labels = labels
+        self.bboxes = bboxes
+        self.scores = scores
+        self.num_classes = num_classes
+        self.img_offsets = np.searchsorted(
+            images, np.arange(num_images + 1)).astype(np.int64)
+
+    @classmethod
+    def from_list(cls, results, num_classes=None, score_thr=0):
+        """Build from a list of per-class (n, 5) arrays of every image.
+
+        Args:
+            results (list[list[ndarray]]): results of every image.
+            num_classes (int, optional): number of classes, required when
+                ``results`` is empty.
+            score_thr (float): keep the detections scored above this
+                threshold.
+        """
+        if isinstance(results, DetResults):
+            return results.filter(score_thr)
+        num_images = len(results)
+        if num_classes is None:
+            num_classes = len(results[0])
+        dets = [cls_dets for img_dets in results for cls_dets in img_dets]
+        assert len(dets) == num_images * num_classes
+        counts = np.array([len(cls_dets) for cls_dets in dets],
+                          dtype=np.int64)
+        if counts.sum() > 0:
+            dets = np.concatenate([
+                np.asarray(cls_dets, dtype=np.float32) for cls_dets in dets
+                if len(cls_dets) > 0
+            ]).reshape(-1, 5)
+        else:
+            dets = np.zeros((0, 5), dtype=np.float32)
+        images = np.repeat(
+            np.arange(num_images, dtype=np.int32).repeat(num_classes),
+            counts)
+        labels = np.repeat(
+            np.tile(np.arange(num_classes, dtype=np.int32), num_images),
+            counts)
+        results = cls(images, labels, np.ascontiguousarray(dets[:, :4]),
+                      np.ascontiguousarray(dets[:, 4]), num_images,
+                      num_classes)
+        return results.filter(score_thr)
+
+    @classmethod
+    def concat(cls, results_list):
+        """Concatenate the images of several :class:`DetResults`."""
+        num_images = [len(results) for results in results_list]
+        img_starts = np.cumsum([0] + num_images[:-1])
+        return cls(
+            np.concatenate([
+                results.images + np.int32(start)
+                for results, start in zip(results_list, img_starts)
+            ]),
+            np.concatenate([results.labels for results in results_list]),
+            np.concatenate([results.bboxes for results in results_list]),
+            np.concatenate([results.scores for results in results_list]),
+            sum(num_images), results_list[0].num_classes)
+
+    def __len__(self):
+        return len(self.img_offsets) - 1
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return self.select(range(len(self))[idx])
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('image index out of range')
+        return ImageDetResults(self, idx)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    @property
+    def num_dets(self):
+        return len(self.scores)
+
+    def get_dets(self, start, stop):
+        """(n, 5) array of the rows ``start:stop``."""
+        dets = np.empty((stop - start, 5), dtype=np.float32)
+        dets[:, :4] = self.bboxes[start:stop]
+        dets[:, 4] = self.scores[start:stop]
+        return dets
+
+    def filter(self, score_thr):
+        """Keep the detections scored above ``score_thr``."""
+        if score_thr <= 0:
+            return self
+        keep = np.asarray(self.scores) > score_thr
+        return DetResults(self.images[keep], self.labels[keep],
+                          self.bboxes[keep], self.scores[keep], len(self),
+                          self.num_classes)
+
+    def select(self, inds):
+        """Results of the images ``inds``, in that order."""
+        inds = np.asarray(inds, dtype=np.int64)
+        starts = self.img_offsets[inds]
+        counts = self.img_offsets[inds + 1] - starts
+        # source row of every selected detection
+        rows = np.repeat(starts - (np.cumsum(counts) - counts),
+                         counts) + np.arange(counts.sum())
+        return DetResults(
+            np.repeat(np.arange(len(inds), dtype=np.int32), counts),
+            self.labels[rows], self.bboxes[rows], self.scores[rows],
+            len(inds), self.num_classes)
+
+    def class_dets(self, cls):
+        """Detections of a class in every image, as a list of (n, 5)
+        arrays."""
+        inds = np.flatnonzero(np.asarray(self.labels) == cls)
+        bounds = np.searchsorted(self.images[inds], np.arange(len(self) + 1))
+        dets = np.empty((len(inds), 5), dtype=np.float32)
+        dets[:, :4] = self.bboxes[inds]
+        dets[:, 4] = self.scores[inds]
+        return np.split(dets, bounds[1:-1])
+
+    def to_list(self):
+        return [list(img_dets) for img_dets in self]
+
+    def dump(self, path):
+        """Save to a directory of npy files, see :meth:`load`."""
+        mmcv.mkdir_or_exist(path)
+        for name in self.columns:
+            np.save(osp.join(path, name + '.npy'), getattr(self, name))
+        mmcv.dump(
+            dict(num_images=len(self), num_classes=self.num_classes),
+            osp.join(path, 'meta.json'))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load the results saved by :meth:`dump`.
+
+        Args:
+            path (str): directory of the results.
+            mmap (bool): memory-map the arrays instead of reading them.
+        """
+        meta = mmcv.load(osp.join(path, 'meta.json'))
+        mmap_mode = 'r' if mmap else None
+        columns = [
+            np.load(osp.join(path, name + '.npy'), mmap_mode=mmap_mode)
+            for name in cls.columns
+        ]
+        return cls(*columns, meta['num_images'], meta['num_classes'])
+
+
+def is_det_results_dir(filename):
+    return osp.isfile(osp.join(filename, 'meta.json')) and osp.isfile(
+        osp.join(filename, 'images.npy'))
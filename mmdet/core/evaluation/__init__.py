@@ -1,18 +1,24 @@
 from .class_names import (voc_classes, imagenet_det_classes,
                           imagenet_vid_classes, coco_classes, dataset_aliases,
                           get_classes)
-from .coco_utils import coco_eval, fast_eval_recall, results2json
+from .coco_evaluator import CocoEvaluator
+from .coco_utils import (coco_eval, coco_eval_results, fast_eval_recall,
+                         results2json)
 from .eval_hooks import (DistEvalHook, DistEvalmAPHook, CocoDistEvalRecallHook,
                          CocoDistEvalmAPHook)
+from . import fast_mean_ap
 from .mean_ap import average_precision, eval_map, print_map_summary
 from .recall import (eval_recalls, print_recall_summary, plot_num_recall,
                      plot_iou_recall)
+from .result_store import ResultStore, ResultStoreWriter, is_result_store
 
 __all__ = [
     'voc_classes', 'imagenet_det_classes', 'imagenet_vid_classes',
     'coco_classes', 'dataset_aliases', 'get_classes', 'coco_eval',
-    'fast_eval_recall', 'results2json', 'DistEvalHook', 'DistEvalmAPHook',
-    'CocoDistEvalRecallHook', 'CocoDistEvalmAPHook', 'average_precision',
-    'eval_map', 'print_map_summary', 'eval_recalls', 'print_recall_summary',
-    'plot_num_recall', 'plot_iou_recall'
+    'coco_eval_results', 'CocoEvaluator', 'fast_eval_recall', 'results2json',
+    'DistEvalHook', 'DistEvalmAPHook', 'CocoDistEvalRecallHook',
+    'CocoDistEvalmAPHook', 'average_precision', 'eval_map',
+    'print_map_summary', 'eval_recalls', 'print_recall_summary',
+    'plot_num_recall', 'plot_iou_recall', 'ResultStore', 'ResultStoreWriter',
+    'is_result_store', 'fast_mean_ap'
 ]
@@ -0,0 +1,625 @@
+"""COCO evaluation of in-memory results.
+
+:class:`CocoEvaluator` computes the same metrics as ``COCOeval`` directly
+from the detection arrays, without dumping them to a json file and loading
+them back. The per-image matching is vectorized over all the (image,
+category) pairs of a chunk of images, the chunks are evaluated by a pool of
+workers as they are added, and the metrics can be computed at any time from
+the images added so far.
+"""
+from multiprocessing import Pool
+
+import numpy as np
+import pycocotools.mask as maskUtils
+
+# same parameters as pycocotools.cocoeval.Params
+IOU_THRS = np.linspace(
+    .5, 0.95, int(np.round((0.95 - .5) / .05)) + 1, endpoint=True)
+REC_THRS = np.linspace(
+    .0, 1.00, int(np.round((1.00 - .0) / .01)) + 1, endpoint=True)
+AREA_RNGS = [[0**2, 1e5**2], [0**2, 32**2], [32**2, 96**2], [96**2, 1e5**2]]
+AREA_LBLS = ['all', 'small', 'medium', 'large']
+# number of padded (pair, gt) cells matched at once
+BATCH_CELLS = 16384
+
+
+def bbox_ious(dets, gts, crowd):
+    """Ious of xywh boxes, computed as by ``maskUtils.iou``.
+
+    Args:
+        dets (ndarray): (p, d, 4) detections of p pairs.
+        gts (ndarray): (p, g, 4) gts of the pairs.
+        crowd (ndarray): (p, g) crowd flags of the gts.
+
+    Returns:
+        ndarray: (p, d, g) ious.
+    """
+    d = dets[:, :, None, :]
+    g = gts[:, None, :, :]
+    w = np.minimum(d[..., 2] + d[..., 0], g[..., 2] + g[..., 0]) - np.maximum(
+        d[..., 0], g[..., 0])
+    h = np.minimum(d[..., 3] + d[..., 1], g[..., 3] + g[..., 1]) - np.maximum(
+        d[..., 1], g[..., 1])
+    inter = w * h
+    det_areas = d[..., 2] * d[..., 3]
+    gt_areas = g[..., 2] * g[..., 3]
+    union = np.where(crowd[:, None, :], det_areas,
+                     det_areas + gt_areas - inter)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where((w > 0) & (h > 0), inter / union, 0.)
+
+
+def match_dets(ious, gt_crowd, gt_ignore, iou_thrs):
+    """Greedy matching of ``COCOeval.evaluateImg`` for a batch of pairs.
+
+    Every det, by descending score, takes the unmatched (or crowd) gt with
+    the largest iou above the threshold, the last one in case of a tie, and
+    it only falls back to an ignored gt when no regular gt is left. The k-th
+    dets of all pairs, area ranges and thresholds are matched at once.
+
+    Args:
+        ious (ndarray): (p, d, g) ious, -inf for the padding.
+        gt_crowd (ndarray): (p, g) crowd flags.
+        gt_ignore (ndarray): (a, p, g) ignore flags of every area range.
+        iou_thrs (ndarray): (t, ) iou thresholds.
+
+    Returns:
+        ndarray: (a, p, t, d) index of the gt matched by every det, -1 for
+            none.
+    """
+    num_pairs, num_dets, num_gts = ious.shape
+    shape = (len(gt_ignore), num_pairs, len(iou_thrs), num_gts)
+    thrs = np.minimum(iou_thrs, 1 - 1e-10)[None, None, :, None]
+    taken = np.zeros(shape, dtype=bool)
+    matches = np.full(shape[:3] + (num_dets, ), -1, dtype=np.int64)
+    for i in range(num_dets):
+        # only the pairs where the det may match a gt
+        active = np.flatnonzero((ious[:, i] >= thrs.min()).any(axis=-1))
+        if len(active) == 0:
+            continue
+        det_ious = ious[None, active, i, None, :]
+        ignore = gt_ignore[:, active, None, :]
+        crowd = gt_crowd[None, active, None, :]
+        cands = (det_ious >= thrs) & ~(taken[:, active] & ~crowd)
+        regular = cands & ~ignore
+        cands = np.where(
+            regular.any(axis=-1, keepdims=True), regular, cands & ignore)
+        found = cands.any(axis=-1)
+        vals = np.where(cands, det_ious, -np.inf)
+        last_max = num_gts - 1 - np.argmax(vals[..., ::-1], axis=-1)
+        matches[..., i][:, active] = np.where(found, last_max, -1)
+        a, p, t = np.nonzero(found)
+        taken[a, active[p], t, last_max[found]] = True
+    return matches
+
+
+def _concat(items):
+    """Concatenate the gts or dets of several images, ``img`` is the index of
+    the image of every element."""
+    out = {}
+    for key in items[0]:
+        if isinstance(items[0][key], list):
+            out[key] = [value for item in items for value in item[key]]
+        else:
+            out[key] = np.concatenate([item[key] for item in items])
+    out['img'] = np.repeat(
+        np.arange(len(items)), [len(item['cat']) for item in items])
+    return out
+
+
+def _take(values, inds):
+    if isinstance(values, list):
+        return [values[i] for i in inds]
+    return values[inds]
+
+
+def _sort_by_pair(items, keys, order):
+    """Sort the gts or dets by ``order`` and give their pair key and their
+    position in the pair."""
+    items = {key: _take(values, order) for key, values in items.items()}
+    keys = keys[order]
+    starts = np.searchsorted(keys, keys)
+    return items, keys, np.arange(len(keys)) - starts
+
+
+def _pad(pairs, pos, values, shape, fill):
+    out = np.full(shape + values.shape[1:], fill, dtype=values.dtype)
+    out[pairs, pos] = values
+    return out
+
+
+def evaluate_batch(gts, dets, pair_keys, params):
+    """Match the dets of a batch of pairs for all area ranges.
+
+    Args:
+        gts (dict): gts of the pairs, ``pair`` is the index of the pair of
+            every gt and ``pos`` its position in the pair.
+        dets (dict): dets of the pairs, sorted in every pair.
+        pair_keys (ndarray): key of every pair, ``img * num_cats + k``.
+        params (dict): evaluation parameters.
+
+    Returns:
+        tuple: (rows, npig), the rows describe every det in every area range
+            and npig is the (k, a) number of non-ignored gts.
+    """
+    num_pairs = len(pair_keys)
+    # at least one padded det and gt to index
+    num_dets = max(1, dets['pos'].max() + 1 if len(dets['pos']) else 0)
+    num_gts = max(1, gts['pos'].max() + 1 if len(gts['pos']) else 0)
+    area_rngs = np.array(params['area_rngs'], dtype=np.float64)
+    num_areas = len(area_rngs)
+
+    gt_shape = (num_pairs, num_gts)
+    det_shape = (num_pairs, num_dets)
+    gt_inds = (gts['pair'], gts['pos'])
+    det_inds = (dets['pair'], dets['pos'])
+    gt_areas = _pad(*gt_inds, gts['area'], gt_shape, 0)
+    gt_crowd = _pad(*gt_inds, gts['crowd'], gt_shape, False)
+    gt_ids = _pad(*gt_inds, gts['id'], gt_shape, 0)
+    gt_valid = _pad(*gt_inds, np.ones(len(gts['id']), dtype=bool), gt_shape,
+                    False)
+    det_areas = _pad(*det_inds, dets['area'], det_shape, 0)
+    det_valid = _pad(*det_inds, np.ones(len(dets['score']), dtype=bool),
+                     det_shape, False)
+    if params['iou_type'] == 'bbox':
+        ious = bbox_ious(
+            _pad(*det_inds, dets['bbox'], det_shape, 0),
+            _pad(*gt_inds, gts['bbox'], gt_shape, 0), gt_crowd)
+    else:
+        ious = np.zeros((num_pairs, num_dets, num_gts))
+        gt_bounds = np.searchsorted(gts['pair'], np.arange(num_pairs + 1))
+        det_bounds = np.searchsorted(dets['pair'], np.arange(num_pairs + 1))
+        for i in range(num_pairs):
+            g0, g1 = gt_bounds[i:i + 2]
+            d0, d1 = det_bounds[i:i + 2]
+            if g1 > g0 and d1 > d0:
+                ious[i, :d1 - d0, :g1 - g0] = maskUtils.iou(
+                    dets['segm'][d0:d1], gts['segm'][g0:g1],
+                    gts['crowd'][g0:g1].astype(np.uint8).tolist())
+    ious[~(det_valid[:, :, None] & gt_valid[:, None, :])] = -np.inf
+
+    lo = area_rngs[:, 0, None, None]
+    hi = area_rngs[:, 1, None, None]
+    gt_ignore = gt_crowd | (gt_areas < lo) | (gt_areas > hi)
+    matches = match_dets(ious, gt_crowd, gt_ignore, params['iou_thrs'])
+
+    is_matched = matches >= 0
+    inds = np.maximum(matches, 0)
+    pair_inds = np.arange(num_pairs)[None, :, None, None]
+    area_inds = np.arange(num_areas)[:, None, None, None]
+    # dets matched to a gt of id 0 count as unmatched, as in COCOeval
+    matched = is_matched & (gt_ids[pair_inds, inds] != 0)
+    # the unmatched dets out of the area range are ignored
+    ignored = (is_matched & gt_ignore[area_inds, pair_inds, inds]) | (
+        ~matched & ((det_areas < lo) | (det_areas > hi))[:, :, None, :])
+
+    # one row per det and area range
+    num_cats = params['num_cats']
+    pair, rank = det_inds
+    a = np.repeat(np.arange(num_areas), len(pair))
+    pair = np.tile(pair, num_areas)
+    rank = np.tile(rank, num_areas)
+    rows = dict(
+        k=pair_keys[pair] % num_cats,
+        a=a,
+        img=pair_keys[pair] // num_cats,
+        rank=rank,
+        score=np.tile(dets['score'], num_areas),
+        matched=matched[a, pair, :, rank],
+        ignored=ignored[a, pair, :, rank])
+    npig = np.zeros((num_cats, num_areas), dtype=np.int64)
+    np.add.at(npig, pair_keys % num_cats,
+              (~gt_ignore & gt_valid).sum(axis=-1).T)
+    return rows, npig
+
+
+def evaluate_imgs(imgs, params):
+    """Evaluate a chunk of images, see :meth:`CocoEvaluator.add`.
+
+    The gts and dets are grouped in (image, category) pairs, or in images
+    when the categories are not used, with the gts in the order of the
+    annotations and the dets by descending score, then in the order of the
+    results, as in ``COCOeval.evaluateImg``.
+    """
+    gts = _concat([img_gts for _, img_gts, _ in imgs])
+    dets = _concat([img_dets for _, _, img_dets in imgs])
+    num_cats = params['num_cats']
+    if params['use_cats']:
+        gt_keys = gts['img'] * num_cats + np.searchsorted(
+            params['cat_ids'], gts['cat'])
+        det_keys = dets['img'] * num_cats + np.searchsorted(
+            params['cat_ids'], dets['cat'])
+    else:
+        gt_keys = gts['img']
+        det_keys = dets['img']
+    # without the categories, the elements of an image are by category
+    gts, gt_keys, gt_pos = _sort_by_pair(gts, gt_keys,
+                                         np.lexsort((gts['cat'], gt_keys)))
+    dets, det_keys, det_pos = _sort_by_pair(
+        dets, det_keys, np.lexsort((dets['cat'], -dets['score'], det_keys)))
+    keep = np.flatnonzero(det_pos < params['max_dets'][-1])
+    dets = {key: _take(values, keep) for key, values in dets.items()}
+    det_keys = det_keys[keep]
+    dets['pos'] = det_pos[keep]
+    gts['pos'] = gt_pos
+    pair_keys = np.union1d(gt_keys, det_keys)
+    if len(pair_keys) == 0:
+        return None
+    gt_pairs = np.searchsorted(pair_keys, gt_keys)
+    det_pairs = np.searchsorted(pair_keys, det_keys)
+
+    # batches of pairs with a similar number of gts to limit the padding
+    num_gts = np.bincount(gt_pairs, minlength=len(pair_keys))
+    num_dets = np.bincount(det_pairs, minlength=len(pair_keys))
+    pair_order = np.lexsort((num_dets, num_gts))
+    batch_of_pair = np.empty(len(pair_keys), dtype=np.int64)
+    batch, size = 0, 0
+    for i in pair_order:
+        if size > 0 and (size + 1) * max(1, num_gts[i]) > BATCH_CELLS:
+            batch, size = batch + 1, 0
+        batch_of_pair[i] = batch
+        size += 1
+    # local index of every pair in its batch
+    local = np.empty(len(pair_keys), dtype=np.int64)
+    for b in range(batch + 1):
+        in_batch = np.flatnonzero(batch_of_pair == b)
+        local[in_batch] = np.arange(len(in_batch))
+    outputs = []
+    for b in range(batch + 1):
+        batch_pairs = np.flatnonzero(batch_of_pair == b)
+        gt_sel = np.flatnonzero(batch_of_pair[gt_pairs] == b)
+        det_sel = np.flatnonzero(batch_of_pair[det_pairs] == b)
+        batch_gts = {key: _take(values, gt_sel) for key, values in gts.items()}
+        batch_dets = {
+            key: _take(values, det_sel)
+            for key, values in dets.items()
+        }
+        batch_gts['pair'] = local[gt_pairs[gt_sel]]
+        batch_dets['pair'] = local[det_pairs[det_sel]]
+        rows, npig = evaluate_batch(batch_gts, batch_dets,
+                                    pair_keys[batch_pairs], params)
+        outputs.append((rows, npig))
+    rows = {
+        key: np.concatenate([out[0][key] for out in outputs])
+        for key in outputs[0][0]
+    }
+    # image ids instead of indices in the chunk
+    img_ids = np.array([img_id for img_id, _, _ in imgs], dtype=np.int64)
+    rows['img'] = img_ids[rows['img']]
+    return rows, sum(out[1] for out in outputs)
+
+
+class CocoEvaluator(object):
+    """Evaluate detection results with the metrics of ``COCOeval``.
+
+    The results are added with :meth:`add` as they come, every chunk of
+    ``chunk_size`` images is evaluated in a pool of ``nproc`` workers while
+    the next results are added, and :meth:`summarize` gives the metrics of
+    the images added so far. The metrics are the same as the ones of
+    ``COCOeval`` on the json files written by :func:`results2json`.
+
+    Args:
+        coco (COCO): ground truth.
+        cat_ids (list[int], optional): category id of every label, the
+            categories of ``coco`` by default.
+        iou_type (str): 'bbox' or 'segm'.
+        use_cats (bool): evaluate every category separately, class agnostic
+            otherwise (as for proposals).
+        max_dets (list[int]): numbers of detections per image to evaluate.
+        nproc (int): number of workers, 0 or 1 to evaluate in this process.
+        chunk_size (int): number of images evaluated by a worker at once.
+    """
+
+    def __init__(self,
+                 coco,
+                 cat_ids=None,
+                 iou_type='bbox',
+                 use_cats=True,
+                 max_dets=(1, 10, 100),
+                 nproc=4,
+                 chunk_size=64):
+        assert iou_type in ['bbox', 'segm']
+        self.coco = coco
+        self.cat_ids = list(cat_ids if cat_ids is not None else
+                            coco.getCatIds())
+        self.eval_cat_ids = np.unique(coco.getCatIds())
+        self._eval_cat_set = set(self.eval_cat_ids.tolist())
+        self.iou_type = iou_type
+        self.use_cats = use_cats
+        self.max_dets = sorted(max_dets)
+        self.nproc = nproc
+        self.chunk_size = chunk_size
+        self.params = dict(
+            iou_type=iou_type,
+            use_cats=use_cats,
+            max_dets=self.max_dets,
+            iou_thrs=IOU_THRS,
+            area_rngs=AREA_RNGS,
+            cat_ids=self.eval_cat_ids,
+            num_cats=len(self.eval_cat_ids) if use_cats else 1)
+        self.pool = None
+        self.reset()
+
+    def reset(self):
+        """Drop all the added results."""
+        self.img_ids = set()
+        self.num_dets = 0
+        self.pending = []
+        self.tasks = []
+        self.outputs = []
+        self.eval = None
+
+    def _load_gts(self, img_id):
+        anns = [
+            ann for ann in self.coco.imgToAnns[img_id]
+            if ann['category_id'] in self._eval_cat_set
+        ]
+        gts = dict(
+            bbox=np.array([ann['bbox'] for ann in anns],
+                          dtype=np.float64).reshape(-1, 4),
+            area=np.array([ann['area'] for ann in anns], dtype=np.float64),
+            crowd=np.array([bool(ann.get('iscrowd', 0)) for ann in anns],
+                           dtype=bool),
+            id=np.array([ann['id'] for ann in anns], dtype=np.int64),
+            cat=np.array([ann['category_id'] for ann in anns],
+                         dtype=np.int64))
+        if self.iou_type == 'segm':
+            gts['segm'] = [self.coco.annToRLE(ann) for ann in anns]
+        return gts
+
+    def _load_dets(self, result):
+        """Detections of an image in the format of the json results."""
+        if isinstance(result, tuple):
+            det, seg = result
+        else:
+            det, seg = result, None
+        if isinstance(det, np.ndarray):
+            # proposals are written to the json results with category 1
+            det = [det]
+            cat_ids = [1]
+        else:
+            det = list(det)
+            cat_ids = self.cat_ids
+        counts = [len(cls_dets) for cls_dets in det]
+        if sum(counts) > 0:
+            bboxes = np.concatenate(
+                [cls_dets for cls_dets in det if len(cls_dets) > 0])
+            bboxes = bboxes.astype(np.float64)
+        else:
+            bboxes = np.zeros((0, 5))
+        cats = np.repeat(np.array(cat_ids[:len(det)], dtype=np.int64), counts)
+        scores = bboxes[:, 4]
+        if self.iou_type == 'segm':
+            segms = []
+            mask_scores = []
+            for label, num in enumerate(counts):
+                # some detectors use different score for det and segm
+                if len(seg) == 2:
+                    segms.extend(seg[0][label][:num])
+                    mask_scores.append(
+                        np.asarray(seg[1][label][:num], dtype=np.float64))
+                else:
+                    segms.extend(seg[label][:num])
+            if len(seg) == 2 and mask_scores:
+                scores = np.concatenate(mask_scores)
+        # the xywh boxes of the json results
+        bboxes = np.stack([
+            bboxes[:, 0], bboxes[:, 1], bboxes[:, 2] - bboxes[:, 0] + 1,
+            bboxes[:, 3] - bboxes[:, 1] + 1
+        ], axis=1)
+        keep = np.isin(cats, self.eval_cat_ids)
+        if not keep.all():
+            bboxes, scores, cats = bboxes[keep], scores[keep], cats[keep]
+            if self.iou_type == 'segm':
+                segms = [segms[i] for i in np.flatnonzero(keep)]
+        dets = dict(bbox=bboxes, score=scores, cat=cats)
+        if self.iou_type == 'bbox':
+            dets['area'] = bboxes[:, 2] * bboxes[:, 3]
+        else:
+            dets['segm'] = segms
+            dets['area'] = (maskUtils.area(segms).astype(np.float64)
+                            if segms else np.zeros(0))
+        return dets
+
+    def add(self, img_ids, results):
+        """Add the results of some images.
+
+        Args:
+            img_ids (list[int]): coco ids of the images.
+            results (list | :obj:`DetResults`): results of every image, as
+                returned by the detector: lists of per-class (n, 5) arrays,
+                (bbox, segm) tuples or (n, 5) arrays of proposals.
+        """
+        assert len(img_ids) == len(results)
+        for img_id, result in zip(img_ids, results):
+            assert img_id not in self.img_ids, \
+                'image {} is already evaluated'.format(img_id)
+            self.img_ids.add(img_id)
+            dets = self._load_dets(result)
+            self.num_dets += len(dets['score'])
+            self.pending.append((img_id, self._load_gts(img_id), dets))
+            if len(self.pending) >= self.chunk_size:
+                self._submit()
+
+    def add_empty(self, img_ids=None):
+        """Add the images without results as images without detections.
+
+        Args:
+            img_ids (list[int], optional): images to add, all the images of
+                the ground truth by default.
+        """
+        if img_ids is None:
+            img_ids = self.coco.getImgIds()
+        img_ids = [img_id for img_id in img_ids if img_id not in self.img_ids]
+        self.add(img_ids, [[] for _ in img_ids])
+
+    def _submit(self):
+        if not self.pending:
+            return
+        if self.nproc > 1:
+            if self.pool is None:
+                self.pool = Pool(self.nproc)
+            self.tasks.append(
+                self.pool.apply_async(evaluate_imgs,
+                                      (self.pending, self.params)))
+        else:
+            self.outputs.append(evaluate_imgs(self.pending, self.params))
+        self.pending = []
+
+    def _gather(self):
+        self._submit()
+        self.outputs.extend(task.get() for task in self.tasks)
+        self.tasks = []
+        outputs = [output for output in self.outputs if output is not None]
+        # keep a single merged output
+        if len(outputs) > 1:
+            rows = {
+                key: np.concatenate([out[0][key] for out in outputs])
+                for key in outputs[0][0]
+            }
+            outputs = [(rows, sum(out[1] for out in outputs))]
+        self.outputs = outputs
+        return outputs[0] if outputs else None
+
+    def state(self):
+        """Evaluation of the images added so far, to be merged into another
+        evaluator with :meth:`merge`, e.g. by the process of rank 0."""
+        return dict(
+            img_ids=sorted(self.img_ids),
+            num_dets=self.num_dets,
+            output=self._gather())
+
+    def merge(self, state):
+        """Add the images evaluated by another evaluator.
+
+        Args:
+            state (dict): the :meth:`state` of an evaluator with the same
+                ground truth and parameters.
+        """
+        assert self.img_ids.isdisjoint(state['img_ids']), \
+            'some images are already evaluated'
+        self.img_ids.update(state['img_ids'])
+        self.num_dets += state['num_dets']
+        if state['output'] is not None:
+            self.outputs.append(state['output'])
+
+    def close(self):
+        """Stop the workers."""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def accumulate(self):
+        """Precision and recall of the images added so far, as in
+        ``COCOeval.accumulate``.
+
+        Returns:
+            dict: 'precision' (t, r, k, a, m), 'recall' (t, k, a, m) and
+                'scores' (t, r, k, a, m), -1 where there are no gts.
+        """
+        num_thrs = len(IOU_THRS)
+        num_recs = len(REC_THRS)
+        num_cats = self.params['num_cats']
+        num_areas = len(AREA_RNGS)
+        precision = -np.ones(
+            (num_thrs, num_recs, num_cats, num_areas, len(self.max_dets)))
+        recall = -np.ones((num_thrs, num_cats, num_areas, len(self.max_dets)))
+        scores = -np.ones_like(precision)
+        output = self._gather()
+        if output is None:
+            self.eval = dict(
+                precision=precision, recall=recall, scores=scores)
+            return self.eval
+        rows, npig = output
+        # rows of a (k, a) group, by image id, then by rank in the image
+        order = np.lexsort((rows['rank'], rows['img'], rows['a'], rows['k']))
+        groups = (rows['k'] * num_areas + rows['a'])[order]
+        bounds = np.searchsorted(groups, np.arange(num_cats * num_areas + 1))
+        ranks = rows['rank'][order]
+        det_scores = rows['score'][order]
+        not_ignored = ~rows['ignored'][order]
+        all_tps = (rows['matched'][order] & not_ignored).T
+        all_fps = (~rows['matched'][order] & not_ignored).T
+        for k in range(num_cats):
+            for a in range(num_areas):
+                num_gts = npig[k, a]
+                if num_gts == 0:
+                    continue
+                start, stop = bounds[k * num_areas + a:k * num_areas + a + 2]
+                for m, max_det in enumerate(self.max_dets):
+                    sel = start + np.flatnonzero(ranks[start:stop] < max_det)
+                    sel = sel[np.argsort(-det_scores[sel], kind='mergesort')]
+                    num_sel = len(sel)
+                    if num_sel == 0:
+                        recall[:, k, a, m] = 0
+                        precision[:, :, k, a, m] = 0
+                        scores[:, :, k, a, m] = 0
+                        continue
+                    tp_sum = np.cumsum(
+                        all_tps[:, sel], axis=1).astype(np.float64)
+                    fp_sum = np.cumsum(
+                        all_fps[:, sel], axis=1).astype(np.float64)
+                    rc = tp_sum / num_gts
+                    pr = tp_sum / (fp_sum + tp_sum + np.spacing(1))
+                    recall[:, k, a, m] = rc[:, -1]
+                    # precision envelope
+                    pr = np.maximum.accumulate(pr[:, ::-1], axis=1)[:, ::-1]
+                    sel_scores = det_scores[sel]
+                    for t in range(num_thrs):
+                        rec_inds = np.searchsorted(
+                            rc[t], REC_THRS, side='left')
+                        valid = rec_inds < num_sel
+                        q = np.zeros(num_recs)
+                        ss = np.zeros(num_recs)
+                        q[valid] = pr[t, rec_inds[valid]]
+                        ss[valid] = sel_scores[rec_inds[valid]]
+                        precision[t, :, k, a, m] = q
+                        scores[t, :, k, a, m] = ss
+        self.eval = dict(precision=precision, recall=recall, scores=scores)
+        return self.eval
+
+    def summarize(self, print_summary=True):
+        """Metrics of ``COCOeval.summarize`` of the images added so far.
+
+        Returns:
+            ndarray: the 12 values of ``COCOeval.stats``.
+        """
+        self.accumulate()
+        max_dets = self.max_dets
+
+        def _summarize(ap=1, iou_thr=None, area_rng='all', max_det=100):
+            i_str = (' {:<18} {} @[ IoU={:<9} | area={:>6s} | '
+                     'maxDets={:>3d} ] = {:0.3f}')
+            title_str = 'Average Precision' if ap == 1 else 'Average Recall'
+            type_str = '(AP)' if ap == 1 else '(AR)'
+            iou_str = '{:0.2f}:{:0.2f}'.format(
+                IOU_THRS[0], IOU_THRS[-1]) if iou_thr is None else \
+                '{:0.2f}'.format(iou_thr)
+            aind = [i for i, lbl in enumerate(AREA_LBLS) if lbl == area_rng]
+            mind = [i for i, m in enumerate(max_dets) if m == max_det]
+            s = self.eval['precision' if ap == 1 else 'recall']
+            if iou_thr is not None:
+                s = s[np.where(iou_thr == IOU_THRS)[0]]
+            s = s[:, :, :, aind, mind] if ap == 1 else s[:, :, aind, mind]
+            mean_s = -1 if len(s[s > -1]) == 0 else np.mean(s[s > -1])
+            if print_summary:
+                print(
+                    i_str.format(title_str, type_str, iou_str, area_rng,
+                                 max_det, mean_s))
+            return mean_s
+
+        stats = np.zeros((12, ))
+        stats[0] = _summarize(1)
+        stats[1] = _summarize(1, iou_thr=.5, max_det=max_dets[2])
+        stats[2] = _summarize(1, iou_thr=.75, max_det=max_dets[2])
+        stats[3] = _summarize(1, area_rng='small', max_det=max_dets[2])
+        stats[4] = _summarize(1, area_rng='medium', max_det=max_dets[2])
+        stats[5] = _summarize(1, area_rng='large', max_det=max_dets[2])
+        stats[6] = _summarize(0, max_det=max_dets[0])
+        stats[7] = _summarize(0, max_det=max_dets[1])
+        stats[8] = _summarize(0, max_det=max_dets[2])
+        stats[9] = _summarize(0, area_rng='small', max_det=max_dets[2])
+        stats[10] = _summarize(0, area_rng='medium', max_det=max_dets[2])
+        stats[11] = _summarize(0, area_rng='large', max_det=max_dets[2])
+        return stats
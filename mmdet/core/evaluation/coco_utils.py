@@ -1,8 +1,12 @@
+import json
+
 import mmcv
 import numpy as np
 from pycocotools.coco import COCO
 from pycocotools.cocoeval import COCOeval
 
+from ..bbox import DetResults
+from .coco_evaluator import CocoEvaluator
 from .recall import eval_recalls
 
 
@@ -39,6 +43,54 @@ def coco_eval(result_files, result_types, coco, max_dets=(100, 300, 1000)):
         cocoEval.summarize()
 
 
+def coco_eval_results(results,
+                      result_types,
+                      dataset,
+                      max_dets=(100, 300, 1000),
+                      nproc=4):
+    """Same as :func:`coco_eval` on the results of a dataset kept in memory,
+    evaluated by :class:`CocoEvaluator` instead of a json round trip.
+
+    Args:
+        results (list | :obj:`DetResults`): results of every image.
+        result_types (list[str]): result types to evaluate.
+        dataset (:obj:`CocoDataset`): the dataset of the results.
+        max_dets (tuple[int]): proposal numbers, only used for recall
+            evaluation.
+        nproc (int): number of workers of the evaluators.
+
+    Returns:
+        dict: ``COCOeval.stats`` of every result type.
+    """
+    for res_type in result_types:
+        assert res_type in ['proposal', 'proposal_fast', 'bbox', 'segm']
+
+    if result_types == ['proposal_fast']:
+        ar = fast_eval_recall(results, dataset.coco, np.array(max_dets))
+        for i, num in enumerate(max_dets):
+            print('AR@{}\t= {:.4f}'.format(num, ar[i]))
+        return
+
+    stats = dict()
+    for res_type in result_types:
+        if res_type == 'proposal':
+            evaluator = CocoEvaluator(
+                dataset.coco,
+                dataset.cat_ids,
+                use_cats=False,
+                max_dets=max_dets,
+                nproc=nproc)
+        else:
+            evaluator = CocoEvaluator(
+                dataset.coco, dataset.cat_ids, iou_type=res_type, nproc=nproc)
+        print('Evaluate annotation type *{}*'.format(evaluator.iou_type))
+        evaluator.add(dataset.img_ids, results)
+        evaluator.add_empty()
+        stats[res_type] = evaluator.summarize()
+        evaluator.close()
+    return stats
+
+
 def fast_eval_recall(results,
                      coco,
                      max_dets,
@@ -154,24 +206,181 @@ def segm2json(dataset, results):
     return bbox_json_results, segm_json_results
 
 
-def results2json(dataset, results, out_file):
+# a json record of det2json, as written by json.dump
+DET_RECORD = ('{"image_id": %d, "bbox": [%r, %r, %r, %r], "score": %r, '
+              '"category_id": %d}')
+SEGM_RECORD = ('{"image_id": %d, "score": %r, "category_id": %d, '
+               '"segmentation": %s}')
+
+
+def flatten_dets(results):
+    """Image index, label and (n, 5) array of the detections of a list of
+    per-class arrays of every image, keeping their dtype."""
+    cls_dets = [dets for img_dets in results for dets in img_dets]
+    counts = [len(dets) for dets in cls_dets]
+    images = np.repeat(
+        np.repeat(np.arange(len(results)),
+                  [len(img_dets) for img_dets in results]), counts)
+    labels = np.repeat(
+        np.concatenate([np.arange(len(img_dets)) for img_dets in results] +
+                       [np.zeros(0, dtype=np.int64)]), counts)
+    nonempty = [dets for dets in cls_dets if len(dets) > 0]
+    dets = np.concatenate(nonempty) if nonempty else np.zeros((0, 5))
+    return images, labels, dets
+
+
+def det_records(img_ids, cat_ids, bboxes, scores):
+    """json records of detections, the same as ``json.dump`` writes for the
+    dicts of :func:`det2json`, separated by ', '."""
+    bboxes = np.asarray(bboxes, dtype=np.float64)
+    scores = np.asarray(scores, dtype=np.float64)
+    xywh = np.stack([
+        bboxes[:, 0], bboxes[:, 1], bboxes[:, 2] - bboxes[:, 0] + 1,
+        bboxes[:, 3] - bboxes[:, 1] + 1
+    ])
+    if not (np.isfinite(xywh).all() and np.isfinite(scores).all()):
+        # json writes NaN and Infinity instead of the float repr
+        return ', '.join(
+            json.dumps(
+                dict(
+                    image_id=img_id,
+                    bbox=bbox,
+                    score=score,
+                    category_id=cat_id))
+            for img_id, bbox, score, cat_id in zip(
+                img_ids.tolist(),
+                xywh.T.tolist(), scores.tolist(), cat_ids.tolist()))
+    rows = zip(img_ids.tolist(), *xywh.tolist(), scores.tolist(),
+               cat_ids.tolist())
+    return ', '.join([DET_RECORD % row for row in rows])
+
+
+def segm_records(img_ids, cat_ids, segms, scores):
+    """json records of :func:`segm2json`, as :func:`det_records`."""
+    records = []
+    for img_id, cat_id, segm, score in zip(img_ids.tolist(),
+                                           cat_ids.tolist(), segms,
+                                           np.asarray(
+                                               scores,
+                                               dtype=np.float64).tolist()):
+        segm = dict(segm)
+        if isinstance(segm['counts'], bytes):
+            segm['counts'] = segm['counts'].decode()
+        if np.isfinite(score):
+            records.append(SEGM_RECORD %
+                           (img_id, score, cat_id, json.dumps(segm)))
+        else:
+            records.append(
+                json.dumps(
+                    dict(
+                        image_id=img_id,
+                        score=score,
+                        category_id=cat_id,
+                        segmentation=segm)))
+    return ', '.join(records)
+
+
+def iter_json_records(dataset, results, res_type, chunk_size=200):
+    """Yield the json records of the results of ``chunk_size`` images at a
+    time, for ``res_type`` 'proposal', 'bbox' or 'segm'."""
+    img_ids = np.array(dataset.img_ids, dtype=np.int64)
+    cat_ids = np.array(dataset.cat_ids, dtype=np.int64)
+    for start in range(0, len(dataset), chunk_size):
+        chunk = results[start:min(start + chunk_size, len(dataset))]
+        if isinstance(chunk, DetResults):
+            yield det_records(img_ids[start + chunk.images],
+                              cat_ids[chunk.labels], chunk.bboxes,
+                              chunk.scores)
+            continue
+        if res_type == 'proposal':
+            images, _, dets = flatten_dets([[dets] for dets in chunk])
+            yield det_records(img_ids[start + images],
+                              np.ones(len(images), dtype=np.int64),
+                              dets[:, :4], dets[:, 4])
+            continue
+        if isinstance(chunk[0], tuple):
+            images, labels, dets = flatten_dets([det for det, _ in chunk])
+        else:
+            images, labels, dets = flatten_dets(chunk)
+        if res_type == 'bbox':
+            yield det_records(img_ids[start + images], cat_ids[labels],
+                              dets[:, :4], dets[:, 4])
+            continue
+        segms = []
+        scores = []
+        for (det, seg) in chunk:
+            for label in range(len(det)):
+                num = len(det[label])
+                # some detectors use different score for det and segm
+                if len(seg) == 2:
+                    segms.extend(seg[0][label][:num])
+                    scores.extend(seg[1][label][:num])
+                else:
+                    segms.extend(seg[label][:num])
+                    scores.extend(det[label][:, 4])
+        yield segm_records(img_ids[start + images], cat_ids[labels], segms,
+                           scores)
+
+
+def dump_json_records(records, out_file):
+    """Stream json records to a file holding their json list."""
+    with open(out_file, 'w') as f:
+        f.write('[')
+        sep = ''
+        for chunk in records:
+            if chunk:
+                f.write(sep)
+                f.write(chunk)
+                sep = ', '
+        f.write(']')
+
+
+def results2json(dataset, results, out_file, bulk=True):
+    """Write the results in the COCO json format.
+
+    Args:
+        dataset (:obj:`CocoDataset`): the dataset of the results.
+        results (list | :obj:`DetResults`): results of every image.
+        out_file (str): prefix of the json files.
+        bulk (bool): stream the json records built from flat arrays, the
+            files are the same as with the dicts of :func:`det2json` and
+            :func:`segm2json`, which are used otherwise.
+
+    Returns:
+        dict: json file of every result type.
+    """
     result_files = dict()
-    if isinstance(results[0], list):
-        json_results = det2json(dataset, results)
+    if isinstance(results, DetResults) or isinstance(results[0], list):
         result_files['bbox'] = '{}.{}.json'.format(out_file, 'bbox')
         result_files['proposal'] = '{}.{}.json'.format(out_file, 'bbox')
-        mmcv.dump(json_results, result_files['bbox'])
+        if bulk:
+            dump_json_records(
+                iter_json_records(dataset, results, 'bbox'),
+                result_files['bbox'])
+        else:
+            mmcv.dump(det2json(dataset, results), result_files['bbox'])
     elif isinstance(results[0], tuple):
-        json_results = segm2json(dataset, results)
         result_files['bbox'] = '{}.{}.json'.format(out_file, 'bbox')
         result_files['proposal'] = '{}.{}.json'.format(out_file, 'bbox')
         result_files['segm'] = '{}.{}.json'.format(out_file, 'segm')
-        mmcv.dump(json_results[0], result_files['bbox'])
-        mmcv.dump(json_results[1], result_files['segm'])
+        if bulk:
+            for res_type in ['bbox', 'segm']:
+                dump_json_records(
+                    iter_json_records(dataset, results, res_type),
+                    result_files[res_type])
+        else:
+            json_results = segm2json(dataset, results)
+            mmcv.dump(json_results[0], result_files['bbox'])
+            mmcv.dump(json_results[1], result_files['segm'])
     elif isinstance(results[0], np.ndarray):
-        json_results = proposal2json(dataset, results)
         result_files['proposal'] = '{}.{}.json'.format(out_file, 'proposal')
-        mmcv.dump(json_results, result_files['proposal'])
+        if bulk:
+            dump_json_records(
+                iter_json_records(dataset, results, 'proposal'),
+                result_files['proposal'])
+        else:
+            mmcv.dump(proposal2json(dataset, results),
+                      result_files['proposal'])
     else:
         raise TypeError('invalid type of results')
     return result_files
@@ -1,23 +1,36 @@
-import os
-import os.path as osp
-
 import mmcv
 import numpy as np
 import torch
 import torch.distributed as dist
-from mmcv.parallel import collate, scatter
 from mmcv.runner import Hook
-from pycocotools.cocoeval import COCOeval
 from torch.utils.data import Dataset
 
 from mmdet import datasets
-from .coco_utils import fast_eval_recall, results2json
-from .mean_ap import eval_map
+from ..utils import build_collector, collect_results
+from .coco_evaluator import CocoEvaluator
+from .coco_utils import fast_eval_recall
+from .fast_mean_ap import eval_map
 
 
 class DistEvalHook(Hook):
-
-    def __init__(self, dataset, interval=1):
+    """Evaluate the model on all ranks after some training epochs.
+
+    The samples are loaded by a distributed dataloader, whose workers
+    prefetch the next samples during the inference. Every rank passes its
+    results to :meth:`add_results`, then :meth:`gather` collects them on
+    rank 0 for :meth:`evaluate`.
+
+    Args:
+        dataset (Dataset | dict): validation dataset or its config.
+        interval (int): evaluation interval, in epochs.
+        workers_per_gpu (int): number of dataloader workers of every rank.
+        collect (str): backend gathering the results on rank 0, see
+            :func:`build_collector`. The default writes them to a shared
+            temporary directory, as ``tools/test.py`` does.
+    """
+
+    def __init__(self, dataset, interval=1, workers_per_gpu=2,
+                 collect='file'):
         if isinstance(dataset, Dataset):
             self.dataset = dataset
         elif isinstance(dataset, dict):
@@ -27,48 +40,61 @@ class DistEvalHook(Hook):
                 'dataset must be a Dataset object or a dict, not {}'.format(
                     type(dataset)))
         self.interval = interval
+        self.workers_per_gpu = workers_per_gpu
+        self.collect = collect
+        self.data_loader = None
 
     def after_train_epoch(self, runner):
         if not self.every_n_epochs(runner, self.interval):
             return
         runner.model.eval()
-        results = [None for _ in range(len(self.dataset))]
+        if self.data_loader is None:
+            # the detectors test one image at a time
+            self.data_loader = datasets.build_dataloader(
+                self.dataset,
+                imgs_per_gpu=1,
+                workers_per_gpu=self.workers_per_gpu,
+                dist=True,
+                shuffle=False)
+        results = []
         if runner.rank == 0:
             prog_bar = mmcv.ProgressBar(len(self.dataset))
-        for idx in range(runner.rank, len(self.dataset), runner.world_size):
-            data = self.dataset[idx]
-            data_gpu = scatter(
-                collate([data], samples_per_gpu=1),
-                [torch.cuda.current_device()])[0]
-
-            # compute output
+        # sample i of this rank is the sample i * world_size + rank, the
+        # sampler pads the last ones with the first samples
+        for i, data in enumerate(self.data_loader):
             with torch.no_grad():
-                result = runner.model(
-                    return_loss=False, rescale=True, **data_gpu)
-            results[idx] = result
-
-            batch_size = runner.world_size
+                result = runner.model(return_loss=False, rescale=True, **data)
+            results.append(result)
+            idx = i * runner.world_size + runner.rank
+            if idx < len(self.dataset):
+                self.add_results(runner, [idx], [result])
             if runner.rank == 0:
-                for _ in range(batch_size):
+                for _ in range(runner.world_size):
                     prog_bar.update()
-
+        results = self.gather(runner, results)
         if runner.rank == 0:
             print('\n')
-            dist.barrier()
-            for i in range(1, runner.world_size):
-                tmp_file = osp.join(runner.work_dir, 'temp_{}.pkl'.format(i))
-                tmp_results = mmcv.load(tmp_file)
-                for idx in range(i, len(results), runner.world_size):
-                    results[idx] = tmp_results[idx]
-                os.remove(tmp_file)
             self.evaluate(runner, results)
-        else:
-            tmp_file = osp.join(runner.work_dir,
-                                'temp_{}.pkl'.format(runner.rank))
-            mmcv.dump(results, tmp_file)
-            dist.barrier()
         dist.barrier()
 
+    def add_results(self, runner, inds, results):
+        """Called on every rank with the results of its images ``inds``, as
+        they are computed."""
+        pass
+
+    def gather(self, runner, results):
+        """Collect the results of all ranks on rank 0.
+
+        Args:
+            results (list): results of the samples of this rank.
+
+        Returns:
+            list | None: the results of the dataset on rank 0, None on the
+                other ranks.
+        """
+        return collect_results(
+            results, len(self.dataset), backend=self.collect)
+
     def evaluate(self):
         raise NotImplementedError
 
@@ -117,9 +143,10 @@ class CocoDistEvalRecallHook(DistEvalHook):
                  dataset,
                  interval=1,
                  proposal_nums=(100, 300, 1000),
-                 iou_thrs=np.arange(0.5, 0.96, 0.05)):
+                 iou_thrs=np.arange(0.5, 0.96, 0.05),
+                 **kwargs):
         super(CocoDistEvalRecallHook, self).__init__(
-            dataset, interval=interval)
+            dataset, interval=interval, **kwargs)
         self.proposal_nums = np.array(proposal_nums, dtype=np.int32)
         self.iou_thrs = np.array(iou_thrs, dtype=np.float32)
 
@@ -134,35 +161,75 @@ class CocoDistEvalRecallHook(DistEvalHook):
 
 
 class CocoDistEvalmAPHook(DistEvalHook):
-
-    def evaluate(self, runner, results):
-        tmp_file = osp.join(runner.work_dir, 'temp_0')
-        result_files = results2json(self.dataset, results, tmp_file)
-
+    """Evaluate the COCO metrics with :class:`CocoEvaluator`.
+
+    Every rank evaluates its images as they are computed, so the evaluation
+    is split between the ranks and overlaps the inference. Only the per-image
+    evaluations are gathered, and rank 0 merges them into the metrics.
+
+    Args:
+        nproc (int): workers of the :class:`CocoEvaluator` of every rank. The
+            ranks already share the evaluation, so by default every rank
+            evaluates in its own process. A larger ``nproc`` starts a pool in
+            every rank, for every result type, at every evaluation.
+    """
+
+    def __init__(self, dataset, interval=1, nproc=1, **kwargs):
+        super(CocoDistEvalmAPHook, self).__init__(
+            dataset, interval=interval, **kwargs)
+        self.nproc = nproc
+        self.evaluators = None
+
+    def _build_evaluators(self, runner):
         res_types = ['bbox', 'segm'
                      ] if runner.model.module.with_mask else ['bbox']
-        cocoGt = self.dataset.coco
-        imgIds = cocoGt.getImgIds()
-        for res_type in res_types:
-            try:
-                cocoDt = cocoGt.loadRes(result_files[res_type])
-            except IndexError:
+        self.evaluators = [(res_type,
+                            CocoEvaluator(
+                                self.dataset.coco,
+                                self.dataset.cat_ids,
+                                iou_type=res_type,
+                                nproc=self.nproc)) for res_type in res_types]
+
+    def add_results(self, runner, inds, results):
+        if self.evaluators is None:
+            self._build_evaluators(runner)
+        img_ids = [self.dataset.img_ids[idx] for idx in inds]
+        for _, evaluator in self.evaluators:
+            evaluator.add(img_ids, results)
+
+    def gather(self, runner, results):
+        if self.evaluators is None:
+            self._build_evaluators(runner)
+        collector = build_collector(self.collect)
+        states = [evaluator.state() for _, evaluator in self.evaluators]
+        if runner.rank != 0:
+            collector.send(states)
+            for _, evaluator in self.evaluators:
+                evaluator.close()
+            self.evaluators = None
+            return None
+        for part in collector.recv():
+            for (_, evaluator), state in zip(self.evaluators, part):
+                evaluator.merge(state)
+        # the results are already evaluated
+        return None
+
+    def evaluate(self, runner, results):
+        evaluators, self.evaluators = self.evaluators, None
+        for res_type, evaluator in evaluators:
+            if evaluator.num_dets == 0:
                 print('No prediction found.')
                 break
-            iou_type = res_type
-            cocoEval = COCOeval(cocoGt, cocoDt, iou_type)
-            cocoEval.params.imgIds = imgIds
-            cocoEval.evaluate()
-            cocoEval.accumulate()
-            cocoEval.summarize()
+            evaluator.add_empty()
+            stats = evaluator.summarize()
             metrics = ['mAP', 'mAP_50', 'mAP_75', 'mAP_s', 'mAP_m', 'mAP_l']
             for i in range(len(metrics)):
                 key = '{}_{}'.format(res_type, metrics[i])
-                val = float('{:.3f}'.format(cocoEval.stats[i]))
+                val = float('{:.3f}'.format(stats[i]))
                 runner.log_buffer.output[key] = val
             runner.log_buffer.output['{}_mAP_copypaste'.format(res_type)] = (
                 '{ap[0]:.3f} {ap[1]:.3f} {ap[2]:.3f} {ap[3]:.3f} '
-                '{ap[4]:.3f} {ap[5]:.3f}').format(ap=cocoEval.stats[:6])
+                '{ap[4]:.3f} {ap[5]:.3f}').format(ap=stats[:6])
+        for _, evaluator in evaluators:
+            evaluator.close()
         runner.log_buffer.ready = True
-        for res_type in res_types:
-            os.remove(result_files[res_type])
@@ -0,0 +1,407 @@
+"""Vectorized version of mean_ap.
+
+The detections and gts of a class are evaluated for all images at once: the
+ious of the (det, gt) pairs of every image are computed in one pass and the
+greedy matching is done with numpy operations. The classes are evaluated in a
+pool of processes. The results are identical to the ones of :mod:`mean_ap`.
+"""
+from multiprocessing import Pool
+
+import numpy as np
+
+from ..bbox import DetResults
+from . import mean_ap
+from .mean_ap import print_map_summary
+
+
+def _areas(bboxes):
+    return (bboxes[:, 2] - bboxes[:, 0] + 1) * (
+        bboxes[:, 3] - bboxes[:, 1] + 1)
+
+
+def _first_of_runs(keys):
+    """Indices of the first element of every run of equal keys."""
+    return np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+
+
+def _run_lengths(starts, size):
+    return np.diff(np.append(starts, size))
+
+
+def _segment_argmax(keys, values):
+    """Max of the values of every run of equal sorted ``keys`` and the index
+    of its first occurrence, -1 where the max is NaN."""
+    starts = _first_of_runs(keys)
+    lengths = _run_lengths(starts, len(keys))
+    seg_max = np.maximum.reduceat(values, starts)
+    max_inds = np.flatnonzero(values == np.repeat(seg_max, lengths))
+    seg_of_max = np.repeat(np.arange(len(starts)), lengths)[max_inds]
+    first = _first_of_runs(seg_of_max)
+    argmax = np.full(len(starts), -1, dtype=np.int64)
+    argmax[seg_of_max[first]] = max_inds[first]
+    return keys[starts], seg_max, argmax
+
+
+class ClassMatcher(object):
+    """Detections and gts of a class in all images.
+
+    Args:
+        dets (ndarray): (n, 5) detections of all images, sorted by image.
+        det_imgs (ndarray): (n, ) image of every detection.
+        gts (ndarray): (m, 4) gts of all images, sorted by image.
+        gt_imgs (ndarray): (m, ) image of every gt.
+        gt_ignore (ndarray): (m, ) ignore flag of every gt.
+        num_imgs (int): number of images.
+    """
+
+    def __init__(self, dets, det_imgs, gts, gt_imgs, gt_ignore, num_imgs):
+        self.dets = dets
+        self.det_imgs = det_imgs
+        self.gts = gts
+        self.gt_ignore = gt_ignore
+        self.num_dets = len(dets)
+        self.num_gts = len(gts)
+        num_img_dets = np.bincount(det_imgs, minlength=num_imgs)
+        num_img_gts = np.bincount(gt_imgs, minlength=num_imgs)
+        self.num_img_dets = num_img_dets
+        self.det_starts = np.cumsum(num_img_dets) - num_img_dets
+        gt_starts = np.cumsum(num_img_gts) - num_img_gts
+        self.order = self._sort_dets()
+        # (det, gt) pairs of the same image, ordered by det then gt
+        pair_counts = num_img_gts[det_imgs]
+        self.pair_dets = np.repeat(np.arange(self.num_dets), pair_counts)
+        self.pair_gts = np.arange(pair_counts.sum()) - np.repeat(
+            np.cumsum(pair_counts) - pair_counts, pair_counts) + np.repeat(
+                gt_starts[det_imgs], pair_counts)
+
+    def _sort_dets(self):
+        """Detection indices sorted by image, then by descending score in the
+        same order as ``np.argsort`` on every image."""
+        neg_scores = -self.dets[:, -1]
+        order = np.lexsort((neg_scores, self.det_imgs))
+        # the order of equal scores depends on the sorting algorithm
+        sorted_imgs = self.det_imgs[order]
+        sorted_scores = neg_scores[order]
+        ties = (sorted_imgs[1:] == sorted_imgs[:-1]) & (
+            sorted_scores[1:] == sorted_scores[:-1])
+        for i in np.unique(sorted_imgs[1:][ties]):
+            start = self.det_starts[i]
+            stop = start + self.num_img_dets[i]
+            order[start:stop] = start + np.argsort(-self.dets[start:stop, -1])
+        return order
+
+    def pair_ious(self, gts):
+        """Ious of the pairs, computed as in :func:`bbox_overlaps`."""
+        dets = self.dets.astype(np.float32)
+        gts = gts.astype(np.float32)
+        det_areas = _areas(dets)[self.pair_dets]
+        gt_areas = _areas(gts)[self.pair_gts]
+        dets = dets[self.pair_dets]
+        gts = gts[self.pair_gts]
+        x_start = np.maximum(dets[:, 0], gts[:, 0])
+        y_start = np.maximum(dets[:, 1], gts[:, 1])
+        x_end = np.minimum(dets[:, 2], gts[:, 2])
+        y_end = np.minimum(dets[:, 3], gts[:, 3])
+        overlap = np.maximum(x_end - x_start + 1, 0) * np.maximum(
+            y_end - y_start + 1, 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return overlap / (det_areas + gt_areas - overlap)
+
+    def tpfp(self, matched_gt, counted, min_area, max_area, gt_areas):
+        """tp and fp of one area range, for the dets matching ``matched_gt``
+        (-1 for none), a matched det is a tp where ``counted`` is set."""
+        tp = np.zeros(self.num_dets, dtype=np.float32)
+        fp = np.zeros(self.num_dets, dtype=np.float32)
+        is_matched = matched_gt >= 0
+        matched = matched_gt[is_matched]
+        ignored = self.gt_ignore[matched]
+        if min_area is not None:
+            ignored = ignored | (gt_areas[matched] < min_area) | (
+                gt_areas[matched] >= max_area)
+        tp[is_matched] = counted[is_matched] & ~ignored
+        fp[is_matched] = ~counted[is_matched] & ~ignored
+        if min_area is None:
+            fp[~is_matched] = 1
+        else:
+            det_areas = _areas(self.dets)
+            fp[~is_matched & (det_areas >= min_area) &
+               (det_areas < max_area)] = 1
+        return tp, fp
+
+
+def tpfp_imagenet(m, default_iou_thr, area_ranges):
+    """:func:`mean_ap.tpfp_imagenet` of all the images of a
+    :class:`ClassMatcher`."""
+    gt_w = m.gts[:, 2] - m.gts[:, 0] + 1
+    gt_h = m.gts[:, 3] - m.gts[:, 1] + 1
+    iou_thrs = np.minimum((gt_w * gt_h) / ((gt_w + 10.0) * (gt_h + 10.0)),
+                          default_iou_thr)
+    ious = m.pair_ious(m.gts - 1)
+    valid = ious >= iou_thrs[m.pair_gts]
+    pair_dets = m.pair_dets[valid]
+    pair_gts = m.pair_gts[valid]
+    ious = ious[valid]
+    rank = np.empty(m.num_dets, dtype=np.int64)
+    rank[m.order] = np.arange(m.num_dets)
+
+    # Every det takes, by descending score, the available gt with the
+    # largest iou. In a round, the dets of an image are resolved in order as
+    # long as their best available gts are all different, so at least the
+    # first unresolved det of every image is resolved.
+    matched_gt = np.full(m.num_dets, -1, dtype=np.int64)
+    unresolved = np.zeros(m.num_dets, dtype=bool)
+    unresolved[pair_dets] = True
+    gt_covered = np.zeros(m.num_gts, dtype=bool)
+    while True:
+        active = unresolved[pair_dets] & ~gt_covered[pair_gts]
+        if not active.any():
+            break
+        # dets left without an available gt stay unmatched
+        has_active = np.zeros(m.num_dets, dtype=bool)
+        has_active[pair_dets[active]] = True
+        unresolved &= has_active
+        dets, _, argmax = _segment_argmax(pair_dets[active], ious[active])
+        best_gts = pair_gts[active][argmax]
+        by_rank = np.argsort(rank[dets])
+        dets = dets[by_rank]
+        best_gts = best_gts[by_rank]
+        _, first_claims = np.unique(best_gts, return_index=True)
+        collides = np.ones(len(dets), dtype=bool)
+        collides[first_claims] = False
+        # collisions up to every det in its image
+        num_collides = np.cumsum(collides)
+        img_starts = _first_of_runs(m.det_imgs[dets])
+        num_collides -= np.repeat(
+            num_collides[img_starts] - collides[img_starts],
+            _run_lengths(img_starts, len(dets)))
+        resolved = num_collides == 0
+        matched_gt[dets[resolved]] = best_gts[resolved]
+        gt_covered[best_gts[resolved]] = True
+        unresolved[dets[resolved]] = False
+
+    counted = np.ones(m.num_dets, dtype=bool)
+    tpfp = [
+        m.tpfp(matched_gt, counted, min_area, max_area, gt_w * gt_h)
+        for min_area, max_area in area_ranges
+    ]
+    return tpfp
+
+
+def tpfp_default(m, iou_thr, area_ranges):
+    """:func:`mean_ap.tpfp_default` of all the images of a
+    :class:`ClassMatcher`."""
+    gt_areas = _areas(m.gts)
+    matched_gt = np.full(m.num_dets, -1, dtype=np.int64)
+    if len(m.pair_dets) > 0:
+        dets, ious_max, argmax = _segment_argmax(m.pair_dets,
+                                                 m.pair_ious(m.gts))
+        is_matched = ious_max >= iou_thr
+        matched_gt[dets[is_matched]] = m.pair_gts[argmax[is_matched]]
+    sorted_gts = matched_gt[m.order]
+    tpfp = []
+    for min_area, max_area in area_ranges:
+        gt_ignored = m.gt_ignore.copy()
+        if min_area is not None:
+            gt_ignored |= (gt_areas < min_area) | (gt_areas >= max_area)
+        # the first det by descending score matching a gt is a tp, the next
+        # ones are fps, the dets matching an ignored gt are ignored
+        takes = sorted_gts >= 0
+        takes[takes] = ~gt_ignored[sorted_gts[takes]]
+        take_inds = np.flatnonzero(takes)
+        _, first = np.unique(sorted_gts[take_inds], return_index=True)
+        counted = np.zeros(m.num_dets, dtype=bool)
+        counted[m.order[take_inds[first]]] = True
+        tpfp.append(m.tpfp(matched_gt, counted, min_area, max_area, gt_areas))
+    return tpfp
+
+
+def average_precision(recalls, precisions, mode='area'):
+    """:func:`mean_ap.average_precision` with the precision envelope computed
+    by ``np.maximum.accumulate``."""
+    if mode != 'area':
+        return mean_ap.average_precision(recalls, precisions, mode)
+    no_scale = False
+    if recalls.ndim == 1:
+        no_scale = True
+        recalls = recalls[np.newaxis, :]
+        precisions = precisions[np.newaxis, :]
+    assert recalls.shape == precisions.shape and recalls.ndim == 2
+    num_scales = recalls.shape[0]
+    ap = np.zeros(num_scales, dtype=np.float32)
+    zeros = np.zeros((num_scales, 1), dtype=recalls.dtype)
+    ones = np.ones((num_scales, 1), dtype=recalls.dtype)
+    mrec = np.hstack((zeros, recalls, ones))
+    mpre = np.hstack((zeros, precisions, zeros))
+    mpre = np.maximum.accumulate(mpre[:, ::-1], axis=1)[:, ::-1]
+    for i in range(num_scales):
+        ind = np.where(mrec[i, 1:] != mrec[i, :-1])[0]
+        ap[i] = np.sum((mrec[i, ind + 1] - mrec[i, ind]) * mpre[i, ind + 1])
+    if no_scale:
+        ap = ap[0]
+    return ap
+
+
+def get_cls_dets(det_results, class_id):
+    """Detections of a class in all images and their image indices, None if
+    the dtype of the arrays differ."""
+    if isinstance(det_results, DetResults):
+        inds = np.flatnonzero(np.asarray(det_results.labels) == class_id)
+        dets = np.empty((len(inds), 5), dtype=np.float32)
+        dets[:, :4] = det_results.bboxes[inds]
+        dets[:, 4] = det_results.scores[inds]
+        return dets, np.asarray(det_results.images[inds], dtype=np.int64)
+    cls_dets = [det[class_id] for det in det_results]
+    num_dets = np.array([len(dets) for dets in cls_dets], dtype=np.int64)
+    cls_dets = [dets for dets in cls_dets if len(dets) > 0]
+    if len(set(dets.dtype for dets in cls_dets)) > 1:
+        return None
+    dets = np.concatenate(cls_dets) if cls_dets else np.zeros(
+        (0, 5), dtype=np.float32)
+    return dets, np.repeat(np.arange(len(num_dets)), num_dets)
+
+
+def eval_cls(args):
+    """Evaluate a class, the arguments are packed to be sent to a worker."""
+    (dets, det_imgs, gts, gt_imgs, gt_ignore, num_imgs, tpfp_func, iou_thr,
+     area_ranges, mode) = args
+    m = ClassMatcher(dets, det_imgs, gts, gt_imgs, gt_ignore, num_imgs)
+    scale_ranges = area_ranges if area_ranges is not None else [(None, None)]
+    tp, fp = tuple(zip(*tpfp_func(m, iou_thr, scale_ranges)))
+    tp = np.vstack(tp)
+    fp = np.vstack(fp)
+    # calculate gt number of each scale, gts ignored or beyond scale
+    # are not counted
+    if area_ranges is None:
+        num_gts = np.array([np.sum(~gt_ignore)], dtype=int)
+    else:
+        gt_areas = _areas(gts)
+        num_gts = np.array([
+            np.sum(~gt_ignore & (gt_areas >= min_area)
+                   & (gt_areas < max_area))
+            for min_area, max_area in area_ranges
+        ],
+                           dtype=int)
+    # sort all det bboxes by score, also sort tp and fp
+    num_dets = dets.shape[0]
+    sort_inds = np.argsort(-dets[:, -1])
+    tp = tp[:, sort_inds]
+    fp = fp[:, sort_inds]
+    # calculate recall and precision with tp and fp
+    tp = np.cumsum(tp, axis=1)
+    fp = np.cumsum(fp, axis=1)
+    eps = np.finfo(np.float32).eps
+    recalls = tp / np.maximum(num_gts[:, np.newaxis], eps)
+    precisions = tp / np.maximum((tp + fp), eps)
+    # calculate AP
+    if area_ranges is None:
+        recalls = recalls[0, :]
+        precisions = precisions[0, :]
+        num_gts = num_gts.item()
+    ap = average_precision(recalls, precisions, mode)
+    return {
+        'num_gts': num_gts,
+        'num_dets': num_dets,
+        'recall': recalls,
+        'precision': precisions,
+        'ap': ap
+    }
+
+
+def eval_map(det_results,
+             gt_bboxes,
+             gt_labels,
+             gt_ignore=None,
+             scale_ranges=None,
+             iou_thr=0.5,
+             dataset=None,
+             print_summary=True,
+             nproc=4):
+    """Evaluate mAP of a dataset, same as :func:`mean_ap.eval_map`.
+
+    Args:
+        det_results (list | :obj:`DetResults`): a list of list,
+            [[cls1_det, cls2_det, ...], ...]
+        gt_bboxes (list): ground truth bboxes of each image, a list of K*4
+            array.
+        gt_labels (list): ground truth labels of each image, a list of K array
+        gt_ignore (list): gt ignore indicators of each image, a list of K array
+        scale_ranges (list, optional): [(min1, max1), (min2, max2), ...]
+        iou_thr (float): IoU threshold
+        dataset (None or str or list): dataset name or dataset classes.
+        print_summary (bool): whether to print the mAP summary
+        nproc (int): number of processes evaluating the classes, 0 or 1 to
+            evaluate them in this process.
+
+    Returns:
+        tuple: (mAP, [dict, dict, ...])
+    """
+    assert len(det_results) == len(gt_bboxes) == len(gt_labels)
+    if gt_ignore is not None:
+        assert len(gt_ignore) == len(gt_labels)
+        for i in range(len(gt_ignore)):
+            assert len(gt_labels[i]) == len(gt_ignore[i])
+    area_ranges = ([(rg[0]**2, rg[1]**2) for rg in scale_ranges]
+                   if scale_ranges is not None else None)
+    num_imgs = len(gt_bboxes)
+    num_classes = len(det_results[0])  # positive class num
+
+    # gts of all images, the per gt values are computed in the dtype of the
+    # gts so they must all have the same one
+    gts = [bboxes for bboxes in gt_bboxes if bboxes.shape[0] > 0]
+    if len(set(bboxes.dtype for bboxes in gts)) > 1:
+        return mean_ap.eval_map(det_results, gt_bboxes, gt_labels, gt_ignore,
+                                scale_ranges, iou_thr, dataset, print_summary)
+    num_img_gts = np.array([bboxes.shape[0] for bboxes in gt_bboxes])
+    gts = np.concatenate(gts) if gts else np.zeros((0, 4), dtype=np.float32)
+    gt_imgs = np.repeat(np.arange(num_imgs), num_img_gts)
+    labels = np.concatenate([
+        label if label.ndim == 1 else label[:, 0] for label in gt_labels
+    ] + [np.zeros(0, dtype=np.int64)])
+    if gt_ignore is None:
+        ignore = np.zeros(len(gts), dtype=bool)
+    else:
+        ignore = np.concatenate(
+            [np.asarray(flags, dtype=bool)
+             for flags in gt_ignore] + [np.zeros(0, dtype=bool)])
+
+    tpfp_func = (tpfp_imagenet if dataset in ['det', 'vid'] else tpfp_default)
+    mode = 'area' if dataset != 'voc07' else '11points'
+    tasks = []
+    for i in range(num_classes):
+        cls_dets = get_cls_dets(det_results, i)
+        if cls_dets is None:
+            return mean_ap.eval_map(det_results, gt_bboxes, gt_labels,
+                                    gt_ignore, scale_ranges, iou_thr, dataset,
+                                    print_summary)
+        cls_inds = labels == i + 1
+        tasks.append(cls_dets + (gts[cls_inds], gt_imgs[cls_inds],
+                                 ignore[cls_inds], num_imgs, tpfp_func,
+                                 iou_thr, area_ranges, mode))
+    if nproc > 1:
+        pool = Pool(min(nproc, num_classes))
+        eval_results = pool.map(eval_cls, tasks)
+        pool.close()
+        pool.join()
+    else:
+        eval_results = [eval_cls(task) for task in tasks]
+    if scale_ranges is not None:
+        # shape (num_classes, num_scales)
+        all_ap = np.vstack([cls_result['ap'] for cls_result in eval_results])
+        all_num_gts = np.vstack(
+            [cls_result['num_gts'] for cls_result in eval_results])
+        mean_ap_ = []
+        for i in range(len(scale_ranges)):
+            if np.any(all_num_gts[:, i] > 0):
+                mean_ap_.append(all_ap[all_num_gts[:, i] > 0, i].mean())
+            else:
+                mean_ap_.append(0.0)
+    else:
+        aps = []
+        for cls_result in eval_results:
+            if cls_result['num_gts'] > 0:
+                aps.append(cls_result['ap'])
+        mean_ap_ = np.array(aps).mean().item() if aps else 0.0
+    if print_summary:
+        print_map_summary(mean_ap_, eval_results, dataset)
+
+    return mean_ap_, eval_results
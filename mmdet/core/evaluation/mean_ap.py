@@ -2,6 +2,7 @@ import mmcv
 import numpy as np
 from terminaltables import AsciiTable
 
+from ..bbox import DetResults
 from .bbox_overlaps import bbox_overlaps
 from .class_names import get_classes
 
@@ -201,8 +202,11 @@ def tpfp_default(det_bboxes, gt_bboxes, gt_ignore, iou_thr, area_ranges=None):
 
 def get_cls_results(det_results, gt_bboxes, gt_labels, gt_ignore, class_id):
     """Get det results and gt information of a certain class."""
-    cls_dets = [det[class_id]
-                for det in det_results]  # det bboxes of this class
+    if isinstance(det_results, DetResults):
+        cls_dets = det_results.class_dets(class_id)
+    else:
+        cls_dets = [det[class_id]
+                    for det in det_results]  # det bboxes of this class
     cls_gts = []  # gt bboxes of this class
     cls_gt_ignore = []
     for j in range(len(gt_bboxes)):
@@ -0,0 +1,198 @@
+import os.path as osp
+
+import mmcv
+import numpy as np
+
+from ..bbox import DetResults
+
+# column name -> (dtype, number of values per detection)
+COLUMNS = {
+    'image': (np.int32, 1),
+    'label': (np.int32, 1),
+    'bbox': (np.float32, 4),
+    'score': (np.float32, 1),
+}
+# video_id, first image, number of images, first detection, number of dets
+INDEX_DTYPE = np.int64
+INDEX_WIDTH = 5
+
+
+class ResultStoreWriter(object):
+    """Append the detection results of videos to a :class:`ResultStore`.
+
+    Every column is an append-only binary file, and a video is committed by
+    appending its row to the index once all its columns are written, so the
+    readers never see a partially written video. Opening an existing store
+    drops the uncommitted tail left by an interrupted writer, and
+    ``video_ids`` tells which videos are already stored.
+
+    Args:
+        path (str): directory of the store.
+        num_classes (int): number of classes of the results.
+    """
+
+    def __init__(self, path, num_classes):
+        mmcv.mkdir_or_exist(path)
+        meta_file = osp.join(path, 'meta.json')
+        if osp.isfile(meta_file):
+            assert mmcv.load(meta_file)['num_classes'] == num_classes
+        else:
+            mmcv.dump(dict(num_classes=num_classes), meta_file)
+        self.path = path
+        self.num_classes = num_classes
+        store = ResultStore(path)
+        self.video_ids = set(store.video_ids.tolist())
+        self.num_images = store.num_images
+        self.num_dets = store.num_dets
+        self.files = {}
+        for name, (dtype, width) in COLUMNS.items():
+            f = open(osp.join(path, name + '.bin'), 'ab')
+            f.truncate(self.num_dets * width * np.dtype(dtype).itemsize)
+            self.files[name] = f
+        self.index_file = open(osp.join(path, 'index.bin'), 'ab')
+        self.index_file.truncate(
+            len(store) * INDEX_WIDTH * np.dtype(INDEX_DTYPE).itemsize)
+
+    def append(self, video_id, det_results, score_thr=0):
+        """Append the results of a video.
+
+        Args:
+            video_id (int): id of the video.
+            det_results (list[list[ndarray]] | :obj:`DetResults`): results of
+                every frame.
+            score_thr (float): keep the detections scored above this
+                threshold.
+        """
+        det_results = DetResults.from_list(det_results, self.num_classes,
+                                           score_thr)
+        columns = dict(
+            image=det_results.images + np.int32(self.num_images),
+            label=det_results.labels,
+            bbox=det_results.bboxes,
+            score=det_results.scores)
+        num_dets = det_results.num_dets
+        for name, (dtype, _) in COLUMNS.items():
+            np.ascontiguousarray(columns[name], dtype=dtype).tofile(
+                self.files[name])
+            self.files[name].flush()
+        row = np.array(
+            [video_id, self.num_images,
+             len(det_results), self.num_dets, num_dets],
+            dtype=INDEX_DTYPE)
+        row.tofile(self.index_file)
+        self.index_file.flush()
+        self.num_images += len(det_results)
+        self.num_dets += num_dets
+        self.video_ids.add(video_id)
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ResultStore(object):
+    """Read-only view of a columnar store of detection results.
+
+    The columns are memory-mapped, so any number of processes can read the
+    store at the same time, also while a :class:`ResultStoreWriter` appends
+    to it. A reader sees the videos committed when it was opened.
+
+    Args:
+        path (str): directory of the store.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        index_file = osp.join(path, 'index.bin')
+        if osp.isfile(index_file):
+            index = np.fromfile(index_file, dtype=INDEX_DTYPE)
+            # ignore a row being written
+            index = index[:len(index) // INDEX_WIDTH * INDEX_WIDTH]
+        else:
+            index = np.zeros(0, dtype=INDEX_DTYPE)
+        self.index = index.reshape(-1, INDEX_WIDTH)
+        meta_file = osp.join(path, 'meta.json')
+        if osp.isfile(meta_file):
+            self.num_classes = mmcv.load(meta_file)['num_classes']
+        else:
+            self.num_classes = 0
+        if len(self.index) > 0:
+            self.num_images = int(self.index[-1, 1] + self.index[-1, 2])
+            self.num_dets = int(self.index[-1, 3] + self.index[-1, 4])
+        else:
+            self.num_images = 0
+            self.num_dets = 0
+        self._columns = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def video_ids(self):
+        return self.index[:, 0]
+
+    def column(self, name):
+        """Memory-mapped column of all committed detections."""
+        if name not in self._columns:
+            dtype, width = COLUMNS[name]
+            shape = (self.num_dets, width) if width > 1 else (self.num_dets, )
+            if self.num_dets == 0:
+                self._columns[name] = np.zeros(shape, dtype=dtype)
+            else:
+                self._columns[name] = np.memmap(
+                    osp.join(self.path, name + '.bin'),
+                    dtype=dtype,
+                    mode='r',
+                    shape=shape)
+        return self._columns[name]
+
+    def get_video(self, idx):
+        """Columns of the ``idx``-th video, the image indices are relative to
+        the first image of the video."""
+        _, first_image, _, first_det, num_dets = self.index[idx]
+        columns = {
+            name: self.column(name)[first_det:first_det + num_dets]
+            for name in COLUMNS
+        }
+        columns['image'] = columns['image'] - np.int32(first_image)
+        return columns
+
+    def get_video_results(self, idx):
+        """Results of the ``idx``-th video as a :obj:`DetResults` of its
+        frames, backed by the memory-mapped columns."""
+        columns = self.get_video(idx)
+        return DetResults(columns['image'], columns['label'], columns['bbox'],
+                          columns['score'], int(self.index[idx, 2]),
+                          self.num_classes)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self.video_ids[idx], self.get_video_results(idx)
+
+    def to_det_results(self):
+        """Results of all frames as one :obj:`DetResults`, in the order of
+        the video ids.
+
+        A store written in video order, as by ``tools/merge_vid_results.py``,
+        is returned as is, backed by the memory-mapped columns.
+        """
+        if np.all(np.diff(self.video_ids) > 0):
+            return DetResults(
+                self.column('image'), self.column('label'),
+                self.column('bbox'), self.column('score'), self.num_images,
+                self.num_classes)
+        return DetResults.concat([
+            self.get_video_results(idx) for idx in np.argsort(self.video_ids)
+        ])
+
+
+def is_result_store(path):
+    return osp.isfile(osp.join(path, 'meta.json')) and osp.isfile(
+        osp.join(path, 'index.bin'))
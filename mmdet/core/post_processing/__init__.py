@@ -5,4 +5,5 @@ from .merge_augs import (merge_aug_proposals, merge_aug_bboxes,
 __all__ = [
     'multiclass_nms', 'merge_aug_proposals', 'merge_aug_bboxes',
     'merge_aug_scores', 'merge_aug_masks','seq_nms','multiclass',
+    'fast_seq_nms',
 ]
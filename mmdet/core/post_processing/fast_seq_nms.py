@@ -0,0 +1,609 @@
+"""Vectorized Seq-NMS.
+
+This is a drop-in replacement of :mod:`seq_nms` producing the same boxes and
+scores. Links between consecutive frames are built from whole-frame IoU
+matrices and stored as flat (CSR-like) arrays, and the max-path dynamic
+programming is vectorized per frame. After a path is removed only the frames
+whose scores can actually change are recomputed.
+
+The kept boxes of a frame stay in their input order, while :mod:`seq_nms`
+orders them as a python set of their indices, so the rows of a frame are
+equal once sorted. See ``tools/check_seq_nms.py`` for the comparison of both.
+"""
+from multiprocessing import Pool
+from multiprocessing.sharedctypes import RawArray
+
+import numpy as np
+
+NMS_THRESH = 0.3
+IOU_THRESH = 0.7
+MAX_THRESH = 1e-2
+
+
+def _box_areas(boxes):
+    return (boxes[:, 2] - boxes[:, 0] + 1) * (boxes[:, 3] - boxes[:, 1] + 1)
+
+
+def _scores(dets):
+    return dets[:, -1].astype(np.float64)
+
+
+def _frame_ious(boxes1, boxes2, areas1, areas2):
+    x1 = np.maximum(boxes1[:, None, 0], boxes2[None, :, 0])
+    y1 = np.maximum(boxes1[:, None, 1], boxes2[None, :, 1])
+    x2 = np.minimum(boxes1[:, None, 2], boxes2[None, :, 2])
+    y2 = np.minimum(boxes1[:, None, 3], boxes2[None, :, 3])
+    w = np.maximum(0.0, x2 - x1 + 1)
+    h = np.maximum(0.0, y2 - y1 + 1)
+    inter = w * h
+    return inter / (areas1[:, None] + areas2[None, :] - inter)
+
+
+def create_frame_links(boxes1, boxes2, areas1, areas2, thresh=IOU_THRESH):
+    """Link the boxes of two consecutive frames.
+
+    Args:
+        boxes1 (ndarray): shape (n, 4+), boxes of the previous frame.
+        boxes2 (ndarray): shape (k, 4+), boxes of the next frame.
+        areas1 (ndarray): shape (n, ), areas of boxes1.
+        areas2 (ndarray): shape (k, ), areas of boxes2.
+        thresh (float): IoU threshold of a link.
+
+    Returns:
+        tuple: (src, dst), indices of the linked boxes in both frames,
+            sorted by (src, dst).
+    """
+    if len(boxes1) == 0 or len(boxes2) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty.copy()
+    ious = _frame_ious(boxes1, boxes2, areas1, areas2)
+    src, dst = np.nonzero(ious >= thresh)
+    return src.astype(np.int64), dst.astype(np.int64)
+
+
+def _best_links(weights, src, dst):
+    """Index of the heaviest link into every linked ``dst`` box, ties
+    resolved by the smallest ``src``."""
+    order = np.lexsort((src, -weights, dst))
+    dst_sorted = dst[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = dst_sorted[1:] != dst_sorted[:-1]
+    return order[first]
+
+
+def _frame_max_path(scores, prev_acc=None, links=None):
+    """Max-path DP of one frame before any path is removed.
+
+    Args:
+        scores (ndarray): scores of the boxes of this frame.
+        prev_acc (ndarray, optional): accumulated scores of the previous
+            frame, not given for the first frame.
+        links (tuple, optional): (src, dst) links from the previous frame.
+
+    Returns:
+        tuple: (acc, back), accumulated scores of this frame and the index of
+            the best predecessor of every box in the previous frame, or -1.
+    """
+    acc = scores.copy()
+    back = np.full(len(scores), -1, dtype=np.int64)
+    if prev_acc is not None and len(links[0]) > 0:
+        src, dst = links
+        weights = prev_acc[src] + scores[dst]
+        best = _best_links(weights, src, dst)
+        best = best[weights[best] > acc[dst[best]]]
+        acc[dst[best]] = weights[best]
+        back[dst[best]] = src[best]
+    return acc, back
+
+
+def create_links(dets_cls, mapped_dets_cls=None):
+    """Build the links of a single class across a whole video.
+
+    Args:
+        dets_cls (list[ndarray]): per-frame detections of shape (n, 5).
+        mapped_dets_cls (list[ndarray], optional): detections of frame t-1
+            mapped to frame t. If given, links are built between the mapped
+            boxes and the detections of frame t.
+
+    Returns:
+        list[tuple]: (src, dst) index arrays for each pair of frames.
+    """
+    links = []
+    areas = [_box_areas(dets).astype(np.float64) for dets in dets_cls]
+    for frame_ind in range(len(dets_cls) - 1):
+        if mapped_dets_cls is None:
+            boxes1 = dets_cls[frame_ind]
+            areas1 = areas[frame_ind]
+        else:
+            boxes1 = mapped_dets_cls[frame_ind + 1]
+            # the reference implementation takes the areas of the first
+            # frame from the mapped boxes and afterwards from the detections
+            if frame_ind == 0:
+                areas1 = _box_areas(boxes1).astype(np.float64)
+            else:
+                areas1 = areas[frame_ind][:len(boxes1)]
+        links.append(
+            create_frame_links(boxes1, dets_cls[frame_ind + 1], areas1,
+                               areas[frame_ind + 1]))
+    return links
+
+
+class _LinkGraph(object):
+    """Boxes and links of one class stored as flat arrays.
+
+    Boxes of all frames are indexed globally, frame ``f`` owning the range
+    ``box_ptr[f]:box_ptr[f + 1]``. Links between frame ``f`` and ``f + 1``
+    occupy ``link_ptr[f]:link_ptr[f + 1]`` of ``link_src``/``link_dst``.
+    """
+
+    def __init__(self, dets_cls, links):
+        self.dets = dets_cls
+        self.num_frames = len(dets_cls)
+        num_boxes = [len(dets) for dets in dets_cls]
+        self.box_ptr = np.zeros(self.num_frames + 1, dtype=np.int64)
+        self.box_ptr[1:] = np.cumsum(num_boxes)
+        num_links = [len(src) for src, _ in links]
+        self.link_ptr = np.zeros(len(links) + 1, dtype=np.int64)
+        self.link_ptr[1:] = np.cumsum(num_links)
+        if sum(num_links) > 0:
+            self.link_src = np.concatenate([
+                src + self.box_ptr[f] for f, (src, _) in enumerate(links)
+            ])
+            self.link_dst = np.concatenate([
+                dst + self.box_ptr[f + 1] for f, (_, dst) in enumerate(links)
+            ])
+        else:
+            self.link_src = np.zeros(0, dtype=np.int64)
+            self.link_dst = np.zeros(0, dtype=np.int64)
+        self.link_alive = np.ones(len(self.link_src), dtype=bool)
+
+        num_total = int(self.box_ptr[-1])
+        if num_total > 0:
+            self.scores = np.concatenate(
+                [dets[:, -1] for dets in dets_cls]).astype(np.float64)
+        else:
+            self.scores = np.zeros(0, dtype=np.float64)
+        self.used = np.zeros(num_total, dtype=bool)
+        self.deleted = np.zeros(num_total, dtype=bool)
+        self.acc = np.zeros(num_total, dtype=np.float64)
+        self.back = np.full(num_total, -1, dtype=np.int64)
+
+    @property
+    def num_links(self):
+        return len(self.link_src)
+
+    def _update_frame(self, f):
+        """Recompute the accumulated path scores of frame ``f``."""
+        lo, hi = self.box_ptr[f], self.box_ptr[f + 1]
+        self.acc[lo:hi] = np.where(self.used[lo:hi], 0, self.scores[lo:hi])
+        self.back[lo:hi] = -1
+        if f == 0:
+            return
+        llo, lhi = self.link_ptr[f - 1], self.link_ptr[f]
+        if llo == lhi:
+            return
+        alive = self.link_alive[llo:lhi]
+        src = self.link_src[llo:lhi][alive]
+        dst = self.link_dst[llo:lhi][alive]
+        if len(src) == 0:
+            return
+        weights = self.acc[src] + self.scores[dst]
+        best = _best_links(weights, src, dst)
+        best_dst = dst[best]
+        better = weights[best] > self.acc[best_dst]
+        best = best[better]
+        self.acc[dst[best]] = weights[best]
+        self.back[dst[best]] = src[best]
+
+    def update(self, start=0, stop=None):
+        """Run the max-path DP from frame ``start`` on.
+
+        Frames after ``stop`` are only recomputed while their accumulated
+        scores keep changing.
+        """
+        if stop is None:
+            stop = self.num_frames - 1
+        for f in range(start, self.num_frames):
+            if f <= stop:
+                self._update_frame(f)
+                continue
+            lo, hi = self.box_ptr[f], self.box_ptr[f + 1]
+            old_acc = self.acc[lo:hi].copy()
+            self._update_frame(f)
+            if np.array_equal(old_acc, self.acc[lo:hi]):
+                break
+
+    def max_path(self):
+        """Find the path with the largest accumulated score.
+
+        Returns:
+            tuple: (root frame index, list of global box indices, score)
+        """
+        if len(self.acc) == 0:
+            return 0, [], 0
+        ind = int(self.acc.argmax())
+        max_score = self.acc[ind]
+        path = [ind]
+        while self.back[ind] != -1:
+            ind = int(self.back[ind])
+            path.append(ind)
+        path.reverse()
+        root = int(np.searchsorted(self.box_ptr, path[0], side='right')) - 1
+        return root, path, max_score
+
+    def remove_path(self, root, path, max_score, thresh=NMS_THRESH):
+        """Rescore the boxes on the path and suppress their neighbours."""
+        new_score = max_score / len(path)
+        kill = np.zeros(len(self.used), dtype=bool)
+        suppressed = []
+        for i, ind in enumerate(path):
+            f = root + i
+            dets = self.dets[f]
+            box_ind = ind - self.box_ptr[f]
+            dets[box_ind][4] = new_score
+            self.scores[ind] = dets[box_ind][-1]
+            areas = _box_areas(dets)
+            box = dets[box_ind]
+            x1 = np.maximum(box[0], dets[:, 0])
+            y1 = np.maximum(box[1], dets[:, 1])
+            x2 = np.minimum(box[2], dets[:, 2])
+            y2 = np.minimum(box[3], dets[:, 3])
+            w = np.maximum(0.0, x2 - x1 + 1)
+            h = np.maximum(0.0, y2 - y1 + 1)
+            inter = w * h
+            ovrs = inter / (areas[box_ind] + areas - inter)
+            deletes = np.nonzero(ovrs >= thresh)[0]
+            kill[deletes + self.box_ptr[f]] = True
+            suppressed.append(deletes[deletes != box_ind])
+
+        # drop every link touching a suppressed box (the path included)
+        llo = self.link_ptr[max(root - 1, 0)]
+        lhi = self.link_ptr[min(root + len(path), self.num_frames - 1)]
+        self.link_alive[llo:lhi] &= ~(kill[self.link_src[llo:lhi]]
+                                      | kill[self.link_dst[llo:lhi]])
+
+        for i, (ind, deletes) in enumerate(zip(path, suppressed)):
+            f = root + i
+            self.used[ind] = True
+            self.dets[f][deletes] = 0
+            self.scores[deletes + self.box_ptr[f]] = 0
+            self.deleted[deletes + self.box_ptr[f]] = True
+
+    def settled(self, num_frames):
+        """Whether the boxes of the first ``num_frames`` frames can no longer
+        change, i.e. every one of them is on a removed path or suppressed."""
+        stop = self.box_ptr[num_frames]
+        return bool(np.all(self.used[:stop] | self.deleted[:stop]))
+
+    def kept_dets(self):
+        return [
+            dets[~self.deleted[self.box_ptr[f]:self.box_ptr[f + 1]]]
+            for f, dets in enumerate(self.dets)
+        ]
+
+
+def _solve_graph(dets_cls, links, dp=None, num_settled=None):
+    """Remove max paths until no path scores :data:`MAX_THRESH`.
+
+    Args:
+        dets_cls (list[ndarray]): per-frame detections, rescored in place.
+        links (list[tuple]): links returned by :func:`create_links`.
+        dp (tuple, optional): per-frame (acc, back) of the graph before any
+            path is removed, as returned by :func:`_frame_max_path`. It is
+            computed here if not given.
+        num_settled (int, optional): stop as soon as the first
+            ``num_settled`` frames are settled. The other frames are then
+            not final.
+
+    Returns:
+        :obj:`_LinkGraph`: the solved graph.
+    """
+    graph = _LinkGraph(dets_cls, links)
+    if graph.num_links > 0:
+        if dp is None:
+            graph.update()
+        else:
+            graph.acc = np.concatenate([acc for acc, _ in dp])
+            graph.back = np.concatenate([
+                np.where(back >= 0, back + graph.box_ptr[max(f - 1, 0)], -1)
+                for f, (_, back) in enumerate(dp)
+            ])
+        while num_settled is None or not graph.settled(num_settled):
+            root, path, max_score = graph.max_path()
+            if max_score < MAX_THRESH or len(path) < 1:
+                break
+            graph.remove_path(root, path, max_score)
+            graph.update(root, root + len(path))
+    return graph
+
+
+def seq_nms_cls(dets_cls, links):
+    """Seq-NMS of a single class.
+
+    The scores of ``dets_cls`` are rescored in place, as in
+    :func:`seq_nms.maxPath`.
+
+    Args:
+        dets_cls (list[ndarray]): per-frame detections of shape (n, 5).
+        links (list[tuple]): links returned by :func:`create_links`.
+
+    Returns:
+        list[ndarray]: per-frame detections that survive suppression.
+    """
+    return _solve_graph(dets_cls, links).kept_dets()
+
+
+class _SharedDets(object):
+    """Detections of several videos packed into one shared buffer.
+
+    ``ptrs[task]`` holds the row offsets of every frame of a
+    (video, class) task, so a worker can rebuild its per-frame views
+    without any detection being pickled.
+    """
+
+    def __init__(self, videos):
+        arrays = [
+            dets for video in videos for dets_cls in video
+            for dets in dets_cls
+        ]
+        self.dtype = np.result_type(*arrays) if arrays else np.float32
+        self.width = max([dets.shape[1] for dets in arrays] or [5])
+        self.ptrs = []
+        num_rows = 0
+        for video in videos:
+            for dets_cls in video:
+                ptr = np.cumsum([0] + [len(dets) for dets in dets_cls])
+                self.ptrs.append(ptr + num_rows)
+                num_rows += int(ptr[-1])
+        self.raw = RawArray(
+            np.ctypeslib.as_ctypes_type(self.dtype),
+            max(num_rows, 1) * self.width)
+        buf = self.buffer()
+        task_ind = 0
+        for video in videos:
+            for dets_cls in video:
+                for f, dets in enumerate(dets_cls):
+                    ptr = self.ptrs[task_ind]
+                    buf[ptr[f]:ptr[f + 1]] = dets
+                task_ind += 1
+
+    def buffer(self):
+        return np.frombuffer(self.raw, dtype=self.dtype).reshape(
+            -1, self.width)
+
+    def task_dets(self, task_ind, buf=None):
+        if buf is None:
+            buf = self.buffer()
+        ptr = self.ptrs[task_ind]
+        return [buf[ptr[f]:ptr[f + 1]] for f in range(len(ptr) - 1)]
+
+
+_shared_dets = None
+_shared_mapped_dets = None
+
+
+def _init_worker(shared_dets, shared_mapped_dets):
+    global _shared_dets, _shared_mapped_dets
+    _shared_dets = shared_dets
+    _shared_mapped_dets = shared_mapped_dets
+
+
+def _seq_nms_task(task_ind):
+    dets_cls = _shared_dets.task_dets(task_ind)
+    mapped_dets_cls = None
+    if _shared_mapped_dets is not None:
+        mapped_dets_cls = _shared_mapped_dets.task_dets(task_ind)
+    graph = _solve_graph(dets_cls, create_links(dets_cls, mapped_dets_cls))
+    # rescored boxes are written back to the shared buffer in place
+    return task_ind, ~graph.deleted
+
+
+def parallel_seq_nms(videos, mapped_videos=None, num_workers=4):
+    """Seq-NMS of several videos with classes sharded across processes.
+
+    Every (video, class) pair is an independent task. The detections are
+    copied once into shared memory, workers rescore them in place there and
+    only send back which boxes survive. The input arrays are not modified.
+
+    The workers inherit the shared memory when they start, so a pool is
+    created by every call. Pass all the videos of a dataset at once rather
+    than one video per call.
+
+    Args:
+        videos (list): ``videos[video][cls][frame]`` of shape (n, 5).
+        mapped_videos (list, optional): mapped detections, indexed the same
+            way as ``videos``.
+        num_workers (int): number of worker processes.
+
+    Returns:
+        list: rescored and suppressed detections of every video.
+    """
+    shared_dets = _SharedDets(videos)
+    shared_mapped_dets = (None if mapped_videos is None else
+                          _SharedDets(mapped_videos))
+    # largest tasks first for a better balance across workers
+    tasks = sorted(
+        range(len(shared_dets.ptrs)),
+        key=lambda i: shared_dets.ptrs[i][0] - shared_dets.ptrs[i][-1])
+    keeps = [None] * len(tasks)
+    pool = Pool(
+        num_workers,
+        initializer=_init_worker,
+        initargs=(shared_dets, shared_mapped_dets))
+    try:
+        for task_ind, keep in pool.imap_unordered(_seq_nms_task, tasks):
+            keeps[task_ind] = keep
+    finally:
+        pool.close()
+        pool.join()
+
+    buf = shared_dets.buffer()
+    outs = []
+    task_ind = 0
+    for video in videos:
+        out = []
+        for _ in video:
+            ptr = shared_dets.ptrs[task_ind] - shared_dets.ptrs[task_ind][0]
+            keep = keeps[task_ind]
+            out.append([
+                dets[keep[ptr[f]:ptr[f + 1]]] for f, dets in enumerate(
+                    shared_dets.task_dets(task_ind, buf))
+            ])
+            task_ind += 1
+        outs.append(out)
+    return outs
+
+
+def seq_nms(dets, mapped_dets=None, num_workers=0):
+    """Seq-NMS over a whole video.
+
+    Args:
+        dets (list[list[ndarray]]): ``dets[cls][frame]`` of shape (n, 5).
+        mapped_dets (list[list[ndarray]], optional): detections mapped from
+            the previous frame, indexed the same way as ``dets``.
+        num_workers (int): if larger than 1, classes are processed in
+            parallel by :func:`parallel_seq_nms`. Every call starts its own
+            processes, so several videos are better passed to a single
+            :func:`parallel_seq_nms` call.
+
+    Returns:
+        list[list[ndarray]]: rescored and suppressed detections.
+    """
+    if num_workers > 1:
+        mapped_videos = None if mapped_dets is None else [mapped_dets]
+        dets[:] = parallel_seq_nms([dets], mapped_videos, num_workers)[0]
+        return dets
+    for cls_ind, dets_cls in enumerate(dets):
+        mapped_dets_cls = (None if mapped_dets is None else
+                           mapped_dets[cls_ind])
+        links = create_links(dets_cls, mapped_dets_cls)
+        dets[cls_ind] = seq_nms_cls(dets_cls, links)
+    return dets
+
+
+def seq_nms_with_mapper(dets, mapped_dets, num_workers=0):
+    return seq_nms(dets, mapped_dets, num_workers)
+
+
+class StreamingSeqNMS(object):
+    """Online Seq-NMS over a sliding window of frames.
+
+    Frames are pushed one at a time and the links to the previous frame are
+    built on arrival. Once ``window_size`` newer frames have been pushed, the
+    oldest buffered frame leaves the window: Seq-NMS is run on the buffered
+    frames and the rescored boxes of that frame are emitted. Only the window
+    is kept in memory, and when ``window_size`` is not smaller than the video
+    length the output is the same as :func:`seq_nms`.
+
+    The max-path DP of the window before any suppression is kept across
+    pushes: a new frame only computes its own accumulated scores, and when
+    the oldest frame leaves, the following frames are recomputed only while
+    their scores change. Path removal stops as soon as the emitted frame is
+    settled instead of running over the whole window.
+
+    Call :meth:`flush` at the end of every video, frames of different videos
+    are never linked.
+
+    Args:
+        window_size (int): number of frames a frame waits for before it is
+            finalized.
+    """
+
+    def __init__(self, window_size=30):
+        assert window_size >= 1
+        self.window_size = window_size
+        self.reset()
+
+    def reset(self):
+        """Start a new video."""
+        self._frames = []
+        self._links = []
+        # per-class (acc, back) of every buffered frame, see _frame_max_path
+        self._dp = []
+        self._num_pushed = 0
+
+    def push(self, dets, mapped_dets=None):
+        """Add the detections of the next frame.
+
+        Args:
+            dets (list[ndarray]): per-class detections of shape (n, 5).
+            mapped_dets (list[ndarray], optional): per-class detections of
+                the previous frame mapped to this frame.
+
+        Returns:
+            list[list[ndarray]]: per-class detections of the frames that
+                left the window, oldest first.
+        """
+        if self._frames:
+            prev = self._frames[-1]
+            frame_links = []
+            for cls_ind, dets_cls in enumerate(dets):
+                if mapped_dets is None:
+                    boxes1 = prev[cls_ind]
+                    areas1 = _box_areas(boxes1).astype(np.float64)
+                else:
+                    # same area bookkeeping as :func:`create_links`
+                    boxes1 = mapped_dets[cls_ind]
+                    if self._num_pushed == 1:
+                        areas1 = _box_areas(boxes1).astype(np.float64)
+                    else:
+                        areas1 = _box_areas(prev[cls_ind]).astype(
+                            np.float64)[:len(boxes1)]
+                frame_links.append(
+                    create_frame_links(boxes1, dets_cls, areas1,
+                                       _box_areas(dets_cls).astype(
+                                           np.float64)))
+            self._links.append(frame_links)
+            self._dp.append([
+                _frame_max_path(_scores(dets_cls), prev_dp[0], links)
+                for prev_dp, dets_cls, links in zip(self._dp[-1], dets,
+                                                    frame_links)
+            ])
+        else:
+            self._dp.append(
+                [_frame_max_path(_scores(dets_cls)) for dets_cls in dets])
+        self._frames.append(list(dets))
+        self._num_pushed += 1
+        if len(self._frames) <= self.window_size:
+            return []
+        out = self._solve(1)[0]
+        self._pop_frame()
+        return [out]
+
+    def flush(self):
+        """Finalize all buffered frames and start a new video."""
+        outs = self._solve(len(self._frames)) if self._frames else []
+        self.reset()
+        return outs
+
+    def _pop_frame(self):
+        self._frames.pop(0)
+        self._links.pop(0)
+        self._dp.pop(0)
+        # paths can no longer go through the removed frame
+        for cls_ind in range(len(self._frames[0])):
+            for f, frame in enumerate(self._frames):
+                scores = _scores(frame[cls_ind])
+                if f == 0:
+                    acc, back = _frame_max_path(scores)
+                else:
+                    acc, back = _frame_max_path(scores,
+                                                self._dp[f - 1][cls_ind][0],
+                                                self._links[f - 1][cls_ind])
+                changed = not np.array_equal(acc, self._dp[f][cls_ind][0])
+                self._dp[f][cls_ind] = (acc, back)
+                if not changed:
+                    break
+
+    def _solve(self, num_frames):
+        """Seq-NMS of the window until its first ``num_frames`` frames are
+        settled, their detections are returned."""
+        outs = [[] for _ in range(num_frames)]
+        for cls_ind in range(len(self._frames[0])):
+            dets_cls = [frame[cls_ind].copy() for frame in self._frames]
+            links = [frame_links[cls_ind] for frame_links in self._links]
+            dp = [frame_dp[cls_ind] for frame_dp in self._dp]
+            graph = _solve_graph(dets_cls, links, dp, num_frames)
+            for frame_out, dets in zip(outs, graph.kept_dets()):
+                frame_out.append(dets)
+        return outs
@@ -1,7 +1,14 @@
-from .dist_utils import allreduce_grads, DistOptimizerHook
-from .misc import tensor2imgs, unmap, multi_apply
+from .collect_utils import (FileCollector, ResultCollector,
+                            SharedMemoryCollector, TensorCollector,
+                            build_collector, collect_results,
+                            collect_results_by_index)
+from .dist_utils import allreduce_grads, DistOptimizerHook, broadcast_tmpdir
+from .misc import normalize_img_tensor, tensor2imgs, unmap, multi_apply
 
 __all__ = [
-    'allreduce_grads', 'DistOptimizerHook', 'tensor2imgs', 'unmap',
+    'allreduce_grads', 'DistOptimizerHook', 'broadcast_tmpdir',
+    'ResultCollector', 'FileCollector', 'SharedMemoryCollector',
+    'TensorCollector', 'build_collector', 'collect_results',
+    'collect_results_by_index', 'normalize_img_tensor', 'tensor2imgs', 'unmap',
     'multi_apply'
 ]
@@ -0,0 +1,330 @@
+import os.path as osp
+import pickle
+import shutil
+import uuid
+
+import mmcv
+import numpy as np
+import torch
+import torch.distributed as dist
+from mmcv.runner import get_dist_info
+
+from .dist_utils import broadcast_tmpdir
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:  # python < 3.8
+    resource_tracker = shared_memory = None
+
+_cpu_group = None
+
+
+def get_cpu_group():
+    """Process group able to exchange CPU tensors.
+
+    It is the default group with the gloo backend, and a gloo group of all
+    ranks created once with the nccl backend.
+    """
+    global _cpu_group
+    if dist.get_backend() == 'gloo':
+        return dist.group.WORLD
+    if _cpu_group is None:
+        _cpu_group = dist.new_group(backend='gloo')
+    return _cpu_group
+
+
+def pack_obj(obj):
+    """Serialize an object into a uint8 array.
+
+    The arrays of ``obj`` are pickled out of band with pickle protocol 5, so
+    their data is copied once, into the returned array, instead of being
+    copied in a pickle string first.
+    """
+    buffers = []
+    if pickle.HIGHEST_PROTOCOL >= 5:
+        data = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+        buffers = [buf.raw() for buf in buffers]
+    else:
+        data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    chunks = [memoryview(data)] + buffers
+    # number of chunks, then their lengths and their data
+    header = np.array([len(chunks)] + [chunk.nbytes for chunk in chunks],
+                      dtype=np.int64)
+    packed = np.empty(header.nbytes + sum(header[1:]), dtype=np.uint8)
+    packed[:header.nbytes] = header.view(np.uint8)
+    offset = header.nbytes
+    for chunk in chunks:
+        packed[offset:offset + chunk.nbytes] = np.frombuffer(
+            chunk, dtype=np.uint8)
+        offset += chunk.nbytes
+    return packed
+
+
+def packed_size(buf):
+    """Length of the object packed at the start of ``buf``."""
+    num_chunks = int(np.frombuffer(buf, dtype=np.int64, count=1)[0])
+    lengths = np.frombuffer(
+        buf, dtype=np.int64, count=num_chunks, offset=8)
+    return 8 * (num_chunks + 1) + int(lengths.sum())
+
+
+def unpack_obj(buf, copy=False):
+    """Load an object serialized by :func:`pack_obj`.
+
+    Args:
+        buf (buffer): the packed object.
+        copy (bool): copy the data of the arrays. Otherwise they are views of
+            ``buf``, which must outlive them.
+    """
+    buf = memoryview(buf).cast('B')
+    num_chunks = int(np.frombuffer(buf, dtype=np.int64, count=1)[0])
+    lengths = np.frombuffer(
+        buf, dtype=np.int64, count=num_chunks, offset=8).tolist()
+    offset = 8 * (num_chunks + 1)
+    chunks = []
+    for length in lengths:
+        chunk = buf[offset:offset + length]
+        chunks.append(bytearray(chunk) if copy else chunk)
+        offset += length
+    if num_chunks > 1:
+        return pickle.loads(chunks[0], buffers=chunks[1:])
+    return pickle.loads(chunks[0])
+
+
+class ResultCollector(object):
+    """Gather the results of all ranks on rank 0, in dataset order.
+
+    The results of rank 0 stay in memory. The other ranks send theirs through
+    the backend of the subclass, and rank 0 places every part as soon as it
+    is received, in rank order.
+
+    A part is either a list of per-sample results or a :obj:`DetResults`.
+    """
+
+    def send(self, part):
+        """Called on the ranks other than 0 with their part."""
+        raise NotImplementedError
+
+    def recv(self):
+        """Called on rank 0, yields the parts of ranks 1 to world_size - 1."""
+        raise NotImplementedError
+
+    def collect(self, result_part, positions, size):
+        """Gather the results.
+
+        Args:
+            result_part (list | :obj:`DetResults`): results of this rank.
+            positions (list[int] | ndarray): position of every result of
+                this rank in the whole results. Those out of
+                ``range(size)`` are dropped, e.g. the samples padded by a
+                sampler.
+            size (int): length of the whole results.
+
+        Returns:
+            list | :obj:`DetResults` | None: the results of all ranks on
+                rank 0, None on the other ranks.
+        """
+        assert len(result_part) == len(positions)
+        rank, _ = get_dist_info()
+        positions = np.asarray(positions, dtype=np.int64)
+        if rank != 0:
+            self.send((positions, result_part))
+            return None
+        if isinstance(result_part, list):
+            results = [None] * size
+            for part_positions, part in self._parts(result_part, positions):
+                for pos, result in zip(part_positions.tolist(), part):
+                    if pos < size:
+                        results[pos] = result
+            return results
+        positions_list = []
+        part_list = []
+        for part_positions, part in self._parts(result_part, positions):
+            positions_list.append(part_positions)
+            part_list.append(part)
+        positions = np.concatenate(positions_list)
+        order = np.argsort(positions, kind='mergesort')
+        # keep the first result of every position
+        keep = np.ones(len(order), dtype=np.bool_)
+        keep[1:] = positions[order[1:]] != positions[order[:-1]]
+        order = order[keep & (positions[order] < size)]
+        assert np.array_equal(positions[order], np.arange(size)), \
+            'the results of some samples are missing'
+        return type(result_part).concat(part_list).select(order)
+
+    def _parts(self, result_part, positions):
+        yield positions, result_part
+        for part_positions, part in self.recv():
+            yield part_positions, part
+
+
+class FileCollector(ResultCollector):
+    """Exchange the parts as pickle files in a directory shared by all ranks.
+
+    Args:
+        tmpdir (str, optional): directory of the files, a temporary directory
+            created by rank 0 by default.
+    """
+
+    def __init__(self, tmpdir=None):
+        self.tmpdir = broadcast_tmpdir(tmpdir)
+
+    def send(self, part):
+        rank, _ = get_dist_info()
+        mmcv.dump(part, osp.join(self.tmpdir, 'part_{}.pkl'.format(rank)))
+        dist.barrier()
+
+    def recv(self):
+        _, world_size = get_dist_info()
+        dist.barrier()
+        for i in range(1, world_size):
+            yield mmcv.load(osp.join(self.tmpdir, 'part_{}.pkl'.format(i)))
+        shutil.rmtree(self.tmpdir)
+
+
+class SharedMemoryCollector(ResultCollector):
+    """Exchange the parts through shared memory, for single node runs.
+
+    Every rank packs its part into a shared memory block, rank 0 unpacks the
+    blocks, then every rank frees its own block. The blocks live in
+    ``/dev/shm``, which must be large enough for the results (docker limits
+    it to 64MB by default). Requires python 3.8 or later.
+    """
+
+    def __init__(self):
+        if shared_memory is None:
+            raise RuntimeError(
+                'the shared memory collector requires python 3.8 or later')
+        # name prefix of the blocks, chosen by rank 0
+        token = torch.zeros(32, dtype=torch.uint8)
+        rank, _ = get_dist_info()
+        if rank == 0:
+            token[:] = torch.tensor(
+                bytearray(uuid.uuid4().hex.encode()), dtype=torch.uint8)
+        dist.broadcast(token, 0, group=get_cpu_group())
+        self.prefix = 'mmdet_' + token.numpy().tobytes().decode()
+
+    def send(self, part):
+        rank, _ = get_dist_info()
+        packed = pack_obj(part)
+        shm = shared_memory.SharedMemory(
+            name='{}_{}'.format(self.prefix, rank),
+            create=True,
+            size=packed.nbytes)
+        np.frombuffer(shm.buf, dtype=np.uint8, count=packed.nbytes)[:] = packed
+        del packed
+        dist.barrier()
+        # rank 0 unpacks the blocks
+        dist.barrier()
+        shm.close()
+        shm.unlink()
+
+    def recv(self):
+        _, world_size = get_dist_info()
+        dist.barrier()
+        for i in range(1, world_size):
+            name = '{}_{}'.format(self.prefix, i)
+            shm = shared_memory.SharedMemory(name=name)
+            # the block is freed by its owner, not by this process at exit
+            resource_tracker.unregister(shm._name, 'shared_memory')
+            buf = shm.buf[:packed_size(shm.buf)]
+            part = unpack_obj(buf, copy=True)
+            buf.release()
+            shm.close()
+            yield part
+        dist.barrier()
+
+
+class TensorCollector(ResultCollector):
+    """Send the parts to rank 0 as CPU tensors, through gloo.
+
+    No GPU and no shared file system are needed. With the nccl backend, a
+    gloo group of all ranks is created for the results.
+    """
+
+    def __init__(self):
+        self.group = get_cpu_group()
+
+    def send(self, part):
+        packed = torch.from_numpy(pack_obj(part))
+        dist.send(
+            torch.tensor([packed.numel()], dtype=torch.int64),
+            0,
+            group=self.group)
+        dist.send(packed, 0, group=self.group)
+
+    def recv(self):
+        _, world_size = get_dist_info()
+        for i in range(1, world_size):
+            size = torch.zeros(1, dtype=torch.int64)
+            dist.recv(size, i, group=self.group)
+            packed = torch.empty(int(size.item()), dtype=torch.uint8)
+            dist.recv(packed, i, group=self.group)
+            # the arrays of the part are views of the received tensor
+            yield unpack_obj(packed.numpy())
+
+
+def build_collector(backend='file', tmpdir=None):
+    """Build a :class:`ResultCollector`.
+
+    Args:
+        backend (str): 'file', 'shm' or 'tensor'.
+        tmpdir (str, optional): directory of the file backend.
+    """
+    if backend == 'file':
+        return FileCollector(tmpdir)
+    elif backend == 'shm':
+        return SharedMemoryCollector()
+    elif backend == 'tensor':
+        return TensorCollector()
+    else:
+        raise ValueError(
+            'unknown result collector {}, must be file, shm or tensor'.format(
+                backend))
+
+
+def collect_results(result_part, size, tmpdir=None, backend='file',
+                    indices=None):
+    """Gather the results of all ranks on rank 0, in dataset order.
+
+    Args:
+        result_part (list | :obj:`DetResults`): results of this rank.
+        size (int): length of the dataset.
+        tmpdir (str, optional): directory of the file backend.
+        backend (str): 'file', 'shm' or 'tensor', see
+            :func:`build_collector`.
+        indices (list[int], optional): dataset index of every result of this
+            rank. By default the samples are interleaved between the ranks as
+            by :obj:`DistributedSampler`, which pads the last samples.
+
+    Returns:
+        list | :obj:`DetResults` | None: the results of the whole dataset on
+            rank 0, None on the other ranks.
+    """
+    rank, world_size = get_dist_info()
+    if indices is None:
+        indices = np.arange(len(result_part)) * world_size + rank
+    return build_collector(backend, tmpdir).collect(result_part, indices,
+                                                    size)
+
+
+def collect_results_by_index(result_part, indices, size, tmpdir=None,
+                             backend='file'):
+    """Gather the results of all ranks on rank 0, in dataset order.
+
+    Unlike the interleaved gathering of ``collect_results``, the samples of a
+    rank may be any subset of the dataset, e.g. the frames of the videos given
+    by a :obj:`DistributedVideoSampler`.
+
+    Args:
+        result_part (list): results of this rank.
+        indices (list[int]): dataset index of every result of this rank.
+        size (int): length of the dataset.
+        tmpdir (str, optional): directory of the file backend.
+        backend (str): 'file', 'shm' or 'tensor'.
+
+    Returns:
+        list or None: the results of the whole dataset on rank 0, None on the
+            other ranks.
+    """
+    return collect_results(result_part, size, tmpdir, backend, indices)
@@ -1,7 +1,10 @@
+import tempfile
 from collections import OrderedDict
 
+import mmcv
+import torch
 import torch.distributed as dist
-from mmcv.runner import OptimizerHook
+from mmcv.runner import OptimizerHook, get_dist_info
 from torch._utils import (_flatten_dense_tensors, _take_tensors,
                           _unflatten_dense_tensors)
 
@@ -56,3 +59,26 @@ class DistOptimizerHook(OptimizerHook):
         if self.grad_clip is not None:
             self.clip_grads(runner.model.parameters())
         runner.optimizer.step()
+
+
+def broadcast_tmpdir(tmpdir=None):
+    """Share a temporary directory created by rank 0 with all ranks.
+
+    The path is broadcast through a CPU tensor for the gloo backend, so no GPU
+    is needed to gather results.
+    """
+    rank, _ = get_dist_info()
+    if tmpdir is not None:
+        mmcv.mkdir_or_exist(tmpdir)
+        return tmpdir
+    device = 'cuda' if dist.get_backend() == 'nccl' else 'cpu'
+    MAX_LEN = 512
+    # 32 is whitespace
+    dir_tensor = torch.full((MAX_LEN, ), 32, dtype=torch.uint8, device=device)
+    if rank == 0:
+        tmpdir = tempfile.mkdtemp()
+        tmpdir = torch.tensor(
+            bytearray(tmpdir.encode()), dtype=torch.uint8, device=device)
+        dir_tensor[:len(tmpdir)] = tmpdir
+    dist.broadcast(dir_tensor, 0)
+    return dir_tensor.cpu().numpy().tobytes().decode().rstrip()
@@ -2,22 +2,67 @@ from functools import partial
 
 import mmcv
 import numpy as np
+import torch
 from six.moves import map, zip
 
 
-def tensor2imgs(tensor, mean=(0, 0, 0), std=(1, 1, 1), to_rgb=True):
+def tensor2imgs(tensor,
+                mean=(0, 0, 0),
+                std=(1, 1, 1),
+                to_rgb=True,
+                normalize=True):
     num_imgs = tensor.size(0)
     mean = np.array(mean, dtype=np.float32)
     std = np.array(std, dtype=np.float32)
     imgs = []
     for img_id in range(num_imgs):
         img = tensor[img_id, ...].cpu().numpy().transpose(1, 2, 0)
-        img = mmcv.imdenormalize(
-            img, mean, std, to_bgr=to_rgb).astype(np.uint8)
+        if normalize:
+            img = mmcv.imdenormalize(
+                img, mean, std, to_bgr=to_rgb).astype(np.uint8)
+        elif to_rgb:
+            img = img[..., ::-1].astype(np.uint8)
+        else:
+            img = img.astype(np.uint8)
         imgs.append(np.ascontiguousarray(img))
     return imgs
 
 
+def normalize_img_tensor(img, img_meta):
+    """Normalize the images left unnormalized by the data pipeline.
+
+    Datasets built with ``img_norm_cfg=dict(..., normalize=False)`` return
+    uint8 images and add their mean and std to the image meta, the
+    normalization being done here on the device of the model. The padding
+    is set back to 0, as when the images are normalized before padding.
+
+    Args:
+        img (Tensor | list[Tensor]): Images of shape (n, ..., c, h, w), or a
+            list of them at test time, one per augmentation.
+        img_meta (list[dict] | list[list[dict]]): Meta info of the images.
+
+    Returns:
+        Tensor | list[Tensor]: The normalized images, ``img`` itself if they
+            are already normalized.
+    """
+    if isinstance(img, (list, tuple)):
+        return [normalize_img_tensor(i, m) for i, m in zip(img, img_meta)]
+    if not img_meta or 'img_norm_cfg' not in img_meta[0]:
+        return img
+    norm_cfg = img_meta[0]['img_norm_cfg']
+    mean = img.new_tensor(norm_cfg['mean'], dtype=torch.float32)
+    std = img.new_tensor(norm_cfg['std'], dtype=torch.float32)
+    out = (img.float() - mean.view(-1, 1, 1)) / std.view(-1, 1, 1)
+    if img.is_floating_point():
+        # e.g. already cast to fp16
+        out = out.to(img.dtype)
+    for i, meta in enumerate(img_meta):
+        h, w = meta['img_shape'][:2]
+        out[i, ..., h:, :] = 0
+        out[i, ..., :h, w:] = 0
+    return out
+
+
 def multi_apply(func, *args, **kwargs):
     pfunc = partial(func, **kwargs) if kwargs else func
     map_results = map(pfunc, *args)
@@ -5,10 +5,15 @@ from .coco import CocoDataset
 from .cityscapes import CityscapesDataset
 from .voc import VOCDataset
 from .wider_face import WIDERFaceDataset
-from .loader import GroupSampler, DistributedGroupSampler, build_dataloader
+from .loader import (GroupSampler, DistributedGroupSampler,
+                     DistributedVideoSampler, ContiguousVideoSampler,
+                     get_video_ranges, build_dataloader)
 from .utils import to_tensor, random_scale, show_ann
 from .dataset_wrappers import ConcatDataset, RepeatDataset
 from .extra_aug import ExtraAugmentation
+from .frame_cache import FrameCache
+from .frame_index import FrameIndex
+from .packed_annotations import PackedAnnotations, pack_annotations
 from .registry import DATASETS
 from .builder import build_dataset
 from .imagenet import ImageNetDETVIDDataset,ImageNetVIDPairDataset,ImageNetVIDBlockDataset
@@ -16,7 +21,10 @@ from .imagenet import ImageNetDETVIDDataset,ImageNetVIDPairDataset,ImageNetVIDBl
 __all__ = [
     'CustomDataset', 'XMLDataset', 'CocoDataset', 'VOCDataset',
     'CityscapesDataset', 'GroupSampler', 'DistributedGroupSampler',
-    'build_dataloader', 'to_tensor', 'random_scale', 'show_ann',
+    'DistributedVideoSampler', 'ContiguousVideoSampler', 'get_video_ranges',
+    'build_dataloader', 'FrameCache', 'FrameIndex', 'PackedAnnotations',
+    'pack_annotations',
+    'to_tensor', 'random_scale', 'show_ann',
     'ConcatDataset', 'RepeatDataset', 'ExtraAugmentation', 'WIDERFaceDataset',
     'DATASETS', 'build_dataset',
     'ImageNetDETVIDDataset','CustomPairDataset','ImageNetVIDPairDataset','ImageNetVIDBlockDataset',
@@ -7,11 +7,14 @@ from mmcv.parallel import DataContainer as DC
 from torch.utils.data import Dataset
 
 from .extra_aug import ExtraAugmentation
+from .frame_cache import FrameCache
+from .frame_index import FrameIndex, split_frame_name
+from .packed_annotations import PackedAnnotations, is_packed_annotations
 from .registry import DATASETS
 from .transforms import (BboxTransform, ImageTransform, MaskTransform,
                          Numpy2Tensor, SegMapTransform)
 from .utils import random_scale, to_tensor
-import torch
+
 
 @DATASETS.register_module
 class CustomBlockDataset(Dataset):
@@ -33,7 +36,24 @@ class CustomBlockDataset(Dataset):
         ...
     ]
 
-    The `ann` field is optional for testing.
+    The `ann` field is optional for testing. The annotations can also be
+    packed into flat arrays with :func:`pack_annotations`, `ann_file` being
+    the output directory.
+
+    `frame_cache` keeps the recently loaded frames, which are shared by the
+    blocks of the neighbouring samples of a video, e.g.
+    ``dict(max_bytes=512 * 1024**2, transformed=False)``. The decoded frames
+    are cached by default, and the resized and normalized ones with
+    ``transformed=True``, keyed by the scale and flip. See
+    :class:`FrameCache`. With ``normalize=False`` in `img_norm_cfg` the
+    transformed frames are kept as uint8, so 4 times as many fit in the
+    cache, and the model normalizes them (see :class:`ImageTransform`).
+
+    The neighbours of every frame are found once at init from a
+    :class:`FrameIndex` of the frames of every video. The index lists the
+    video directories, and is saved to `frame_index_file` if given, where
+    the videos whose directory changed are listed again, or is built from the
+    frames of the annotations with `frame_index_from_ann`.
     """
 
     CLASSES = None
@@ -59,7 +79,10 @@ class CustomBlockDataset(Dataset):
                  skip_img_without_anno=True,
                  test_mode=False,
                  block_size= 5,
-                 block_gap = 5):
+                 block_gap = 5,
+                 frame_cache=None,
+                 frame_index_file=None,
+                 frame_index_from_ann=False):
         # prefix of images path
         self.img_prefix = img_prefix
         self.block_size = block_size
@@ -73,7 +96,10 @@ class CustomBlockDataset(Dataset):
         # filter images with no annotation during training
         if not test_mode:
             valid_inds = self._filter_imgs()
-            self.img_infos = [self.img_infos[i] for i in valid_inds]
+            if isinstance(self.img_infos, PackedAnnotations):
+                self.img_infos = self.img_infos.select(valid_inds)
+            else:
+                self.img_infos = [self.img_infos[i] for i in valid_inds]
             if self.proposals is not None:
                 self.proposals = [self.proposals[i] for i in valid_inds]
 
@@ -116,6 +142,9 @@ class CustomBlockDataset(Dataset):
         # set group flag for the sampler
         if not self.test_mode:
             self._set_group_flag()
+        # frame numbers of the block of every sample
+        self._set_block_frames(
+            self.load_frame_index(frame_index_file, frame_index_from_ann))
         # transforms
         self.img_transform = ImageTransform(
             size_divisor=self.size_divisor, **self.img_norm_cfg)
@@ -134,10 +163,21 @@ class CustomBlockDataset(Dataset):
         self.resize_keep_ratio = resize_keep_ratio
         self.skip_img_without_anno = skip_img_without_anno
 
+        # cache of the frames shared by the blocks of neighbouring samples
+        if frame_cache is not None:
+            frame_cache = frame_cache.copy()
+            self.cache_transformed = frame_cache.pop('transformed', False)
+            self.frame_cache = FrameCache(**frame_cache)
+        else:
+            self.cache_transformed = False
+            self.frame_cache = None
+
     def __len__(self):
         return len(self.img_infos)
 
     def load_annotations(self, ann_file):
+        if is_packed_annotations(ann_file):
+            return PackedAnnotations(ann_file)
         return mmcv.load(ann_file)
 
     def load_proposals(self, proposal_file):
@@ -166,6 +206,136 @@ class CustomBlockDataset(Dataset):
             if img_info['width'] / img_info['height'] > 1:
                 self.flag[i] = 1
 
+    def load_frame_index(self, frame_index_file=None, from_ann=False):
+        """Load the frames of the videos of the dataset.
+
+        Args:
+            frame_index_file (str, optional): File caching the frames listed
+                in the video directories. It is built if needed, and the
+                videos missing from it or whose directory was modified since
+                are listed again.
+            from_ann (bool): Only use the frames of the annotations, without
+                accessing the file system.
+
+        Returns:
+            :obj:`FrameIndex`: The frames of every video directory.
+        """
+        filenames = [img_info['filename'] for img_info in self.img_infos]
+        if from_ann:
+            return FrameIndex.from_filenames(filenames)
+        video_exts = {}
+        for filename in filenames:
+            video_dir, frame_id, ext = split_frame_name(filename)
+            if frame_id is not None:
+                video_exts.setdefault(video_dir, ext)
+        if frame_index_file is not None and osp.isfile(frame_index_file):
+            frame_index = FrameIndex.load(frame_index_file)
+            outdated = {
+                d: video_exts[d]
+                for d in frame_index.outdated(self.img_prefix, video_exts)
+            }
+            if not outdated:
+                return frame_index
+            frame_index = frame_index.merge(
+                FrameIndex.from_dirs(self.img_prefix, outdated))
+        else:
+            frame_index = FrameIndex.from_dirs(self.img_prefix, video_exts)
+        if frame_index_file is not None:
+            frame_index.dump(frame_index_file)
+        return frame_index
+
+    def _set_block_frames(self, frame_index):
+        """Set the frame numbers of the block of every sample.
+
+        The frames missing in the index are replaced by their neighbour
+        towards the center of the block. The blocks of images which are not
+        numbered frames are set to -1 and repeat the image.
+        """
+        hf_size = int((self.block_size - 1) / 2)
+        video_inds = np.full(len(self), -1, dtype=np.int64)
+        centers = np.full(len(self), -1, dtype=np.int64)
+        for i, img_info in enumerate(self.img_infos):
+            video_dir, frame_id, _ = split_frame_name(img_info['filename'])
+            if frame_id is not None:
+                video_inds[i] = frame_index.video_inds[video_dir]
+                centers[i] = frame_id
+        shifts = np.arange(-hf_size, hf_size + 1) * self.block_gap
+        frames = centers[:, None] + shifts[None, :]
+        exists = frame_index.contains(
+            np.repeat(video_inds[:, None], len(shifts), axis=1), frames)
+        for i in range(hf_size - 1, -1, -1):
+            frames[:, i] = np.where(exists[:, i], frames[:, i],
+                                    frames[:, i + 1])
+        for i in range(hf_size + 1, len(shifts)):
+            frames[:, i] = np.where(exists[:, i], frames[:, i],
+                                    frames[:, i - 1])
+        frames[centers < 0] = -1
+        self.block_frames = frames.astype(np.int32)
+
+    def get_block_names(self, idx):
+        """Paths of the frames of the block of a sample."""
+        img_name = osp.join(self.img_prefix, self.img_infos[idx]['filename'])
+        frames = self.block_frames[idx]
+        if frames[0] < 0:
+            return [img_name] * len(frames)
+        dname = osp.dirname(img_name)
+        ext = osp.splitext(img_name)[1]
+        center = frames[int((self.block_size - 1) / 2)]
+        return [
+            img_name if f == center else osp.join(dname, '%06d' % f + ext)
+            for f in frames
+        ]
+
+    def load_frame(self, img_name, img_scale, flip, out=None):
+        """Load and transform a frame of a block, through the frame cache
+        if there is one.
+
+        Returns:
+            tuple: The transformed image (``out`` if given), image shape,
+                padded shape and scale factor, as returned by
+                :class:`ImageTransform`.
+        """
+
+        def load():
+            return mmcv.imread(img_name)
+
+        def transform(img, out=None):
+            return self.img_transform(
+                img,
+                img_scale,
+                flip,
+                keep_ratio=self.resize_keep_ratio,
+                out=out)
+
+        if self.frame_cache is None:
+            return transform(load(), out)
+        if self.cache_transformed:
+            key = (img_name, img_scale, flip, self.resize_keep_ratio)
+            result = self.frame_cache.get(key, lambda: transform(load()))
+            if out is None:
+                return result
+            out[...] = result[0]
+            return (out, ) + result[1:]
+        return transform(self.frame_cache.get(img_name, load), out)
+
+    def load_block(self, img_names, img_scale, flip):
+        """Load and transform the frames of a block into a single array.
+
+        The frames after the first one are transformed in place into the
+        array, so they are not copied again to be stacked.
+
+        Returns:
+            tuple: The frames of shape (block_size, c, h, w), and the image
+                shape, padded shape and scale factor of the first frame.
+        """
+        img, img_shape, pad_shape, scale_factor = self.load_frame(
+            img_names[0], img_scale, flip)
+        imgs = np.empty((len(img_names), ) + img.shape, dtype=img.dtype)
+        imgs[0] = img
+        for i, img_name in enumerate(img_names[1:], 1):
+            self.load_frame(img_name, img_scale, flip, out=imgs[i])
+        return imgs, img_shape, pad_shape, scale_factor
+
     def _rand_another(self, idx):
         pool = np.where(self.flag == self.flag[idx])[0]
         return np.random.choice(pool)
@@ -182,44 +352,7 @@ class CustomBlockDataset(Dataset):
 
     def prepare_train_img(self, idx):
         img_info = self.img_infos[idx]
-        # load image
-        img_name = osp.join(self.img_prefix, img_info['filename'])
-        dname = osp.dirname(img_name)
-        fname, ext = osp.splitext(osp.basename(img_name))
-        if fname.isdigit():
-            fidx = int(fname)
-        else:
-            fidx = None
-        hf_size = int((self.block_size-1)/2)
-        img_name_list = []
-        for i in range(-hf_size, hf_size+1):
-            if i==0:
-                img_name_list.append(osp.join(dname, fname + ext))
-                continue
-            shift = i*self.block_gap
-            if fidx is not None:
-                fidx_other = fidx+shift
-                fname_other = osp.join(dname, '%06d' % (fidx_other) + ext)
-                if not osp.exists(fname_other):
-                    img_name_list.append(None)
-                else:
-                    img_name_list.append(fname_other)
-            else:
-                img_name_list.append(None)
-
-        if None in img_name_list:
-            assert img_name_list[hf_size] is not None, img_name_list
-            for i in range(hf_size):
-                if img_name_list[hf_size-1-i] is None:
-                    img_name_list[hf_size - 1 - i] = img_name_list[hf_size - i]
-            for i in range(hf_size):
-                if img_name_list[hf_size+1+i] is None:
-                    img_name_list[hf_size+1+i] = img_name_list[hf_size + i]
-
-        img_list = []
-        for img_name in img_name_list:
-            img = mmcv.imread(img_name)
-            img_list.append(img)
+        img_name_list = self.get_block_names(idx)
 
         # load proposals if necessary
         if self.proposals is not None:
@@ -254,19 +387,13 @@ class CustomBlockDataset(Dataset):
         # extra augmentation
         if self.extra_aug is not None:
             raise ValueError('Need to implement for img list.')
-            img, gt_bboxes, gt_labels = self.extra_aug(img, gt_bboxes,
-                                                       gt_labels)
 
         # apply transforms
         flip = True if np.random.rand() < self.flip_ratio else False
         # randomly sample a scale
         img_scale = random_scale(self.img_scales, self.multiscale_mode)
-        for idx, im in enumerate(img_list):
-            im, img_shape, pad_shape, scale_factor = self.img_transform(
-                im, img_scale, flip, keep_ratio=self.resize_keep_ratio)
-            im = im.copy()
-            img_list[idx] = im
-        img = np.stack(img_list,axis=0)
+        img, img_shape, pad_shape, scale_factor = self.load_block(
+            img_name_list, img_scale, flip)
 
         if self.with_seg:
             gt_seg = mmcv.imread(
@@ -298,6 +425,8 @@ class CustomBlockDataset(Dataset):
             pad_shape=pad_shape,
             scale_factor=scale_factor,
             flip=flip)
+        if self.img_transform.img_norm_cfg is not None:
+            img_meta['img_norm_cfg'] = self.img_transform.img_norm_cfg
 
         data = dict(
             imgs=DC(to_tensor(img), stack=True),
@@ -319,34 +448,7 @@ class CustomBlockDataset(Dataset):
         """Prepare an image for testing (multi-scale and flipping)"""
         img_info = self.img_infos[idx]
 
-        # load image
-        img_name = osp.join(self.img_prefix, img_info['filename'])
-        dname = osp.dirname(img_name)
-        fname, ext = osp.splitext(osp.basename(img_name))
-        fidx = int(fname)
-        hf_size = int((self.block_size - 1) / 2)
-        img_name_list = []
-        for i in range(-hf_size, hf_size + 1):
-            shift = i * self.block_gap
-            fidx_other = fidx + shift
-            fname_other = osp.join(dname, '%06d' % (fidx_other) + ext)
-            if not osp.exists(fname_other):
-                img_name_list.append(None)
-            else:
-                img_name_list.append(fname_other)
-        if None in img_name_list:
-            assert img_name_list[hf_size] is not None
-            for i in range(hf_size):
-                if img_name_list[hf_size - 1 - i] is None:
-                    img_name_list[hf_size - 1 - i] = img_name_list[hf_size - i]
-            for i in range(hf_size):
-                if img_name_list[hf_size + 1 + i] is None:
-                    img_name_list[hf_size + 1 + i] = img_name_list[hf_size + i]
-
-        img_list = []
-        for img_name in img_name_list:
-            img = mmcv.imread(img_name)
-            img_list.append(img)
+        img_name_list = self.get_block_names(idx)
 
         if self.proposals is not None:
             proposal = self.proposals[idx][:self.num_max_proposals]
@@ -357,9 +459,9 @@ class CustomBlockDataset(Dataset):
         else:
             proposal = None
 
-        def prepare_single(img, scale, flip, proposal=None):
-            _img, img_shape, pad_shape, scale_factor = self.img_transform(
-                img, scale, flip, keep_ratio=self.resize_keep_ratio)
+        def prepare_single(img_names, scale, flip, proposal=None):
+            _img, img_shape, pad_shape, scale_factor = self.load_block(
+                img_names, scale, flip)
             _img = to_tensor(_img)
             _img_meta = dict(
                 ori_shape=(img_info['height'], img_info['width'], 3),
@@ -367,6 +469,8 @@ class CustomBlockDataset(Dataset):
                 pad_shape=pad_shape,
                 scale_factor=scale_factor,
                 flip=flip)
+            if self.img_transform.img_norm_cfg is not None:
+                _img_meta['img_norm_cfg'] = self.img_transform.img_norm_cfg
             if proposal is not None:
                 if proposal.shape[1] == 5:
                     score = proposal[:, 4, None]
@@ -386,13 +490,12 @@ class CustomBlockDataset(Dataset):
         assert len(self.img_scales)==1,'Only 1 scale testing supported.'
         scale = self.img_scales[0]
 
-        for idx, img in enumerate(img_list):
-            _img, _img_meta, _proposal = prepare_single(img, scale, False, proposal)
-            img_list[idx] = _img
+        _imgs, _img_meta, _proposal = prepare_single(img_name_list, scale,
+                                                     False, proposal)
 
         img_metas.append(DC(_img_meta, cpu_only=True))
         proposals.append(_proposal)
-        imgs = [torch.stack(img_list, dim=0)]
+        imgs = [_imgs]
         data = dict(img=imgs,
                     img_meta=img_metas)
         if self.proposals is not None:
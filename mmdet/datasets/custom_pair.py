@@ -7,6 +7,7 @@ from mmcv.parallel import DataContainer as DC
 from torch.utils.data import Dataset
 
 from .extra_aug import ExtraAugmentation
+from .packed_annotations import PackedAnnotations, is_packed_annotations
 from .registry import DATASETS
 from .transforms import (BboxTransform, ImageTransform, MaskTransform,
                          Numpy2Tensor, SegMapTransform)
@@ -42,7 +43,9 @@ class CustomPairDataset(Dataset):
         ...
     ]
 
-    The `ann` field is optional for testing.
+    The `ann` field is optional for testing. The annotations can also be
+    packed into flat arrays with :func:`pack_annotations`, `ann_file` being
+    the output directory.
     """
 
     CLASSES = None
@@ -81,7 +84,10 @@ class CustomPairDataset(Dataset):
         # filter images with no annotation during training
         if not test_mode:
             valid_inds = self._filter_imgs()
-            self.img_infos = [self.img_infos[i] for i in valid_inds]
+            if isinstance(self.img_infos, PackedAnnotations):
+                self.img_infos = self.img_infos.select(valid_inds)
+            else:
+                self.img_infos = [self.img_infos[i] for i in valid_inds]
             if self.proposals is not None:
                 self.proposals = [self.proposals[i] for i in valid_inds]
 
@@ -150,6 +156,8 @@ class CustomPairDataset(Dataset):
         return len(self.img_infos)
 
     def load_annotations(self, ann_file):
+        if is_packed_annotations(ann_file):
+            return PackedAnnotations(ann_file)
         return mmcv.load(ann_file)
 
     def load_proposals(self, proposal_file):
@@ -287,6 +295,8 @@ class CustomPairDataset(Dataset):
             pad_shape=pad_shape,
             scale_factor=scale_factor,
             flip=flip)
+        if self.img_transform.img_norm_cfg is not None:
+            img_meta['img_norm_cfg'] = self.img_transform.img_norm_cfg
         data = dict(
             img1=DC(to_tensor(img1), stack=True),
             img2=DC(to_tensor(img2), stack=True),
@@ -334,6 +344,8 @@ class CustomPairDataset(Dataset):
                 pad_shape=pad_shape,
                 scale_factor=scale_factor,
                 flip=flip)
+            if self.img_transform.img_norm_cfg is not None:
+                _img_meta['img_norm_cfg'] = self.img_transform.img_norm_cfg
             if proposal is not None:
                 if proposal.shape[1] == 5:
                     score = proposal[:, 4, None]
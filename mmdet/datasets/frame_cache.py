@@ -0,0 +1,73 @@
+from collections import OrderedDict
+
+import numpy as np
+
+
+def _nbytes(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    elif isinstance(value, (tuple, list)):
+        return sum(_nbytes(v) for v in value)
+    return 0
+
+
+class FrameCache(object):
+    """LRU cache of decoded frames with a cap on their total size.
+
+    The neighbouring frames of consecutive samples of a video overlap, e.g.
+    a block of 5 frames shares 4 of them with the block of the next sample,
+    so keeping the recently decoded frames avoids decoding each frame up to
+    ``block_size`` times. Every dataloader worker holds its own copy of the
+    dataset, hence its own cache, so samplers should give each worker a
+    contiguous run of frames, see :class:`ContiguousVideoSampler`.
+
+    The cached values are shared between the samples using them and must not
+    be modified in place.
+
+    Args:
+        max_bytes (int): Maximum total size of the cached arrays. The least
+            recently used values are evicted beyond it.
+    """
+
+    def __init__(self, max_bytes=256 * 1024**2):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._values = OrderedDict()
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def get(self, key, load_func):
+        """Get the value of a key, loading it with ``load_func()`` if it is
+        not cached."""
+        try:
+            value = self._values.pop(key)
+        except KeyError:
+            self.misses += 1
+            value = load_func()
+            self.put(key, value)
+            return value
+        self.hits += 1
+        self._values[key] = value
+        return value
+
+    def put(self, key, value):
+        nbytes = _nbytes(value)
+        if nbytes > self.max_bytes:
+            return
+        if key in self._values:
+            self.nbytes -= _nbytes(self._values.pop(key))
+        self._values[key] = value
+        self.nbytes += nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._values.popitem(last=False)
+            self.nbytes -= _nbytes(evicted)
+
+    def clear(self):
+        self._values.clear()
+        self.nbytes = 0
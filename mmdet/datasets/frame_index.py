@@ -0,0 +1,184 @@
+import os
+import os.path as osp
+
+import mmcv
+import numpy as np
+
+
+def split_frame_name(filename):
+    """Split the path of a frame into its video directory, frame number and
+    extension, the frame number being None if the name is not a number."""
+    video_dir = osp.dirname(filename)
+    fname, ext = osp.splitext(osp.basename(filename))
+    frame_id = int(fname) if fname.isdigit() else None
+    return video_dir, frame_id, ext
+
+
+class FrameIndex(object):
+    """Sorted frame numbers of every video, stored in flat arrays.
+
+    The frames of the i-th video of ``video_dirs`` are
+    ``frame_ids[frame_offsets[i]:frame_offsets[i + 1]]``, so finding whether
+    a neighbouring frame exists is an array lookup instead of a call to the
+    file system.
+
+    Args:
+        video_dirs (list[str]): Directory of every video.
+        frame_offsets (ndarray): Start of the frames of every video in
+            ``frame_ids``, followed by the total number of frames.
+        frame_ids (ndarray): Frame numbers, sorted within every video.
+        video_mtimes (ndarray, optional): Modification time of every video
+            directory when it was listed, NaN if unknown.
+    """
+
+    def __init__(self,
+                 video_dirs,
+                 frame_offsets,
+                 frame_ids,
+                 video_mtimes=None):
+        assert len(frame_offsets) == len(video_dirs) + 1
+        self.video_dirs = list(video_dirs)
+        self.frame_offsets = np.asarray(frame_offsets, dtype=np.int64)
+        self.frame_ids = np.asarray(frame_ids, dtype=np.int64)
+        if video_mtimes is None:
+            video_mtimes = np.full(len(self.video_dirs), np.nan)
+        self.video_mtimes = np.asarray(video_mtimes, dtype=np.float64)
+        assert len(self.video_mtimes) == len(self.video_dirs)
+        self.video_inds = {d: i for i, d in enumerate(self.video_dirs)}
+
+    def __len__(self):
+        return len(self.video_dirs)
+
+    @classmethod
+    def from_frame_lists(cls, video_frames, video_mtimes=None):
+        """Build the index from a dict mapping every video directory to the
+        numbers of its frames, and optionally a dict of the modification
+        times of the directories."""
+        video_dirs = sorted(video_frames)
+        frames = [np.unique(video_frames[d]) for d in video_dirs]
+        frame_offsets = np.cumsum([0] + [len(f) for f in frames])
+        frame_ids = np.concatenate(frames) if frames else []
+        if video_mtimes is not None:
+            video_mtimes = [video_mtimes.get(d, np.nan) for d in video_dirs]
+        return cls(video_dirs, frame_offsets, frame_ids, video_mtimes)
+
+    @classmethod
+    def from_filenames(cls, filenames):
+        """Build the index from the frames listed in the annotations."""
+        video_frames = {}
+        for filename in filenames:
+            video_dir, frame_id, _ = split_frame_name(filename)
+            frames = video_frames.setdefault(video_dir, [])
+            if frame_id is not None:
+                frames.append(frame_id)
+        return cls.from_frame_lists(video_frames)
+
+    @classmethod
+    def from_dirs(cls, root, video_exts, nproc=8):
+        """Build the index by listing the frames of every video directory.
+
+        Args:
+            root (str): Prefix of the video directories.
+            video_exts (dict): Extension of the frames of every video
+                directory.
+            nproc (int): Number of processes listing the directories.
+        """
+        video_dirs = sorted(video_exts)
+        # taken before listing, so that a change during the listing makes
+        # the video outdated
+        video_mtimes = {d: osp.getmtime(osp.join(root, d)) for d in video_dirs}
+        tasks = [(osp.join(root, d), video_exts[d]) for d in video_dirs]
+        if nproc > 1 and len(tasks) > 1:
+            frames = mmcv.track_parallel_progress(_list_frames, tasks, nproc)
+        else:
+            frames = [_list_frames(task) for task in tasks]
+        return cls.from_frame_lists(
+            dict(zip(video_dirs, frames)), video_mtimes)
+
+    @classmethod
+    def load(cls, filename):
+        data = mmcv.load(filename, file_format='pkl')
+        # indexes saved without the modification times are all outdated
+        return cls(data['video_dirs'], data['frame_offsets'],
+                   data['frame_ids'], data.get('video_mtimes'))
+
+    def dump(self, filename):
+        # write then rename, several processes may build the same index
+        tmp_filename = '{}.{}.tmp'.format(filename, os.getpid())
+        mmcv.dump(
+            dict(
+                video_dirs=self.video_dirs,
+                frame_offsets=self.frame_offsets,
+                frame_ids=self.frame_ids,
+                video_mtimes=self.video_mtimes),
+            tmp_filename,
+            file_format='pkl')
+        os.replace(tmp_filename, filename)
+
+    def merge(self, other):
+        """Return an index with the videos of both indexes, those of
+        ``other`` taking precedence."""
+        video_frames = {
+            d: self.video_frames(i)
+            for i, d in enumerate(self.video_dirs)
+        }
+        video_frames.update({
+            d: other.video_frames(i)
+            for i, d in enumerate(other.video_dirs)
+        })
+        video_mtimes = dict(zip(self.video_dirs, self.video_mtimes))
+        video_mtimes.update(zip(other.video_dirs, other.video_mtimes))
+        return FrameIndex.from_frame_lists(video_frames, video_mtimes)
+
+    def outdated(self, root, video_dirs):
+        """The video directories missing from the index, or modified since
+        they were listed.
+
+        Adding, removing or renaming a frame updates the modification time
+        of its directory, so only the directories are checked.
+        """
+        outdated = []
+        for d in video_dirs:
+            idx = self.video_inds.get(d)
+            mtime = osp.getmtime(osp.join(root, d))
+            # NaN, an unknown time, never compares equal
+            if idx is None or self.video_mtimes[idx] != mtime:
+                outdated.append(d)
+        return outdated
+
+    def video_frames(self, video_idx):
+        start, stop = self.frame_offsets[video_idx:video_idx + 2]
+        return self.frame_ids[start:stop]
+
+    def contains(self, video_inds, frame_ids):
+        """Whether every frame ``frame_ids[i]`` of video ``video_inds[i]``
+        exists, for arrays of the same shape."""
+        video_inds = np.asarray(video_inds, dtype=np.int64)
+        frame_ids = np.asarray(frame_ids, dtype=np.int64)
+        found = np.zeros(frame_ids.shape, dtype=bool)
+        valid = (video_inds >= 0) & (frame_ids >= 0)
+        if len(self.frame_ids) == 0 or not valid.any():
+            return found
+        # (video, frame) keys sorted by video then frame, so a single sorted
+        # search covers all videos
+        keys = _frame_keys(
+            np.repeat(np.arange(len(self)), np.diff(self.frame_offsets)),
+            self.frame_ids)
+        queries = _frame_keys(video_inds[valid], frame_ids[valid])
+        pos = np.minimum(np.searchsorted(keys, queries), len(keys) - 1)
+        found[valid] = keys[pos] == queries
+        return found
+
+
+def _frame_keys(video_inds, frame_ids):
+    return (video_inds << 32) | frame_ids
+
+
+def _list_frames(task):
+    video_dir, ext = task
+    frames = []
+    for name in os.listdir(video_dir):
+        fname, fext = osp.splitext(name)
+        if fext == ext and fname.isdigit():
+            frames.append(int(fname))
+    return frames
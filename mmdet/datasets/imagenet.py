@@ -21,13 +21,14 @@ class ImageNetDETVIDDataset(CustomDataset):
       self.cat_ids = list(range(len(self.CLASSES)))
 
     def get_ann_info(self, idx):
-        ann = self.img_infos[idx]['ann']
+        # convert a copy, writing to img_infos would copy its memory pages in
+        # every dataloader worker
+        ann = dict(self.img_infos[idx]['ann'])
         # modify type if necessary.
         if not isinstance(ann['bboxes'],np.ndarray):
             ann['bboxes'] = np.array(ann['bboxes'], dtype=np.float32).reshape(-1, 4)
         if not isinstance(ann['labels'], np.ndarray):
             ann['labels'] = np.array(ann['labels'], dtype=np.int64)#.reshape(-1, 1)
-        self.img_infos[idx]['ann']=ann
         return ann
 
 
@@ -45,13 +46,14 @@ class ImageNetVIDBlockDataset(CustomBlockDataset):
     self.cat_ids = list(range(len(self.CLASSES)))
 
   def get_ann_info(self, idx):
-    ann = self.img_infos[idx]['ann']
+    # convert a copy, writing to img_infos would copy its memory pages in
+    # every dataloader worker
+    ann = dict(self.img_infos[idx]['ann'])
     # modify type if necessary.
     if not isinstance(ann['bboxes'], np.ndarray):
       ann['bboxes'] = np.array(ann['bboxes'], dtype=np.float32).reshape(-1, 4)
     if not isinstance(ann['labels'], np.ndarray):
       ann['labels'] = np.array(ann['labels'], dtype=np.int64)  # .reshape(-1, 1)
-    self.img_infos[idx]['ann'] = ann
     return ann
 
 
@@ -69,8 +71,10 @@ class ImageNetVIDPairDataset(CustomPairDataset):
     self.cat_ids = list(range(len(self.CLASSES)))
 
   def get_ann_info(self, idx):
-    ann1 = self.img_infos[idx]['ann1']
-    ann2 = self.img_infos[idx]['ann2']
+    # convert copies, writing to img_infos would copy its memory pages in
+    # every dataloader worker
+    ann1 = dict(self.img_infos[idx]['ann1'])
+    ann2 = dict(self.img_infos[idx]['ann2'])
     # modify type if necessary.
     if not isinstance(ann1['bboxes'], np.ndarray):
       ann1['bboxes'] = np.array(ann1['bboxes'], dtype=np.float32).reshape(-1, 4)
@@ -78,7 +82,6 @@ class ImageNetVIDPairDataset(CustomPairDataset):
       ann1['labels'] = np.array(ann1['labels'], dtype=np.int64)
     if not isinstance(ann1['trackids'], np.ndarray):
       ann1['trackids'] = np.array(ann1['trackids'], dtype=np.int64)
-    self.img_infos[idx]['ann1'] = ann1
 
     if not isinstance(ann2['bboxes'], np.ndarray):
       ann2['bboxes'] = np.array(ann2['bboxes'], dtype=np.float32).reshape(-1, 4)
@@ -86,5 +89,4 @@ class ImageNetVIDPairDataset(CustomPairDataset):
       ann2['labels'] = np.array(ann2['labels'], dtype=np.int64)
     if not isinstance(ann2['trackids'], np.ndarray):
       ann2['trackids'] = np.array(ann2['trackids'], dtype=np.int64)
-    self.img_infos[idx]['ann2'] = ann2
     return ann1, ann2
\ No newline at end of file
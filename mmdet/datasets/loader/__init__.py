@@ -1,4 +1,9 @@
 from .build_loader import build_dataloader
-from .sampler import GroupSampler, DistributedGroupSampler
+from .sampler import (GroupSampler, DistributedGroupSampler,
+                      DistributedVideoSampler, ContiguousVideoSampler,
+                      get_video_ranges)
 
-__all__ = ['GroupSampler', 'DistributedGroupSampler', 'build_dataloader']
+__all__ = [
+    'GroupSampler', 'DistributedGroupSampler', 'DistributedVideoSampler',
+    'ContiguousVideoSampler', 'get_video_ranges', 'build_dataloader'
+]
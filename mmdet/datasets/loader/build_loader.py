@@ -5,7 +5,9 @@ from mmcv.parallel import collate
 from mmcv.runner import get_dist_info
 from torch.utils.data import DataLoader
 
-from .sampler import DistributedGroupSampler, DistributedSampler, GroupSampler
+from .sampler import (ContiguousVideoSampler, DistributedGroupSampler,
+                      DistributedSampler, DistributedVideoSampler,
+                      GroupSampler)
 
 if platform.system() != 'Windows':
     # https://github.com/pytorch/pytorch/issues/973
@@ -19,11 +21,35 @@ def build_dataloader(dataset,
                      workers_per_gpu,
                      num_gpus=1,
                      dist=True,
+                     by_video=False,
+                     contiguous=False,
                      **kwargs):
     shuffle = kwargs.get('shuffle', True)
-    if dist:
+    if contiguous:
+        # walk through the videos so that every worker can reuse the frames
+        # shared by consecutive samples, see FrameCache
+        if dist:
+            rank, world_size = get_dist_info()
+            batch_size = imgs_per_gpu
+            num_workers = workers_per_gpu
+        else:
+            rank, world_size = 0, 1
+            batch_size = num_gpus * imgs_per_gpu
+            num_workers = num_gpus * workers_per_gpu
+        sampler = ContiguousVideoSampler(
+            dataset,
+            batch_size,
+            num_workers,
+            shuffle=shuffle,
+            num_replicas=world_size,
+            rank=rank)
+    elif dist:
         rank, world_size = get_dist_info()
-        if shuffle:
+        if by_video:
+            # keep the frames of a video on one process and in order
+            assert not shuffle
+            sampler = DistributedVideoSampler(dataset, world_size, rank)
+        elif shuffle:
             sampler = DistributedGroupSampler(dataset, imgs_per_gpu,
                                               world_size, rank)
         else:
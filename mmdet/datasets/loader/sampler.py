@@ -1,5 +1,7 @@
 from __future__ import division
+import heapq
 import math
+import os.path as osp
 
 import numpy as np
 import torch
@@ -157,3 +159,186 @@ class DistributedGroupSampler(Sampler):
 
     def set_epoch(self, epoch):
         self.epoch = epoch
+
+
+def get_video_ranges(dataset):
+    """Frame index range ``(start, stop)`` of every video of a dataset.
+
+    Each dataset of a :obj:`ConcatDataset` holds one video. In any other
+    dataset the consecutive frames stored in the same directory form a video.
+    """
+    if hasattr(dataset, 'cumulative_sizes'):
+        stops = list(dataset.cumulative_sizes)
+        return list(zip([0] + stops[:-1], stops))
+    ranges = []
+    last_dir = None
+    for idx, img_info in enumerate(dataset.img_infos):
+        video_dir = osp.dirname(img_info['filename'])
+        if video_dir != last_dir:
+            ranges.append([idx, idx])
+            last_dir = video_dir
+        ranges[-1][1] = idx + 1
+    return [tuple(r) for r in ranges]
+
+
+def partition_videos(lengths, num_parts):
+    """Split videos into ``num_parts`` bins of about the same total length.
+
+    The longest remaining video always goes to the least loaded bin, which
+    bounds the largest bin by 4/3 of the optimum.
+
+    Args:
+        lengths (list[int]): number of frames of every video.
+        num_parts (int): number of bins.
+
+    Returns:
+        list[list[int]]: sorted video indices of every bin.
+    """
+    bins = [[] for _ in range(num_parts)]
+    heap = [(0, i) for i in range(num_parts)]
+    order = sorted(range(len(lengths)), key=lambda i: (-lengths[i], i))
+    for video_idx in order:
+        load, bin_idx = heapq.heappop(heap)
+        bins[bin_idx].append(video_idx)
+        heapq.heappush(heap, (load + lengths[video_idx], bin_idx))
+    return [sorted(b) for b in bins]
+
+
+class DistributedVideoSampler(Sampler):
+    """Sampler giving whole videos to every process.
+
+    The frames of a video are all loaded by the same process and in order, so
+    models keeping a temporal state across frames can be tested in
+    distributed mode. The videos are assigned with :func:`partition_videos`,
+    so each process gets about the same number of frames. Samples are not
+    padded, the processes may get a different number of frames.
+
+    Arguments:
+        dataset: Dataset used for sampling, see :func:`get_video_ranges`.
+        num_replicas (optional): Number of processes participating in
+            distributed testing.
+        rank (optional): Rank of the current process within num_replicas.
+    """
+
+    def __init__(self, dataset, num_replicas=None, rank=None):
+        _rank, _num_replicas = get_dist_info()
+        if num_replicas is None:
+            num_replicas = _num_replicas
+        if rank is None:
+            rank = _rank
+        self.dataset = dataset
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.video_ranges = get_video_ranges(dataset)
+        lengths = [stop - start for start, stop in self.video_ranges]
+        # the video indices of this process, in loading order
+        self.videos = partition_videos(lengths, num_replicas)[rank]
+        self.num_samples = sum(lengths[i] for i in self.videos)
+
+    def __iter__(self):
+        indices = []
+        for video_idx in self.videos:
+            start, stop = self.video_ranges[video_idx]
+            indices.extend(range(start, stop))
+        assert len(indices) == self.num_samples
+        return iter(indices)
+
+    def __len__(self):
+        return self.num_samples
+
+
+class ContiguousVideoSampler(Sampler):
+    """Sampler walking through the videos in contiguous runs of frames.
+
+    The videos are cut into chunks of ``chunk_size`` consecutive frames, which
+    are shuffled every epoch. Each chunk is padded with its last frames to a
+    multiple of ``batch_size``, so a batch never mixes videos (nor aspect
+    ratio groups). The :class:`DataLoader` hands the batches to its workers in
+    turn, so the batches are interleaved such that every worker loads a
+    contiguous run of frames, which keeps the frames shared by neighbouring
+    samples in its :class:`FrameCache`.
+
+    Arguments:
+        dataset: Dataset used for sampling, see :func:`get_video_ranges`.
+        batch_size (int): Batch size of the data loader.
+        num_workers (int): Number of workers of the data loader.
+        chunk_size (int): Number of consecutive frames loaded together.
+        shuffle (bool): Whether to shuffle the chunks every epoch.
+        num_replicas (optional): Number of processes participating in
+            distributed training.
+        rank (optional): Rank of the current process within num_replicas.
+    """
+
+    def __init__(self,
+                 dataset,
+                 batch_size=1,
+                 num_workers=1,
+                 chunk_size=64,
+                 shuffle=True,
+                 num_replicas=None,
+                 rank=None):
+        _rank, _num_replicas = get_dist_info()
+        if num_replicas is None:
+            num_replicas = _num_replicas
+        if rank is None:
+            rank = _rank
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.num_workers = max(num_workers, 1)
+        self.shuffle = shuffle
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.epoch = 0
+
+        # (start, stop) frame range of every chunk, as a multiple of batches
+        chunk_size = max(chunk_size // batch_size, 1) * batch_size
+        self.chunks = [(start, min(start + chunk_size, stop))
+                       for video_start, stop in get_video_ranges(dataset)
+                       for start in range(video_start, stop, chunk_size)]
+        num_batches = sum(
+            int(math.ceil((stop - start) / batch_size))
+            for start, stop in self.chunks)
+        self.num_batches = int(math.ceil(num_batches / num_replicas))
+        self.num_samples = self.num_batches * batch_size
+
+    def __iter__(self):
+        # deterministically shuffle based on epoch
+        if self.shuffle:
+            g = torch.Generator()
+            g.manual_seed(self.epoch)
+            order = torch.randperm(len(self.chunks), generator=g).tolist()
+        else:
+            order = range(len(self.chunks))
+
+        batches = []
+        for chunk_idx in order:
+            start, stop = self.chunks[chunk_idx]
+            indices = list(range(start, stop))
+            indices += [stop - 1] * (-len(indices) % self.batch_size)
+            batches += [
+                indices[i:i + self.batch_size]
+                for i in range(0, len(indices), self.batch_size)
+            ]
+        # add extra batches to make it evenly divisible
+        total_batches = self.num_batches * self.num_replicas
+        batches += batches[:total_batches - len(batches)]
+        assert len(batches) == total_batches
+
+        # subsample a contiguous part, then split it into one contiguous run
+        # per worker and give the batches to the workers in turn
+        offset = self.num_batches * self.rank
+        batches = batches[offset:offset + self.num_batches]
+        runs = np.array_split(np.arange(self.num_batches), self.num_workers)
+        indices = []
+        for step in range(max(len(run) for run in runs)):
+            for run in runs:
+                if step < len(run):
+                    indices.extend(batches[run[step]])
+        assert len(indices) == self.num_samples
+        return iter(indices)
+
+    def __len__(self):
+        return self.num_samples
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
@@ -0,0 +1,249 @@
+import os.path as osp
+from collections.abc import MutableMapping
+
+import mmcv
+import numpy as np
+
+META_FILE = 'meta.json'
+
+
+def is_packed_annotations(ann_file):
+    return osp.isfile(osp.join(ann_file, META_FILE))
+
+
+def _ragged_array(values, name):
+    """Concatenate the arrays of a field of all images, returning the flat
+    array and the offsets of every image."""
+    arrays = [np.asarray(v) for v in values]
+    if name.startswith('bboxes'):
+        arrays = [a.reshape(-1, 4) for a in arrays]
+    else:
+        # the shape of the rows is given by the non empty arrays
+        row_shape = ()
+        for a in arrays:
+            if a.size > 0:
+                row_shape = a.shape[1:]
+                break
+        arrays = [a.reshape((-1, ) + row_shape) for a in arrays]
+    offsets = np.cumsum([0] + [len(a) for a in arrays], dtype=np.int64)
+    # empty lists are parsed as floats, only the other arrays give the type
+    kinds = set(a.dtype.kind for a in arrays if a.size > 0)
+    if name.startswith('bboxes') or 'f' in kinds:
+        dtype = np.float32
+    elif kinds <= set('iub'):
+        dtype = np.int64
+    else:
+        raise TypeError('Cannot pack the field "{}" of types {}'.format(
+            name, kinds))
+    data = np.concatenate([a.astype(dtype) for a in arrays])
+    return data, offsets
+
+
+def _string_array(values):
+    encoded = [v.encode('utf-8') for v in values]
+    offsets = np.cumsum([0] + [len(s) for s in encoded], dtype=np.int64)
+    chars = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return chars, offsets
+
+
+def pack_annotations(img_infos, out_dir):
+    """Convert the annotations of a :class:`CustomDataset` style dataset to
+    flat arrays, saved as ``.npy`` files in ``out_dir``.
+
+    Strings and numbers of every image become one array per field, and every
+    array of the annotation dicts (e.g. ``ann``, or ``ann1`` and ``ann2`` of
+    pair datasets) becomes one array holding the rows of all images plus an
+    array of the offsets of every image. Floats are stored as float32 and
+    integers as int64. A field missing in some images is stored along with a
+    mask of the images having it.
+
+    Args:
+        img_infos (list[dict]): Annotations in the format of
+            :class:`CustomDataset`.
+        out_dir (str): Output directory, loaded by
+            :class:`PackedAnnotations`.
+    """
+    mmcv.mkdir_or_exist(out_dir)
+
+    def save(name, array):
+        np.save(osp.join(out_dir, name + '.npy'), array)
+
+    def save_present(name, present):
+        if not all(present):
+            save(name + '.present', np.array(present, dtype=bool))
+            return True
+        return False
+
+    names = []
+    for img_info in img_infos:
+        names.extend(name for name in img_info if name not in names)
+    fields = {}
+    for name in names:
+        present = [info.get(name) is not None for info in img_infos]
+        sample = img_infos[present.index(True)][name]
+        field = dict(optional=save_present(name, present))
+        if isinstance(sample, str):
+            chars, offsets = _string_array([
+                info[name] if p else ''
+                for info, p in zip(img_infos, present)
+            ])
+            save(name + '.chars', chars)
+            save(name + '.offsets', offsets)
+            field['type'] = 'str'
+        elif isinstance(sample, dict):
+            keys = []
+            for info, p in zip(img_infos, present):
+                if p:
+                    keys.extend(key for key in info[name] if key not in keys)
+            field['type'] = 'dict'
+            field['keys'] = {}
+            for key in keys:
+                key_name = '{}.{}'.format(name, key)
+                key_present = [
+                    p and key in info[name]
+                    for info, p in zip(img_infos, present)
+                ]
+                data, offsets = _ragged_array([
+                    info[name][key] if p else []
+                    for info, p in zip(img_infos, key_present)
+                ], key)
+                save(key_name, data)
+                save(key_name + '.offsets', offsets)
+                field['keys'][key] = dict(
+                    optional=save_present(key_name, key_present))
+        elif isinstance(sample, (bool, int, float, np.number)):
+            save(name,
+                 np.array([
+                     info[name] if p else 0
+                     for info, p in zip(img_infos, present)
+                 ]))
+            field['type'] = 'number'
+        else:
+            raise TypeError('Cannot pack the field "{}" of type {}'.format(
+                name, type(sample)))
+        fields[name] = field
+    mmcv.dump(
+        dict(num_images=len(img_infos), fields=fields),
+        osp.join(out_dir, META_FILE))
+
+
+class PackedImageInfo(MutableMapping):
+    """Annotations of an image of :class:`PackedAnnotations`, whose fields are
+    read on access.
+
+    The arrays are copied out of the memory-mapped files. Setting a field only
+    changes this object, not the packed annotations.
+    """
+
+    def __init__(self, packed, idx):
+        self._packed = packed
+        self._idx = idx
+        self._values = {}
+
+    def __getitem__(self, name):
+        if name not in self._values:
+            if name not in self._packed.fields or not self._packed.has_field(
+                    name, self._idx):
+                raise KeyError(name)
+            self._values[name] = self._packed.get_field(name, self._idx)
+        return self._values[name]
+
+    def __setitem__(self, name, value):
+        self._values[name] = value
+
+    def __delitem__(self, name):
+        raise TypeError('Fields of packed annotations cannot be deleted')
+
+    def __iter__(self):
+        for name in self._packed.fields:
+            if name in self._values or self._packed.has_field(
+                    name, self._idx):
+                yield name
+        for name in self._values:
+            if name not in self._packed.fields:
+                yield name
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class PackedAnnotations(object):
+    """Read only sequence of the image annotations saved by
+    :func:`pack_annotations`.
+
+    The arrays are memory-mapped, so they are loaded on demand and their
+    pages are shared by all the dataloader workers instead of being copied
+    by the reference counting of Python objects. Indexing returns a
+    :class:`PackedImageInfo`, which behaves as the dict of the image.
+
+    Args:
+        ann_dir (str): Directory written by :func:`pack_annotations`.
+        inds (ndarray, optional): Indices of the images to keep, see
+            :meth:`select`.
+    """
+
+    def __init__(self, ann_dir, inds=None):
+        self.ann_dir = ann_dir
+        meta = mmcv.load(osp.join(ann_dir, META_FILE))
+        self.num_images = meta['num_images']
+        self.fields = meta['fields']
+        self.inds = None if inds is None else np.asarray(inds, np.int64)
+        self._arrays = {}
+
+    def __getstate__(self):
+        # reopen the files instead of pickling the arrays
+        return dict(ann_dir=self.ann_dir, inds=self.inds)
+
+    def __setstate__(self, state):
+        self.__init__(state['ann_dir'], state['inds'])
+
+    def __len__(self):
+        return self.num_images if self.inds is None else len(self.inds)
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('image index out of range')
+        return PackedImageInfo(
+            self, idx if self.inds is None else int(self.inds[idx]))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def select(self, inds):
+        """Keep the images of the given indices."""
+        inds = np.asarray(inds, dtype=np.int64)
+        if self.inds is not None:
+            inds = self.inds[inds]
+        return PackedAnnotations(self.ann_dir, inds)
+
+    def array(self, name):
+        """Memory-mapped array of a file."""
+        if name not in self._arrays:
+            self._arrays[name] = np.load(
+                osp.join(self.ann_dir, name + '.npy'), mmap_mode='r')
+        return self._arrays[name]
+
+    def has_field(self, name, idx):
+        return (not self.fields[name]['optional']
+                or bool(self.array(name + '.present')[idx]))
+
+    def get_field(self, name, idx):
+        field = self.fields[name]
+        if field['type'] == 'str':
+            start, stop = self.array(name + '.offsets')[idx:idx + 2]
+            return self.array(name + '.chars')[start:stop].tobytes().decode(
+                'utf-8')
+        elif field['type'] == 'number':
+            return self.array(name)[idx].item()
+        value = {}
+        for key, key_field in field['keys'].items():
+            key_name = '{}.{}'.format(name, key)
+            if key_field['optional'] and not self.array(key_name +
+                                                        '.present')[idx]:
+                continue
+            start, stop = self.array(key_name + '.offsets')[idx:idx + 2]
+            value[key] = np.array(self.array(key_name)[start:stop])
+        return value
@@ -16,19 +16,44 @@ class ImageTransform(object):
     3. flip the image (if needed)
     4. pad the image (if needed)
     5. transpose to (c, h, w)
+
+    Steps 2 to 5 are done in a single pass writing the rescaled image into
+    the output array, band by band so that the rows being processed stay in
+    cache. The output array can be given with ``out``, e.g. a slice of the
+    array of a block of frames, to save the allocation and the copy.
+
+    With ``normalize=False`` the output is a uint8 image whose channels are
+    ordered and padded as above but not normalized. It is 4 times smaller to
+    collate and transfer, and the model normalizes it on its device with
+    :func:`mmdet.core.normalize_img_tensor`, given the mean and std added to
+    the image meta by the datasets (see :attr:`img_norm_cfg`). Float inputs,
+    e.g. from the extra augmentations, are rounded and clipped to [0, 255].
     """
 
+    # size of the rows of the image processed at once
+    band_bytes = 256 * 1024
+
     def __init__(self,
                  mean=(0, 0, 0),
                  std=(1, 1, 1),
                  to_rgb=True,
-                 size_divisor=None):
+                 size_divisor=None,
+                 normalize=True):
         self.mean = np.array(mean, dtype=np.float32)
         self.std = np.array(std, dtype=np.float32)
         self.to_rgb = to_rgb
         self.size_divisor = size_divisor
+        self.normalize = normalize
 
-    def __call__(self, img, scale, flip=False, keep_ratio=True):
+    @property
+    def img_norm_cfg(self):
+        """Mean and std to add to the image meta if the normalization is left
+        to the model, else None."""
+        if self.normalize:
+            return None
+        return dict(mean=self.mean.tolist(), std=self.std.tolist())
+
+    def __call__(self, img, scale, flip=False, keep_ratio=True, out=None):
         if keep_ratio:
             img, scale_factor = mmcv.imrescale(img, scale, return_scale=True)
         else:
@@ -37,16 +62,50 @@ class ImageTransform(object):
             scale_factor = np.array([w_scale, h_scale, w_scale, h_scale],
                                     dtype=np.float32)
         img_shape = img.shape
-        img = mmcv.imnormalize(img, self.mean, self.std, self.to_rgb)
-        if flip:
-            img = mmcv.imflip(img)
+        h, w, c = img_shape
         if self.size_divisor is not None:
-            img = mmcv.impad_to_multiple(img, self.size_divisor)
-            pad_shape = img.shape
+            divisor = self.size_divisor
+            pad_shape = (int(np.ceil(h / divisor)) * divisor,
+                         int(np.ceil(w / divisor)) * divisor, c)
         else:
             pad_shape = img_shape
-        img = img.transpose(2, 0, 1)
-        return img, img_shape, pad_shape, scale_factor
+        dtype = np.float32 if self.normalize else np.uint8
+        out_shape = (c, pad_shape[0], pad_shape[1])
+        if out is None:
+            out = np.empty(out_shape, dtype=dtype)
+        elif out.shape != out_shape or out.dtype != dtype:
+            raise ValueError(
+                'out should be a {} array of shape {}, but got {} {}'.format(
+                    np.dtype(dtype), out_shape, out.dtype, out.shape))
+        self._fill(img, flip, out)
+        return out, img_shape, pad_shape, scale_factor
+
+    def _fill(self, img, flip, out):
+        h, w, c = img.shape
+        # views of the input in the output order, nothing is copied here
+        if flip:
+            img = img[:, ::-1]
+        if self.to_rgb:
+            img = img[..., ::-1]
+        band = max(self.band_bytes // (w * c * out.itemsize), 1)
+        for start in range(0, h, band):
+            stop = min(start + band, h)
+            for i in range(c):
+                src = img[start:stop, :, i]
+                dst = out[i, start:stop, :w]
+                if self.normalize:
+                    # same float32 operations as mmcv.imnormalize
+                    np.subtract(
+                        src, self.mean[i], out=dst, dtype=np.float32)
+                    np.divide(dst, self.std[i], out=dst)
+                elif src.dtype != np.uint8:
+                    # e.g. the float output of the extra augmentations,
+                    # which may be out of [0, 255]
+                    dst[...] = np.clip(np.rint(src), 0, 255)
+                else:
+                    dst[...] = src
+        out[:, h:, :] = 0
+        out[:, :h, w:] = 0
 
 
 def bbox_flip(bboxes, img_shape):
@@ -1,86 +1,218 @@
+import glob
+import hashlib
+import os
 import os.path as osp
+import shutil
+import socket
 import xml.etree.ElementTree as ET
 
 import mmcv
 import numpy as np
 
 from .custom import CustomDataset
+from .packed_annotations import PackedAnnotations, pack_annotations
 from .registry import DATASETS
 
 
+def parse_xml(xml_path):
+    """Parse a PASCAL VOC style annotation file.
+
+    Returns:
+        dict: The image size and folder, and the names, difficult flags and
+            boxes (as in the file, not shifted by 1) of the objects.
+    """
+    tree = ET.parse(xml_path)
+    root = tree.getroot()
+    size = root.find('size')
+    folder = root.find('folder')
+    names = []
+    difficult = []
+    bboxes = []
+    for obj in root.findall('object'):
+        names.append(obj.find('name').text)
+        difficult.append(int(obj.find('difficult').text))
+        bnd_box = obj.find('bndbox')
+        bboxes.append([
+            int(bnd_box.find('xmin').text),
+            int(bnd_box.find('ymin').text),
+            int(bnd_box.find('xmax').text),
+            int(bnd_box.find('ymax').text)
+        ])
+    return dict(
+        width=int(size.find('width').text),
+        height=int(size.find('height').text),
+        folder=folder.text if folder is not None else None,
+        names=names,
+        difficult=np.array(difficult, dtype=np.int64),
+        bboxes=np.array(bboxes, dtype=np.float32).reshape(-1, 4))
+
+
 @DATASETS.register_module
 class XMLDataset(CustomDataset):
+    """Dataset with PASCAL VOC style XML annotations.
 
-    def __init__(self, min_size=None, **kwargs):
-        super(XMLDataset, self).__init__(**kwargs)
+    All the XML files are parsed once at init. With ``cache_dir``, the
+    parsed annotations are also saved there with :func:`pack_annotations`
+    and memory-mapped by the next runs. A file is parsed again when its
+    modification time changes. Every build is saved under a new name, which
+    depends on the image ids and modification times, so a cache read by
+    another process is never replaced.
+
+    After a new build, only the newest ``cache_keep`` builds of the same
+    annotation file are kept and the older ones are deleted. A run still
+    reading a deleted build fails when its dataloader workers reopen it, so
+    ``cache_keep`` must be at least the number of versions of the
+    annotations used by concurrent runs.
+
+    Without ``cache_dir`` every run (and every rank of a distributed run)
+    parses all the files again, so they are parsed in the current process.
+    With ``cache_dir`` the files to parse are split between ``nproc``
+    processes, as the result is saved.
+
+    Args:
+        min_size (int, optional): Boxes smaller than it are ignored.
+        cache_dir (str, optional): Directory of the parsed annotations.
+        nproc (int): Number of processes parsing the XML files to cache.
+        cache_keep (int): Number of builds kept in ``cache_dir``.
+    """
+
+    def __init__(self,
+                 min_size=None,
+                 cache_dir=None,
+                 nproc=8,
+                 cache_keep=2,
+                 **kwargs):
+        assert cache_keep >= 1
+        # used by load_annotations, called by CustomDataset
         self.cat2label = {cat: i + 1 for i, cat in enumerate(self.CLASSES)}
+        self.cache_dir = cache_dir
+        self.nproc = nproc
+        self.cache_keep = cache_keep
+        super(XMLDataset, self).__init__(**kwargs)
         self.min_size = min_size
 
+    def img_filename(self, img_id, folder):
+        return 'JPEGImages/{}.jpg'.format(img_id)
+
+    def _cache_prefix(self, ann_file):
+        key = '{}:{}:{}'.format(
+            type(self).__name__, osp.abspath(ann_file),
+            osp.abspath(self.img_prefix))
+        return osp.join(
+            self.cache_dir, '{}_{}'.format(
+                osp.splitext(osp.basename(ann_file))[0],
+                hashlib.md5(key.encode('utf-8')).hexdigest()[:8]))
+
+    @staticmethod
+    def _cache_version(img_ids, mtimes):
+        md5 = hashlib.md5('\n'.join(img_ids).encode('utf-8'))
+        md5.update(mtimes.astype(np.float64).tobytes())
+        return md5.hexdigest()[:16]
+
+    @staticmethod
+    def _cache_builds(prefix):
+        """Finished builds of a cache prefix, the newest first."""
+        builds = []
+        for path in glob.glob('{}.*'.format(prefix)):
+            if path.endswith('.tmp') or not osp.isdir(path):
+                continue
+            try:
+                builds.append((osp.getmtime(path), path))
+            except OSError:
+                # pruned by another process
+                continue
+        return [path for _, path in sorted(builds, reverse=True)]
+
     def load_annotations(self, ann_file):
-        img_infos = []
         img_ids = mmcv.list_from_file(ann_file)
-        for img_id in img_ids:
-            filename = 'JPEGImages/{}.jpg'.format(img_id)
-            xml_path = osp.join(self.img_prefix, 'Annotations',
-                                '{}.xml'.format(img_id))
-            tree = ET.parse(xml_path)
-            root = tree.getroot()
-            size = root.find('size')
-            width = int(size.find('width').text)
-            height = int(size.find('height').text)
+        xml_paths = [
+            osp.join(self.img_prefix, 'Annotations', '{}.xml'.format(img_id))
+            for img_id in img_ids
+        ]
+        cached = {}
+        if self.cache_dir is not None:
+            prefix = self._cache_prefix(ann_file)
+            mtimes = np.array([osp.getmtime(p) for p in xml_paths])
+            cache_file = '{}.{}'.format(
+                prefix, self._cache_version(img_ids, mtimes))
+            if osp.isdir(cache_file):
+                return PackedAnnotations(cache_file)
+            # reuse the annotations of the unchanged files of the latest
+            # build, if any
+            builds = self._cache_builds(prefix)
+            if builds:
+                packed = PackedAnnotations(builds[0])
+                cached_mtimes = packed.array('mtime')
+                cached_ids = [img_info['id'] for img_info in packed]
+                mtimes_by_id = dict(zip(img_ids, mtimes))
+                cached = {
+                    img_id: img_info
+                    for img_id, img_info, mtime in zip(
+                        cached_ids, packed, cached_mtimes)
+                    if mtimes_by_id.get(img_id) == mtime
+                }
+
+        inds = [i for i, img_id in enumerate(img_ids) if img_id not in cached]
+        paths = [xml_paths[i] for i in inds]
+        if self.cache_dir is not None and self.nproc > 1 and len(paths) > 1:
+            parsed = mmcv.track_parallel_progress(parse_xml, paths,
+                                                  self.nproc)
+        else:
+            parsed = [parse_xml(path) for path in paths]
+        parsed = dict(zip(inds, parsed))
+
+        img_infos = []
+        for i, img_id in enumerate(img_ids):
+            if img_id in cached:
+                img_infos.append(dict(cached[img_id]))
+                continue
+            xml_info = parsed[i]
             img_infos.append(
-                dict(id=img_id, filename=filename, width=width, height=height))
-        return img_infos
+                dict(
+                    id=img_id,
+                    filename=self.img_filename(img_id, xml_info['folder']),
+                    width=xml_info['width'],
+                    height=xml_info['height'],
+                    ann=dict(
+                        bboxes=xml_info['bboxes'],
+                        labels=np.array(
+                            [self.cat2label[n] for n in xml_info['names']],
+                            dtype=np.int64),
+                        difficult=xml_info['difficult'])))
+        if self.cache_dir is None:
+            return img_infos
+
+        for img_info, mtime in zip(img_infos, mtimes):
+            img_info['mtime'] = float(mtime)
+        # write to a temporary directory first, other processes may build the
+        # same version
+        tmp_file = '{}.{}.{}.tmp'.format(cache_file, socket.gethostname(),
+                                         os.getpid())
+        pack_annotations(img_infos, tmp_file)
+        try:
+            os.rename(tmp_file, cache_file)
+        except OSError:
+            # built by another process in the meantime
+            shutil.rmtree(tmp_file)
+        for path in self._cache_builds(prefix)[self.cache_keep:]:
+            if path != cache_file:
+                # may be pruned by another process at the same time
+                shutil.rmtree(path, ignore_errors=True)
+        return PackedAnnotations(cache_file)
 
     def get_ann_info(self, idx):
-        img_id = self.img_infos[idx]['id']
-        xml_path = osp.join(self.img_prefix, 'Annotations',
-                            '{}.xml'.format(img_id))
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
-        bboxes = []
-        labels = []
-        bboxes_ignore = []
-        labels_ignore = []
-        for obj in root.findall('object'):
-            name = obj.find('name').text
-            label = self.cat2label[name]
-            difficult = int(obj.find('difficult').text)
-            bnd_box = obj.find('bndbox')
-            bbox = [
-                int(bnd_box.find('xmin').text),
-                int(bnd_box.find('ymin').text),
-                int(bnd_box.find('xmax').text),
-                int(bnd_box.find('ymax').text)
-            ]
-            ignore = False
-            if self.min_size:
-                assert not self.test_mode
-                w = bbox[2] - bbox[0]
-                h = bbox[3] - bbox[1]
-                if w < self.min_size or h < self.min_size:
-                    ignore = True
-            if difficult or ignore:
-                bboxes_ignore.append(bbox)
-                labels_ignore.append(label)
-            else:
-                bboxes.append(bbox)
-                labels.append(label)
-        if not bboxes:
-            bboxes = np.zeros((0, 4))
-            labels = np.zeros((0, ))
-        else:
-            bboxes = np.array(bboxes, ndmin=2) - 1
-            labels = np.array(labels)
-        if not bboxes_ignore:
-            bboxes_ignore = np.zeros((0, 4))
-            labels_ignore = np.zeros((0, ))
-        else:
-            bboxes_ignore = np.array(bboxes_ignore, ndmin=2) - 1
-            labels_ignore = np.array(labels_ignore)
+        ann = self.img_infos[idx]['ann']
+        bboxes = ann['bboxes']
+        labels = ann['labels']
+        ignore = ann['difficult'] > 0
+        if self.min_size:
+            assert not self.test_mode
+            w = bboxes[:, 2] - bboxes[:, 0]
+            h = bboxes[:, 3] - bboxes[:, 1]
+            ignore |= (w < self.min_size) | (h < self.min_size)
         ann = dict(
-            bboxes=bboxes.astype(np.float32),
-            labels=labels.astype(np.int64),
-            bboxes_ignore=bboxes_ignore.astype(np.float32),
-            labels_ignore=labels_ignore.astype(np.int64))
+            bboxes=(bboxes[~ignore] - 1).astype(np.float32),
+            labels=labels[~ignore].astype(np.int64),
+            bboxes_ignore=(bboxes[ignore] - 1).astype(np.float32),
+            labels_ignore=labels[ignore].astype(np.int64))
         return ann
@@ -1,3 +1,5 @@
+import warnings
+
 import torch
 import torch.nn as nn
 from torch.nn import functional as F
@@ -103,8 +105,9 @@ class SiameseRPNHead(nn.Module):
         self.target_means = target_means
         self.target_stds = target_stds
 
-        self.kernel_crop_modules = [self._get_kernel_crop_modules(in_channels, kernel_size, spatial_scale) for kernel_size, spatial_scale in zip(kernel_sizes, spatial_scales)]
-        self.target_crop_modules = [self._get_target_crop_modules(in_channels, target_size, spatial_scale) for target_size, spatial_scale in zip(target_sizes, spatial_scales)]
+        # submodules, so that they move with the head and their weights are saved.
+        self.kernel_crop_modules = nn.ModuleList([self._get_kernel_crop_modules(in_channels, kernel_size, spatial_scale) for kernel_size, spatial_scale in zip(kernel_sizes, spatial_scales)])
+        self.target_crop_modules = nn.ModuleList([self._get_target_crop_modules(in_channels, target_size, spatial_scale) for target_size, spatial_scale in zip(target_sizes, spatial_scales)])
         self.rpn_module = DepthwiseRPN(in_channels, out_channels, kernel_sizes[0], target_sizes[0], n_classes=1)
 
         self.kernel_sizes = kernel_sizes
@@ -115,6 +118,20 @@ class SiameseRPNHead(nn.Module):
         if self.use_down_c_op:
             self.down_c_conv = nn.Conv2d(in_channels, ngroups*conv_op_per_group, kernel_size=1, bias=False, groups=ngroups)
 
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        '''
+        The crop modules used to be kept in plain lists, so older checkpoints have no weights for the
+        psroi_align_kernel crop modules. They keep their initial weights when loading such a checkpoint.
+        '''
+        for name in ('kernel_crop_modules', 'target_crop_modules'):
+            module_prefix = prefix + name + '.'
+            module_state = getattr(self, name).state_dict()
+            if module_state and not any(key.startswith(module_prefix) for key in state_dict):
+                warnings.warn('The checkpoint has no {} weights, they keep their initial values.'.format(name))
+                for key, value in module_state.items():
+                    state_dict[module_prefix + key] = value
+        super(SiameseRPNHead, self)._load_from_state_dict(state_dict, prefix, *args, **kwargs)
+
     def _get_kernel_crop_modules(self, in_channels, kernel_size, spatial_scale):
         if self.psroi_align_kernel:
             kernel_crop_channels = 10
@@ -129,11 +146,11 @@ class SiameseRPNHead(nn.Module):
                                                )
         else:
             kernel_crop_module = RoIAlign(kernel_size, spatial_scale)
-        return kernel_crop_module.cuda()
+        return kernel_crop_module
 
     def _get_target_crop_modules(self, in_channels, kernel_size, spatial_scale):
         target_crop_module = RoIAlign(kernel_size, spatial_scale)
-        return target_crop_module.cuda()
+        return target_crop_module
 
     def _get_resized_kernels_targets_single_lvl(self, feat1, feat2, img_meta, feat_stride, kernel_size, target_size, rpn_rois,
                                         kernel_crop_module, target_crop_module):
@@ -150,6 +167,9 @@ class SiameseRPNHead(nn.Module):
         roi_targets = torch.zeros_like(rpn_rois)
         roi_kernels[:, 0] = rpn_rois[:, 0]
         roi_targets[:, 0] = rpn_rois[:, 0]
+        if feat2.size(0) == 1:
+            # a single search image is shared by the rois of all templates.
+            roi_targets[:, 0] = 0
 
         # kernels
         roi_kernels[:, 1] = rpn_rois[:, 1]
@@ -8,7 +8,8 @@ import torch.nn as nn
 import cv2
 from matplotlib import pyplot as plt
 
-from mmdet.core import auto_fp16, get_classes, tensor2imgs
+from mmdet.core import (auto_fp16, get_classes, normalize_img_tensor,
+                        tensor2imgs)
 
 
 class BaseDetector(nn.Module):
@@ -84,6 +85,7 @@ class BaseDetector(nn.Module):
 
     @auto_fp16(apply_to=('img', ))
     def forward(self, img, img_meta, return_loss=True, **kwargs):
+        img = normalize_img_tensor(img, img_meta)
         if return_loss:
             return self.forward_train(img, img_meta, **kwargs)
         else:
@@ -7,7 +7,7 @@ import torch.nn as nn
 import torch.nn.functional as F
 from mmdet.ops import nms
 from mmdet.core import bbox2result, bbox2roi, build_assigner, build_sampler, auto_fp16, bbox2delta, delta2bbox, \
-    bbox_overlaps,multiclass_nms, multiclass
+    bbox_overlaps,multiclass_nms, multiclass, normalize_img_tensor
 from ..utils import ConvModule
 from ...datasets.transforms import BboxTransform
 import random
@@ -212,6 +212,7 @@ class DualAttentionRCNN(TwoStageDetector, '''??testmixin'''):
             self.da_cfg.norm_cfg,)
 
     def forward(self, imgs, img_meta, gt_bboxes, gt_labels, gt_bboxes_ignore=None, gt_masks=None, proposals=None):
+        imgs = normalize_img_tensor(imgs, img_meta)
         N = imgs.shape[0]
         H = imgs.shape[3]
         W = imgs.shape[4]
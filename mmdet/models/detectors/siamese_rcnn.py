@@ -1,13 +1,14 @@
 from ..registry import DETECTORS
 from .two_stage import TwoStageDetector
 from .. import builder
+from ..utils import FeatureMemory
 
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from mmdet.ops import nms
 from mmdet.core import bbox2result, bbox2roi, build_assigner, build_sampler, auto_fp16, bbox2delta, delta2bbox, \
-    bbox_overlaps,multiclass_nms, multiclass
+    bbox_overlaps,multiclass_nms, multiclass, normalize_img_tensor
 from .test_mixins import SiameseRPNTestMixin
 from ...datasets.transforms import BboxTransform
 import random
@@ -16,6 +17,18 @@ from copy import deepcopy
 from mmdet import ops
 
 import time
+import warnings
+from contextlib import contextmanager
+
+
+class TrackingSession(object):
+    '''
+    Temporal state of one video stream served by a SiameseRCNN, see SiameseRCNN.new_session.
+    '''
+    def __init__(self, **state):
+        self.__dict__.update(state)
+
+
 class clock():
     def tic(self):
         self._tic = time.time()
@@ -76,7 +89,8 @@ class SiameseRCNN(TwoStageDetector, SiameseRPNTestMixin):
                  train_rcnn=True,
                  detach_track_feature=False,
                  T=1,
-                 space_time_augmentation=None):
+                 space_time_augmentation=None,
+                 batched_multi_track=True):
         super(SiameseRCNN, self).__init__(
             backbone=backbone,
             neck=neck,
@@ -111,8 +125,12 @@ class SiameseRCNN(TwoStageDetector, SiameseRPNTestMixin):
         self.sequence_mapped_bboxes_result = None
         self.sequence_buffer = None
         self.sequence_buffer_length = 1
+        self.sequence_buffer_max_bytes = None
+        self.sequence_buffer_policy = 'fifo'
+        self.sequence_buffer_fp16 = False
         self.sequence_gap = 1
         self.multi_track_max_gap = 10
+        self.batched_multi_track = batched_multi_track
         self.sequence_counter = 0
         self._proposal_repo = None
         self.detach_track_feature = detach_track_feature
@@ -124,14 +142,130 @@ class SiameseRCNN(TwoStageDetector, SiameseRPNTestMixin):
             C_qk = self.space_time_augmentation.C_qk
             relation_percent = self.space_time_augmentation.relation_percent
             print('relation_percent set to:', relation_percent)
-            self.space_time_modules = [ops.PointwiseGraphNN(C_in, C_qk=C_qk, relation_percent=relation_percent).cuda() for _ in range(nlvls)]
-            self.space_time_mem = []
+            chunk_size = self.space_time_augmentation.get('chunk_size', None)
+            mem_pool = self.space_time_augmentation.get('mem_pool', None)
+            mem_pool_stride = self.space_time_augmentation.get('mem_pool_stride', 2)
+            self.space_time_modules = nn.ModuleList([
+                ops.PointwiseGraphNN(C_in, C_qk=C_qk, relation_percent=relation_percent, chunk_size=chunk_size,
+                                     mem_pool=mem_pool, mem_pool_stride=mem_pool_stride)
+                for _ in range(nlvls)])
+            # store projected keys and values in the memory instead of features.
+            self.space_time_mem_cache_projections = self.space_time_augmentation.get('mem_cache_projections', False)
+            self.space_time_mem = self.build_space_time_mem()
+            self.space_time_mem_interval = self.space_time_augmentation.get('mem_interval', 5)
             self.space_time_mem_counter = 0
         else:
             self.space_time_modules = None
 
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        '''
+        The space-time modules used to be kept in a plain list, so older checkpoints have no weights for them.
+        They keep their initial weights when loading such a checkpoint, as they did before.
+        '''
+        if self.space_time_modules is not None:
+            module_prefix = prefix + 'space_time_modules.'
+            if not any(key.startswith(module_prefix) for key in state_dict):
+                warnings.warn('The checkpoint has no space_time_modules weights, they keep their initial values.')
+                for key, value in self.space_time_modules.state_dict().items():
+                    state_dict[module_prefix + key] = value
+        super(SiameseRCNN, self)._load_from_state_dict(state_dict, prefix, *args, **kwargs)
+
+    def build_space_time_mem(self):
+        return FeatureMemory(self.space_time_augmentation.get('mem_size', 20),
+                             max_bytes=self.space_time_augmentation.get('mem_max_bytes', None),
+                             policy=self.space_time_augmentation.get('mem_policy', 'fifo'),
+                             fp16=self.space_time_augmentation.get('mem_fp16', False))
+
+    # attributes holding the temporal state of the video being tested.
+    tracking_state_attrs = ('rois_tracked', 'extracted_feat1', 'sequence_mapped_bboxes',
+                            'sequence_mapped_bboxes_result', 'sequence_buffer', 'sequence_counter',
+                            'sequence_non_supressed_proposals', '_proposal_repo', 'last_det_labels',
+                            'space_time_mem', 'space_time_mem_counter')
+
+    def new_session(self):
+        '''
+        Create the tracking state of a new video stream.
+        Several sessions can share the weights of this model, see simple_test_multi_stream.
+        '''
+        state = {attr: None for attr in self.tracking_state_attrs}
+        state['sequence_counter'] = 0
+        state['space_time_mem_counter'] = 0
+        if self.space_time_modules is not None:
+            state['space_time_mem'] = self.build_space_time_mem()
+        return TrackingSession(**state)
+
+    def get_tracking_state(self):
+        return {attr: getattr(self, attr, None) for attr in self.tracking_state_attrs}
+
+    def set_tracking_state(self, state):
+        for attr in self.tracking_state_attrs:
+            setattr(self, attr, state[attr])
+
+    def reset_tracking_state(self):
+        '''
+        Drop the temporal state kept between frames, e.g. before the first frame of a new video.
+        '''
+        self.set_tracking_state(self.new_session().__dict__)
+
+    @contextmanager
+    def tracking_session(self, session):
+        '''
+        Swap the state of a session in for the duration of the block, and save the updated state back to it.
+        '''
+        model_state = self.get_tracking_state()
+        self.set_tracking_state(session.__dict__)
+        try:
+            yield session
+        finally:
+            session.__dict__.update(self.get_tracking_state())
+            self.set_tracking_state(model_state)
+
+    def extract_feat_multi(self, imgs):
+        '''
+        Extract the features of several images, batching the ones of the same size.
+        :param imgs: list of images of shape (1, C, H, W).
+        :return: list of features, one per image.
+        '''
+        feats = [None for _ in imgs]
+        groups = {}
+        for idx, img in enumerate(imgs):
+            groups.setdefault(tuple(img.shape[1:]), []).append(idx)
+        for inds in groups.values():
+            x = self.extract_feat(torch.cat([imgs[idx] for idx in inds], dim=0))
+            for batch_idx, idx in enumerate(inds):
+                feats[idx] = [lvl[batch_idx:batch_idx+1] for lvl in x]
+        return feats
+
+    @auto_fp16(apply_to=('imgs',))
+    def simple_test_multi_stream(self, imgs, img_metas, sessions, rescale=False, out=False):
+        '''
+        Test the current frames of several video streams together.
+        The backbone runs once on all frames, the tracking state of every stream is kept in its session.
+        The images are cast and normalized as in forward, which is not called here.
+        :param imgs: list of images of shape (1, C, H, W), one per stream.
+        :param img_metas: list of img_meta, one per stream.
+        :param sessions: list of TrackingSession, one per stream.
+        :return: list of results, one per stream.
+        '''
+        assert not self.img_train and not self.vid_train, 'Only tracking models keep a per stream state.'
+        assert len(imgs) == len(img_metas) == len(sessions)
+        imgs = normalize_img_tensor(imgs, img_metas)
+        feats = self.extract_feat_multi(imgs)
+        results = []
+        for x, img_meta, session in zip(feats, img_metas, sessions):
+            with self.tracking_session(session):
+                if self.graphnn_train:
+                    results.append(self.simple_test_graphnn_img(None, img_meta, rescale=rescale, feats=x))
+                else:
+                    results.append(self.simple_test_vid_track(None, img_meta, rescale=rescale, out=out, feats=x))
+        return results
+
     @auto_fp16(apply_to=('img',))
     def forward(self, return_loss = True, **inputs):
+        for key in ('img', 'imgs', 'img1', 'img2'):
+            if key in inputs:
+                inputs[key] = normalize_img_tensor(inputs[key],
+                                                   inputs['img_meta'])
         if return_loss is True:
             if self.img_train:
                 return self.forward_img_train(**inputs)
@@ -759,18 +893,24 @@ class SiameseRCNN(TwoStageDetector, SiameseRPNTestMixin):
                                              losses)
         return losses
 
-    def update_sequence_list(self, new_tuple):
+    def update_sequence_list(self, new_tuple, det_scores=None):
         '''
 
-        :param new_tuple: (feature,det_bboxes,det_labels,rois_tracked)
-        :return:
+        :param new_tuple: (feature,det_bboxes,det_labels,rois_tracked), only feature and rois_tracked are kept.
+        :param det_scores: class scores of the detections of the frame, their max is the frame score of the
+                           'score' eviction policy. It is not computed with the other policies.
+        :return: memory of (feature, rois_tracked), newest first.
         '''
         if self.sequence_buffer is None:
-            self.sequence_buffer = []
+            self.sequence_buffer = FeatureMemory(self.sequence_buffer_length,
+                                                 max_bytes=self.sequence_buffer_max_bytes,
+                                                 policy=self.sequence_buffer_policy,
+                                                 fp16=self.sequence_buffer_fp16)
         if self.sequence_counter%self.sequence_gap==0:
-            if len(self.sequence_buffer)==self.sequence_buffer_length:
-                self.sequence_buffer.pop(-1)
-            self.sequence_buffer = [new_tuple]+self.sequence_buffer
+            score = 0.
+            if self.sequence_buffer_policy == 'score' and det_scores is not None and det_scores.numel() > 0:
+                score = det_scores.max()
+            self.sequence_buffer.push(new_tuple[0], new_tuple[-1], score)
             self.sequence_counter = 0
         self.sequence_counter+=1
         return self.sequence_buffer
@@ -787,12 +927,45 @@ class SiameseRCNN(TwoStageDetector, SiameseRPNTestMixin):
         self.sequence_mapped_bboxes_result.append(bboxes_mapped_result)
         return self.sequence_mapped_bboxes_result
 
+    def get_tracked_buffer(self, max_gap = None):
+        tracked_tuples = []
+        for ind, tpl in enumerate(self.sequence_buffer):
+            if max_gap is not None and (ind+1)*self.sequence_gap>max_gap:
+                break
+            rois_tracked = tpl[-1]
+            if rois_tracked is not None and len(rois_tracked)>0:
+                tracked_tuples.append(tpl)
+        return tracked_tuples
+
+    def batched_multi_track_proposals(self, current_feature, img_meta, cfg, max_gap = None):
+        '''
+        Track all buffered frames with one Siamese RPN forward.
+        :return: (proposal_list_siamese, proposal_list_siamese_non_suppressed) before NMS,
+                 or None if the buffered features can not be stacked.
+        '''
+        tracked_tuples = self.get_tracked_buffer(max_gap)
+        if len(tracked_tuples)==0:
+            return [], []
+        features = [tpl[0] for tpl in tracked_tuples]
+        feat_shapes = [tuple(feat.shape for feat in feature) for feature in features]
+        if any(feat_shape != feat_shapes[0] for feat_shape in feat_shapes):
+            return None
+        proposals, proposals_non_suppressed = self.simple_test_siamese_rpn_multi_template(
+            features, current_feature, [tpl[-1] for tpl in tracked_tuples], img_meta, cfg)
+        return [torch.cat(proposals, dim=0)], [torch.cat(proposals_non_suppressed, dim=0)]
+
     def multi_track(self, current_feature, img_meta, cfg, max_gap = None):
+        if self.batched_multi_track:
+            batched_proposals = self.batched_multi_track_proposals(current_feature, img_meta, cfg, max_gap)
+            if batched_proposals is not None:
+                proposal_list_siamese = batched_proposals[0]
+                proposal_list_siamese = [nms(proposals, cfg.nms_thr)[0] for proposals in proposal_list_siamese]
+                return proposal_list_siamese
         list_of_proposal_list_siamese = []
         for ind, tpl in enumerate(self.sequence_buffer):
             if max_gap is not None and (ind+1)*self.sequence_gap>max_gap:
                 break
-            feature, det_bboxes, det_labels, rois_tracked = tpl
+            feature, rois_tracked = tpl
             if len(rois_tracked)>0:
                 list_of_proposal_list_siamese.append(self.simple_test_siamese_rpn(
                     feature, current_feature, rois_tracked, img_meta, cfg))
@@ -803,12 +976,18 @@ class SiameseRCNN(TwoStageDetector, SiameseRPNTestMixin):
         return proposal_list_siamese
 
     def multi_track_with_non_nms_proposals(self, current_feature, img_meta, cfg, max_gap = None):
+        if self.batched_multi_track:
+            batched_proposals = self.batched_multi_track_proposals(current_feature, img_meta, cfg, max_gap)
+            if batched_proposals is not None:
+                proposal_list_siamese, proposal_list_siamese_non_suppressed = batched_proposals
+                proposal_list_siamese = [nms(proposals, cfg.nms_thr)[0] for proposals in proposal_list_siamese]
+                return proposal_list_siamese, proposal_list_siamese_non_suppressed
         list_of_proposal_list_siamese = []
         list_of_non_suppressed_proposal_list_siamese = []
         for ind, tpl in enumerate(self.sequence_buffer):
             if max_gap is not None and (ind+1)*self.sequence_gap>max_gap:
                 break
-            feature, det_bboxes, det_labels, rois_tracked = tpl
+            feature, rois_tracked = tpl
             if len(rois_tracked)>0:
                 proposals_, non_suppressed_proposals_ = self.simple_test_siamese_rpn_with_non_suppressed_output(
                     feature, current_feature, rois_tracked, img_meta, cfg)
@@ -858,7 +1037,7 @@ class SiameseRCNN(TwoStageDetector, SiameseRPNTestMixin):
         roi_tracked = roi_tracked.view(-1, 5)
         # start from the newest.
         for tpl in self.sequence_buffer:
-            feature, det_bboxes, det_labels, rois_tracked = tpl
+            feature, rois_tracked = tpl
             proposal_list = self.simple_test_siamese_rpn(current_feature, feature, roi_tracked, img_meta, cfg_track)
             if len(proposal_list[0])>0:
                 # extract probability.
@@ -1040,7 +1219,7 @@ class SiameseRCNN(TwoStageDetector, SiameseRPNTestMixin):
                                                     self.test_cfg.rcnn.score_thr,
                                                     self.test_cfg.rcnn.nms,
                                                     self.test_cfg.rcnn.max_per_img)
-            self.update_sequence_list((merged_x, None, None, rois))
+            self.update_sequence_list((merged_x, None, None, rois), det_scores=self.last_det_labels[:, 1:])
         else:
             det_bboxes = det_bboxes.new_empty(0, 5)
             det_labels = det_labels.new_empty(0, 1)
@@ -1055,7 +1234,7 @@ class SiameseRCNN(TwoStageDetector, SiameseRPNTestMixin):
             return bbox_results
 
     # original
-    def simple_test_vid_track(self, img, img_meta, proposals=None, rescale=False, out = False):
+    def simple_test_vid_track(self, img, img_meta, proposals=None, rescale=False, out = False, feats=None):
         """Test without augmentation."""
         assert self.with_bbox, "Bbox head must be implemented."
         det_bbox_result = None
@@ -1064,7 +1243,7 @@ class SiameseRCNN(TwoStageDetector, SiameseRPNTestMixin):
         det_bboxes, det_labels = None, None
         #Timer = clock()
         #Timer.tic()
-        x = self.extract_feat(img)
+        x = self.extract_feat(img) if feats is None else feats
         proposal_list_raw = self.simple_test_rpn(x, img_meta, self.test_cfg.rpn) if proposals is None else proposals
         det_bboxes, det_labels = self.simple_test_bboxes(x, img_meta, proposal_list_raw, None, rescale=False)
         # prune proposals.
@@ -1139,7 +1318,7 @@ class SiameseRCNN(TwoStageDetector, SiameseRPNTestMixin):
             det_bboxes = det_bboxes.repeat(1, det_labels.size()[-1])
             self.last_det_labels = det_labels
             det_bboxes, det_labels = multiclass(det_bboxes, det_labels)
-            self.update_sequence_list((merged_x, None, None, rois))
+            self.update_sequence_list((merged_x, None, None, rois), det_scores=self.last_det_labels[:, 1:])
         else:
             det_bboxes = det_bboxes.new_empty(0, 5)
             det_labels = det_labels.new_empty(0, 1)
@@ -1157,33 +1336,45 @@ class SiameseRCNN(TwoStageDetector, SiameseRPNTestMixin):
         '''
 
         :param idx: None if all space time memories are used. Or list of indices to select.
-        :return: list of memory for relation distillation.
+        :return: list of memory for relation distillation, oldest first. With mem_cache_projections
+                 every item is [key_0, value_0, key_1, value_1, ...] instead of features.
         '''
-        if idx is None:
-            mems_list = self.space_time_mem
-        else:
-            mems_list = self.space_time_mem[idx]
+        mems_list = [self.space_time_mem[i][0] for i in reversed(range(len(self.space_time_mem)))]
+        if idx is not None:
+            mems_list = [mems_list[i] for i in idx]
         return mems_list
 
-    def simple_test_graphnn_img(self, img, img_meta, proposals=None, rescale=False):
+    def simple_test_graphnn_img(self, img, img_meta, proposals=None, rescale=False, feats=None):
         """Test without augmentation."""
         assert self.with_bbox, "Bbox head must be implemented."
         #Timer = clock()
         #Timer.tic()
-        extracted_features_1 = self.extract_feat(img)
+        extracted_features_1 = self.extract_feat(img) if feats is None else feats
         # Augment
         augmented_feats1 = [None for _ in range(len(extracted_features_1))]
-        space_time_mem_list = self.retrieve_space_time_mem(idx=None)
-        #print('space_time_mem_list len:', len(space_time_mem_list))
         for idx, ext_feat1 in enumerate(extracted_features_1):
-            space_time_mem = torch.stack([it[idx] for it in space_time_mem_list]+[ext_feat1], dim=0)
+            if self.space_time_mem_cache_projections:
+                # memory levels hold [key_0, value_0, key_1, value_1, ...].
+                mem_key, mem_value = self.space_time_modules[idx].project_memory(ext_feat1)
+                mem_key, mem_value = mem_key[None], mem_value[None]
+                if len(self.space_time_mem) > 0:
+                    mem_key = torch.cat([self.space_time_mem.stacked(2*idx), mem_key], dim=0)
+                    mem_value = torch.cat([self.space_time_mem.stacked(2*idx+1), mem_value], dim=0)
+                augmented_feats1[idx] = self.space_time_modules[idx].forward_projected(mem_key, mem_value, ext_feat1)
+                continue
+            if len(self.space_time_mem) > 0:
+                space_time_mem = torch.cat([self.space_time_mem.stacked(idx), ext_feat1[None]], dim=0)
+            else:
+                space_time_mem = ext_feat1[None]
             augmented_feats1[idx] = self.space_time_modules[idx](space_time_mem, ext_feat1)
 
         # update memory.
-        if self.space_time_mem_counter%5==0:
-            if len(self.space_time_mem)==20:
-                self.space_time_mem = self.space_time_mem[:-1]
-            self.space_time_mem = self.space_time_mem + [augmented_feats1]
+        if self.space_time_mem_counter%self.space_time_mem_interval==0:
+            if self.space_time_mem_cache_projections:
+                self.space_time_mem.push([proj for idx, feat in enumerate(augmented_feats1)
+                                          for proj in self.space_time_modules[idx].project_memory(feat)])
+            else:
+                self.space_time_mem.push(augmented_feats1)
             self.space_time_mem_counter = 0
         self.space_time_mem_counter+=1
         #Timer.toc('extract_feat')
@@ -1295,7 +1486,7 @@ class SiameseRCNN(TwoStageDetector, SiameseRPNTestMixin):
             det_bboxes = det_bboxes.repeat(1, det_labels.size()[-1])
             self.last_det_labels = det_labels
             det_bboxes, det_labels = multiclass(det_bboxes, det_labels)
-            self.update_sequence_list((merged_x, None, None, rois))
+            self.update_sequence_list((merged_x, None, None, rois), det_scores=self.last_det_labels[:, 1:])
         else:
             det_bboxes = det_bboxes.new_empty(0, 5)
             det_labels = det_labels.new_empty(0, 1)
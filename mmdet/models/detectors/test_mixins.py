@@ -1,5 +1,6 @@
 from mmdet.core import (bbox2roi, bbox_mapping, merge_aug_bboxes,
                         merge_aug_masks, merge_aug_proposals, multiclass_nms)
+import torch
 import torch.nn.functional as F
 
 class RPNTestMixin(object):
@@ -57,6 +58,35 @@ class SiameseRPNTestMixin(object):
                                                              score_threshold=0)
         return proposals, proposals_non_suppressed
 
+    def simple_test_siamese_rpn_multi_template(self, feat1_list, feat2, rpn_rois_1_list, img_meta, siamese_rpn_test_cfg):
+        '''
+        Track the rois of several template frames into one search frame with a single Siamese RPN forward.
+        :param feat1_list: list of template features, each a list of levels with batch size 1.
+        :param feat2: search features with batch size 1.
+        :param rpn_rois_1_list: list of rois of each template frame.
+        :return: (proposals, non suppressed proposals), lists with one item per template frame.
+        '''
+        n_templates = len(feat1_list)
+        feat1 = [torch.cat(lvl_feats, dim=0) for lvl_feats in zip(*feat1_list)]
+        rpn_rois_1 = []
+        for idx, rois in enumerate(rpn_rois_1_list):
+            rois = rois.clone()
+            rois[:, 0] = idx
+            rpn_rois_1.append(rois)
+        rpn_rois_1 = torch.cat(rpn_rois_1, dim=0)
+        cls_score, bbox_pred, target_ranges, target_metas = self.siameserpn_head(feat1, feat2, rpn_rois_1, img_meta*n_templates)
+        proposal_inputs = (n_templates, rpn_rois_1, cls_score, bbox_pred, target_metas, siamese_rpn_test_cfg,)
+        bboxes_list, scores_list = self.siameserpn_head.get_bboxes(*proposal_inputs)
+        proposals = self.siameserpn_head.get_rois_from_boxes(n_templates,
+                                                             bboxes_list,
+                                                             scores_list,
+                                                             score_threshold=siamese_rpn_test_cfg.score_threshold)
+        proposals_non_suppressed = self.siameserpn_head.get_rois_from_boxes(n_templates,
+                                                             bboxes_list,
+                                                             scores_list,
+                                                             score_threshold=0)
+        return proposals, proposals_non_suppressed
+
     def aug_test_siamese_rpn(self, feat1s, feat2s, rpn_rois_1s, img_metas, siamese_rpn_test_cfg):
         imgs_per_gpu = len(img_metas[0])
         aug_proposals = [[] for _ in range(imgs_per_gpu)]
@@ -0,0 +1,160 @@
+import torch
+
+
+class FeatureMemory(object):
+    """Preallocated ring buffer of per-frame multi-level features.
+
+    The feature storage of every level is allocated once, on the first
+    push, and frames are written into free slots instead of building new
+    lists. The number of slots is bounded by both ``max_len`` and
+    ``max_bytes``. Indexing follows the order of the old python lists:
+    ``memory[0]`` is the newest frame and ``memory[-1]`` the oldest one.
+
+    All the frames must have features of the same shapes, on the same
+    device: pushing a frame that does not fit the storage raises an error,
+    unless the memory is empty, e.g. after :meth:`reset` at the start of a
+    video, and the storage is then allocated again.
+
+    The features returned by indexing are views of the storage unless they
+    are stored in half precision. They are overwritten when their slot is
+    reused by a later push, so copy them to keep them across pushes.
+
+    Args:
+        max_len (int): maximum number of stored frames.
+        max_bytes (int, optional): byte budget of the feature storage.
+        policy (str): which frame to evict when the memory is full.
+            ``fifo`` drops the oldest frame, ``stride`` drops the newer frame
+            of the closest pair so the kept frames cover a growing time span,
+            ``score`` drops the frame with the lowest score. Scores are only
+            kept, and read back to the host once per eviction, with this
+            policy.
+        fp16 (bool): store the features in half precision.
+    """
+
+    policies = ('fifo', 'stride', 'score')
+
+    def __init__(self, max_len, max_bytes=None, policy='fifo', fp16=False):
+        assert max_len >= 1
+        assert policy in self.policies
+        self.max_len = max_len
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.fp16 = fp16
+        self.storage = None
+        self.capacity = 0
+        self.reset()
+
+    def reset(self):
+        """Drop all stored frames. The storage is kept for reuse, or
+        allocated again by the next push if the frame does not fit it."""
+        self.slots = []
+        self.rois = {}
+        self.scores = {}
+        self.frame_ids = {}
+        self.num_pushed = 0
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __getitem__(self, idx):
+        slot = self.slots[::-1][idx]
+        return self.get_feats(slot), self.rois[slot]
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    @property
+    def nbytes(self):
+        if self.storage is None:
+            return 0
+        return sum(
+            level.numel() * level.element_size() for level in self.storage)
+
+    def get_feats(self, slot):
+        return [
+            level[slot].to(dtype) for level, dtype in zip(
+                self.storage, self.dtypes)
+        ]
+
+    def stacked(self, level):
+        """Features of one level of all frames, stacked from oldest to
+        newest."""
+        index = torch.tensor(
+            self.slots, dtype=torch.long, device=self.storage[level].device)
+        return self.storage[level].index_select(0, index).to(
+            self.dtypes[level])
+
+    def _allocate(self, feats):
+        dtypes = [torch.half if self.fp16 else feat.dtype for feat in feats]
+        frame_bytes = sum(
+            feat.numel() * torch.tensor([], dtype=dtype).element_size()
+            for feat, dtype in zip(feats, dtypes))
+        capacity = self.max_len
+        if self.max_bytes is not None:
+            capacity = max(1, min(capacity, self.max_bytes // frame_bytes))
+        self.storage = [
+            feat.new_empty((capacity, ) + tuple(feat.shape), dtype=dtype)
+            for feat, dtype in zip(feats, dtypes)
+        ]
+        self.dtypes = [feat.dtype for feat in feats]
+        self.capacity = capacity
+
+    def _fits(self, feats):
+        return self.storage is not None and len(feats) == len(
+            self.storage) and all(
+                tuple(feat.shape) == tuple(level.shape[1:])
+                and feat.device == level.device
+                for feat, level in zip(feats, self.storage))
+
+    def _evict(self):
+        if self.policy == 'fifo' or len(self.slots) < 2:
+            idx = 0
+        elif self.policy == 'stride':
+            # the oldest frame is always kept
+            frame_ids = [self.frame_ids[slot] for slot in self.slots]
+            frame_ids.append(self.num_pushed)
+            gaps = [
+                frame_ids[i + 1] - frame_ids[i - 1]
+                for i in range(1, len(self.slots))
+            ]
+            idx = gaps.index(min(gaps)) + 1
+        else:
+            scores = torch.stack([self.scores[slot] for slot in self.slots])
+            idx = int(scores.argmin())
+        slot = self.slots.pop(idx)
+        self.rois.pop(slot)
+        self.scores.pop(slot, None)
+        self.frame_ids.pop(slot)
+        return slot
+
+    def push(self, feats, rois=None, score=0.):
+        """Store the features of a new frame.
+
+        Args:
+            feats (list[Tensor]): features of all levels.
+            rois (Tensor, optional): rois kept along with the features.
+            score (float or Tensor): used by the ``score`` policy.
+        """
+        if not self._fits(feats):
+            if len(self.slots) > 0:
+                raise ValueError(
+                    'the features do not match the stored frames, reset the '
+                    'memory before pushing frames of another size')
+            self._allocate(feats)
+        if len(self.slots) < self.capacity:
+            # slots are only freed by an eviction or a reset
+            slot = len(self.slots)
+        else:
+            slot = self._evict()
+        for level, feat in zip(self.storage, feats):
+            level[slot].copy_(feat)
+        self.slots.append(slot)
+        self.rois[slot] = rois
+        if self.policy == 'score':
+            # kept on the device, a python float is copied there
+            self.scores[slot] = torch.as_tensor(
+                score, dtype=torch.float32,
+                device=self.storage[0].device).reshape(())
+        self.frame_ids[slot] = self.num_pushed
+        self.num_pushed += 1
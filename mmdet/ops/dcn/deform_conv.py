@@ -6,7 +6,7 @@ from torch.autograd import Function
 from torch.autograd.function import once_differentiable
 from torch.nn.modules.utils import _pair
 
-from . import deform_conv_cuda
+from . import deform_conv_cpu, deform_conv_cuda
 
 
 class DeformConvFunction(Function):
@@ -41,18 +41,18 @@ class DeformConvFunction(Function):
 
         ctx.bufs_ = [input.new_empty(0), input.new_empty(0)]  # columns, ones
 
-        if not input.is_cuda:
-            raise NotImplementedError
+        cur_im2col_step = min(ctx.im2col_step, input.shape[0])
+        assert (input.shape[0] %
+                cur_im2col_step) == 0, 'im2col step must divide batchsize'
+        if input.is_cuda:
+            forward_func = deform_conv_cuda.deform_conv_forward_cuda
         else:
-            cur_im2col_step = min(ctx.im2col_step, input.shape[0])
-            assert (input.shape[0] %
-                    cur_im2col_step) == 0, 'im2col step must divide batchsize'
-            deform_conv_cuda.deform_conv_forward_cuda(
-                input, weight, offset, output, ctx.bufs_[0], ctx.bufs_[1],
-                weight.size(3), weight.size(2), ctx.stride[1], ctx.stride[0],
-                ctx.padding[1], ctx.padding[0], ctx.dilation[1],
-                ctx.dilation[0], ctx.groups, ctx.deformable_groups,
-                cur_im2col_step)
+            forward_func = deform_conv_cpu.deform_conv_forward_cpu
+        forward_func(input, weight, offset, output, ctx.bufs_[0],
+                     ctx.bufs_[1], weight.size(3), weight.size(2),
+                     ctx.stride[1], ctx.stride[0], ctx.padding[1],
+                     ctx.padding[0], ctx.dilation[1], ctx.dilation[0],
+                     ctx.groups, ctx.deformable_groups, cur_im2col_step)
         return output
 
     @staticmethod
@@ -62,33 +62,38 @@ class DeformConvFunction(Function):
 
         grad_input = grad_offset = grad_weight = None
 
-        if not grad_output.is_cuda:
-            raise NotImplementedError
+        cur_im2col_step = min(ctx.im2col_step, input.shape[0])
+        assert (input.shape[0] %
+                cur_im2col_step) == 0, 'im2col step must divide batchsize'
+        if grad_output.is_cuda:
+            backward_input_func = \
+                deform_conv_cuda.deform_conv_backward_input_cuda
+            backward_parameters_func = \
+                deform_conv_cuda.deform_conv_backward_parameters_cuda
         else:
-            cur_im2col_step = min(ctx.im2col_step, input.shape[0])
-            assert (input.shape[0] %
-                    cur_im2col_step) == 0, 'im2col step must divide batchsize'
-
-            if ctx.needs_input_grad[0] or ctx.needs_input_grad[1]:
-                grad_input = torch.zeros_like(input)
-                grad_offset = torch.zeros_like(offset)
-                deform_conv_cuda.deform_conv_backward_input_cuda(
-                    input, offset, grad_output, grad_input,
-                    grad_offset, weight, ctx.bufs_[0], weight.size(3),
-                    weight.size(2), ctx.stride[1], ctx.stride[0],
-                    ctx.padding[1], ctx.padding[0], ctx.dilation[1],
-                    ctx.dilation[0], ctx.groups, ctx.deformable_groups,
-                    cur_im2col_step)
-
-            if ctx.needs_input_grad[2]:
-                grad_weight = torch.zeros_like(weight)
-                deform_conv_cuda.deform_conv_backward_parameters_cuda(
-                    input, offset, grad_output,
-                    grad_weight, ctx.bufs_[0], ctx.bufs_[1], weight.size(3),
-                    weight.size(2), ctx.stride[1], ctx.stride[0],
-                    ctx.padding[1], ctx.padding[0], ctx.dilation[1],
-                    ctx.dilation[0], ctx.groups, ctx.deformable_groups, 1,
-                    cur_im2col_step)
+            backward_input_func = \
+                deform_conv_cpu.deform_conv_backward_input_cpu
+            backward_parameters_func = \
+                deform_conv_cpu.deform_conv_backward_parameters_cpu
+
+        if ctx.needs_input_grad[0] or ctx.needs_input_grad[1]:
+            grad_input = torch.zeros_like(input)
+            grad_offset = torch.zeros_like(offset)
+            backward_input_func(
+                input, offset, grad_output, grad_input, grad_offset, weight,
+                ctx.bufs_[0], weight.size(3), weight.size(2), ctx.stride[1],
+                ctx.stride[0], ctx.padding[1], ctx.padding[0],
+                ctx.dilation[1], ctx.dilation[0], ctx.groups,
+                ctx.deformable_groups, cur_im2col_step)
+
+        if ctx.needs_input_grad[2]:
+            grad_weight = torch.zeros_like(weight)
+            backward_parameters_func(
+                input, offset, grad_output, grad_weight, ctx.bufs_[0],
+                ctx.bufs_[1], weight.size(3), weight.size(2), ctx.stride[1],
+                ctx.stride[0], ctx.padding[1], ctx.padding[0],
+                ctx.dilation[1], ctx.dilation[0], ctx.groups,
+                ctx.deformable_groups, 1, cur_im2col_step)
 
         return (grad_input, grad_offset, grad_weight, None, None, None, None,
                 None)
@@ -132,15 +137,17 @@ class ModulatedDeformConvFunction(Function):
         ctx.with_bias = bias is not None
         if not ctx.with_bias:
             bias = input.new_empty(1)  # fake tensor
-        if not input.is_cuda:
-            raise NotImplementedError
         if weight.requires_grad or mask.requires_grad or offset.requires_grad \
                 or input.requires_grad:
             ctx.save_for_backward(input, offset, mask, weight, bias)
         output = input.new_empty(
             ModulatedDeformConvFunction._infer_shape(ctx, input, weight))
         ctx._bufs = [input.new_empty(0), input.new_empty(0)]
-        deform_conv_cuda.modulated_deform_conv_cuda_forward(
+        if input.is_cuda:
+            forward_func = deform_conv_cuda.modulated_deform_conv_cuda_forward
+        else:
+            forward_func = deform_conv_cpu.modulated_deform_conv_cpu_forward
+        forward_func(
             input, weight, bias, ctx._bufs[0], offset, mask, output,
             ctx._bufs[1], weight.shape[2], weight.shape[3], ctx.stride,
             ctx.stride, ctx.padding, ctx.padding, ctx.dilation, ctx.dilation,
@@ -150,15 +157,18 @@ class ModulatedDeformConvFunction(Function):
     @staticmethod
     @once_differentiable
     def backward(ctx, grad_output):
-        if not grad_output.is_cuda:
-            raise NotImplementedError
         input, offset, mask, weight, bias = ctx.saved_tensors
         grad_input = torch.zeros_like(input)
         grad_offset = torch.zeros_like(offset)
         grad_mask = torch.zeros_like(mask)
         grad_weight = torch.zeros_like(weight)
         grad_bias = torch.zeros_like(bias)
-        deform_conv_cuda.modulated_deform_conv_cuda_backward(
+        if grad_output.is_cuda:
+            backward_func = \
+                deform_conv_cuda.modulated_deform_conv_cuda_backward
+        else:
+            backward_func = deform_conv_cpu.modulated_deform_conv_cpu_backward
+        backward_func(
             input, weight, bias, ctx._bufs[0], offset, mask, ctx._bufs[1],
             grad_input, grad_weight, grad_bias, grad_offset, grad_mask,
             grad_output, weight.shape[2], weight.shape[3], ctx.stride,
@@ -3,7 +3,7 @@ import torch.nn as nn
 from torch.autograd import Function
 from torch.autograd.function import once_differentiable
 
-from . import deform_pool_cuda
+from . import deform_pool_cpu, deform_pool_cuda
 
 
 class DeformRoIPoolingFunction(Function):
@@ -31,13 +31,15 @@ class DeformRoIPoolingFunction(Function):
         ctx.trans_std = trans_std
 
         assert 0.0 <= ctx.trans_std <= 1.0
-        if not data.is_cuda:
-            raise NotImplementedError
 
         n = rois.shape[0]
         output = data.new_empty(n, out_channels, out_size, out_size)
         output_count = data.new_empty(n, out_channels, out_size, out_size)
-        deform_pool_cuda.deform_psroi_pooling_cuda_forward(
+        if data.is_cuda:
+            forward_func = deform_pool_cuda.deform_psroi_pooling_cuda_forward
+        else:
+            forward_func = deform_pool_cpu.deform_psroi_pooling_cpu_forward
+        forward_func(
             data, rois, offset, output, output_count, ctx.no_trans,
             ctx.spatial_scale, ctx.out_channels, ctx.group_size, ctx.out_size,
             ctx.part_size, ctx.sample_per_part, ctx.trans_std)
@@ -51,20 +53,21 @@ class DeformRoIPoolingFunction(Function):
     @staticmethod
     @once_differentiable
     def backward(ctx, grad_output):
-        if not grad_output.is_cuda:
-            raise NotImplementedError
-
         data, rois, offset = ctx.saved_tensors
         output_count = ctx.output_count
         grad_input = torch.zeros_like(data)
         grad_rois = None
         grad_offset = torch.zeros_like(offset)
 
-        deform_pool_cuda.deform_psroi_pooling_cuda_backward(
-            grad_output, data, rois, offset, output_count, grad_input,
-            grad_offset, ctx.no_trans, ctx.spatial_scale, ctx.out_channels,
-            ctx.group_size, ctx.out_size, ctx.part_size, ctx.sample_per_part,
-            ctx.trans_std)
+        if grad_output.is_cuda:
+            backward_func = deform_pool_cuda.deform_psroi_pooling_cuda_backward
+        else:
+            backward_func = deform_pool_cpu.deform_psroi_pooling_cpu_backward
+        backward_func(grad_output.contiguous(), data, rois, offset,
+                      output_count, grad_input, grad_offset, ctx.no_trans,
+                      ctx.spatial_scale, ctx.out_channels, ctx.group_size,
+                      ctx.out_size, ctx.part_size, ctx.sample_per_part,
+                      ctx.trans_std)
         return (grad_input, grad_rois, grad_offset, None, None, None, None,
                 None, None, None, None)
 
@@ -0,0 +1,228 @@
+import os.path as osp
+import sys
+
+import torch
+import torch.nn.functional as F
+from torch.autograd import gradcheck
+
+sys.path.append(osp.abspath(osp.join(__file__, '../../')))
+from dcn import (DeformConv, DeformRoIPooling,  # noqa: E402, isort:skip
+                 ModulatedDeformConv, deform_conv, deform_roi_pooling,
+                 modulated_deform_conv)
+
+
+def grid_sample(input, grid):
+    # the pixel centers are at -1 and 1, which was the only mode before
+    # PyTorch 1.3
+    try:
+        return F.grid_sample(input, grid, align_corners=True)
+    except TypeError:
+        return F.grid_sample(input, grid)
+
+
+def deform_conv_ref(input,
+                    offset,
+                    weight,
+                    mask=None,
+                    bias=None,
+                    stride=1,
+                    padding=0,
+                    dilation=1,
+                    groups=1,
+                    deformable_groups=1):
+    """Deformable convolution by sampling each kernel position of each
+    deformable group with grid_sample."""
+    n, c, h, w = input.size()
+    out_channels, _, kernel_h, kernel_w = weight.size()
+    out_h, out_w = offset.size()[2:]
+    num_k = kernel_h * kernel_w
+    ys = torch.arange(out_h, dtype=input.dtype) * stride - padding
+    xs = torch.arange(out_w, dtype=input.dtype) * stride - padding
+    offset = offset.view(n * deformable_groups, num_k, 2, out_h, out_w)
+    if mask is not None:
+        mask = mask.view(n * deformable_groups, num_k, 1, out_h, out_w)
+    input = input.view(n * deformable_groups, c // deformable_groups, h, w)
+    columns = []
+    for k in range(num_k):
+        i, j = divmod(k, kernel_w)
+        y = ys.view(1, -1, 1) + i * dilation + offset[:, k, 0]
+        x = xs.view(1, 1, -1) + j * dilation + offset[:, k, 1]
+        grid = torch.stack([x / (w - 1) * 2 - 1, y / (h - 1) * 2 - 1], dim=-1)
+        sampled = grid_sample(input, grid)
+        if mask is not None:
+            sampled = sampled * mask[:, k]
+        columns.append(sampled.view(n, c, out_h * out_w))
+    # (n, groups, c / groups * kernel_h * kernel_w, out_h * out_w)
+    columns = torch.stack(columns, dim=2).view(n, groups, -1, out_h * out_w)
+    output = torch.matmul(weight.view(groups, out_channels // groups, -1),
+                          columns).view(n, out_channels, out_h, out_w)
+    if bias is not None:
+        output = output + bias.view(1, -1, 1, 1)
+    return output
+
+
+def check_deform_conv(modulated, stride, padding, dilation, groups,
+                      deformable_groups):
+    in_channels, out_channels, kernel_size = 4, 6, 3
+    num_imgs, height, width = 2, 9, 11
+    x = torch.randn(
+        num_imgs, in_channels, height, width, dtype=torch.double)
+    conv_cls = ModulatedDeformConv if modulated else DeformConv
+    conv = conv_cls(
+        in_channels,
+        out_channels,
+        kernel_size,
+        stride=stride,
+        padding=padding,
+        dilation=dilation,
+        groups=groups,
+        deformable_groups=deformable_groups,
+        bias=modulated).double()
+    if modulated:
+        conv.bias.data.normal_()
+    out_h = (height + 2 * padding - dilation * (kernel_size - 1) - 1) // \
+        stride + 1
+    out_w = (width + 2 * padding - dilation * (kernel_size - 1) - 1) // \
+        stride + 1
+    offset = torch.randn(
+        num_imgs,
+        deformable_groups * 2 * kernel_size * kernel_size,
+        out_h,
+        out_w,
+        dtype=torch.double) * 2
+    mask = torch.rand(
+        num_imgs,
+        deformable_groups * kernel_size * kernel_size,
+        out_h,
+        out_w,
+        dtype=torch.double)
+    if modulated:
+        inputs = [x, offset, mask, conv.weight, conv.bias]
+    else:
+        inputs = [x, offset, conv.weight]
+    inputs = [t.detach().requires_grad_() for t in inputs]
+
+    if modulated:
+
+        def func(x, offset, mask, weight, bias):
+            return modulated_deform_conv(x, offset, mask, weight, bias, stride,
+                                         padding, dilation, groups,
+                                         deformable_groups)
+
+        def ref_func(x, offset, mask, weight, bias):
+            return deform_conv_ref(x, offset, weight, mask, bias, stride,
+                                   padding, dilation, groups,
+                                   deformable_groups)
+    else:
+
+        def func(x, offset, weight):
+            return deform_conv(x, offset, weight, stride, padding, dilation,
+                               groups, deformable_groups)
+
+        def ref_func(x, offset, weight):
+            return deform_conv_ref(x, offset, weight, None, None, stride,
+                                   padding, dilation, groups,
+                                   deformable_groups)
+
+    output = func(*inputs)
+    grad = torch.randn_like(output)
+    grads = torch.autograd.grad(output, inputs, grad)
+    ref_output = ref_func(*inputs)
+    ref_grads = torch.autograd.grad(ref_output, inputs, grad)
+    assert torch.allclose(output, ref_output, atol=1e-8)
+    for g, ref_g in zip(grads, ref_grads):
+        assert torch.allclose(g, ref_g, atol=1e-6)
+    return gradcheck(func, inputs, atol=1e-3, eps=1e-4)
+
+
+print('Deform conv on cpu against grid_sample...')
+for modulated in [False, True]:
+    for stride, padding, dilation, groups, deformable_groups in [
+        (1, 1, 1, 1, 1),
+        (2, 1, 1, 2, 2),
+        (1, 2, 2, 1, 4),
+    ]:
+        print(
+            check_deform_conv(modulated, stride, padding, dilation, groups,
+                              deformable_groups))
+
+feat_size = 15
+spatial_scale = 1.0 / 8
+img_size = feat_size / spatial_scale
+num_imgs = 2
+num_rois = 10
+out_size, part_size, group_size, out_channels = 3, 3, 1, 4
+
+rois = torch.rand(num_rois, 4, dtype=torch.double) * img_size * 0.3
+rois[:, :2] += img_size * 0.2
+rois[:, 2:] += rois[:, :2] + img_size * 0.1
+rois = torch.cat(
+    [torch.randint(num_imgs, (num_rois, 1)).double(), rois], dim=1)
+feat = torch.randn(
+    num_imgs,
+    out_channels,
+    feat_size,
+    feat_size,
+    requires_grad=True,
+    dtype=torch.double)
+# small offsets keep the samples inside the feature map
+offset = torch.randn(
+    num_rois, 2, part_size, part_size, dtype=torch.double) * 0.5
+offset.requires_grad_()
+print('Gradcheck for deform roi pooling on cpu...')
+pooling = DeformRoIPooling(
+    spatial_scale,
+    out_size,
+    out_channels,
+    no_trans=True,
+    group_size=group_size,
+    part_size=part_size)
+test = gradcheck(
+    lambda feat: pooling(feat, rois, None), (feat, ), atol=1e-3, eps=1e-4)
+print(test)
+
+
+def deform_roi_pooling_func(feat, offset):
+    return deform_roi_pooling(feat, rois, offset, spatial_scale, out_size,
+                              out_channels, False, group_size, part_size, 4,
+                              0.1)
+
+
+test = gradcheck(
+    deform_roi_pooling_func, (feat, offset), atol=1e-3, eps=1e-4)
+print(test)
+
+if torch.cuda.is_available():
+    print('Deform ops on cpu against cuda...')
+    x = torch.randn(2, 4, 9, 11, requires_grad=True)
+    conv = DeformConv(4, 6, 3, padding=1, deformable_groups=2)
+    offset = torch.randn(2, 36, 9, 11, requires_grad=True)
+    output = conv(x, offset)
+    output.sum().backward()
+    conv_cuda = conv.cuda()
+    x_cuda = x.detach().cuda().requires_grad_()
+    offset_cuda = offset.detach().cuda().requires_grad_()
+    output_cuda = conv_cuda(x_cuda, offset_cuda)
+    output_cuda.sum().backward()
+    print(
+        torch.allclose(output, output_cuda.cpu(), atol=1e-4)
+        and torch.allclose(x.grad, x_cuda.grad.cpu(), atol=1e-4)
+        and torch.allclose(offset.grad, offset_cuda.grad.cpu(), atol=1e-4))
+
+    feat = feat.detach().float().requires_grad_()
+    offset = torch.randn(num_rois, 2, part_size, part_size, requires_grad=True)
+    rois = rois.float()
+    output = deform_roi_pooling(feat, rois, offset, spatial_scale, out_size,
+                                out_channels, False, group_size, part_size, 4,
+                                0.1)
+    output.sum().backward()
+    feat_cuda = feat.detach().cuda().requires_grad_()
+    offset_cuda = offset.detach().cuda().requires_grad_()
+    output_cuda = deform_roi_pooling(feat_cuda, rois.cuda(), offset_cuda,
+                                     spatial_scale, out_size, out_channels,
+                                     False, group_size, part_size, 4, 0.1)
+    output_cuda.sum().backward()
+    print(
+        torch.allclose(output, output_cuda.cpu(), atol=1e-4)
+        and torch.allclose(feat.grad, feat_cuda.grad.cpu(), atol=1e-4)
+        and torch.allclose(offset.grad, offset_cuda.grad.cpu(), atol=1e-4))
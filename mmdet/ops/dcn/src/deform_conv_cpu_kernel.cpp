@@ -0,0 +1,479 @@
+// CPU version of deform_conv_cuda_kernel.cu
+//
+// The im2col kernels fill the rows of one (input channel, image) pair per
+// task, the col2im kernel scatters the gradient of one input channel per task
+// and the col2im_coord kernel computes the gradient of one (image, offset
+// channel) pair per task, so no two threads ever write to the same location.
+// The modulated kernels are the plain ones with a mask, which is NULL for the
+// plain deformable convolution.
+
+#include <ATen/Parallel.h>
+#include <torch/extension.h>
+
+#include <cmath>
+
+template <typename scalar_t>
+scalar_t deformable_im2col_bilinear(const scalar_t *bottom_data,
+                                    const int data_width, const int height,
+                                    const int width, scalar_t h, scalar_t w) {
+  int h_low = std::floor(h);
+  int w_low = std::floor(w);
+  int h_high = h_low + 1;
+  int w_high = w_low + 1;
+
+  scalar_t lh = h - h_low;
+  scalar_t lw = w - w_low;
+  scalar_t hh = 1 - lh, hw = 1 - lw;
+
+  scalar_t v1 = 0;
+  if (h_low >= 0 && w_low >= 0) v1 = bottom_data[h_low * data_width + w_low];
+  scalar_t v2 = 0;
+  if (h_low >= 0 && w_high <= width - 1)
+    v2 = bottom_data[h_low * data_width + w_high];
+  scalar_t v3 = 0;
+  if (h_high <= height - 1 && w_low >= 0)
+    v3 = bottom_data[h_high * data_width + w_low];
+  scalar_t v4 = 0;
+  if (h_high <= height - 1 && w_high <= width - 1)
+    v4 = bottom_data[h_high * data_width + w_high];
+
+  scalar_t w1 = hh * hw, w2 = hh * lw, w3 = lh * hw, w4 = lh * lw;
+
+  scalar_t val = (w1 * v1 + w2 * v2 + w3 * v3 + w4 * v4);
+  return val;
+}
+
+// Adds the bilinear weights of (h, w) times grad to the 4 neighbouring pixels,
+// same as looping over the pixels with get_gradient_weight in the CUDA kernel.
+template <typename scalar_t>
+void deformable_col2im_bilinear(scalar_t *grad_data, const int height,
+                                const int width, scalar_t h, scalar_t w,
+                                const scalar_t grad) {
+  if (h <= -1 || h >= height || w <= -1 || w >= width) {
+    // empty
+    return;
+  }
+
+  int h_low = std::floor(h);
+  int w_low = std::floor(w);
+  int h_high = h_low + 1;
+  int w_high = w_low + 1;
+
+  scalar_t lh = h - h_low;
+  scalar_t lw = w - w_low;
+  scalar_t hh = 1 - lh, hw = 1 - lw;
+
+  if (h_low >= 0 && w_low >= 0)
+    grad_data[h_low * width + w_low] += hh * hw * grad;
+  if (h_low >= 0 && w_high <= width - 1)
+    grad_data[h_low * width + w_high] += hh * lw * grad;
+  if (h_high <= height - 1 && w_low >= 0)
+    grad_data[h_high * width + w_low] += lh * hw * grad;
+  if (h_high <= height - 1 && w_high <= width - 1)
+    grad_data[h_high * width + w_high] += lh * lw * grad;
+}
+
+template <typename scalar_t>
+scalar_t get_coordinate_weight(scalar_t argmax_h, scalar_t argmax_w,
+                               const int height, const int width,
+                               const scalar_t *im_data, const int data_width,
+                               const int bp_dir) {
+  if (argmax_h <= -1 || argmax_h >= height || argmax_w <= -1 ||
+      argmax_w >= width) {
+    // empty
+    return 0;
+  }
+
+  int argmax_h_low = std::floor(argmax_h);
+  int argmax_w_low = std::floor(argmax_w);
+  int argmax_h_high = argmax_h_low + 1;
+  int argmax_w_high = argmax_w_low + 1;
+
+  scalar_t weight = 0;
+
+  if (bp_dir == 0) {
+    if (argmax_h_low >= 0 && argmax_w_low >= 0)
+      weight += -1 * (argmax_w_low + 1 - argmax_w) *
+                im_data[argmax_h_low * data_width + argmax_w_low];
+    if (argmax_h_low >= 0 && argmax_w_high <= width - 1)
+      weight += -1 * (argmax_w - argmax_w_low) *
+                im_data[argmax_h_low * data_width + argmax_w_high];
+    if (argmax_h_high <= height - 1 && argmax_w_low >= 0)
+      weight += (argmax_w_low + 1 - argmax_w) *
+                im_data[argmax_h_high * data_width + argmax_w_low];
+    if (argmax_h_high <= height - 1 && argmax_w_high <= width - 1)
+      weight += (argmax_w - argmax_w_low) *
+                im_data[argmax_h_high * data_width + argmax_w_high];
+  } else if (bp_dir == 1) {
+    if (argmax_h_low >= 0 && argmax_w_low >= 0)
+      weight += -1 * (argmax_h_low + 1 - argmax_h) *
+                im_data[argmax_h_low * data_width + argmax_w_low];
+    if (argmax_h_low >= 0 && argmax_w_high <= width - 1)
+      weight += (argmax_h_low + 1 - argmax_h) *
+                im_data[argmax_h_low * data_width + argmax_w_high];
+    if (argmax_h_high <= height - 1 && argmax_w_low >= 0)
+      weight += -1 * (argmax_h - argmax_h_low) *
+                im_data[argmax_h_high * data_width + argmax_w_low];
+    if (argmax_h_high <= height - 1 && argmax_w_high <= width - 1)
+      weight += (argmax_h - argmax_h_low) *
+                im_data[argmax_h_high * data_width + argmax_w_high];
+  }
+
+  return weight;
+}
+
+template <typename scalar_t>
+void deformable_im2col_cpu_kernel(
+    const scalar_t *data_im, const scalar_t *data_offset,
+    const scalar_t *data_mask, const int height, const int width,
+    const int kernel_h, const int kernel_w, const int pad_h, const int pad_w,
+    const int stride_h, const int stride_w, const int dilation_h,
+    const int dilation_w, const int channel_per_deformable_group,
+    const int batch_size, const int num_channels, const int deformable_group,
+    const int height_col, const int width_col, scalar_t *data_col) {
+  const int col_size = height_col * width_col;
+  at::parallel_for(0, num_channels * batch_size, 1, [&](int64_t begin,
+                                                        int64_t end) {
+    for (int index = begin; index < end; index++) {
+      const int b_col = index % batch_size;
+      const int c_im = index / batch_size;
+      const int c_col = c_im * kernel_h * kernel_w;
+
+      // compute deformable group index
+      const int deformable_group_index = c_im / channel_per_deformable_group;
+
+      const scalar_t *data_im_ptr =
+          data_im + (b_col * num_channels + c_im) * height * width;
+      const scalar_t *data_offset_ptr =
+          data_offset + (b_col * deformable_group + deformable_group_index) *
+                            2 * kernel_h * kernel_w * col_size;
+      const scalar_t *data_mask_ptr =
+          data_mask == NULL
+              ? NULL
+              : data_mask + (b_col * deformable_group +
+                             deformable_group_index) *
+                                kernel_h * kernel_w * col_size;
+
+      for (int i = 0; i < kernel_h; ++i) {
+        for (int j = 0; j < kernel_w; ++j) {
+          const int k = i * kernel_w + j;
+          const scalar_t *offset_h_ptr = data_offset_ptr + 2 * k * col_size;
+          const scalar_t *offset_w_ptr = offset_h_ptr + col_size;
+          scalar_t *data_col_ptr =
+              data_col + ((c_col + k) * batch_size + b_col) * col_size;
+          for (int h_col = 0; h_col < height_col; ++h_col) {
+            const int h_in = h_col * stride_h - pad_h;
+            for (int w_col = 0; w_col < width_col; ++w_col) {
+              const int w_in = w_col * stride_w - pad_w;
+              const int pos = h_col * width_col + w_col;
+              scalar_t val = static_cast<scalar_t>(0);
+              const scalar_t h_im = h_in + i * dilation_h + offset_h_ptr[pos];
+              const scalar_t w_im = w_in + j * dilation_w + offset_w_ptr[pos];
+              if (h_im > -1 && w_im > -1 && h_im < height && w_im < width) {
+                val = deformable_im2col_bilinear(data_im_ptr, width, height,
+                                                 width, h_im, w_im);
+              }
+              if (data_mask_ptr != NULL) {
+                val *= data_mask_ptr[k * col_size + pos];
+              }
+              data_col_ptr[pos] = val;
+            }
+          }
+        }
+      }
+    }
+  });
+}
+
+template <typename scalar_t>
+void deformable_col2im_cpu_kernel(
+    const scalar_t *data_col, const scalar_t *data_offset,
+    const scalar_t *data_mask, const int channels, const int height,
+    const int width, const int kernel_h, const int kernel_w, const int pad_h,
+    const int pad_w, const int stride_h, const int stride_w,
+    const int dilation_h, const int dilation_w,
+    const int channel_per_deformable_group, const int batch_size,
+    const int deformable_group, const int height_col, const int width_col,
+    scalar_t *grad_im) {
+  const int col_size = height_col * width_col;
+  at::parallel_for(0, channels, 1, [&](int64_t begin, int64_t end) {
+    for (int c = begin; c < end; c++) {
+      const int deformable_group_index = c / channel_per_deformable_group;
+      for (int b = 0; b < batch_size; b++) {
+        const scalar_t *data_offset_ptr =
+            data_offset + (b * deformable_group + deformable_group_index) * 2 *
+                              kernel_h * kernel_w * col_size;
+        const scalar_t *data_mask_ptr =
+            data_mask == NULL
+                ? NULL
+                : data_mask + (b * deformable_group + deformable_group_index) *
+                                  kernel_h * kernel_w * col_size;
+        scalar_t *grad_im_ptr = grad_im + (b * channels + c) * height * width;
+        for (int i = 0; i < kernel_h; ++i) {
+          for (int j = 0; j < kernel_w; ++j) {
+            const int k = i * kernel_w + j;
+            const scalar_t *offset_h_ptr = data_offset_ptr + 2 * k * col_size;
+            const scalar_t *offset_w_ptr = offset_h_ptr + col_size;
+            const scalar_t *data_col_ptr =
+                data_col +
+                ((c * kernel_h * kernel_w + k) * batch_size + b) * col_size;
+            for (int h_out = 0; h_out < height_col; ++h_out) {
+              const int h_in = h_out * stride_h - pad_h;
+              for (int w_out = 0; w_out < width_col; ++w_out) {
+                const int w_in = w_out * stride_w - pad_w;
+                const int pos = h_out * width_col + w_out;
+                const scalar_t cur_inv_h_data =
+                    h_in + i * dilation_h + offset_h_ptr[pos];
+                const scalar_t cur_inv_w_data =
+                    w_in + j * dilation_w + offset_w_ptr[pos];
+                scalar_t cur_top_grad = data_col_ptr[pos];
+                if (data_mask_ptr != NULL) {
+                  cur_top_grad *= data_mask_ptr[k * col_size + pos];
+                }
+                deformable_col2im_bilinear(grad_im_ptr, height, width,
+                                           cur_inv_h_data, cur_inv_w_data,
+                                           cur_top_grad);
+              }
+            }
+          }
+        }
+      }
+    }
+  });
+}
+
+template <typename scalar_t>
+void deformable_col2im_coord_cpu_kernel(
+    const scalar_t *data_col, const scalar_t *data_im,
+    const scalar_t *data_offset, const scalar_t *data_mask, const int channels,
+    const int height, const int width, const int kernel_h, const int kernel_w,
+    const int pad_h, const int pad_w, const int stride_h, const int stride_w,
+    const int dilation_h, const int dilation_w,
+    const int channel_per_deformable_group, const int batch_size,
+    const int offset_channels, const int deformable_group,
+    const int height_col, const int width_col, scalar_t *grad_offset,
+    scalar_t *grad_mask) {
+  const int col_size = height_col * width_col;
+  const int col_step = kernel_h * kernel_w;
+  at::parallel_for(0, batch_size * offset_channels, 1, [&](int64_t begin,
+                                                           int64_t end) {
+    for (int index = begin; index < end; index++) {
+      const int c = index % offset_channels;
+      const int b = index / offset_channels;
+
+      const int deformable_group_index = c / (2 * kernel_h * kernel_w);
+      const int offset_c = c - deformable_group_index * 2 * kernel_h * kernel_w;
+      const int bp_dir = offset_c % 2;
+      const int i = (offset_c / 2) / kernel_w;
+      const int j = (offset_c / 2) % kernel_w;
+
+      const scalar_t *data_col_ptr =
+          data_col + deformable_group_index * channel_per_deformable_group *
+                         batch_size * col_size;
+      const scalar_t *data_im_ptr =
+          data_im + (b * deformable_group + deformable_group_index) *
+                        channel_per_deformable_group / kernel_h / kernel_w *
+                        height * width;
+      const scalar_t *data_offset_ptr =
+          data_offset + (b * deformable_group + deformable_group_index) * 2 *
+                            kernel_h * kernel_w * col_size;
+      const scalar_t *offset_h_ptr = data_offset_ptr + (offset_c - bp_dir) *
+                                                           col_size;
+      const scalar_t *offset_w_ptr = offset_h_ptr + col_size;
+      const scalar_t *data_mask_ptr =
+          data_mask == NULL
+              ? NULL
+              : data_mask + ((b * deformable_group + deformable_group_index) *
+                                 kernel_h * kernel_w +
+                             offset_c / 2) *
+                                col_size;
+      scalar_t *grad_offset_ptr = grad_offset + index * col_size;
+      scalar_t *grad_mask_ptr =
+          (data_mask == NULL || bp_dir != 0)
+              ? NULL
+              : grad_mask + ((b * deformable_group + deformable_group_index) *
+                                 kernel_h * kernel_w +
+                             offset_c / 2) *
+                                col_size;
+
+      for (int h = 0; h < height_col; ++h) {
+        const int h_in = h * stride_h - pad_h;
+        for (int w = 0; w < width_col; ++w) {
+          const int w_in = w * stride_w - pad_w;
+          const int pos = h * width_col + w;
+          const scalar_t mask =
+              data_mask_ptr == NULL ? static_cast<scalar_t>(1)
+                                    : data_mask_ptr[pos];
+          scalar_t inv_h = h_in + i * dilation_h + offset_h_ptr[pos];
+          scalar_t inv_w = w_in + j * dilation_w + offset_w_ptr[pos];
+          const bool inside =
+              !(inv_h <= -1 || inv_w <= -1 || inv_h >= height ||
+                inv_w >= width);
+          if (!inside) {
+            inv_h = inv_w = -2;
+          }
+          scalar_t val = 0, mval = 0;
+          int cnt = 0;
+          for (int col_c = (offset_c / 2); col_c < channel_per_deformable_group;
+               col_c += col_step) {
+            const scalar_t col =
+                data_col_ptr[(col_c * batch_size + b) * col_size + pos];
+            const scalar_t *im_ptr = data_im_ptr + cnt * height * width;
+            if (grad_mask_ptr != NULL && inside) {
+              mval += col * deformable_im2col_bilinear(im_ptr, width, height,
+                                                       width, inv_h, inv_w);
+            }
+            const scalar_t weight = get_coordinate_weight(
+                inv_h, inv_w, height, width, im_ptr, width, bp_dir);
+            val += weight * col * mask;
+            cnt += 1;
+          }
+          grad_offset_ptr[pos] = val;
+          if (grad_mask_ptr != NULL) grad_mask_ptr[pos] = mval;
+        }
+      }
+    }
+  });
+}
+
+void deformable_im2col_cpu(
+    const at::Tensor data_im, const at::Tensor data_offset, const int channels,
+    const int height, const int width, const int ksize_h, const int ksize_w,
+    const int pad_h, const int pad_w, const int stride_h, const int stride_w,
+    const int dilation_h, const int dilation_w, const int parallel_imgs,
+    const int deformable_group, at::Tensor data_col) {
+  int height_col =
+      (height + 2 * pad_h - (dilation_h * (ksize_h - 1) + 1)) / stride_h + 1;
+  int width_col =
+      (width + 2 * pad_w - (dilation_w * (ksize_w - 1) + 1)) / stride_w + 1;
+  int channel_per_deformable_group = channels / deformable_group;
+
+  AT_DISPATCH_FLOATING_TYPES(
+      data_im.scalar_type(), "deformable_im2col_cpu", ([&] {
+        deformable_im2col_cpu_kernel<scalar_t>(
+            data_im.data<scalar_t>(), data_offset.data<scalar_t>(), NULL,
+            height, width, ksize_h, ksize_w, pad_h, pad_w, stride_h, stride_w,
+            dilation_h, dilation_w, channel_per_deformable_group,
+            parallel_imgs, channels, deformable_group, height_col, width_col,
+            data_col.data<scalar_t>());
+      }));
+}
+
+void deformable_col2im_cpu(
+    const at::Tensor data_col, const at::Tensor data_offset,
+    const int channels, const int height, const int width, const int ksize_h,
+    const int ksize_w, const int pad_h, const int pad_w, const int stride_h,
+    const int stride_w, const int dilation_h, const int dilation_w,
+    const int parallel_imgs, const int deformable_group, at::Tensor grad_im) {
+  int height_col =
+      (height + 2 * pad_h - (dilation_h * (ksize_h - 1) + 1)) / stride_h + 1;
+  int width_col =
+      (width + 2 * pad_w - (dilation_w * (ksize_w - 1) + 1)) / stride_w + 1;
+  int channel_per_deformable_group = channels / deformable_group;
+
+  AT_DISPATCH_FLOATING_TYPES(
+      data_col.scalar_type(), "deformable_col2im_cpu", ([&] {
+        deformable_col2im_cpu_kernel<scalar_t>(
+            data_col.data<scalar_t>(), data_offset.data<scalar_t>(), NULL,
+            channels, height, width, ksize_h, ksize_w, pad_h, pad_w, stride_h,
+            stride_w, dilation_h, dilation_w, channel_per_deformable_group,
+            parallel_imgs, deformable_group, height_col, width_col,
+            grad_im.data<scalar_t>());
+      }));
+}
+
+void deformable_col2im_coord_cpu(
+    const at::Tensor data_col, const at::Tensor data_im,
+    const at::Tensor data_offset, const int channels, const int height,
+    const int width, const int ksize_h, const int ksize_w, const int pad_h,
+    const int pad_w, const int stride_h, const int stride_w,
+    const int dilation_h, const int dilation_w, const int parallel_imgs,
+    const int deformable_group, at::Tensor grad_offset) {
+  int height_col =
+      (height + 2 * pad_h - (dilation_h * (ksize_h - 1) + 1)) / stride_h + 1;
+  int width_col =
+      (width + 2 * pad_w - (dilation_w * (ksize_w - 1) + 1)) / stride_w + 1;
+  int channel_per_deformable_group =
+      channels * ksize_h * ksize_w / deformable_group;
+
+  AT_DISPATCH_FLOATING_TYPES(
+      data_col.scalar_type(), "deformable_col2im_coord_cpu", ([&] {
+        deformable_col2im_coord_cpu_kernel<scalar_t>(
+            data_col.data<scalar_t>(), data_im.data<scalar_t>(),
+            data_offset.data<scalar_t>(), NULL, channels, height, width,
+            ksize_h, ksize_w, pad_h, pad_w, stride_h, stride_w, dilation_h,
+            dilation_w, channel_per_deformable_group, parallel_imgs,
+            2 * ksize_h * ksize_w * deformable_group, deformable_group,
+            height_col, width_col, grad_offset.data<scalar_t>(), NULL);
+      }));
+}
+
+void modulated_deformable_im2col_cpu(
+    const at::Tensor data_im, const at::Tensor data_offset,
+    const at::Tensor data_mask, const int batch_size, const int channels,
+    const int height_im, const int width_im, const int height_col,
+    const int width_col, const int kernel_h, const int kernel_w,
+    const int pad_h, const int pad_w, const int stride_h, const int stride_w,
+    const int dilation_h, const int dilation_w, const int deformable_group,
+    at::Tensor data_col) {
+  const int channel_per_deformable_group = channels / deformable_group;
+
+  AT_DISPATCH_FLOATING_TYPES(
+      data_im.scalar_type(), "modulated_deformable_im2col_cpu", ([&] {
+        deformable_im2col_cpu_kernel<scalar_t>(
+            data_im.data<scalar_t>(), data_offset.data<scalar_t>(),
+            data_mask.data<scalar_t>(), height_im, width_im, kernel_h,
+            kernel_w, pad_h, pad_w, stride_h, stride_w, dilation_h,
+            dilation_w, channel_per_deformable_group, batch_size, channels,
+            deformable_group, height_col, width_col,
+            data_col.data<scalar_t>());
+      }));
+}
+
+void modulated_deformable_col2im_cpu(
+    const at::Tensor data_col, const at::Tensor data_offset,
+    const at::Tensor data_mask, const int batch_size, const int channels,
+    const int height_im, const int width_im, const int height_col,
+    const int width_col, const int kernel_h, const int kernel_w,
+    const int pad_h, const int pad_w, const int stride_h, const int stride_w,
+    const int dilation_h, const int dilation_w, const int deformable_group,
+    at::Tensor grad_im) {
+  const int channel_per_deformable_group = channels / deformable_group;
+
+  AT_DISPATCH_FLOATING_TYPES(
+      data_col.scalar_type(), "modulated_deformable_col2im_cpu", ([&] {
+        deformable_col2im_cpu_kernel<scalar_t>(
+            data_col.data<scalar_t>(), data_offset.data<scalar_t>(),
+            data_mask.data<scalar_t>(), channels, height_im, width_im,
+            kernel_h, kernel_w, pad_h, pad_w, stride_h, stride_w, dilation_h,
+            dilation_w, channel_per_deformable_group, batch_size,
+            deformable_group, height_col, width_col,
+            grad_im.data<scalar_t>());
+      }));
+}
+
+void modulated_deformable_col2im_coord_cpu(
+    const at::Tensor data_col, const at::Tensor data_im,
+    const at::Tensor data_offset, const at::Tensor data_mask,
+    const int batch_size, const int channels, const int height_im,
+    const int width_im, const int height_col, const int width_col,
+    const int kernel_h, const int kernel_w, const int pad_h, const int pad_w,
+    const int stride_h, const int stride_w, const int dilation_h,
+    const int dilation_w, const int deformable_group, at::Tensor grad_offset,
+    at::Tensor grad_mask) {
+  const int channel_per_deformable_group =
+      channels * kernel_h * kernel_w / deformable_group;
+
+  AT_DISPATCH_FLOATING_TYPES(
+      data_col.scalar_type(), "modulated_deformable_col2im_coord_cpu", ([&] {
+        deformable_col2im_coord_cpu_kernel<scalar_t>(
+            data_col.data<scalar_t>(), data_im.data<scalar_t>(),
+            data_offset.data<scalar_t>(), data_mask.data<scalar_t>(),
+            channels, height_im, width_im, kernel_h, kernel_w, pad_h, pad_w,
+            stride_h, stride_w, dilation_h, dilation_w,
+            channel_per_deformable_group, batch_size,
+            2 * kernel_h * kernel_w * deformable_group, deformable_group,
+            height_col, width_col, grad_offset.data<scalar_t>(),
+            grad_mask.data<scalar_t>());
+      }));
+}
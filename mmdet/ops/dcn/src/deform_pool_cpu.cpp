@@ -0,0 +1,387 @@
+// CPU version of deform_pool_cuda.cpp and deform_pool_cuda_kernel.cu
+//
+// The RoIs are processed in parallel in the forward pass. In the backward pass
+// the gradient of the features is computed in parallel over the output
+// channels, each of which pools its own group of input channels, and the
+// gradient of the offsets in parallel over the RoIs, so that no two threads
+// accumulate into the same gradient.
+
+#include <ATen/Parallel.h>
+#include <torch/extension.h>
+
+#include <algorithm>
+#include <cmath>
+
+#define CHECK_CPU(x) AT_CHECK(!x.type().is_cuda(), #x, " must be a CPU tensor ")
+#define CHECK_CONTIGUOUS(x) \
+  AT_CHECK(x.is_contiguous(), #x, " must be contiguous ")
+#define CHECK_INPUT(x) \
+  CHECK_CPU(x);        \
+  CHECK_CONTIGUOUS(x)
+
+template <typename scalar_t>
+scalar_t bilinear_interp(const scalar_t *data, const scalar_t x,
+                         const scalar_t y, const int width, const int height) {
+  int x1 = std::floor(x);
+  int x2 = std::ceil(x);
+  int y1 = std::floor(y);
+  int y2 = std::ceil(y);
+  scalar_t dist_x = (scalar_t)(x - x1);
+  scalar_t dist_y = (scalar_t)(y - y1);
+  scalar_t value11 = data[y1 * width + x1];
+  scalar_t value12 = data[y2 * width + x1];
+  scalar_t value21 = data[y1 * width + x2];
+  scalar_t value22 = data[y2 * width + x2];
+  scalar_t value = (1 - dist_x) * (1 - dist_y) * value11 +
+                   (1 - dist_x) * dist_y * value12 +
+                   dist_x * (1 - dist_y) * value21 + dist_x * dist_y * value22;
+  return value;
+}
+
+// Geometry of a RoI and of its bins, shared by the forward and backward
+// passes.
+template <typename scalar_t>
+struct DeformRoIBins {
+  int batch_ind;
+  scalar_t roi_start_w, roi_start_h, roi_width, roi_height;
+  scalar_t bin_size_w, bin_size_h, sub_bin_size_w, sub_bin_size_h;
+
+  DeformRoIBins(const scalar_t *roi, const scalar_t spatial_scale,
+                const int pooled_height, const int pooled_width,
+                const int sample_per_part) {
+    batch_ind = roi[0];
+    roi_start_w = (scalar_t)(std::round(roi[1])) * spatial_scale - 0.5;
+    roi_start_h = (scalar_t)(std::round(roi[2])) * spatial_scale - 0.5;
+    scalar_t roi_end_w =
+        (scalar_t)(std::round(roi[3]) + 1.) * spatial_scale - 0.5;
+    scalar_t roi_end_h =
+        (scalar_t)(std::round(roi[4]) + 1.) * spatial_scale - 0.5;
+
+    // Force too small ROIs to be 1x1
+    roi_width = std::max(roi_end_w - roi_start_w, (scalar_t)0.1);  // avoid 0
+    roi_height = std::max(roi_end_h - roi_start_h, (scalar_t)0.1);
+
+    // Compute w and h at bottom
+    bin_size_h = roi_height / (scalar_t)(pooled_height);
+    bin_size_w = roi_width / (scalar_t)(pooled_width);
+
+    sub_bin_size_h = bin_size_h / (scalar_t)(sample_per_part);
+    sub_bin_size_w = bin_size_w / (scalar_t)(sample_per_part);
+  }
+};
+
+// Position of the bin (ph, pw) of output channel ctop, after the offset.
+template <typename scalar_t>
+struct DeformBin {
+  int c, trans_index;
+  scalar_t wstart, hstart;
+
+  DeformBin(const DeformRoIBins<scalar_t> &roi, const int n, const int ctop,
+            const int ph, const int pw, const scalar_t *bottom_trans,
+            const int no_trans, const scalar_t trans_std,
+            const int pooled_height, const int pooled_width,
+            const int group_size, const int part_size, const int num_classes,
+            const int channels_each_class) {
+    int part_h = std::floor((scalar_t)(ph) / pooled_height * part_size);
+    int part_w = std::floor((scalar_t)(pw) / pooled_width * part_size);
+    int class_id = ctop / channels_each_class;
+    // index of trans_x, trans_y is one part_size * part_size plane further
+    trans_index =
+        (((n * num_classes + class_id) * 2) * part_size + part_h) * part_size +
+        part_w;
+    scalar_t trans_x =
+        no_trans ? (scalar_t)(0) : bottom_trans[trans_index] * trans_std;
+    scalar_t trans_y =
+        no_trans ? (scalar_t)(0)
+                 : bottom_trans[trans_index + part_size * part_size] *
+                       trans_std;
+
+    wstart = (scalar_t)(pw)*roi.bin_size_w + roi.roi_start_w;
+    wstart += trans_x * roi.roi_width;
+    hstart = (scalar_t)(ph)*roi.bin_size_h + roi.roi_start_h;
+    hstart += trans_y * roi.roi_height;
+
+    int gw = std::floor((scalar_t)(pw)*group_size / pooled_width);
+    int gh = std::floor((scalar_t)(ph)*group_size / pooled_height);
+    gw = std::min(std::max(gw, 0), group_size - 1);
+    gh = std::min(std::max(gh, 0), group_size - 1);
+    c = (ctop * group_size + gh) * group_size + gw;
+  }
+};
+
+template <typename scalar_t>
+void DeformablePSROIPoolForwardCPU(
+    const scalar_t *bottom_data, const scalar_t spatial_scale,
+    const int num_rois, const int channels, const int height, const int width,
+    const int pooled_height, const int pooled_width,
+    const scalar_t *bottom_rois, const scalar_t *bottom_trans,
+    const int no_trans, const scalar_t trans_std, const int sample_per_part,
+    const int output_dim, const int group_size, const int part_size,
+    const int num_classes, const int channels_each_class, scalar_t *top_data,
+    scalar_t *top_count) {
+  at::parallel_for(0, num_rois, 1, [&](int64_t begin, int64_t end) {
+    for (int n = begin; n < end; n++) {
+      const DeformRoIBins<scalar_t> roi(bottom_rois + n * 5, spatial_scale,
+                                        pooled_height, pooled_width,
+                                        sample_per_part);
+      const scalar_t *offset_bottom_data =
+          bottom_data + (roi.batch_ind * channels) * height * width;
+      for (int ctop = 0; ctop < output_dim; ctop++) {
+        for (int ph = 0; ph < pooled_height; ph++) {
+          for (int pw = 0; pw < pooled_width; pw++) {
+            const DeformBin<scalar_t> bin(
+                roi, n, ctop, ph, pw, bottom_trans, no_trans, trans_std,
+                pooled_height, pooled_width, group_size, part_size,
+                num_classes, channels_each_class);
+            scalar_t sum = 0;
+            int count = 0;
+            for (int ih = 0; ih < sample_per_part; ih++) {
+              for (int iw = 0; iw < sample_per_part; iw++) {
+                scalar_t w = bin.wstart + iw * roi.sub_bin_size_w;
+                scalar_t h = bin.hstart + ih * roi.sub_bin_size_h;
+                // bilinear interpolation
+                if (w < -0.5 || w > width - 0.5 || h < -0.5 ||
+                    h > height - 0.5) {
+                  continue;
+                }
+                w = std::min(std::max(w, (scalar_t)0.), (scalar_t)(width - 1.));
+                h = std::min(std::max(h, (scalar_t)0.),
+                             (scalar_t)(height - 1.));
+                sum += bilinear_interp(
+                    offset_bottom_data + bin.c * height * width, w, h, width,
+                    height);
+                count++;
+              }
+            }
+            int index =
+                ((n * output_dim + ctop) * pooled_height + ph) * pooled_width +
+                pw;
+            top_data[index] = count == 0 ? (scalar_t)(0) : sum / count;
+            top_count[index] = count;
+          }
+        }
+      }
+    }
+  });
+}
+
+// Calls func(roi, bin, w, h, diff_val) for the samples of the bins of the
+// output channels [ctop_begin, ctop_end) of RoI n.
+template <typename scalar_t, typename Func>
+void DeformablePSROIPoolVisitSamples(
+    const int n, const int ctop_begin, const int ctop_end,
+    const scalar_t *top_diff, const scalar_t *top_count,
+    const scalar_t spatial_scale, const int height, const int width,
+    const int pooled_height, const int pooled_width, const int output_dim,
+    const scalar_t *bottom_rois, const scalar_t *bottom_trans,
+    const int no_trans, const scalar_t trans_std, const int sample_per_part,
+    const int group_size, const int part_size, const int num_classes,
+    const int channels_each_class, Func func) {
+  const DeformRoIBins<scalar_t> roi(bottom_rois + n * 5, spatial_scale,
+                                    pooled_height, pooled_width,
+                                    sample_per_part);
+  for (int ctop = ctop_begin; ctop < ctop_end; ctop++) {
+    for (int ph = 0; ph < pooled_height; ph++) {
+      for (int pw = 0; pw < pooled_width; pw++) {
+        int index =
+            ((n * output_dim + ctop) * pooled_height + ph) * pooled_width + pw;
+        if (top_count[index] <= 0) {
+          continue;
+        }
+        scalar_t diff_val = top_diff[index] / top_count[index];
+        const DeformBin<scalar_t> bin(
+            roi, n, ctop, ph, pw, bottom_trans, no_trans, trans_std,
+            pooled_height, pooled_width, group_size, part_size, num_classes,
+            channels_each_class);
+        for (int ih = 0; ih < sample_per_part; ih++) {
+          for (int iw = 0; iw < sample_per_part; iw++) {
+            scalar_t w = bin.wstart + iw * roi.sub_bin_size_w;
+            scalar_t h = bin.hstart + ih * roi.sub_bin_size_h;
+            // bilinear interpolation
+            if (w < -0.5 || w > width - 0.5 || h < -0.5 || h > height - 0.5) {
+              continue;
+            }
+            w = std::min(std::max(w, (scalar_t)0.), (scalar_t)(width - 1.));
+            h = std::min(std::max(h, (scalar_t)0.), (scalar_t)(height - 1.));
+            func(roi, bin, w, h, diff_val);
+          }
+        }
+      }
+    }
+  }
+}
+
+template <typename scalar_t>
+void DeformablePSROIPoolBackwardAccCPU(
+    const scalar_t *top_diff, const scalar_t *top_count, const int num_rois,
+    const scalar_t spatial_scale, const int channels, const int height,
+    const int width, const int pooled_height, const int pooled_width,
+    const int output_dim, scalar_t *bottom_data_diff,
+    scalar_t *bottom_trans_diff, const scalar_t *bottom_data,
+    const scalar_t *bottom_rois, const scalar_t *bottom_trans,
+    const int no_trans, const scalar_t trans_std, const int sample_per_part,
+    const int group_size, const int part_size, const int num_classes,
+    const int channels_each_class) {
+  // backward on feature
+  auto feature_grad = [&](const DeformRoIBins<scalar_t> &roi,
+                          const DeformBin<scalar_t> &bin, scalar_t w,
+                          scalar_t h, scalar_t diff_val) {
+    int x0 = std::floor(w);
+    int x1 = std::ceil(w);
+    int y0 = std::floor(h);
+    int y1 = std::ceil(h);
+    scalar_t dist_x = w - x0, dist_y = h - y0;
+    scalar_t q00 = (1 - dist_x) * (1 - dist_y);
+    scalar_t q01 = (1 - dist_x) * dist_y;
+    scalar_t q10 = dist_x * (1 - dist_y);
+    scalar_t q11 = dist_x * dist_y;
+    scalar_t *offset_bottom_data_diff =
+        bottom_data_diff + (roi.batch_ind * channels + bin.c) * height * width;
+    offset_bottom_data_diff[y0 * width + x0] += q00 * diff_val;
+    offset_bottom_data_diff[y1 * width + x0] += q01 * diff_val;
+    offset_bottom_data_diff[y0 * width + x1] += q10 * diff_val;
+    offset_bottom_data_diff[y1 * width + x1] += q11 * diff_val;
+  };
+  at::parallel_for(0, output_dim, 1, [&](int64_t begin, int64_t end) {
+    for (int n = 0; n < num_rois; n++) {
+      DeformablePSROIPoolVisitSamples(
+          n, begin, end, top_diff, top_count, spatial_scale, height, width,
+          pooled_height, pooled_width, output_dim, bottom_rois, bottom_trans,
+          no_trans, trans_std, sample_per_part, group_size, part_size,
+          num_classes, channels_each_class, feature_grad);
+    }
+  });
+
+  if (no_trans) {
+    return;
+  }
+
+  // backward on offset
+  auto trans_grad = [&](const DeformRoIBins<scalar_t> &roi,
+                        const DeformBin<scalar_t> &bin, scalar_t w, scalar_t h,
+                        scalar_t diff_val) {
+    int x0 = std::floor(w);
+    int x1 = std::ceil(w);
+    int y0 = std::floor(h);
+    int y1 = std::ceil(h);
+    scalar_t dist_x = w - x0, dist_y = h - y0;
+    const scalar_t *offset_bottom_data =
+        bottom_data + (roi.batch_ind * channels + bin.c) * height * width;
+    scalar_t U00 = offset_bottom_data[y0 * width + x0];
+    scalar_t U01 = offset_bottom_data[y1 * width + x0];
+    scalar_t U10 = offset_bottom_data[y0 * width + x1];
+    scalar_t U11 = offset_bottom_data[y1 * width + x1];
+    scalar_t diff_x = (U11 * dist_y + U10 * (1 - dist_y) - U01 * dist_y -
+                       U00 * (1 - dist_y)) *
+                      trans_std * diff_val;
+    diff_x *= roi.roi_width;
+    scalar_t diff_y = (U11 * dist_x + U01 * (1 - dist_x) - U10 * dist_x -
+                       U00 * (1 - dist_x)) *
+                      trans_std * diff_val;
+    diff_y *= roi.roi_height;
+
+    bottom_trans_diff[bin.trans_index] += diff_x;
+    bottom_trans_diff[bin.trans_index + part_size * part_size] += diff_y;
+  };
+  at::parallel_for(0, num_rois, 1, [&](int64_t begin, int64_t end) {
+    for (int n = begin; n < end; n++) {
+      DeformablePSROIPoolVisitSamples(
+          n, 0, output_dim, top_diff, top_count, spatial_scale, height, width,
+          pooled_height, pooled_width, output_dim, bottom_rois, bottom_trans,
+          no_trans, trans_std, sample_per_part, group_size, part_size,
+          num_classes, channels_each_class, trans_grad);
+    }
+  });
+}
+
+void deform_psroi_pooling_cpu_forward(
+    at::Tensor input, at::Tensor bbox, at::Tensor trans, at::Tensor out,
+    at::Tensor top_count, const int no_trans, const float spatial_scale,
+    const int output_dim, const int group_size, const int pooled_size,
+    const int part_size, const int sample_per_part, const float trans_std) {
+  CHECK_INPUT(input);
+  CHECK_INPUT(bbox);
+  CHECK_INPUT(out);
+  CHECK_INPUT(top_count);
+  if (!no_trans) {
+    CHECK_INPUT(trans);
+  }
+
+  const int channels = input.size(1);
+  const int height = input.size(2);
+  const int width = input.size(3);
+  const int channels_trans = no_trans ? 2 : trans.size(1);
+
+  const int num_bbox = bbox.size(0);
+  if (num_bbox != out.size(0))
+    AT_ERROR("Output shape and bbox number wont match: (%d vs %d).",
+             out.size(0), num_bbox);
+
+  const int num_classes = no_trans ? 1 : channels_trans / 2;
+  const int channels_each_class =
+      no_trans ? output_dim : output_dim / num_classes;
+
+  AT_DISPATCH_FLOATING_TYPES(
+      input.scalar_type(), "deformable_psroi_pool_forward", ([&] {
+        DeformablePSROIPoolForwardCPU<scalar_t>(
+            input.data<scalar_t>(), (scalar_t)spatial_scale, num_bbox,
+            channels, height, width, pooled_size, pooled_size,
+            bbox.data<scalar_t>(),
+            no_trans ? NULL : trans.data<scalar_t>(), no_trans,
+            (scalar_t)trans_std, sample_per_part, output_dim, group_size,
+            part_size, num_classes, channels_each_class,
+            out.data<scalar_t>(), top_count.data<scalar_t>());
+      }));
+}
+
+void deform_psroi_pooling_cpu_backward(
+    at::Tensor out_grad, at::Tensor input, at::Tensor bbox, at::Tensor trans,
+    at::Tensor top_count, at::Tensor input_grad, at::Tensor trans_grad,
+    const int no_trans, const float spatial_scale, const int output_dim,
+    const int group_size, const int pooled_size, const int part_size,
+    const int sample_per_part, const float trans_std) {
+  CHECK_INPUT(out_grad);
+  CHECK_INPUT(input);
+  CHECK_INPUT(bbox);
+  CHECK_INPUT(top_count);
+  CHECK_INPUT(input_grad);
+  if (!no_trans) {
+    CHECK_INPUT(trans);
+    CHECK_INPUT(trans_grad);
+  }
+
+  const int channels = input.size(1);
+  const int height = input.size(2);
+  const int width = input.size(3);
+  const int channels_trans = no_trans ? 2 : trans.size(1);
+
+  const int num_bbox = bbox.size(0);
+  if (num_bbox != out_grad.size(0))
+    AT_ERROR("Output shape and bbox number wont match: (%d vs %d).",
+             out_grad.size(0), num_bbox);
+
+  const int num_classes = no_trans ? 1 : channels_trans / 2;
+  const int channels_each_class =
+      no_trans ? output_dim : output_dim / num_classes;
+
+  AT_DISPATCH_FLOATING_TYPES(
+      out_grad.scalar_type(), "deformable_psroi_pool_backward_acc", ([&] {
+        DeformablePSROIPoolBackwardAccCPU<scalar_t>(
+            out_grad.data<scalar_t>(), top_count.data<scalar_t>(), num_bbox,
+            (scalar_t)spatial_scale, channels, height, width, pooled_size,
+            pooled_size, output_dim, input_grad.data<scalar_t>(),
+            no_trans ? NULL : trans_grad.data<scalar_t>(),
+            input.data<scalar_t>(), bbox.data<scalar_t>(),
+            no_trans ? NULL : trans.data<scalar_t>(), no_trans,
+            (scalar_t)trans_std, sample_per_part, group_size, part_size,
+            num_classes, channels_each_class);
+      }));
+}
+
+PYBIND11_MODULE(TORCH_EXTENSION_NAME, m) {
+  m.def("deform_psroi_pooling_cpu_forward", &deform_psroi_pooling_cpu_forward,
+        "deform psroi pooling forward(CPU)");
+  m.def("deform_psroi_pooling_cpu_backward",
+        &deform_psroi_pooling_cpu_backward,
+        "deform psroi pooling backward(CPU)");
+}
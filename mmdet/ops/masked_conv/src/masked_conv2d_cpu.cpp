@@ -0,0 +1,120 @@
+#include <ATen/Parallel.h>
+#include <torch/extension.h>
+
+#include <cmath>
+
+// CPU version of masked_conv2d_kernel.cu. Only the active positions are
+// gathered into the (ic * kh * kw, mask_cnt) column buffer, so the cost of
+// the convolution is proportional to the number of positions in the mask.
+// Both kernels are parallel over the channels, each thread writes disjoint
+// rows of the output.
+
+#define CHECK_CPU(x) AT_CHECK(!x.type().is_cuda(), #x, " must be a CPU tensor ")
+#define CHECK_CONTIGUOUS(x) \
+  AT_CHECK(x.is_contiguous(), #x, " must be contiguous ")
+#define CHECK_INPUT(x) \
+  CHECK_CPU(x);        \
+  CHECK_CONTIGUOUS(x)
+
+template <typename scalar_t>
+void MaskedIm2colForward(const scalar_t *bottom_data, const int height,
+                         const int width, const int channels,
+                         const int kernel_h, const int kernel_w,
+                         const int pad_h, const int pad_w,
+                         const int64_t *mask_h_idx, const int64_t *mask_w_idx,
+                         const int mask_cnt, scalar_t *data_col) {
+  at::parallel_for(0, channels, 1, [&](int64_t begin, int64_t end) {
+    for (int c = begin; c < end; c++) {
+      const scalar_t *data_im = bottom_data + c * height * width;
+      for (int i = 0; i < kernel_h; ++i) {
+        for (int j = 0; j < kernel_w; ++j) {
+          // one contiguous row of the column buffer per kernel position
+          scalar_t *col = data_col +
+                          ((c * kernel_h + i) * kernel_w + j) * mask_cnt;
+          for (int m = 0; m < mask_cnt; m++) {
+            const int h_im = mask_h_idx[m] - pad_h + i;
+            const int w_im = mask_w_idx[m] - pad_w + j;
+            col[m] = (h_im >= 0 && w_im >= 0 && h_im < height && w_im < width)
+                         ? data_im[h_im * width + w_im]
+                         : (scalar_t)0;
+          }
+        }
+      }
+    }
+  });
+}
+
+template <typename scalar_t>
+void MaskedCol2imForward(const scalar_t *data_col, const int height,
+                         const int width, const int channels,
+                         const int64_t *mask_h_idx, const int64_t *mask_w_idx,
+                         const int mask_cnt, scalar_t *data_im) {
+  at::parallel_for(0, channels, 1, [&](int64_t begin, int64_t end) {
+    for (int c = begin; c < end; c++) {
+      const scalar_t *col = data_col + c * mask_cnt;
+      scalar_t *im = data_im + c * height * width;
+      for (int m = 0; m < mask_cnt; m++) {
+        im[mask_h_idx[m] * width + mask_w_idx[m]] = col[m];
+      }
+    }
+  });
+}
+
+int masked_im2col_forward_cpu(const at::Tensor im, const at::Tensor mask_h_idx,
+                              const at::Tensor mask_w_idx, const int kernel_h,
+                              const int kernel_w, const int pad_h,
+                              const int pad_w, at::Tensor col) {
+  CHECK_INPUT(im);
+  CHECK_INPUT(mask_h_idx);
+  CHECK_INPUT(mask_w_idx);
+  CHECK_INPUT(col);
+  // im: (n, ic, h, w), kernel size (kh, kw)
+  // kernel: (oc, ic * kh * kw), col: (kh * kw * ic, ow * oh)
+
+  int channels = im.size(1);
+  int height = im.size(2);
+  int width = im.size(3);
+  int mask_cnt = mask_h_idx.size(0);
+
+  AT_DISPATCH_FLOATING_TYPES(im.scalar_type(), "MaskedIm2colForward", ([&] {
+                               MaskedIm2colForward<scalar_t>(
+                                   im.data<scalar_t>(), height, width,
+                                   channels, kernel_h, kernel_w, pad_h, pad_w,
+                                   mask_h_idx.data<int64_t>(),
+                                   mask_w_idx.data<int64_t>(), mask_cnt,
+                                   col.data<scalar_t>());
+                             }));
+
+  return 1;
+}
+
+int masked_col2im_forward_cpu(const at::Tensor col,
+                              const at::Tensor mask_h_idx,
+                              const at::Tensor mask_w_idx, int height,
+                              int width, int channels, at::Tensor im) {
+  CHECK_INPUT(col);
+  CHECK_INPUT(mask_h_idx);
+  CHECK_INPUT(mask_w_idx);
+  CHECK_INPUT(im);
+  // im: (n, ic, h, w), kernel size (kh, kw)
+  // kernel: (oc, ic * kh * kh), col: (kh * kw * ic, ow * oh)
+
+  int mask_cnt = mask_h_idx.size(0);
+
+  AT_DISPATCH_FLOATING_TYPES(col.scalar_type(), "MaskedCol2imForward", ([&] {
+                               MaskedCol2imForward<scalar_t>(
+                                   col.data<scalar_t>(), height, width,
+                                   channels, mask_h_idx.data<int64_t>(),
+                                   mask_w_idx.data<int64_t>(), mask_cnt,
+                                   im.data<scalar_t>());
+                             }));
+
+  return 1;
+}
+
+PYBIND11_MODULE(TORCH_EXTENSION_NAME, m) {
+  m.def("masked_im2col_forward", &masked_im2col_forward_cpu,
+        "masked_im2col forward (CPU)");
+  m.def("masked_col2im_forward", &masked_col2im_forward_cpu,
+        "masked_col2im forward (CPU)");
+}
@@ -4,13 +4,12 @@ from torch.autograd import Function
 from torch.autograd.function import once_differentiable
 from torch.nn.modules.utils import _pair
 
-from . import psroi_pool_cuda
+from . import psroi_pool_cpu, psroi_pool_cuda
 
 class PSRoIPoolingFunction(Function):
 
     @staticmethod
     def forward(ctx, features, rois, out_size, spatial_scale, sample_num):
-        assert features.is_cuda
         out_h, out_w = _pair(out_size)
         assert isinstance(out_h, int) and isinstance(out_w, int) and out_h == out_w
         num_channels = features.size(1)
@@ -20,7 +19,8 @@ class PSRoIPoolingFunction(Function):
         output = features.new_zeros(out_size)
         mappingchannel = features.new_zeros(out_size, dtype=torch.int32)
         group_size = out_h
-        psroi_pool_cuda.forward(out_h, out_w, spatial_scale, sample_num, group_size, output_dim, features, rois,
+        psroi_pool_ext = psroi_pool_cuda if features.is_cuda else psroi_pool_cpu
+        psroi_pool_ext.forward(out_h, out_w, spatial_scale, sample_num, group_size, output_dim, features, rois,
                                 output, mappingchannel)
         feature_size = features.size()
         ctx.save_for_backward(rois, mappingchannel)
@@ -40,10 +40,11 @@ class PSRoIPoolingFunction(Function):
         feature_size = ctx.feature_size
         sample_num = ctx.sample_num
         spatial_scale = ctx.spatial_scale
-        assert (feature_size is not None and grad_output.is_cuda)
+        assert feature_size is not None
         batch_size, num_channels, data_height, data_width = feature_size
         grad_input = grad_output.new_zeros(batch_size, num_channels, data_height, data_width)
-        psroi_pool_cuda.backward(out_h, out_w, spatial_scale, sample_num, output_dim,
+        psroi_pool_ext = psroi_pool_cuda if grad_output.is_cuda else psroi_pool_cpu
+        psroi_pool_ext.backward(out_h, out_w, spatial_scale, sample_num, output_dim,
                                  grad_output, rois, grad_input, mappingchannel)
         return grad_input, None, None, None, None
 
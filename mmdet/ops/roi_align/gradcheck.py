@@ -19,12 +19,28 @@ rois = np.random.rand(num_rois, 4) * img_size * 0.5
 rois[:, 2:] += img_size * 0.5
 rois = np.hstack((batch_ind, rois))
 
+# the cpu version supports double, which is more accurate
 feat = torch.randn(
-    num_imgs, 16, feat_size, feat_size, requires_grad=True, device='cuda:0')
-rois = torch.from_numpy(rois).float().cuda()
-inputs = (feat, rois)
-print('Gradcheck for roi align...')
+    num_imgs, 16, feat_size, feat_size, requires_grad=True, dtype=torch.double)
+inputs = (feat, torch.from_numpy(rois).double())
+print('Gradcheck for roi align on cpu...')
 test = gradcheck(RoIAlign(3, spatial_scale), inputs, atol=1e-3, eps=1e-3)
 print(test)
 test = gradcheck(RoIAlign(3, spatial_scale, 2), inputs, atol=1e-3, eps=1e-3)
 print(test)
+
+if torch.cuda.is_available():
+    feat = torch.randn(
+        num_imgs,
+        16,
+        feat_size,
+        feat_size,
+        requires_grad=True,
+        device='cuda:0')
+    inputs = (feat, torch.from_numpy(rois).float().cuda())
+    print('Gradcheck for roi align...')
+    test = gradcheck(RoIAlign(3, spatial_scale), inputs, atol=1e-3, eps=1e-3)
+    print(test)
+    test = gradcheck(
+        RoIAlign(3, spatial_scale, 2), inputs, atol=1e-3, eps=1e-3)
+    print(test)
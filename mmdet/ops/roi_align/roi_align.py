@@ -3,7 +3,7 @@ from torch.autograd import Function
 from torch.autograd.function import once_differentiable
 from torch.nn.modules.utils import _pair
 
-from . import roi_align_cuda
+from . import roi_align_cpu, roi_align_cuda
 
 
 class RoIAlignFunction(Function):
@@ -21,11 +21,9 @@ class RoIAlignFunction(Function):
         num_rois = rois.size(0)
 
         output = features.new_zeros(num_rois, num_channels, out_h, out_w)
-        if features.is_cuda:
-            roi_align_cuda.forward(features, rois, out_h, out_w, spatial_scale,
-                                   sample_num, output)
-        else:
-            raise NotImplementedError
+        roi_align_ext = roi_align_cuda if features.is_cuda else roi_align_cpu
+        roi_align_ext.forward(features, rois, out_h, out_w, spatial_scale,
+                              sample_num, output)
 
         return output
 
@@ -36,7 +34,7 @@ class RoIAlignFunction(Function):
         spatial_scale = ctx.spatial_scale
         sample_num = ctx.sample_num
         rois = ctx.saved_tensors[0]
-        assert (feature_size is not None and grad_output.is_cuda)
+        assert feature_size is not None
 
         batch_size, num_channels, data_height, data_width = feature_size
         out_w = grad_output.size(3)
@@ -46,9 +44,11 @@ class RoIAlignFunction(Function):
         if ctx.needs_input_grad[0]:
             grad_input = rois.new_zeros(batch_size, num_channels, data_height,
                                         data_width)
-            roi_align_cuda.backward(grad_output.contiguous(), rois, out_h,
-                                    out_w, spatial_scale, sample_num,
-                                    grad_input)
+            roi_align_ext = (
+                roi_align_cuda if grad_output.is_cuda else roi_align_cpu)
+            roi_align_ext.backward(grad_output.contiguous(), rois, out_h,
+                                   out_w, spatial_scale, sample_num,
+                                   grad_input)
 
         return grad_input, grad_rois, None, None, None
 
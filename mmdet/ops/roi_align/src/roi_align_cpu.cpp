@@ -0,0 +1,258 @@
+#include <ATen/Parallel.h>
+#include <torch/extension.h>
+
+#include <cmath>
+
+// CPU version of roi_align_kernel.cu, the RoIs are processed in parallel in
+// the forward pass and the channels in the backward pass, so that no two
+// threads accumulate into the same gradient.
+
+#define CHECK_CPU(x) AT_CHECK(!x.type().is_cuda(), #x, " must be a CPU tensor ")
+#define CHECK_CONTIGUOUS(x) \
+  AT_CHECK(x.is_contiguous(), #x, " must be contiguous ")
+#define CHECK_INPUT(x) \
+  CHECK_CPU(x);        \
+  CHECK_CONTIGUOUS(x)
+
+template <typename scalar_t>
+void bilinear_interpolate_gradient(const int height, const int width,
+                                   scalar_t y, scalar_t x, scalar_t &w1,
+                                   scalar_t &w2, scalar_t &w3, scalar_t &w4,
+                                   int &x_low, int &x_high, int &y_low,
+                                   int &y_high) {
+  // deal with cases that inverse elements are out of feature map boundary
+  if (y < -1.0 || y > height || x < -1.0 || x > width) {
+    w1 = w2 = w3 = w4 = 0.;
+    x_low = x_high = y_low = y_high = -1;
+    return;
+  }
+
+  if (y <= 0) y = 0;
+  if (x <= 0) x = 0;
+
+  y_low = (int)y;
+  x_low = (int)x;
+
+  if (y_low >= height - 1) {
+    y_high = y_low = height - 1;
+    y = (scalar_t)y_low;
+  } else {
+    y_high = y_low + 1;
+  }
+
+  if (x_low >= width - 1) {
+    x_high = x_low = width - 1;
+    x = (scalar_t)x_low;
+  } else {
+    x_high = x_low + 1;
+  }
+
+  scalar_t ly = y - y_low;
+  scalar_t lx = x - x_low;
+  scalar_t hy = 1. - ly;
+  scalar_t hx = 1. - lx;
+
+  w1 = hy * hx, w2 = hy * lx, w3 = ly * hx, w4 = ly * lx;
+}
+
+// Geometry of a RoI, shared by the forward and backward passes.
+template <typename scalar_t>
+struct RoIBins {
+  int batch_ind;
+  scalar_t start_w, start_h, bin_size_w, bin_size_h;
+  int sample_num_h, sample_num_w;
+
+  RoIBins(const scalar_t *roi, const scalar_t spatial_scale,
+          const int sample_num, const int pooled_height,
+          const int pooled_width) {
+    batch_ind = roi[0];
+    start_w = roi[1] * spatial_scale;
+    start_h = roi[2] * spatial_scale;
+    scalar_t end_w = (roi[3] + 1) * spatial_scale;
+    scalar_t end_h = (roi[4] + 1) * spatial_scale;
+
+    // Force malformed ROIs to be 1x1
+    scalar_t roi_width = std::max(end_w - start_w, (scalar_t)0.);
+    scalar_t roi_height = std::max(end_h - start_h, (scalar_t)0.);
+
+    bin_size_h = roi_height / pooled_height;
+    bin_size_w = roi_width / pooled_width;
+
+    sample_num_h =
+        (sample_num > 0) ? sample_num : std::ceil(roi_height / pooled_height);
+    sample_num_w =
+        (sample_num > 0) ? sample_num : std::ceil(roi_width / pooled_width);
+  }
+
+  scalar_t y(const int ph, const int iy) const {
+    return start_h + ph * bin_size_h +
+           (scalar_t)(iy + scalar_t(.5f)) * bin_size_h /
+               (scalar_t)(sample_num_h);
+  }
+
+  scalar_t x(const int pw, const int ix) const {
+    return start_w + pw * bin_size_w +
+           (scalar_t)(ix + scalar_t(.5f)) * bin_size_w /
+               (scalar_t)(sample_num_w);
+  }
+};
+
+template <typename scalar_t>
+void ROIAlignForward(const scalar_t *bottom_data, const scalar_t *bottom_rois,
+                     const scalar_t spatial_scale, const int sample_num,
+                     const int num_rois, const int channels, const int height,
+                     const int width, const int pooled_height,
+                     const int pooled_width, scalar_t *top_data) {
+  at::parallel_for(0, num_rois, 1, [&](int64_t begin, int64_t end) {
+    for (int n = begin; n < end; n++) {
+      const RoIBins<scalar_t> roi(bottom_rois + n * 5, spatial_scale,
+                                  sample_num, pooled_height, pooled_width);
+      const scalar_t count = (scalar_t)(roi.sample_num_h * roi.sample_num_w);
+      for (int c = 0; c < channels; c++) {
+        const scalar_t *offset_bottom_data =
+            bottom_data + (roi.batch_ind * channels + c) * height * width;
+        scalar_t *offset_top_data =
+            top_data + (n * channels + c) * pooled_height * pooled_width;
+        for (int ph = 0; ph < pooled_height; ph++) {
+          for (int pw = 0; pw < pooled_width; pw++) {
+            scalar_t output_val = 0;
+            for (int iy = 0; iy < roi.sample_num_h; iy++) {
+              const scalar_t y = roi.y(ph, iy);
+              for (int ix = 0; ix < roi.sample_num_w; ix++) {
+                const scalar_t x = roi.x(pw, ix);
+                scalar_t w1, w2, w3, w4;
+                int x_low, x_high, y_low, y_high;
+                bilinear_interpolate_gradient<scalar_t>(
+                    height, width, y, x, w1, w2, w3, w4, x_low, x_high, y_low,
+                    y_high);
+                if (x_low >= 0) {
+                  output_val += w1 * offset_bottom_data[y_low * width + x_low] +
+                                w2 * offset_bottom_data[y_low * width + x_high] +
+                                w3 * offset_bottom_data[y_high * width + x_low] +
+                                w4 * offset_bottom_data[y_high * width + x_high];
+                }
+              }
+            }
+            offset_top_data[ph * pooled_width + pw] = output_val / count;
+          }
+        }
+      }
+    }
+  });
+}
+
+template <typename scalar_t>
+void ROIAlignBackward(const scalar_t *top_diff, const scalar_t *bottom_rois,
+                      const scalar_t spatial_scale, const int sample_num,
+                      const int num_rois, const int channels, const int height,
+                      const int width, const int pooled_height,
+                      const int pooled_width, scalar_t *bottom_diff) {
+  at::parallel_for(0, channels, 1, [&](int64_t begin, int64_t end) {
+    for (int n = 0; n < num_rois; n++) {
+      const RoIBins<scalar_t> roi(bottom_rois + n * 5, spatial_scale,
+                                  sample_num, pooled_height, pooled_width);
+      const scalar_t count = (scalar_t)(roi.sample_num_h * roi.sample_num_w);
+      for (int c = begin; c < end; c++) {
+        scalar_t *offset_bottom_diff =
+            bottom_diff + (roi.batch_ind * channels + c) * height * width;
+        const scalar_t *offset_top_diff =
+            top_diff + (n * channels + c) * pooled_height * pooled_width;
+        for (int ph = 0; ph < pooled_height; ph++) {
+          for (int pw = 0; pw < pooled_width; pw++) {
+            const scalar_t grad = offset_top_diff[ph * pooled_width + pw];
+            for (int iy = 0; iy < roi.sample_num_h; iy++) {
+              const scalar_t y = roi.y(ph, iy);
+              for (int ix = 0; ix < roi.sample_num_w; ix++) {
+                const scalar_t x = roi.x(pw, ix);
+                scalar_t w1, w2, w3, w4;
+                int x_low, x_high, y_low, y_high;
+                bilinear_interpolate_gradient<scalar_t>(
+                    height, width, y, x, w1, w2, w3, w4, x_low, x_high, y_low,
+                    y_high);
+                if (x_low >= 0 && x_high >= 0 && y_low >= 0 && y_high >= 0) {
+                  offset_bottom_diff[y_low * width + x_low] += grad * w1 / count;
+                  offset_bottom_diff[y_low * width + x_high] +=
+                      grad * w2 / count;
+                  offset_bottom_diff[y_high * width + x_low] +=
+                      grad * w3 / count;
+                  offset_bottom_diff[y_high * width + x_high] +=
+                      grad * w4 / count;
+                }
+              }
+            }
+          }
+        }
+      }
+    }
+  });
+}
+
+int roi_align_forward_cpu(at::Tensor features, at::Tensor rois,
+                          int pooled_height, int pooled_width,
+                          float spatial_scale, int sample_num,
+                          at::Tensor output) {
+  CHECK_INPUT(features);
+  CHECK_INPUT(rois);
+  CHECK_INPUT(output);
+
+  // Number of ROIs
+  int num_rois = rois.size(0);
+  int size_rois = rois.size(1);
+
+  if (size_rois != 5) {
+    printf("wrong roi size\n");
+    return 0;
+  }
+
+  int num_channels = features.size(1);
+  int data_height = features.size(2);
+  int data_width = features.size(3);
+
+  AT_DISPATCH_FLOATING_TYPES(features.scalar_type(), "ROIAlignForward", ([&] {
+                               ROIAlignForward<scalar_t>(
+                                   features.data<scalar_t>(),
+                                   rois.data<scalar_t>(),
+                                   scalar_t(spatial_scale), sample_num,
+                                   num_rois, num_channels, data_height,
+                                   data_width, pooled_height, pooled_width,
+                                   output.data<scalar_t>());
+                             }));
+  return 1;
+}
+
+int roi_align_backward_cpu(at::Tensor top_grad, at::Tensor rois,
+                           int pooled_height, int pooled_width,
+                           float spatial_scale, int sample_num,
+                           at::Tensor bottom_grad) {
+  CHECK_INPUT(top_grad);
+  CHECK_INPUT(rois);
+  CHECK_INPUT(bottom_grad);
+
+  // Number of ROIs
+  int num_rois = rois.size(0);
+  int size_rois = rois.size(1);
+  if (size_rois != 5) {
+    printf("wrong roi size\n");
+    return 0;
+  }
+
+  int num_channels = bottom_grad.size(1);
+  int data_height = bottom_grad.size(2);
+  int data_width = bottom_grad.size(3);
+
+  AT_DISPATCH_FLOATING_TYPES(top_grad.scalar_type(), "ROIAlignBackward", ([&] {
+                               ROIAlignBackward<scalar_t>(
+                                   top_grad.data<scalar_t>(),
+                                   rois.data<scalar_t>(),
+                                   scalar_t(spatial_scale), sample_num,
+                                   num_rois, num_channels, data_height,
+                                   data_width, pooled_height, pooled_width,
+                                   bottom_grad.data<scalar_t>());
+                             }));
+  return 1;
+}
+
+PYBIND11_MODULE(TORCH_EXTENSION_NAME, m) {
+  m.def("forward", &roi_align_forward_cpu, "Roi_Align forward (CPU)");
+  m.def("backward", &roi_align_backward_cpu, "Roi_Align backward (CPU)");
+}
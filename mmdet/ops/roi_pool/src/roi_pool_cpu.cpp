@@ -0,0 +1,193 @@
+#include <ATen/Parallel.h>
+#include <torch/extension.h>
+
+#include <cmath>
+
+// CPU version of roi_pool_kernel.cu, the RoIs are processed in parallel in
+// the forward pass and the channels in the backward pass, so that no two
+// threads accumulate into the same gradient. The bins without any pixel have
+// an argmax of -1 and get no gradient.
+
+#define CHECK_CPU(x) AT_CHECK(!x.type().is_cuda(), #x, " must be a CPU tensor ")
+#define CHECK_CONTIGUOUS(x) \
+  AT_CHECK(x.is_contiguous(), #x, " must be contiguous ")
+#define CHECK_INPUT(x) \
+  CHECK_CPU(x);        \
+  CHECK_CONTIGUOUS(x)
+
+template <typename scalar_t>
+void ROIPoolForward(const scalar_t *bottom_data, const scalar_t *rois,
+                    const scalar_t spatial_scale, const int num_rois,
+                    const int channels, const int height, const int width,
+                    const int pooled_h, const int pooled_w, scalar_t *top_data,
+                    int *argmax_data) {
+  at::parallel_for(0, num_rois, 1, [&](int64_t begin, int64_t end) {
+    for (int n = begin; n < end; n++) {
+      const scalar_t *offset_rois = rois + n * 5;
+      int roi_batch_ind = offset_rois[0];
+      // calculate the roi region on feature maps
+      scalar_t roi_x1 = offset_rois[1] * spatial_scale;
+      scalar_t roi_y1 = offset_rois[2] * spatial_scale;
+      scalar_t roi_x2 = (offset_rois[3] + 1) * spatial_scale;
+      scalar_t roi_y2 = (offset_rois[4] + 1) * spatial_scale;
+
+      scalar_t *offset_top_data = top_data + n * channels * pooled_h * pooled_w;
+      int *offset_argmax_data =
+          argmax_data + n * channels * pooled_h * pooled_w;
+
+      // malformed rois are pooled to 0
+      scalar_t roi_w = roi_x2 - roi_x1;
+      scalar_t roi_h = roi_y2 - roi_y1;
+      if (roi_w <= 0 || roi_h <= 0) {
+        std::fill(offset_top_data,
+                  offset_top_data + channels * pooled_h * pooled_w, 0);
+        std::fill(offset_argmax_data,
+                  offset_argmax_data + channels * pooled_h * pooled_w, -1);
+        continue;
+      }
+
+      scalar_t bin_size_w = roi_w / static_cast<scalar_t>(pooled_w);
+      scalar_t bin_size_h = roi_h / static_cast<scalar_t>(pooled_h);
+
+      for (int ph = 0; ph < pooled_h; ph++) {
+        for (int pw = 0; pw < pooled_w; pw++) {
+          // the corresponding bin region
+          int bin_x1 =
+              std::floor(static_cast<scalar_t>(pw) * bin_size_w + roi_x1);
+          int bin_y1 =
+              std::floor(static_cast<scalar_t>(ph) * bin_size_h + roi_y1);
+          int bin_x2 =
+              std::ceil(static_cast<scalar_t>(pw + 1) * bin_size_w + roi_x1);
+          int bin_y2 =
+              std::ceil(static_cast<scalar_t>(ph + 1) * bin_size_h + roi_y1);
+
+          // add roi offsets and clip to input boundaries
+          bin_x1 = std::min(std::max(bin_x1, 0), width);
+          bin_y1 = std::min(std::max(bin_y1, 0), height);
+          bin_x2 = std::min(std::max(bin_x2, 0), width);
+          bin_y2 = std::min(std::max(bin_y2, 0), height);
+          bool is_empty = (bin_y2 <= bin_y1) || (bin_x2 <= bin_x1);
+
+          for (int c = 0; c < channels; c++) {
+            const scalar_t *offset_bottom_data =
+                bottom_data + (roi_batch_ind * channels + c) * height * width;
+            // If nothing is pooled, argmax = -1 causes nothing to be
+            // backprop'd
+            int max_idx = -1;
+            // Define an empty pooling region to be zero
+            scalar_t max_val =
+                is_empty ? static_cast<scalar_t>(0)
+                         : offset_bottom_data[bin_y1 * width + bin_x1] - 1;
+            for (int h = bin_y1; h < bin_y2; ++h) {
+              for (int w = bin_x1; w < bin_x2; ++w) {
+                int offset = h * width + w;
+                if (offset_bottom_data[offset] > max_val) {
+                  max_val = offset_bottom_data[offset];
+                  max_idx = offset;
+                }
+              }
+            }
+            int index = (c * pooled_h + ph) * pooled_w + pw;
+            offset_top_data[index] = max_val;
+            offset_argmax_data[index] = max_idx;
+          }
+        }
+      }
+    }
+  });
+}
+
+template <typename scalar_t>
+void ROIPoolBackward(const scalar_t *top_diff, const scalar_t *rois,
+                     const int *argmax_data, const int num_rois,
+                     const int channels, const int height, const int width,
+                     const int pooled_h, const int pooled_w,
+                     scalar_t *bottom_diff) {
+  at::parallel_for(0, channels, 1, [&](int64_t begin, int64_t end) {
+    for (int n = 0; n < num_rois; n++) {
+      int roi_batch_ind = rois[n * 5];
+      for (int c = begin; c < end; c++) {
+        scalar_t *offset_bottom_diff =
+            bottom_diff + (roi_batch_ind * channels + c) * height * width;
+        int offset_top = (n * channels + c) * pooled_h * pooled_w;
+        for (int i = 0; i < pooled_h * pooled_w; i++) {
+          int bottom_index = argmax_data[offset_top + i];
+          if (bottom_index >= 0) {
+            offset_bottom_diff[bottom_index] += top_diff[offset_top + i];
+          }
+        }
+      }
+    }
+  });
+}
+
+int roi_pooling_forward_cpu(at::Tensor features, at::Tensor rois,
+                            int pooled_height, int pooled_width,
+                            float spatial_scale, at::Tensor output,
+                            at::Tensor argmax) {
+  CHECK_INPUT(features);
+  CHECK_INPUT(rois);
+  CHECK_INPUT(output);
+  CHECK_INPUT(argmax);
+
+  // Number of ROIs
+  int num_rois = rois.size(0);
+  int size_rois = rois.size(1);
+
+  if (size_rois != 5) {
+    printf("wrong roi size\n");
+    return 0;
+  }
+
+  int channels = features.size(1);
+  int height = features.size(2);
+  int width = features.size(3);
+
+  AT_DISPATCH_FLOATING_TYPES(features.scalar_type(), "ROIPoolForward", ([&] {
+                               ROIPoolForward<scalar_t>(
+                                   features.data<scalar_t>(),
+                                   rois.data<scalar_t>(),
+                                   scalar_t(spatial_scale), num_rois,
+                                   channels, height, width, pooled_height,
+                                   pooled_width, output.data<scalar_t>(),
+                                   argmax.data<int>());
+                             }));
+  return 1;
+}
+
+int roi_pooling_backward_cpu(at::Tensor top_grad, at::Tensor rois,
+                             at::Tensor argmax, float spatial_scale,
+                             at::Tensor bottom_grad) {
+  CHECK_INPUT(top_grad);
+  CHECK_INPUT(rois);
+  CHECK_INPUT(argmax);
+  CHECK_INPUT(bottom_grad);
+
+  int pooled_height = top_grad.size(2);
+  int pooled_width = top_grad.size(3);
+  int num_rois = rois.size(0);
+  int size_rois = rois.size(1);
+
+  if (size_rois != 5) {
+    printf("wrong roi size\n");
+    return 0;
+  }
+  int channels = bottom_grad.size(1);
+  int height = bottom_grad.size(2);
+  int width = bottom_grad.size(3);
+
+  AT_DISPATCH_FLOATING_TYPES(top_grad.scalar_type(), "ROIPoolBackward", ([&] {
+                               ROIPoolBackward<scalar_t>(
+                                   top_grad.data<scalar_t>(),
+                                   rois.data<scalar_t>(), argmax.data<int>(),
+                                   num_rois, channels, height, width,
+                                   pooled_height, pooled_width,
+                                   bottom_grad.data<scalar_t>());
+                             }));
+  return 1;
+}
+
+PYBIND11_MODULE(TORCH_EXTENSION_NAME, m) {
+  m.def("forward", &roi_pooling_forward_cpu, "Roi_Pooling forward (CPU)");
+  m.def("backward", &roi_pooling_backward_cpu, "Roi_Pooling backward (CPU)");
+}
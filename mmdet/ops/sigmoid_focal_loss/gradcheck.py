@@ -0,0 +1,61 @@
+import os.path as osp
+import sys
+
+import torch
+import torch.nn.functional as F
+from torch.autograd import gradcheck
+
+sys.path.append(osp.abspath(osp.join(__file__, '../../')))
+from sigmoid_focal_loss import sigmoid_focal_loss  # noqa: E402, isort:skip
+
+
+def sigmoid_focal_loss_ref(pred, target, gamma=2.0, alpha=0.25):
+    """Elementwise sigmoid focal loss with labels starting from 1, 0 being the
+    background and negative labels being ignored."""
+    num_classes = pred.size(1)
+    labels = torch.arange(1, num_classes + 1, dtype=target.dtype)
+    one_hot = (target[:, None] == labels[None]).type_as(pred)
+    valid = (target >= 0).type_as(pred)[:, None]
+    pred_sigmoid = pred.sigmoid()
+    pt = (1 - pred_sigmoid) * one_hot + pred_sigmoid * (1 - one_hot)
+    focal_weight = (alpha * one_hot + (1 - alpha) *
+                    (1 - one_hot)) * pt.pow(gamma)
+    loss = F.binary_cross_entropy_with_logits(
+        pred, one_hot, reduction='none') * focal_weight
+    return loss * valid
+
+
+num_samples, num_classes = 50, 8
+pred = torch.randn(num_samples, num_classes, dtype=torch.double) * 3
+pred.requires_grad_()
+target = torch.randint(-1, num_classes + 1, (num_samples, ))
+
+print('Sigmoid focal loss on cpu against the reference...')
+for gamma, alpha in [(2.0, 0.25), (1.5, 0.5), (0.0, 0.25)]:
+    loss = sigmoid_focal_loss(pred, target, gamma, alpha)
+    grad = torch.randn_like(loss)
+    pred_grad, = torch.autograd.grad(loss, pred, grad)
+    ref_loss = sigmoid_focal_loss_ref(pred, target, gamma, alpha)
+    ref_grad, = torch.autograd.grad(ref_loss, pred, grad)
+    print(
+        torch.allclose(loss, ref_loss, atol=1e-8)
+        and torch.allclose(pred_grad, ref_grad, atol=1e-8))
+
+print('Gradcheck for sigmoid focal loss on cpu...')
+test = gradcheck(
+    lambda pred: sigmoid_focal_loss(pred, target, 2.0, 0.25), (pred, ),
+    atol=1e-3,
+    eps=1e-4)
+print(test)
+
+if torch.cuda.is_available():
+    print('Sigmoid focal loss on cpu against cuda...')
+    pred = pred.detach().float().requires_grad_()
+    loss = sigmoid_focal_loss(pred, target, 2.0, 0.25)
+    loss.sum().backward()
+    pred_cuda = pred.detach().cuda().requires_grad_()
+    loss_cuda = sigmoid_focal_loss(pred_cuda, target.cuda(), 2.0, 0.25)
+    loss_cuda.sum().backward()
+    print(
+        torch.allclose(loss, loss_cuda.cpu(), atol=1e-5)
+        and torch.allclose(pred.grad, pred_cuda.grad.cpu(), atol=1e-5))
@@ -2,7 +2,7 @@ import torch.nn as nn
 from torch.autograd import Function
 from torch.autograd.function import once_differentiable
 
-from . import sigmoid_focal_loss_cuda
+from . import sigmoid_focal_loss_cpu, sigmoid_focal_loss_cuda
 
 
 class SigmoidFocalLossFunction(Function):
@@ -15,8 +15,11 @@ class SigmoidFocalLossFunction(Function):
         ctx.gamma = gamma
         ctx.alpha = alpha
 
-        loss = sigmoid_focal_loss_cuda.forward(input, target, num_classes,
-                                               gamma, alpha)
+        sigmoid_focal_loss_ext = (
+            sigmoid_focal_loss_cuda
+            if input.is_cuda else sigmoid_focal_loss_cpu)
+        loss = sigmoid_focal_loss_ext.forward(input, target, num_classes,
+                                              gamma, alpha)
         return loss
 
     @staticmethod
@@ -27,8 +30,11 @@ class SigmoidFocalLossFunction(Function):
         gamma = ctx.gamma
         alpha = ctx.alpha
         d_loss = d_loss.contiguous()
-        d_input = sigmoid_focal_loss_cuda.backward(input, target, d_loss,
-                                                   num_classes, gamma, alpha)
+        sigmoid_focal_loss_ext = (
+            sigmoid_focal_loss_cuda
+            if input.is_cuda else sigmoid_focal_loss_cpu)
+        d_input = sigmoid_focal_loss_ext.backward(input, target, d_loss,
+                                                  num_classes, gamma, alpha)
         return d_input, None, None, None, None
 
 
@@ -44,7 +50,6 @@ class SigmoidFocalLoss(nn.Module):
         self.alpha = alpha
 
     def forward(self, logits, targets):
-        assert logits.is_cuda
         loss = sigmoid_focal_loss(logits, targets, self.gamma, self.alpha)
         return loss.sum()
 
@@ -0,0 +1,165 @@
+#include <ATen/Parallel.h>
+#include <torch/extension.h>
+
+#include <algorithm>
+#include <cfloat>
+#include <cmath>
+
+// CPU version of sigmoid_focal_loss_cuda.cu. Each element is computed in a
+// single pass from one exp() and one log1p() of its logit, without building
+// any intermediate (N, num_classes) tensors. The rows are processed in
+// parallel.
+
+#define CHECK_CPU(x) AT_CHECK(!x.type().is_cuda(), #x, " must be a CPU tensor ")
+#define CHECK_CONTIGUOUS(x) \
+  AT_CHECK(x.is_contiguous(), #x, " must be contiguous ")
+#define CHECK_INPUT(x) \
+  CHECK_CPU(x);        \
+  CHECK_CONTIGUOUS(x)
+
+// p = sigmoid(x), log(p) (clamped as in the CUDA kernel) and log(1 - p),
+// computed from exp(-|x|) so that neither overflows.
+template <typename scalar_t>
+void sigmoid_and_logs(const scalar_t x, scalar_t &p, scalar_t &log_p,
+                      scalar_t &log_1_p) {
+  const scalar_t e = std::exp(-std::abs(x));
+  const scalar_t log1p_e = std::log1p(e);
+  p = x >= 0 ? 1. / (1. + e) : e / (1. + e);
+  log_p = std::max(-std::max(-x, (scalar_t)0.) - log1p_e,
+                   (scalar_t)std::log(FLT_MIN));
+  log_1_p = -std::max(x, (scalar_t)0.) - log1p_e;
+}
+
+template <typename scalar_t>
+void SigmoidFocalLossForward(const int num_samples, const scalar_t *logits,
+                             const int64_t *targets, const int num_classes,
+                             const float gamma, const float alpha,
+                             scalar_t *losses) {
+  const scalar_t zn = (1.0 - alpha);
+  const scalar_t zp = (alpha);
+  at::parallel_for(0, num_samples, 1, [&](int64_t begin, int64_t end) {
+    for (int n = begin; n < end; n++) {
+      const int64_t t = targets[n];
+      const scalar_t *row_logits = logits + n * num_classes;
+      scalar_t *row_losses = losses + n * num_classes;
+      for (int d = 0; d < num_classes; d++) {
+        // Decide it is positive or negative case.
+        const scalar_t c1 = (t == (d + 1));
+        const scalar_t c2 = (t >= 0 && t != (d + 1));
+
+        scalar_t p, log_p, log_1_p;
+        sigmoid_and_logs(row_logits[d], p, log_p, log_1_p);
+
+        // (1-p)**gamma * log(p)
+        const scalar_t term1 = std::pow((1. - p), gamma) * log_p;
+        // p**gamma * log(1-p)
+        const scalar_t term2 = std::pow(p, gamma) * log_1_p;
+
+        row_losses[d] = -c1 * term1 * zp - c2 * term2 * zn;
+      }
+    }
+  });
+}
+
+template <typename scalar_t>
+void SigmoidFocalLossBackward(const int num_samples, const scalar_t *logits,
+                              const int64_t *targets, const scalar_t *d_losses,
+                              const int num_classes, const float gamma,
+                              const float alpha, scalar_t *d_logits) {
+  const scalar_t zn = (1.0 - alpha);
+  const scalar_t zp = (alpha);
+  at::parallel_for(0, num_samples, 1, [&](int64_t begin, int64_t end) {
+    for (int n = begin; n < end; n++) {
+      const int64_t t = targets[n];
+      const scalar_t *row_logits = logits + n * num_classes;
+      const scalar_t *row_d_losses = d_losses + n * num_classes;
+      scalar_t *row_d_logits = d_logits + n * num_classes;
+      for (int d = 0; d < num_classes; d++) {
+        // Decide it is positive or negative case.
+        const scalar_t c1 = (t == (d + 1));
+        const scalar_t c2 = (t >= 0 && t != (d + 1));
+
+        scalar_t p, log_p, log_1_p;
+        sigmoid_and_logs(row_logits[d], p, log_p, log_1_p);
+
+        // (1-p)**g * (1 - p - g*p*log(p))
+        const scalar_t term1 =
+            std::pow((1. - p), gamma) * (1. - p - (p * gamma * log_p));
+        // p**g * (g*(1-p)*log(1-p) - p)
+        const scalar_t term2 =
+            std::pow(p, gamma) * (log_1_p * (1. - p) * gamma - p);
+
+        row_d_logits[d] =
+            (-c1 * term1 * zp - c2 * term2 * zn) * row_d_losses[d];
+      }
+    }
+  });
+}
+
+at::Tensor SigmoidFocalLoss_forward_cpu(const at::Tensor &logits,
+                                        const at::Tensor &targets,
+                                        const int num_classes,
+                                        const float gamma, const float alpha) {
+  CHECK_INPUT(logits);
+  CHECK_INPUT(targets);
+  AT_CHECK(logits.dim() == 2, "logits should be NxClass");
+  AT_CHECK(targets.dim() == 1, "targets should be N");
+  AT_CHECK(logits.size(0) == targets.size(0),
+           "logits.size(0) should equal targets.size(0)");
+
+  const int num_samples = logits.size(0);
+
+  auto losses = at::empty({num_samples, logits.size(1)}, logits.options());
+
+  if (losses.numel() == 0) {
+    return losses;
+  }
+
+  AT_DISPATCH_FLOATING_TYPES(
+      logits.scalar_type(), "SigmoidFocalLoss_forward", ([&] {
+        SigmoidFocalLossForward<scalar_t>(
+            num_samples, logits.data<scalar_t>(), targets.data<int64_t>(),
+            num_classes, gamma, alpha, losses.data<scalar_t>());
+      }));
+  return losses;
+}
+
+at::Tensor SigmoidFocalLoss_backward_cpu(const at::Tensor &logits,
+                                         const at::Tensor &targets,
+                                         const at::Tensor &d_losses,
+                                         const int num_classes,
+                                         const float gamma, const float alpha) {
+  CHECK_INPUT(logits);
+  CHECK_INPUT(targets);
+  CHECK_INPUT(d_losses);
+  AT_CHECK(logits.dim() == 2, "logits should be NxClass");
+  AT_CHECK(targets.dim() == 1, "targets should be N");
+  AT_CHECK(logits.size(0) == targets.size(0),
+           "logits.size(0) should equal targets.size(0)");
+
+  const int num_samples = logits.size(0);
+  AT_CHECK(logits.size(1) == num_classes,
+           "logits.size(1) should be num_classes");
+
+  auto d_logits = at::empty({num_samples, num_classes}, logits.options());
+
+  if (d_logits.numel() == 0) {
+    return d_logits;
+  }
+
+  AT_DISPATCH_FLOATING_TYPES(
+      logits.scalar_type(), "SigmoidFocalLoss_backward", ([&] {
+        SigmoidFocalLossBackward<scalar_t>(
+            num_samples, logits.data<scalar_t>(), targets.data<int64_t>(),
+            d_losses.data<scalar_t>(), num_classes, gamma, alpha,
+            d_logits.data<scalar_t>());
+      }));
+  return d_logits;
+}
+
+PYBIND11_MODULE(TORCH_EXTENSION_NAME, m) {
+  m.def("forward", &SigmoidFocalLoss_forward_cpu,
+        "SigmoidFocalLoss forward (CPU)");
+  m.def("backward", &SigmoidFocalLoss_backward_cpu,
+        "SigmoidFocalLoss backward (CPU)");
+}
@@ -0,0 +1,57 @@
+import os.path as osp
+import resource
+import sys
+import time
+from multiprocessing import Process, Queue
+
+import numpy as np
+import torch
+
+sys.path.append(osp.abspath(osp.join(__file__, '../../')))
+from space_time_mem import PointwiseGraphNN  # noqa: E402, isort:skip
+
+C_in = 256
+T = 20
+H, W = 32, 56
+relation_percents = [0.25, 1.0]
+chunk_sizes = [None, 4096, 1024]
+repeats = 3
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+
+def run(relation_percent, chunk_size, queue):
+    torch.manual_seed(0)
+    module = PointwiseGraphNN(
+        C_in, relation_percent=relation_percent, chunk_size=chunk_size)
+    space_time_mem = torch.randn(T, 1, C_in, H, W)
+    features = torch.randn(1, C_in, H, W)
+    with torch.no_grad():
+        rss_before = peak_rss_mb()
+        start = time.time()
+        for _ in range(repeats):
+            out = module(space_time_mem, features)
+        elapsed = (time.time() - start) / repeats
+    # a tensor would be shared through a file descriptor of this process,
+    # which exits
+    queue.put((elapsed, peak_rss_mb() - rss_before, out.numpy()))
+
+
+for relation_percent in relation_percents:
+    print('PointwiseGraphNN on CPU, T={}, C={}, {}x{}, relation_percent={}'.
+          format(T, C_in, H, W, relation_percent))
+    dense_out = None
+    for chunk_size in chunk_sizes:
+        queue = Queue()
+        proc = Process(target=run, args=(relation_percent, chunk_size, queue))
+        proc.start()
+        elapsed, peak_mb, out = queue.get()
+        proc.join()
+        if dense_out is None:
+            dense_out = out
+        print('chunk_size={}: {:.3f}s per forward, +{:.0f}MB peak memory, '
+              'max abs diff to dense {:.2e}'.format(
+                  chunk_size, elapsed, peak_mb,
+                  np.abs(out - dense_out).max()))
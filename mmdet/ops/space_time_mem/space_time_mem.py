@@ -1,11 +1,17 @@
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 import numpy as np
 
 class PointwiseGraphNN(nn.Module):
   # space_time_mem is used to augment the features2
   # relation percent 1.0 for training, 0.25 for testing.
-  def __init__(self, C_in, C_qk=None, relation_percent=1.0, relation_num=1024):
+  # chunk_size: if set, memory positions are processed chunk_size at a time
+  # and the full relation matrix is never built, see chunked_augment_feature2.
+  # mem_pool: None, 'avg' or 'learned', spatially downsample the memory by
+  # mem_pool_stride before the key/value projections.
+  def __init__(self, C_in, C_qk=None, relation_percent=1.0, relation_num=1024, chunk_size=None,
+               mem_pool=None, mem_pool_stride=2):
     super(PointwiseGraphNN, self).__init__()
     if C_qk is None:
       C_qk = int(C_in / 8)
@@ -16,6 +22,12 @@ class PointwiseGraphNN(nn.Module):
     self.C_qk = C_qk
     self.relation_percent = relation_percent
     self.relation_num = relation_num
+    self.chunk_size = chunk_size
+    assert mem_pool in (None, 'avg', 'learned')
+    self.mem_pool = mem_pool
+    self.mem_pool_stride = mem_pool_stride
+    if mem_pool == 'learned':
+      self.pool = nn.Conv2d(C_in, C_in, kernel_size=mem_pool_stride, stride=mem_pool_stride, groups=C_in, bias=False)
     self.softmax = nn.Softmax(dim=1)
     self.init_weights()
     assert relation_percent>0 and relation_percent<=1.0
@@ -27,6 +39,22 @@ class PointwiseGraphNN(nn.Module):
     nn.init.constant_(self.key.bias, 0)
     nn.init.xavier_uniform_(self.value.weight)
     nn.init.constant_(self.value.bias, 0)
+    if self.mem_pool == 'learned':
+      # start as average pooling.
+      nn.init.constant_(self.pool.weight, 1.0/(self.mem_pool_stride*self.mem_pool_stride))
+
+  def project_memory(self, feats):
+    '''
+    Keys and values of memory frames. They only depend on the frame, so callers may cache them.
+
+    :param feats: [M,C,H1,W1]
+    :return: keys [M,C_qk,h1,w1] and values [M,C,h1,w1], downsampled if mem_pool is set.
+    '''
+    if self.mem_pool == 'avg':
+      feats = F.avg_pool2d(feats, self.mem_pool_stride, ceil_mode=True)
+    elif self.mem_pool == 'learned':
+      feats = self.pool(feats)
+    return self.key(feats), self.value(feats)
 
   def forward(self, space_time_mem, features2):
     '''
@@ -39,11 +67,24 @@ class PointwiseGraphNN(nn.Module):
     T, N, C, H1, W1 = space_time_mem.shape
     space_time_mem_4d = space_time_mem.view(T * N, C, H1, W1)
     #query_feat1 = self.query(space_time_mem_4d)
-    query_feat1 = self.key(space_time_mem_4d)
+    query_feat1, value_feat1 = self.project_memory(space_time_mem_4d)
+    query_feat1 = query_feat1.view((T, N) + query_feat1.shape[1:])
+    value_feat1 = value_feat1.view((T, N) + value_feat1.shape[1:])
+    return self.forward_projected(query_feat1, value_feat1, features2)
+
+  def forward_projected(self, mem_keys, mem_values, features2):
+    '''
+    Same as forward, with the memory already projected by project_memory.
+
+    :param mem_keys: [T,N,C_qk,H1,W1]
+    :param mem_values: [T,N,C,H1,W1]
+    :param features2: [N,C,H2,W2]
+    '''
     key_feat2 = self.key(features2)
-    value_feat1 = self.value(space_time_mem_4d)
-    query_feat1_transpose = query_feat1.view(T, N, self.C_qk, H1, W1).permute(1, 2, 0, 3, 4)
-    value_feat1_transpose = value_feat1.view(T, N, C, H1, W1).permute(1, 2, 0, 3, 4)
+    query_feat1_transpose = mem_keys.permute(1, 2, 0, 3, 4)
+    value_feat1_transpose = mem_values.permute(1, 2, 0, 3, 4)
+    if self.chunk_size is not None:
+      return self.chunked_augment_feature2(query_feat1_transpose, key_feat2, value_feat1_transpose, features2)
     relation_matrix = self.pointwise_relation_matrix(query_feat1_transpose, key_feat2)
     aug_feat2 = self.augment_feature2(relation_matrix, value_feat1_transpose, features2)
     return aug_feat2
@@ -79,7 +120,51 @@ class PointwiseGraphNN(nn.Module):
     augmented_features2 = augmented_features2 + features2
     return augmented_features2
 
+  def chunked_augment_feature2(self, space_time_mem_5d, key_feat2, value_feat1_5d, features2):
+    '''
+    Same as augment_feature2(pointwise_relation_matrix(...)) without the full relation matrix.
+    The softmax over the memory positions is computed online, chunk_size rows at a time, and only
+    the kept rows are multiplied with the values, so at most (N, chunk_size, H2*W2) relations are alive.
 
-
-
-
+    :param space_time_mem_5d: [N,C_qk,T,H1,W1]
+    :param key_feat2: [N,C_qk,H2,W2]
+    :param value_feat1_5d: [N,C,T,H1,W1]
+    :param features2: [N,C,H2,W2]
+    '''
+    N1, C1, T, H1, W1 = space_time_mem_5d.shape
+    N2, C2, H2, W2 = key_feat2.shape
+    R1 = T*H1*W1
+    m1 = space_time_mem_5d.reshape(N1, C1, R1).permute(0, 2, 1)
+    m2 = key_feat2.view(N2, C2, H2*W2)
+    values = value_feat1_5d.reshape(N1, value_feat1_5d.shape[1], R1)
+    scale = np.sqrt(C1)
+
+    def relations(keys, col_max, col_sum):
+      return torch.exp(torch.bmm(keys, m2)/scale - col_max)/col_sum
+
+    # running max and normalizer of every column of the relation matrix.
+    col_max = m2.new_full((N2, 1, H2*W2), float('-inf'))
+    col_sum = m2.new_zeros((N2, 1, H2*W2))
+    for start in range(0, R1, self.chunk_size):
+      logits = torch.bmm(m1[:, start:start+self.chunk_size], m2)/scale
+      new_max = torch.max(col_max, logits.max(dim=1, keepdim=True)[0])
+      col_sum = col_sum*torch.exp(col_max - new_max) + torch.exp(logits - new_max).sum(dim=1, keepdim=True)
+      col_max = new_max
+
+    # keep the memory positions with the largest total relation.
+    if self.relation_percent<1.0:
+      rel_sum = m2.new_empty(R1)
+      for start in range(0, R1, self.chunk_size):
+        rel_sum[start:start+self.chunk_size] = \
+          relations(m1[:, start:start+self.chunk_size], col_max, col_sum).sum(dim=(0, 2))
+      kept_num = int(R1*self.relation_percent)
+      indices = torch.argsort(rel_sum, descending=True)[:kept_num]
+      m1 = torch.index_select(m1, 1, indices)
+      values = torch.index_select(values, 2, indices)
+
+    augmented_features2 = features2.new_zeros((N1, values.shape[1], H2*W2))
+    for start in range(0, m1.shape[1], self.chunk_size):
+      relation_matrix = relations(m1[:, start:start+self.chunk_size], col_max, col_sum)
+      augmented_features2 = augmented_features2 + torch.bmm(values[:, :, start:start+self.chunk_size], relation_matrix)
+    augmented_features2 = augmented_features2.view(features2.shape) + features2
+    return augmented_features2
@@ -6,7 +6,8 @@ from setuptools import Extension, find_packages, setup
 
 import numpy as np
 from Cython.Build import cythonize
-from torch.utils.cpp_extension import BuildExtension, CUDAExtension
+from torch.utils.cpp_extension import (BuildExtension, CppExtension,
+                                       CUDAExtension)
 
 
 def readme():
@@ -100,6 +101,21 @@ def make_cuda_ext(name, module, sources):
         })
 
 
+def make_cpu_ext(name, module, sources):
+    # the kernels are parallelized with at::parallel_for, which uses OpenMP
+    extra_compile_args = {'cxx': []}
+    extra_link_args = []
+    if platform.system() != 'Windows':
+        extra_compile_args['cxx'].append('-fopenmp')
+        extra_link_args.append('-fopenmp')
+
+    return CppExtension(
+        name='{}.{}'.format(module, name),
+        sources=[os.path.join(*module.split('.'), p) for p in sources],
+        extra_compile_args=extra_compile_args,
+        extra_link_args=extra_link_args)
+
+
 def make_cython_ext(name, module, sources):
     extra_compile_args = None
     if platform.system() != 'Windows':
@@ -159,14 +175,28 @@ if __name__ == '__main__':
                 name='nms_cuda',
                 module='mmdet.ops.nms',
                 sources=['src/nms_cuda.cpp', 'src/nms_kernel.cu']),
+            make_cpu_ext(
+                name='roi_align_cpu',
+                module='mmdet.ops.roi_align',
+                sources=['src/roi_align_cpu.cpp']),
             make_cuda_ext(
                 name='roi_align_cuda',
                 module='mmdet.ops.roi_align',
                 sources=['src/roi_align_cuda.cpp', 'src/roi_align_kernel.cu']),
+            make_cpu_ext(
+                name='roi_pool_cpu',
+                module='mmdet.ops.roi_pool',
+                sources=['src/roi_pool_cpu.cpp']),
             make_cuda_ext(
                 name='roi_pool_cuda',
                 module='mmdet.ops.roi_pool',
                 sources=['src/roi_pool_cuda.cpp', 'src/roi_pool_kernel.cu']),
+            make_cpu_ext(
+                name='deform_conv_cpu',
+                module='mmdet.ops.dcn',
+                sources=[
+                    'src/deform_conv_cpu.cpp', 'src/deform_conv_cpu_kernel.cpp'
+                ]),
             make_cuda_ext(
                 name='deform_conv_cuda',
                 module='mmdet.ops.dcn',
@@ -174,6 +204,10 @@ if __name__ == '__main__':
                     'src/deform_conv_cuda.cpp',
                     'src/deform_conv_cuda_kernel.cu'
                 ]),
+            make_cpu_ext(
+                name='deform_pool_cpu',
+                module='mmdet.ops.dcn',
+                sources=['src/deform_pool_cpu.cpp']),
             make_cuda_ext(
                 name='deform_pool_cuda',
                 module='mmdet.ops.dcn',
@@ -181,6 +215,10 @@ if __name__ == '__main__':
                     'src/deform_pool_cuda.cpp',
                     'src/deform_pool_cuda_kernel.cu'
                 ]),
+            make_cpu_ext(
+                name='sigmoid_focal_loss_cpu',
+                module='mmdet.ops.sigmoid_focal_loss',
+                sources=['src/sigmoid_focal_loss_cpu.cpp']),
             make_cuda_ext(
                 name='sigmoid_focal_loss_cuda',
                 module='mmdet.ops.sigmoid_focal_loss',
@@ -188,12 +226,20 @@ if __name__ == '__main__':
                     'src/sigmoid_focal_loss.cpp',
                     'src/sigmoid_focal_loss_cuda.cu'
                 ]),
+            make_cpu_ext(
+                name='masked_conv2d_cpu',
+                module='mmdet.ops.masked_conv',
+                sources=['src/masked_conv2d_cpu.cpp']),
             make_cuda_ext(
                 name='masked_conv2d_cuda',
                 module='mmdet.ops.masked_conv',
                 sources=[
                     'src/masked_conv2d_cuda.cpp', 'src/masked_conv2d_kernel.cu'
                 ]),
+            make_cpu_ext(
+                name='psroi_pool_cpu',
+                module='mmdet.ops.psroi_pool',
+                sources=['src/psroi_pooling_cpu.cpp']),
             make_cuda_ext(
                 name='psroi_pool_cuda',
                 module='mmdet.ops.psroi_pool',
@@ -0,0 +1,121 @@
+"""Compare COCOeval and CocoEvaluator on a synthetic COCO dataset."""
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+from pycocotools.coco import COCO
+from pycocotools.cocoeval import COCOeval
+
+from mmdet.core import CocoEvaluator
+
+
+def synthetic_coco(num_imgs, num_classes, max_gts, max_dets, seed=0):
+    """Ground truth with crowd boxes and noisy detections with tied scores."""
+    rng = np.random.RandomState(seed)
+    img_size = 600
+    images = []
+    anns = []
+    for img_id in range(1, num_imgs + 1):
+        images.append(dict(id=img_id, width=img_size, height=img_size))
+        for _ in range(rng.randint(0, max_gts + 1)):
+            x, y = rng.uniform(0, img_size * 0.8, 2).round(1)
+            w, h = rng.uniform(4, img_size * 0.2, 2).round(1)
+            anns.append(
+                dict(
+                    id=len(anns) + 1,
+                    image_id=img_id,
+                    category_id=int(rng.randint(1, num_classes + 1)),
+                    bbox=[x, y, w, h],
+                    area=w * h * rng.uniform(0.5, 1),
+                    iscrowd=int(rng.rand() < 0.05)))
+    coco = COCO()
+    coco.dataset = dict(
+        images=images,
+        annotations=anns,
+        categories=[
+            dict(id=cat_id, name=str(cat_id))
+            for cat_id in range(1, num_classes + 1)
+        ])
+    with contextlib.redirect_stdout(io.StringIO()):
+        coco.createIndex()
+
+    results = []
+    for img_id in coco.getImgIds():
+        img_results = []
+        for cat_id in coco.getCatIds():
+            gts = np.array([
+                ann['bbox'] for ann in coco.imgToAnns[img_id]
+                if ann['category_id'] == cat_id
+            ]).reshape(-1, 4)
+            gts = gts[rng.rand(len(gts)) < 0.8]
+            gts[:, 2:] += gts[:, :2] - 1
+            num_fps = rng.randint(0, max_dets + 1)
+            xy = rng.uniform(0, img_size * 0.8, (num_fps, 2))
+            wh = rng.uniform(4, img_size * 0.2, (num_fps, 2))
+            bboxes = np.vstack([
+                gts + rng.normal(0, 4, gts.shape),
+                np.hstack([xy, xy + wh])
+            ])
+            scores = rng.rand(len(bboxes), 1).round(2)
+            img_results.append(
+                np.hstack([bboxes, scores]).astype(np.float32))
+        results.append(img_results)
+    return coco, results
+
+
+def det2json(coco, results):
+    json_results = []
+    for img_id, img_results in zip(coco.getImgIds(), results):
+        for cat_id, bboxes in zip(coco.getCatIds(), img_results):
+            for bbox in bboxes:
+                x1, y1, x2, y2, score = bbox.tolist()
+                json_results.append(
+                    dict(
+                        image_id=img_id,
+                        category_id=cat_id,
+                        bbox=[x1, y1, x2 - x1 + 1, y2 - y1 + 1],
+                        score=score))
+    return json_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark COCO evaluation')
+    parser.add_argument('--num-imgs', type=int, default=5000)
+    parser.add_argument('--num-classes', type=int, default=80)
+    parser.add_argument('--max-gts', type=int, default=15)
+    parser.add_argument('--max-dets', type=int, default=2)
+    parser.add_argument('--nproc', type=int, default=4)
+    args = parser.parse_args()
+
+    coco, results = synthetic_coco(args.num_imgs, args.num_classes,
+                                   args.max_gts, args.max_dets)
+    start = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        coco_dets = coco.loadRes(det2json(coco, results))
+        coco_eval = COCOeval(coco, coco_dets, 'bbox')
+        coco_eval.params.imgIds = coco.getImgIds()
+        coco_eval.evaluate()
+        coco_eval.accumulate()
+        coco_eval.summarize()
+    print('{} detections'.format(len(coco_dets.anns)))
+    print('COCOeval: {:.2f}s'.format(time.time() - start))
+
+    start = time.time()
+    evaluator = CocoEvaluator(coco, nproc=args.nproc)
+    evaluator.add(coco.getImgIds(), results)
+    stats = evaluator.summarize()
+    evaluator.close()
+    print('CocoEvaluator ({} processes): {:.2f}s'.format(
+        args.nproc,
+        time.time() - start))
+
+    for key in ['precision', 'recall', 'scores']:
+        assert np.array_equal(coco_eval.eval[key], evaluator.eval[key]), key
+    assert np.array_equal(coco_eval.stats, stats)
+    print('identical results')
+
+
+if __name__ == '__main__':
+    main()
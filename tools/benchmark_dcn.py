@@ -0,0 +1,101 @@
+"""Measure the latency of the CPU deformable convolution and deformable RoI
+pooling ops with several numbers of threads."""
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from mmdet.ops import (DeformConvPack, DeformRoIPoolingPack,
+                       ModulatedDeformConvPack, ModulatedDeformRoIPoolingPack)
+
+
+def random_rois(num_rois, num_imgs, img_size, seed=0):
+    rng = np.random.RandomState(seed)
+    xy = rng.uniform(0, img_size * 0.8, (num_rois, 2))
+    wh = rng.uniform(8, img_size * 0.4, (num_rois, 2))
+    rois = np.hstack([
+        rng.randint(num_imgs, size=(num_rois, 1)), xy,
+        np.minimum(xy + wh, img_size - 1)
+    ])
+    return torch.from_numpy(rois).float()
+
+
+def timeit(func, repeat):
+    func()
+    start = time.time()
+    for _ in range(repeat):
+        func()
+    return (time.time() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the DCN ops')
+    parser.add_argument('--num-imgs', type=int, default=1)
+    parser.add_argument('--channels', type=int, default=256)
+    parser.add_argument(
+        '--feat-size',
+        type=int,
+        nargs=2,
+        default=[50, 68],
+        help='height and width of the feature map (stride 16 of 800x1088)')
+    parser.add_argument('--num-rois', type=int, default=256)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument(
+        '--threads',
+        type=int,
+        nargs='+',
+        default=[1, torch.get_num_threads()])
+    args = parser.parse_args()
+
+    feat = torch.randn(
+        args.num_imgs, args.channels, *args.feat_size, requires_grad=True)
+    spatial_scale = 1.0 / 16
+    img_size = min(args.feat_size) / spatial_scale
+    rois = random_rois(args.num_rois, args.num_imgs, img_size)
+    ops = [
+        ('DeformConvPack',
+         DeformConvPack(
+             args.channels, args.channels, 3, padding=1,
+             deformable_groups=1), lambda op: op(feat)),
+        ('ModulatedDeformConvPack',
+         ModulatedDeformConvPack(
+             args.channels, args.channels, 3, padding=1,
+             deformable_groups=1), lambda op: op(feat)),
+        # same settings as the dconv RoI extractors in the configs
+        ('DeformRoIPoolingPack',
+         DeformRoIPoolingPack(
+             spatial_scale,
+             7,
+             args.channels,
+             no_trans=False,
+             group_size=1,
+             trans_std=0.1), lambda op: op(feat, rois)),
+        ('ModulatedDeformRoIPoolingPack',
+         ModulatedDeformRoIPoolingPack(
+             spatial_scale,
+             7,
+             args.channels,
+             no_trans=False,
+             group_size=1,
+             trans_std=0.1), lambda op: op(feat, rois)),
+    ]
+    for name, op, forward in ops:
+
+        def forward_backward():
+            feat.grad = None
+            op.zero_grad()
+            forward(op).sum().backward()
+
+        for num_threads in args.threads:
+            torch.set_num_threads(num_threads)
+            with torch.no_grad():
+                forward_time = timeit(lambda: forward(op), args.repeat)
+            total_time = timeit(forward_backward, args.repeat)
+            print('{} ({} threads): forward {:.1f} ms, forward + backward '
+                  '{:.1f} ms'.format(name, num_threads, forward_time * 1000,
+                                     total_time * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Measure the CPU time of ImageTransform against the previous pipeline of
+separate mmcv calls, for a block of frames as loaded by CustomBlockDataset."""
+import argparse
+import time
+
+import mmcv
+import numpy as np
+
+from mmdet.datasets.transforms import ImageTransform
+
+
+def reference_transform(img, scale, mean, std, to_rgb, size_divisor, flip):
+    """The transform as done before, one full image pass per step."""
+    img, scale_factor = mmcv.imrescale(img, scale, return_scale=True)
+    img_shape = img.shape
+    img = mmcv.imnormalize(img, mean, std, to_rgb)
+    if flip:
+        img = mmcv.imflip(img)
+    img = mmcv.impad_to_multiple(img, size_divisor)
+    return img.transpose(2, 0, 1), img_shape, img.shape, scale_factor
+
+
+def timeit(func, repeat):
+    func()
+    start = time.time()
+    for _ in range(repeat):
+        func()
+    return (time.time() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the image transform')
+    parser.add_argument(
+        '--img-size',
+        type=int,
+        nargs=2,
+        default=[720, 1280],
+        help='height and width of the input frames')
+    parser.add_argument('--scale', type=int, nargs=2, default=[1000, 600])
+    parser.add_argument('--size-divisor', type=int, default=32)
+    parser.add_argument('--block-size', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    img_norm_cfg = dict(
+        mean=[123.675, 116.28, 103.53], std=[58.395, 57.12, 57.375])
+    mean = np.array(img_norm_cfg['mean'], dtype=np.float32)
+    std = np.array(img_norm_cfg['std'], dtype=np.float32)
+    scale = tuple(args.scale)
+    frames = [
+        np.random.randint(0, 256, tuple(args.img_size) + (3, ), np.uint8)
+        for _ in range(args.block_size)
+    ]
+
+    def reference():
+        return np.stack([
+            reference_transform(frame, scale, mean, std, True,
+                                args.size_divisor, True)[0]
+            for frame in frames
+        ])
+
+    def fused(transform):
+        img = transform(frames[0], scale, True)[0]
+        imgs = np.empty((len(frames), ) + img.shape, dtype=img.dtype)
+        imgs[0] = img
+        for i, frame in enumerate(frames[1:], 1):
+            transform(frame, scale, True, out=imgs[i])
+        return imgs
+
+    float_transform = ImageTransform(
+        size_divisor=args.size_divisor, **img_norm_cfg)
+    uint8_transform = ImageTransform(
+        size_divisor=args.size_divisor, normalize=False, **img_norm_cfg)
+    resized = mmcv.imrescale(frames[0], scale)
+    expected = reference()
+    print('block of {} frames of {}x{}, resized to {}x{}'.format(
+        args.block_size, args.img_size[0], args.img_size[1],
+        *resized.shape[:2]))
+    print('resize only: {:.1f} ms'.format(
+        timeit(lambda: [mmcv.imrescale(f, scale) for f in frames],
+               args.repeat) * 1000))
+    print('separate passes: {:.1f} ms'.format(
+        timeit(reference, args.repeat) * 1000))
+    for name, transform in [('float32', float_transform),
+                            ('uint8', uint8_transform)]:
+        output = fused(transform)
+        if transform.normalize:
+            diff = np.abs(output - expected).max()
+        else:
+            # normalized by the model, the padding excluded
+            h, w = resized.shape[:2]
+            normalized = (output[:, :, :h, :w] - mean.reshape(-1, 1, 1)
+                          ) / std.reshape(-1, 1, 1)
+            diff = np.abs(normalized - expected[:, :, :h, :w]).max()
+        print('fused {}: {:.1f} ms, max diff {:.2e}'.format(
+            name,
+            timeit(lambda: fused(transform), args.repeat) * 1000, diff))
+
+
+if __name__ == '__main__':
+    main()
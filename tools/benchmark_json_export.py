@@ -0,0 +1,72 @@
+"""Compare the export of detection results to COCO json files with the
+dicts of det2json and with the bulk records of results2json."""
+import argparse
+import filecmp
+import os
+import os.path as osp
+import tempfile
+import time
+
+import numpy as np
+
+from mmdet.core import DetResults, results2json
+
+
+class FakeDataset(object):
+
+    def __init__(self, num_imgs, num_classes):
+        self.img_ids = list(range(1, num_imgs + 1))
+        self.cat_ids = list(range(1, num_classes + 1))
+
+    def __len__(self):
+        return len(self.img_ids)
+
+
+def synthetic_results(num_imgs, num_classes, max_dets, seed=0):
+    rng = np.random.RandomState(seed)
+    results = []
+    for _ in range(num_imgs):
+        img_results = []
+        for _ in range(num_classes):
+            num = rng.randint(0, max_dets + 1)
+            xy = rng.uniform(0, 800, (num, 2))
+            wh = rng.uniform(1, 200, (num, 2))
+            img_results.append(
+                np.hstack([xy, xy + wh, rng.rand(num, 1)]).astype(np.float32))
+        results.append(img_results)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark json export')
+    parser.add_argument('--num-imgs', type=int, default=5000)
+    parser.add_argument('--num-classes', type=int, default=80)
+    parser.add_argument('--max-dets', type=int, default=5)
+    args = parser.parse_args()
+
+    dataset = FakeDataset(args.num_imgs, args.num_classes)
+    results = synthetic_results(args.num_imgs, args.num_classes,
+                                args.max_dets)
+    print('{} images, {} detections'.format(
+        args.num_imgs, sum(len(dets) for img in results for dets in img)))
+    tmpdir = tempfile.mkdtemp()
+    files = {}
+    for name, bulk, outputs in [('det2json', False, results),
+                                ('bulk', True, results),
+                                ('bulk DetResults', True,
+                                 DetResults.from_list(results))]:
+        start = time.time()
+        files[name] = results2json(dataset, outputs,
+                                   osp.join(tmpdir, name.replace(' ', '_')),
+                                   bulk)['bbox']
+        print('{}: {:.2f}s'.format(name, time.time() - start))
+    for name in files:
+        assert filecmp.cmp(files['det2json'], files[name], shallow=False)
+    for name in files:
+        os.remove(files[name])
+    os.rmdir(tmpdir)
+    print('identical files')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Compare mean_ap and fast_mean_ap on synthetic detection results."""
+import argparse
+import time
+
+import numpy as np
+
+from mmdet.core.evaluation import fast_mean_ap, mean_ap
+
+
+def random_bboxes(rng, num, img_size=600):
+    xy = rng.uniform(0, img_size * 0.8, (num, 2))
+    wh = rng.uniform(8, img_size * 0.2, (num, 2))
+    return np.hstack([xy, xy + wh]).astype(np.float32)
+
+
+def synthetic_dataset(num_imgs, num_classes, max_gts, max_dets, seed=0):
+    rng = np.random.RandomState(seed)
+    det_results = []
+    gt_bboxes = []
+    gt_labels = []
+    for _ in range(num_imgs):
+        num_gts = rng.randint(1, max_gts + 1)
+        bboxes = random_bboxes(rng, num_gts)
+        labels = rng.randint(1, num_classes + 1, num_gts)
+        gt_bboxes.append(bboxes)
+        gt_labels.append(labels)
+        img_dets = []
+        for cls in range(num_classes):
+            # jittered copies of the gts of the class and false positives
+            gts = bboxes[labels == cls + 1]
+            gts = gts[rng.rand(len(gts)) < 0.8]
+            dets = np.vstack([
+                gts + rng.normal(0, 4, gts.shape).astype(np.float32),
+                random_bboxes(rng, rng.randint(0, max_dets + 1))
+            ])
+            # rounded scores to have ties
+            scores = np.round(rng.rand(len(dets), 1), 2).astype(np.float32)
+            img_dets.append(np.hstack([dets, scores]))
+        det_results.append(img_dets)
+    return det_results, gt_bboxes, gt_labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark mAP evaluation')
+    parser.add_argument('--num-imgs', type=int, default=100000)
+    parser.add_argument('--num-classes', type=int, default=30)
+    parser.add_argument('--max-gts', type=int, default=5)
+    parser.add_argument('--max-dets', type=int, default=10)
+    parser.add_argument('--dataset', default='vid')
+    parser.add_argument('--nproc', type=int, default=4)
+    parser.add_argument(
+        '--scale-ranges', action='store_true', help='evaluate 3 scales')
+    args = parser.parse_args()
+
+    det_results, gt_bboxes, gt_labels = synthetic_dataset(
+        args.num_imgs, args.num_classes, args.max_gts, args.max_dets)
+    scale_ranges = [(0, 32), (32, 96), (96, 1e5)] if args.scale_ranges \
+        else None
+    dataset = None if args.dataset == 'none' else args.dataset
+    print('{} images, {} classes, {} detections'.format(
+        args.num_imgs, args.num_classes,
+        sum(len(dets) for img_dets in det_results for dets in img_dets)))
+
+    start = time.time()
+    ref_map, ref_results = mean_ap.eval_map(
+        det_results,
+        gt_bboxes,
+        gt_labels,
+        scale_ranges=scale_ranges,
+        dataset=dataset,
+        print_summary=False)
+    print('mean_ap: {:.2f}s'.format(time.time() - start))
+    start = time.time()
+    fast_map, fast_results = fast_mean_ap.eval_map(
+        det_results,
+        gt_bboxes,
+        gt_labels,
+        scale_ranges=scale_ranges,
+        dataset=dataset,
+        print_summary=False,
+        nproc=args.nproc)
+    print('fast_mean_ap ({} processes): {:.2f}s'.format(
+        args.nproc,
+        time.time() - start))
+
+    assert np.array_equal(ref_map, fast_map)
+    for ref, fast in zip(ref_results, fast_results):
+        for key in ref:
+            assert np.array_equal(ref[key], fast[key]), key
+    print('mAP {}, identical results'.format(ref_map))
+
+
+if __name__ == '__main__':
+    main()
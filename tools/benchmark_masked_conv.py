@@ -0,0 +1,64 @@
+"""Measure the latency of the CPU masked convolution for several ratios of
+active positions, against a dense convolution of the whole feature map."""
+import argparse
+import time
+
+import torch
+import torch.nn.functional as F
+
+from mmdet.ops import MaskedConv2d
+
+
+def timeit(func, repeat):
+    func()
+    start = time.time()
+    for _ in range(repeat):
+        func()
+    return (time.time() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the masked convolution')
+    parser.add_argument('--channels', type=int, default=256)
+    # 9 anchors * 80 classes as in GARetinaHead
+    parser.add_argument('--out-channels', type=int, default=720)
+    parser.add_argument(
+        '--feat-size',
+        type=int,
+        nargs=2,
+        default=[100, 136],
+        help='height and width of the feature map (stride 8 of 800x1088)')
+    parser.add_argument(
+        '--ratios',
+        type=float,
+        nargs='+',
+        default=[0.01, 0.05, 0.2, 1.0],
+        help='ratios of active positions in the mask')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--threads', type=int, default=None)
+    args = parser.parse_args()
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+
+    conv = MaskedConv2d(
+        args.channels, args.out_channels, 3, padding=1).eval()
+    feat = torch.randn(1, args.channels, *args.feat_size)
+    with torch.no_grad():
+        dense_time = timeit(lambda: conv(feat), args.repeat)
+        dense_output = F.conv2d(feat, conv.weight, conv.bias, padding=1)
+        print('dense conv: {:.1f} ms'.format(dense_time * 1000))
+        for ratio in args.ratios:
+            mask = (torch.rand(1, *args.feat_size) < ratio).float()
+            masked_time = timeit(lambda: conv(feat, mask), args.repeat)
+            output = conv(feat, mask)
+            active = mask[:, None] > 0
+            max_diff = (output - dense_output)[active.expand_as(output)].abs()
+            print('masked conv ({:.0%} active): {:.1f} ms, max diff to the '
+                  'dense conv {:.2e}'.format(
+                      ratio, masked_time * 1000,
+                      max_diff.max().item() if max_diff.numel() else 0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Measure the throughput of the CPU RoI ops with several numbers of threads,
+and check them against the CUDA ops when a GPU is available."""
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from mmdet.ops import PSRoIPool, RoIAlign, RoIPool
+
+
+def random_rois(num_rois, num_imgs, img_size, seed=0):
+    rng = np.random.RandomState(seed)
+    xy = rng.uniform(0, img_size * 0.8, (num_rois, 2))
+    wh = rng.uniform(8, img_size * 0.4, (num_rois, 2))
+    rois = np.hstack([
+        rng.randint(num_imgs, size=(num_rois, 1)), xy,
+        np.minimum(xy + wh, img_size - 1)
+    ])
+    return torch.from_numpy(rois).float()
+
+
+def timeit(func, repeat):
+    func()
+    start = time.time()
+    for _ in range(repeat):
+        func()
+    return (time.time() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the RoI ops')
+    parser.add_argument('--num-rois', type=int, default=512)
+    parser.add_argument('--num-imgs', type=int, default=2)
+    parser.add_argument('--channels', type=int, default=256)
+    parser.add_argument('--feat-size', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument(
+        '--threads',
+        type=int,
+        nargs='+',
+        default=[1, torch.get_num_threads()])
+    args = parser.parse_args()
+
+    spatial_scale = 1.0 / 16
+    img_size = args.feat_size / spatial_scale
+    rois = random_rois(args.num_rois, args.num_imgs, img_size)
+    ops = [
+        ('RoIAlign', RoIAlign(7, spatial_scale, 2), args.channels),
+        ('RoIPool', RoIPool(7, spatial_scale), args.channels),
+        # 10 channels per bin as in SiameseRPNHead
+        ('PSRoIPool', PSRoIPool(7, spatial_scale), 10 * 7 * 7),
+    ]
+    for name, op, channels in ops:
+        feat = torch.randn(
+            args.num_imgs,
+            channels,
+            args.feat_size,
+            args.feat_size,
+            requires_grad=True)
+
+        def forward_backward():
+            feat.grad = None
+            op(feat, rois).sum().backward()
+
+        for num_threads in args.threads:
+            torch.set_num_threads(num_threads)
+            forward = timeit(lambda: op(feat, rois), args.repeat)
+            total = timeit(forward_backward, args.repeat)
+            print('{} ({} threads): forward {:.0f} rois/s, forward + backward '
+                  '{:.0f} rois/s'.format(name, num_threads,
+                                         args.num_rois / forward,
+                                         args.num_rois / total))
+
+        if torch.cuda.is_available():
+            feat.grad = None
+            op(feat, rois).sum().backward()
+            feat_cuda = feat.detach().cuda().requires_grad_()
+            output = op(feat_cuda, rois.cuda())
+            output.sum().backward()
+            assert torch.allclose(
+                op(feat, rois), output.cpu(), atol=1e-4), name
+            assert torch.allclose(
+                feat.grad, feat_cuda.grad.cpu(), atol=1e-4), name
+            print('{}: same outputs and gradients as the CUDA op'.format(name))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""Check that the batched multi-frame tracking of SiameseRCNN gives the
+proposals of the per-frame loop.
+
+With ``batched_multi_track=True`` (the default), ``multi_track`` and
+``multi_track_with_non_nms_proposals`` stack every buffered template frame
+and run the Siamese RPN once, instead of once per frame. The script fills a
+sequence buffer with random features and rois, some frames having no roi,
+and asserts that both paths give the same proposals and scores, with and
+without ``max_gap``. The Siamese RPN head is randomly initialised, so no
+checkpoint is needed.
+"""
+import argparse
+
+import numpy as np
+import torch
+import torch.nn as nn
+from mmcv import Config
+
+from mmdet.models.anchor_heads import SiameseRPNHead
+from mmdet.models.detectors import SiameseRCNN
+from mmdet.models.utils import FeatureMemory
+
+
+def build_tracker(args):
+    """A SiameseRCNN with only the parts used by the multi-frame tracking."""
+    tracker = SiameseRCNN.__new__(SiameseRCNN)
+    nn.Module.__init__(tracker)
+    tracker.siameserpn_head = SiameseRPNHead(
+        args.channels,
+        args.channels,
+        feat_strides=[args.stride],
+        target_stds=[0.1, 0.1, 0.2, 0.2],
+        psroi_align_kernel=args.psroi_align_kernel)
+    tracker.sequence_gap = args.gap
+    tracker.batched_multi_track = True
+    return tracker.to(args.device).eval()
+
+
+def random_rois(rng, num_rois, img_size):
+    xy = rng.uniform(0, img_size * 0.7, (num_rois, 2))
+    wh = rng.uniform(img_size * 0.05, img_size * 0.25, (num_rois, 2))
+    boxes = np.hstack([xy, np.minimum(xy + wh, img_size - 1)])
+    return np.hstack([np.zeros((num_rois, 1)), boxes]).astype(np.float32)
+
+
+def fill_buffer(rng, args):
+    """A buffer of random template frames, newest first, with frames without
+    rois as when nothing was detected."""
+    img_size = args.feat_size * args.stride
+    buffer = FeatureMemory(args.num_frames)
+    for frame_ind in range(args.num_frames):
+        feature = [
+            torch.from_numpy(
+                rng.randn(1, args.channels, args.feat_size,
+                          args.feat_size).astype(np.float32)).to(args.device)
+        ]
+        num_rois = 0 if frame_ind % 4 == 2 else rng.randint(1, args.max_rois)
+        rois = torch.from_numpy(random_rois(rng, num_rois, img_size))
+        buffer.push(feature, rois.to(args.device))
+    current = [
+        torch.from_numpy(
+            rng.randn(1, args.channels, args.feat_size,
+                      args.feat_size).astype(np.float32)).to(args.device)
+    ]
+    img_meta = [dict(img_shape=(img_size, img_size, 3))]
+    return buffer, current, img_meta
+
+
+def run_paths(tracker, method, *inputs, **kwargs):
+    outputs = []
+    for batched in (True, False):
+        tracker.batched_multi_track = batched
+        with torch.no_grad():
+            outputs.append(getattr(tracker, method)(*inputs, **kwargs))
+    return outputs
+
+
+def assert_same(batched, looped, atol):
+    assert len(batched) == len(looped)
+    for batched_proposals, looped_proposals in zip(batched, looped):
+        assert batched_proposals.shape == looped_proposals.shape, \
+            (batched_proposals.shape, looped_proposals.shape)
+        # boxes and scores
+        assert torch.allclose(
+            batched_proposals, looped_proposals, atol=atol), \
+            (batched_proposals - looped_proposals).abs().max()
+
+
+def check(tracker, buffer, current, img_meta, cfg, max_gap, atol):
+    tracker.sequence_buffer = buffer
+    batched, looped = run_paths(
+        tracker, 'multi_track', current, img_meta, cfg, max_gap=max_gap)
+    assert_same(batched, looped, atol)
+    (batched, batched_non_nms), (looped, looped_non_nms) = run_paths(
+        tracker,
+        'multi_track_with_non_nms_proposals',
+        current,
+        img_meta,
+        cfg,
+        max_gap=max_gap)
+    assert_same(batched, looped, atol)
+    assert_same(batched_non_nms, looped_non_nms, atol)
+    return len(batched_non_nms[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare the batched and looped multi-frame tracking '
+        'of SiameseRCNN')
+    parser.add_argument('--num-frames', type=int, default=6)
+    parser.add_argument('--max-rois', type=int, default=8)
+    parser.add_argument('--gap', type=int, default=1)
+    parser.add_argument('--channels', type=int, default=32)
+    parser.add_argument('--feat-size', type=int, default=40)
+    parser.add_argument('--stride', type=int, default=16)
+    parser.add_argument('--psroi-align-kernel', action='store_true')
+    parser.add_argument('--score-threshold', type=float, default=0.3)
+    parser.add_argument('--nms-thr', type=float, default=0.7)
+    parser.add_argument('--atol', type=float, default=1e-4)
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    rng = np.random.RandomState(args.seed)
+    tracker = build_tracker(args)
+    buffer, current, img_meta = fill_buffer(rng, args)
+    cfg = Config(
+        dict(score_threshold=args.score_threshold, nms_thr=args.nms_thr))
+    for max_gap in (None, args.gap * (args.num_frames // 2)):
+        num_proposals = check(tracker, buffer, current, img_meta, cfg, max_gap,
+                              args.atol)
+        print('max_gap={}: {} proposals are the same'.format(
+            max_gap, num_proposals))
+    print('All checks passed.')
+
+
+if __name__ == '__main__':
+    main()
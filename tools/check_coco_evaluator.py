@@ -0,0 +1,110 @@
+"""Check that CocoEvaluator gives the metrics of pycocotools on a result file.
+
+The results are written to json files with ``results2json`` and evaluated by
+``COCOeval``, as ``tools/test.py --eval`` does, then evaluated in memory by
+:class:`CocoEvaluator`, as ``tools/test.py --eval --fast_eval`` does. The 12
+values of ``COCOeval.stats`` of every result type must be equal.
+"""
+import argparse
+import contextlib
+import io
+import os.path as osp
+import shutil
+import tempfile
+
+import mmcv
+import numpy as np
+from pycocotools.cocoeval import COCOeval
+
+from mmdet.core import (DetResults, coco_eval_results, is_det_results_dir,
+                        results2json)
+from mmdet.datasets import build_dataset
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Compare CocoEvaluator with pycocotools')
+    parser.add_argument('config', help='test config file path')
+    parser.add_argument(
+        'result',
+        help='result file of tools/test.py, a pkl file or a .dets directory')
+    parser.add_argument(
+        '--types',
+        type=str,
+        nargs='+',
+        choices=['proposal', 'bbox', 'segm'],
+        default=['bbox'],
+        help='result types')
+    parser.add_argument(
+        '--max-dets',
+        type=int,
+        nargs='+',
+        default=[100, 300, 1000],
+        help='proposal numbers, only used for recall evaluation')
+    parser.add_argument(
+        '--atol',
+        type=float,
+        default=0.,
+        help='largest accepted difference of a metric')
+    return parser.parse_args()
+
+
+def pycocotools_stats(coco, result_files, res_type, max_dets):
+    coco_dets = coco.loadRes(result_files[res_type])
+    iou_type = 'bbox' if res_type == 'proposal' else res_type
+    coco_eval = COCOeval(coco, coco_dets, iou_type)
+    coco_eval.params.imgIds = coco.getImgIds()
+    if res_type == 'proposal':
+        coco_eval.params.useCats = 0
+        coco_eval.params.maxDets = list(max_dets)
+    coco_eval.evaluate()
+    coco_eval.accumulate()
+    coco_eval.summarize()
+    return coco_eval.stats
+
+
+def main():
+    args = parse_args()
+    cfg = mmcv.Config.fromfile(args.config)
+    cfg.data.test.test_mode = True
+    dataset = build_dataset(cfg.data.test)
+    if is_det_results_dir(args.result):
+        results = DetResults.load(args.result)
+    else:
+        results = mmcv.load(args.result)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        fast_stats = coco_eval_results(results, args.types, dataset,
+                                       args.max_dets)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        result_files = results2json(dataset, results,
+                                    osp.join(tmp_dir, 'results'))
+        ref_stats = dict()
+        for res_type in args.types:
+            print('\nEvaluating {} with pycocotools'.format(res_type))
+            ref_stats[res_type] = pycocotools_stats(dataset.coco, result_files,
+                                                    res_type, args.max_dets)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    failed = []
+    for res_type in args.types:
+        diff = np.abs(np.asarray(fast_stats[res_type]) - ref_stats[res_type])
+        print('{}: largest difference of CocoEvaluator {:.3e}'.format(
+            res_type, diff.max()))
+        if diff.max() > args.atol:
+            failed.append(res_type)
+            for i in np.flatnonzero(diff > args.atol):
+                print('  stats[{}]: pycocotools {:.6f}, CocoEvaluator '
+                      '{:.6f}'.format(i, ref_stats[res_type][i],
+                                      fast_stats[res_type][i]))
+    if failed:
+        raise SystemExit('CocoEvaluator differs from pycocotools on {}'.format(
+            ' and '.join(failed)))
+    print('\nCocoEvaluator matches pycocotools on {}'.format(' and '.join(
+        args.types)))
+
+
+if __name__ == '__main__':
+    main()
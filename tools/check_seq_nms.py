@@ -0,0 +1,184 @@
+"""Check that fast_seq_nms gives the detections of seq_nms.
+
+The reference :mod:`seq_nms` is slow, so its outputs are recorded once with
+``--record`` together with the synthetic videos they were computed on, and
+later runs compare every implementation of :mod:`fast_seq_nms` against the
+recorded file.
+
+The kept boxes of a frame are not in the same order: :mod:`seq_nms` orders
+them as a python set of their indices while :mod:`fast_seq_nms` keeps their
+input order. The rows of every frame are therefore compared once sorted.
+"""
+import argparse
+import copy
+import os.path as osp
+
+import mmcv
+import numpy as np
+
+from mmdet.core.post_processing import fast_seq_nms, seq_nms
+
+NUM_CLASSES = len(seq_nms.CLASSES)
+IMG_SIZE = 600
+
+
+def random_video(rng, num_frames):
+    """Detections of objects moving across the frames, with jittered
+    duplicates, clutter and frames where a class is missing."""
+    dets = [[] for _ in range(NUM_CLASSES)]
+    mapped_dets = [[] for _ in range(NUM_CLASSES)]
+    for cls_dets, cls_mapped in zip(dets, mapped_dets):
+        num_objs = rng.randint(0, 4)
+        starts = rng.rand(num_objs, 4) * IMG_SIZE * 0.4
+        starts[:, 2:] += starts[:, :2] + 50
+        speeds = rng.randn(num_objs, 2) * 3
+        for frame_ind in range(num_frames):
+            boxes = []
+            for obj_ind in range(num_objs):
+                if rng.rand() < 0.1:
+                    continue
+                box = starts[obj_ind] + np.tile(speeds[obj_ind] * frame_ind, 2)
+                for _ in range(rng.randint(1, 4)):
+                    boxes.append(box + rng.randn(4) * 4)
+            for _ in range(rng.randint(0, 3)):
+                x1, y1 = rng.rand(2) * IMG_SIZE * 0.8
+                w, h = rng.rand(2) * IMG_SIZE * 0.2 + 10
+                boxes.append([x1, y1, x1 + w, y1 + h])
+            boxes = np.array(boxes, dtype=np.float32).reshape(-1, 4)
+            scores = rng.rand(len(boxes), 1).astype(np.float32)
+            cls_dets.append(np.hstack([boxes, scores]))
+            if frame_ind == 0:
+                cls_mapped.append(np.zeros((0, 5), dtype=np.float32))
+            else:
+                # boxes of the previous frame moved to this one
+                prev = cls_dets[frame_ind - 1].copy()
+                prev[:, :4] += rng.randn(len(prev), 4).astype(np.float32) * 2
+                cls_mapped.append(prev)
+    return dets, mapped_dets
+
+
+def record(num_videos, num_frames, seed):
+    rng = np.random.RandomState(seed)
+    videos = [random_video(rng, num_frames) for _ in range(num_videos)]
+    ref = []
+    ref_mapper = []
+    prog_bar = mmcv.ProgressBar(num_videos)
+    for dets, mapped_dets in videos:
+        ref.append(seq_nms.seq_nms(copy.deepcopy(dets)))
+        ref_mapper.append(
+            seq_nms.seq_nms_with_mapper(copy.deepcopy(dets), mapped_dets))
+        prog_bar.update()
+    return dict(videos=videos, seq_nms=ref, seq_nms_with_mapper=ref_mapper)
+
+
+def sort_rows(dets):
+    return dets[np.lexsort(dets.T[::-1])]
+
+
+def assert_same(dets, ref_dets):
+    assert len(dets) == len(ref_dets)
+    for cls_dets, ref_cls_dets in zip(dets, ref_dets):
+        assert len(cls_dets) == len(ref_cls_dets)
+        for frame_dets, ref_frame_dets in zip(cls_dets, ref_cls_dets):
+            assert np.array_equal(
+                sort_rows(frame_dets), sort_rows(ref_frame_dets))
+
+
+def stream(dets, mapped_dets, window_size):
+    streaming = fast_seq_nms.StreamingSeqNMS(window_size)
+    frames = []
+    for frame_ind in range(len(dets[0])):
+        frame_dets = [cls_dets[frame_ind] for cls_dets in dets]
+        frame_mapped = None
+        if mapped_dets is not None:
+            frame_mapped = [
+                cls_mapped[frame_ind] for cls_mapped in mapped_dets
+            ]
+        frames += streaming.push(frame_dets, frame_mapped)
+    frames += streaming.flush()
+    assert len(frames) == len(dets[0])
+    # back to dets[cls][frame]
+    return [[frame[cls_ind] for frame in frames]
+            for cls_ind in range(len(dets))]
+
+
+def check(recorded, num_workers):
+    videos = recorded['videos']
+    ref = recorded['seq_nms']
+    ref_mapper = recorded['seq_nms_with_mapper']
+    num_frames = len(videos[0][0][0])
+
+    print('Checking seq_nms...')
+    for (dets, _), ref_dets in zip(videos, ref):
+        assert_same(fast_seq_nms.seq_nms(copy.deepcopy(dets)), ref_dets)
+    print('Checking seq_nms_with_mapper...')
+    for (dets, mapped_dets), ref_dets in zip(videos, ref_mapper):
+        assert_same(
+            fast_seq_nms.seq_nms_with_mapper(copy.deepcopy(dets), mapped_dets),
+            ref_dets)
+
+    print('Checking seq_nms with num_workers={}...'.format(num_workers))
+    for (dets, mapped_dets), ref_dets, ref_mapper_dets in zip(
+            videos, ref, ref_mapper):
+        assert_same(
+            fast_seq_nms.seq_nms(copy.deepcopy(dets), num_workers=num_workers),
+            ref_dets)
+        assert_same(
+            fast_seq_nms.seq_nms_with_mapper(
+                copy.deepcopy(dets), mapped_dets, num_workers=num_workers),
+            ref_mapper_dets)
+    print('Checking parallel_seq_nms on several videos...')
+    outs = fast_seq_nms.parallel_seq_nms([dets for dets, _ in videos],
+                                         num_workers=num_workers)
+    for out, ref_dets in zip(outs, ref):
+        assert_same(out, ref_dets)
+    outs = fast_seq_nms.parallel_seq_nms(
+        [dets for dets, _ in videos],
+        [mapped_dets for _, mapped_dets in videos],
+        num_workers=num_workers)
+    for out, ref_dets in zip(outs, ref_mapper):
+        assert_same(out, ref_dets)
+
+    print('Checking StreamingSeqNMS with a window covering the video...')
+    for (dets, mapped_dets), ref_dets, ref_mapper_dets in zip(
+            videos, ref, ref_mapper):
+        assert_same(stream(dets, None, num_frames), ref_dets)
+        assert_same(stream(dets, mapped_dets, num_frames), ref_mapper_dets)
+    print('Checking StreamingSeqNMS with a short window...')
+    for dets, mapped_dets in videos:
+        out = stream(dets, mapped_dets, 8)
+        for cls_dets, in_cls_dets in zip(out, dets):
+            for frame_dets, in_frame_dets in zip(cls_dets, in_cls_dets):
+                assert len(frame_dets) <= len(in_frame_dets)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare fast_seq_nms with seq_nms')
+    parser.add_argument(
+        'reference', help='pkl file of the recorded seq_nms outputs')
+    parser.add_argument(
+        '--record',
+        action='store_true',
+        help='run seq_nms on new synthetic videos and record its outputs')
+    parser.add_argument('--num-videos', type=int, default=5)
+    parser.add_argument('--num-frames', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--num-workers', type=int, default=2)
+    args = parser.parse_args()
+
+    if args.record:
+        print('Recording seq_nms on {} videos of {} frames...'.format(
+            args.num_videos, args.num_frames))
+        mmcv.dump(
+            record(args.num_videos, args.num_frames, args.seed),
+            args.reference)
+    elif not osp.isfile(args.reference):
+        raise SystemExit('{} does not exist, record it with --record'.format(
+            args.reference))
+    check(mmcv.load(args.reference), args.num_workers)
+    print('All checks passed.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Check the distributed video testing on CPU with the gloo backend.
+
+Every process samples a synthetic video dataset with
+:class:`DistributedVideoSampler` and the script asserts that every video is
+loaded by exactly one process, with its frames in order, then gathers one
+result per frame with :func:`collect_results_by_index` and asserts that rank
+0 gets them back in dataset order. No GPU is needed.
+"""
+import argparse
+
+import numpy as np
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+from mmdet.core import collect_results_by_index
+from mmdet.datasets import DistributedVideoSampler, get_video_ranges
+
+
+class VideoDataset(object):
+    """Frames of videos of random lengths, one directory per video."""
+
+    def __init__(self, num_videos, max_frames, seed=0):
+        rng = np.random.RandomState(seed)
+        self.img_infos = [
+            dict(filename='{:06d}/{:06d}.JPEG'.format(video_id, frame_id))
+            for video_id in range(num_videos)
+            for frame_id in range(rng.randint(1, max_frames + 1))
+        ]
+
+    def __len__(self):
+        return len(self.img_infos)
+
+
+def frame_result(idx):
+    # results of different sizes, as the detections of the frames
+    return [np.full((idx % 4, 5), idx, dtype=np.float32)]
+
+
+def check_sampler(dataset, sampler, world_size):
+    indices = list(sampler)
+    assert len(indices) == len(sampler)
+    video_ranges = get_video_ranges(dataset)
+    expected = []
+    for video_idx in sampler.videos:
+        start, stop = video_ranges[video_idx]
+        expected.extend(range(start, stop))
+    assert indices == expected, 'the frames of a video are split or unordered'
+
+    # every video is tested by exactly one rank
+    counts = torch.zeros(len(video_ranges), dtype=torch.int64)
+    counts[sampler.videos] = 1
+    dist.all_reduce(counts)
+    assert (counts == 1).all(), 'a video is sampled by several processes'
+    return indices
+
+
+def run(rank, world_size, port, args):
+    dist.init_process_group(
+        'gloo',
+        init_method='tcp://127.0.0.1:{}'.format(port),
+        rank=rank,
+        world_size=world_size)
+    dataset = VideoDataset(args.num_videos, args.max_frames, args.seed)
+    sampler = DistributedVideoSampler(dataset, world_size, rank)
+    indices = check_sampler(dataset, sampler, world_size)
+    if rank == 0:
+        print('{} videos, {} frames, {} processes: every video is sampled by '
+              'one process'.format(
+                  len(get_video_ranges(dataset)), len(dataset), world_size))
+
+    results = [frame_result(idx) for idx in indices]
+    for backend in args.collect:
+        outputs = collect_results_by_index(results, indices, len(dataset),
+                                           None, backend)
+        if rank == 0:
+            assert len(outputs) == len(dataset)
+            for idx, output in enumerate(outputs):
+                assert len(output) == 1
+                assert np.array_equal(output[0], frame_result(idx)[0])
+            print('collect {}: results are in dataset order'.format(backend))
+        else:
+            assert outputs is None
+    dist.destroy_process_group()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Check DistributedVideoSampler and '
+        'collect_results_by_index with gloo')
+    parser.add_argument('--world-size', type=int, default=3)
+    parser.add_argument('--num-videos', type=int, default=10)
+    parser.add_argument('--max-frames', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--port', type=int, default=29511)
+    parser.add_argument(
+        '--collect',
+        nargs='+',
+        choices=['file', 'shm', 'tensor'],
+        default=['file', 'tensor'],
+        help='backends of collect_results_by_index, shm requires python 3.8 '
+        'and makes the resource tracker shared by the spawned processes '
+        'print KeyErrors at exit')
+    args = parser.parse_args()
+    mp.spawn(
+        run, args=(args.world_size, args.port, args), nprocs=args.world_size)
+    print('All checks passed.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+import argparse
+import time
+
+import mmcv
+
+from mmdet.datasets import pack_annotations
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Pack the annotations of a custom dataset into flat '
+        'memory-mapped arrays')
+    parser.add_argument(
+        'ann_file', help='annotation file in the CustomDataset format')
+    parser.add_argument(
+        'out_dir', help='output directory, to be used as the ann_file')
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    args = parse_args()
+    start = time.time()
+    img_infos = mmcv.load(args.ann_file)
+    print('loaded {} images in {:.1f} s'.format(
+        len(img_infos),
+        time.time() - start))
+    pack_annotations(img_infos, args.out_dir)
+    print('Done!')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+import argparse
+import glob
+import heapq
+import json
+import os.path as osp
+
+import mmcv
+from test_vids import load_video_results
+
+from mmdet.core import DetResults, ResultStore, ResultStoreWriter
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Merge the detection results of videos.')
+    parser.add_argument(
+        'results',
+        nargs='+',
+        help='directory of per video %%06d.pkl results, or the merged result '
+        'files (one per rank) written by test_vids.py')
+    parser.add_argument('out', help='directory of the merged result store')
+    parser.add_argument(
+        '--vid_jsons_dir',
+        help='directory contains json anns for all vids, used to check the '
+        'number of frames of every video',
+        type=str)
+    parser.add_argument(
+        '--threshold',
+        help='filter out det with score lower than threshold.',
+        type=float,
+        default=0.)
+    parser.add_argument(
+        '--component',
+        help='which bbox results are merged when a model gives a tuple per '
+        'frame, the last ones by default (the merged detection and tracking '
+        'results of SiameseRCNN)',
+        type=int,
+        default=-1)
+    parser.add_argument(
+        '--jsons_dir',
+        help='directory contains json outputs for all vids',
+        type=str)
+    parser.add_argument(
+        '--json_out',
+        help='merged json filename, image ids are made unique across vids',
+        type=str)
+    args = parser.parse_args()
+    return args
+
+
+def iter_video_results(results):
+    """Iterate over the ``(video_id, outputs)`` of all sources in video order.
+
+    The result files of different ranks are each sorted by video, they are
+    merged lazily so only one video per file is loaded at a time.
+    """
+    if len(results) == 1 and osp.isdir(results[0]):
+        pkl_dir = results[0]
+        num_videos = len(glob.glob1(pkl_dir, '*.pkl'))
+        for i in range(num_videos):
+            yield i, mmcv.load(osp.join(pkl_dir, '%06d.pkl' % (i)))
+    else:
+        for record in heapq.merge(
+                *[load_video_results(f) for f in results],
+                key=lambda record: record[0]):
+            yield record
+
+
+def select_component(outputs, component=-1):
+    """The bbox results of a video, selected by ``component`` when every
+    frame gives a tuple of results."""
+    if isinstance(outputs, tuple):
+        # a record of test_vids.py, see pack_video_outputs
+        return outputs[component]
+    if len(outputs) > 0 and isinstance(outputs[0], tuple):
+        return [output[component] for output in outputs]
+    return outputs
+
+
+def merge_results(results,
+                  out,
+                  vid_jsons_dir=None,
+                  threshold=0.,
+                  component=-1):
+    writer = None
+    try:
+        for video_id, outputs in iter_video_results(results):
+            outputs = select_component(outputs, component)
+            if writer is None:
+                if isinstance(outputs, DetResults):
+                    num_classes = outputs.num_classes
+                else:
+                    num_classes = len(outputs[0]) if len(outputs) > 0 else 0
+                writer = ResultStoreWriter(out, num_classes)
+            if video_id in writer.video_ids:
+                # resume an interrupted merge
+                continue
+            if vid_jsons_dir is not None:
+                anns = mmcv.load(
+                    osp.join(vid_jsons_dir, '%06d.json' % (video_id)))
+                assert len(anns) == len(outputs), \
+                    'video {} has {} frames, {} results'.format(
+                        video_id, len(anns), len(outputs))
+            writer.append(video_id, outputs, threshold)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def merge_jsons(jsons_dir, vid_jsons_dir, json_out):
+    """Write the per video json results as one json list, one video at a
+    time."""
+    num_videos = len(glob.glob1(vid_jsons_dir, '*.json'))
+    num_dets = 0
+    last_count = 0
+    with open(json_out, 'w') as f:
+        f.write('[')
+        for i in range(num_videos):
+            anns = mmcv.load(osp.join(vid_jsons_dir, '%06d.json' % (i)))
+            dets = mmcv.load(osp.join(jsons_dir, '%06d.bbox.json' % (i)))
+            for det in dets:
+                det['image_id'] = det['image_id'] + last_count
+                if num_dets > 0:
+                    f.write(',')
+                f.write(json.dumps(det))
+                num_dets += 1
+            last_count = last_count + len(anns)
+        f.write(']')
+    return num_dets, last_count
+
+
+def main():
+    args = parse_args()
+    merge_results(args.results, args.out, args.vid_jsons_dir, args.threshold,
+                  args.component)
+    store = ResultStore(args.out)
+    print('{} videos, {} frames, {} detections'.format(
+        len(store), store.num_images, store.num_dets))
+
+    if args.json_out:
+        assert args.jsons_dir and args.vid_jsons_dir, \
+            '--jsons_dir and --vid_jsons_dir are required by --json_out'
+        num_dets, num_images = merge_jsons(args.jsons_dir, args.vid_jsons_dir,
+                                           args.json_out)
+        print('{} frames, {} detections written to {}'.format(
+            num_images, num_dets, args.json_out))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,14 @@
 import argparse
 import os
-import os.path as osp
-import shutil
-import tempfile
 
 import mmcv
 import torch
-import torch.distributed as dist
 from mmcv.parallel import MMDataParallel, MMDistributedDataParallel
 from mmcv.runner import get_dist_info, load_checkpoint
 
 from mmdet.apis import init_dist
-from mmdet.core import coco_eval, results2json, wrap_fp16_model
+from mmdet.core import (DetResults, coco_eval, coco_eval_results,
+                        collect_results, results2json, wrap_fp16_model)
 from mmdet.datasets import build_dataloader, build_dataset
 from mmdet.models import build_detector
 
@@ -35,7 +32,8 @@ def single_gpu_test(model, data_loader, show=False):
     return results
 
 
-def multi_gpu_test(model, data_loader, tmpdir=None):
+def multi_gpu_test(model, data_loader, tmpdir=None, compact=False,
+                   collect='file'):
     model.eval()
     results = []
     dataset = data_loader.dataset
@@ -53,58 +51,22 @@ def multi_gpu_test(model, data_loader, tmpdir=None):
                 prog_bar.update()
 
     # collect results from all ranks
-    results = collect_results(results, len(dataset), tmpdir)
+    if compact:
+        # a few flat arrays instead of an array per image and class
+        results = DetResults.from_list(results)
+    results = collect_results(results, len(dataset), tmpdir, collect)
 
     return results
 
 
-def collect_results(result_part, size, tmpdir=None):
-    rank, world_size = get_dist_info()
-    # create a tmp dir if it is not specified
-    if tmpdir is None:
-        MAX_LEN = 512
-        # 32 is whitespace
-        dir_tensor = torch.full((MAX_LEN, ),
-                                32,
-                                dtype=torch.uint8,
-                                device='cuda')
-        if rank == 0:
-            tmpdir = tempfile.mkdtemp()
-            tmpdir = torch.tensor(
-                bytearray(tmpdir.encode()), dtype=torch.uint8, device='cuda')
-            dir_tensor[:len(tmpdir)] = tmpdir
-        dist.broadcast(dir_tensor, 0)
-        tmpdir = dir_tensor.cpu().numpy().tobytes().decode().rstrip()
-    else:
-        mmcv.mkdir_or_exist(tmpdir)
-    # dump the part result to the dir
-    mmcv.dump(result_part, osp.join(tmpdir, 'part_{}.pkl'.format(rank)))
-    dist.barrier()
-    # collect all parts
-    if rank != 0:
-        return None
-    else:
-        # load results of all parts from tmp dir
-        part_list = []
-        for i in range(world_size):
-            part_file = osp.join(tmpdir, 'part_{}.pkl'.format(i))
-            part_list.append(mmcv.load(part_file))
-        # sort the results
-        ordered_results = []
-        for res in zip(*part_list):
-            ordered_results.extend(list(res))
-        # the dataloader may pad some samples
-        ordered_results = ordered_results[:size]
-        # remove tmp dir
-        shutil.rmtree(tmpdir)
-        return ordered_results
-
-
 def parse_args():
     parser = argparse.ArgumentParser(description='MMDet test detector')
     parser.add_argument('config', help='test config file path')
     parser.add_argument('checkpoint', help='checkpoint file')
-    parser.add_argument('--out', help='output result file')
+    parser.add_argument(
+        '--out',
+        help='output result file, a pkl file or a .dets directory holding the '
+        'bbox results in flat arrays')
     parser.add_argument(
         '--json_out',
         help='output result file name without extension',
@@ -115,8 +77,19 @@ def parse_args():
         nargs='+',
         choices=['proposal', 'proposal_fast', 'bbox', 'segm', 'keypoints'],
         help='eval types')
+    parser.add_argument(
+        '--fast_eval',
+        action='store_true',
+        help='evaluate the results in memory with CocoEvaluator instead of '
+        'pycocotools on json files, see tools/check_coco_evaluator.py')
     parser.add_argument('--show', action='store_true', help='show results')
     parser.add_argument('--tmpdir', help='tmp dir for writing some results')
+    parser.add_argument(
+        '--collect',
+        choices=['file', 'shm', 'tensor'],
+        default='file',
+        help='how the results are gathered on rank 0: pickle files in tmpdir, '
+        'shared memory (single node) or CPU tensors sent through gloo')
     parser.add_argument(
         '--launcher',
         choices=['none', 'pytorch', 'slurm', 'mpi'],
@@ -136,8 +109,11 @@ def main():
         ('Please specify at least one operation (save or show the results) '
          'with the argument "--out" or "--show" or "--json_out"')
 
-    if args.out is not None and not args.out.endswith(('.pkl', '.pickle')):
-        raise ValueError('The output file must be a pkl file.')
+    compact = args.out is not None and args.out.endswith('.dets')
+    if args.out is not None and not compact and not args.out.endswith(
+            ('.pkl', '.pickle')):
+        raise ValueError(
+            'The output file must be a pkl file or a .dets directory.')
 
     if args.json_out is not None and args.json_out.endswith('.json'):
         args.json_out = args.json_out[:-5]
@@ -149,6 +125,18 @@ def main():
     cfg.model.pretrained = None
     cfg.data.test.test_mode = True
 
+    if compact:
+        # the .dets directory only holds per-class bbox results
+        if cfg.model.type == 'RPN' or 'mask_head' in cfg.model:
+            raise ValueError(
+                'Only bbox-only detectors can save their results in a .dets '
+                'directory, use a pkl file for {}.'.format(cfg.model.type))
+        unsupported = set(args.eval or []) & {'proposal_fast', 'segm'}
+        if unsupported:
+            raise ValueError(
+                'Cannot evaluate {} from a .dets directory, use a pkl '
+                'file.'.format(' and '.join(sorted(unsupported))))
+
     # init distributed env first, since logger depends on the dist info.
     if args.launcher == 'none':
         distributed = False
@@ -184,18 +172,31 @@ def main():
         outputs = single_gpu_test(model, data_loader, args.show)
     else:
         model = MMDistributedDataParallel(model.cuda())
-        outputs = multi_gpu_test(model, data_loader, args.tmpdir)
+        outputs = multi_gpu_test(model, data_loader, args.tmpdir, compact,
+                                 args.collect)
 
     rank, _ = get_dist_info()
     if args.out and rank == 0:
         print('\nwriting results to {}'.format(args.out))
-        mmcv.dump(outputs, args.out)
+        if compact:
+            outputs = DetResults.from_list(outputs)
+            outputs.dump(args.out)
+        else:
+            mmcv.dump(outputs, args.out)
         eval_types = args.eval
         if eval_types:
             print('Starting evaluate {}'.format(' and '.join(eval_types)))
             if eval_types == ['proposal_fast']:
                 result_file = args.out
                 coco_eval(result_file, eval_types, dataset.coco)
+            elif args.fast_eval:
+                if not isinstance(outputs[0], dict):
+                    coco_eval_results(outputs, eval_types, dataset)
+                else:
+                    for name in outputs[0]:
+                        print('\nEvaluating {}'.format(name))
+                        outputs_ = [out[name] for out in outputs]
+                        coco_eval_results(outputs_, eval_types, dataset)
             else:
                 if not isinstance(outputs[0], dict):
                     result_files = results2json(dataset, outputs, args.out)
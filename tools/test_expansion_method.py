@@ -1,37 +1,88 @@
 import argparse
 import os
 import os.path as osp
-import shutil
-import tempfile
 
 import mmcv
 import torch
-import torch.distributed as dist
 from mmcv.parallel import MMDataParallel, MMDistributedDataParallel
 from mmcv.runner import get_dist_info, load_checkpoint
 
 from mmdet.apis import init_dist
-from mmdet.core import coco_eval, results2json, wrap_fp16_model, seq_nms
-from mmdet.datasets import build_dataloader, build_dataset
+from mmdet.core import (coco_eval, collect_results_by_index, results2json,
+                        wrap_fp16_model, fast_seq_nms)
+from mmdet.datasets import build_dataloader, build_dataset, get_video_ranges
 from mmdet.models import build_detector
 from copy import deepcopy
 import numpy as np
 
-def single_gpu_test(model, data_loader, show=False):
+
+def video_seq_nms(results, mapped_results, video_ranges, num_workers=0):
+    '''
+    Seq-NMS of every video.
+    :param results: per-class detections of every frame of the dataset.
+    :param mapped_results: per-class detections of the previous frame mapped to every frame.
+    :param video_ranges: (start, stop) frame range of every video, see get_video_ranges.
+    :param num_workers: if larger than 1, the classes of all the videos are shared by one pool of processes.
+    :return: the rescored and suppressed per-class detections of every frame.
+    '''
+    videos = []
+    mapped_videos = []
+    for start, stop in video_ranges:
+        videos.append([list(det) for det in zip(*results[start:stop])])
+        mapped_videos.append([list(det) for det in zip(*mapped_results[start:stop])])
+    if num_workers > 1:
+        # a single call, so that the pool is created once for the whole dataset
+        videos = fast_seq_nms.parallel_seq_nms(videos, mapped_videos, num_workers)
+    else:
+        videos = [fast_seq_nms.seq_nms_with_mapper(dets, dets_mapped)
+                  for dets, dets_mapped in zip(videos, mapped_videos)]
+    outs = []
+    for dets in videos:
+        outs.extend(zip(*dets))
+    return outs
+
+
+def single_gpu_test(model,
+                    data_loader,
+                    show=False,
+                    seq_nms_window=None,
+                    seq_nms_workers=0):
     use_inv = False
     model.eval()
     results = []
     dataset = data_loader.dataset
     prog_bar = mmcv.ProgressBar(len(dataset))
     data_list = []
+    stream = None
+    if seq_nms_window is not None and not show:
+        stream = fast_seq_nms.StreamingSeqNMS(seq_nms_window)
+    video_ranges = get_video_ranges(dataset)
+    video_starts = set(start for start, _ in video_ranges)
+    mapped_results = []
     for i, data in enumerate(data_loader):
+        if i in video_starts:
+            if stream is not None:
+                # frames of different videos are never linked
+                results.extend(stream.flush())
+            if hasattr(model.module, 'reset_tracking_state'):
+                model.module.reset_tracking_state()
         with torch.no_grad():
             result = model(return_loss=False, rescale=not show, out=not show, **data)
-        results.append(result)
-        data_list.append(data)
+        # take the mapped boxes out of the model, they are cleared with the
+        # tracking state of every video
+        mapped_result = model.module.sequence_mapped_bboxes_result.pop()
+        if stream is not None:
+            results.extend(stream.push(result, mapped_result))
+        else:
+            results.append(result)
+            mapped_results.append(mapped_result)
+            data_list.append(data)
         batch_size = data['img'][0].size(0)
         for _ in range(batch_size):
             prog_bar.update()
+    if stream is not None:
+        results.extend(stream.flush())
+        return results
     if use_inv:
         prog_bar = mmcv.ProgressBar(len(dataset))
         ndata = len(data_list)
@@ -71,10 +122,7 @@ def single_gpu_test(model, data_loader, show=False):
 
         all_results = deepcopy(results)
         dets = [result[2] for result in all_results]
-        dets = [list(det) for det in zip(*dets)]
-        dets_mapped = [list(det) for det in zip(*model.module.sequence_mapped_bboxes_result)]
-        dets = seq_nms.seq_nms_with_mapper(dets, dets_mapped)
-        dets = [det for det in zip(*dets)]
+        dets = video_seq_nms(dets, mapped_results, video_ranges, seq_nms_workers)
         for idx, (result, det) in enumerate(zip(results, dets)):
             result = list(result)
             result.append(det)
@@ -83,20 +131,25 @@ def single_gpu_test(model, data_loader, show=False):
             im_name = osp.abspath('./work_dirs/tmp/%06d.pdf'%(i))
             model.module.show_result(data, result, dataset.img_norm_cfg, im_name=im_name)
     else:
-        dets = [list(det) for det in zip(*results)]
-        dets_mapped = [list(det) for det in zip(*model.module.sequence_mapped_bboxes_result)]
-        dets = seq_nms.seq_nms_with_mapper(dets, dets_mapped)
-        results = [det for det in zip(*dets)]
+        results = video_seq_nms(results, mapped_results, video_ranges, seq_nms_workers)
     return results
 
-def multi_gpu_test(model, data_loader, tmpdir=None):
+
+def multi_gpu_test(model, data_loader, tmpdir=None, collect='file'):
     model.eval()
     results = []
     dataset = data_loader.dataset
+    sampler = data_loader.sampler
     rank, world_size = get_dist_info()
     if rank == 0:
         prog_bar = mmcv.ProgressBar(len(dataset))
-    for i, data in enumerate(data_loader):
+    # every rank tests whole videos, see DistributedVideoSampler
+    video_starts = set(sampler.video_ranges[i][0] for i in sampler.videos)
+    indices = list(sampler)
+    for idx, data in zip(indices, data_loader):
+        if idx in video_starts:
+            if hasattr(model.module, 'reset_tracking_state'):
+                model.module.reset_tracking_state()
         with torch.no_grad():
             result = model(return_loss=False, rescale=True, **data)
         results.append(result)
@@ -107,53 +160,12 @@ def multi_gpu_test(model, data_loader, tmpdir=None):
                 prog_bar.update()
 
     # collect results from all ranks
-    results = collect_results(results, len(dataset), tmpdir)
+    results = collect_results_by_index(results, indices, len(dataset), tmpdir,
+                                       collect)
 
     return results
 
 
-def collect_results(result_part, size, tmpdir=None):
-    rank, world_size = get_dist_info()
-    # create a tmp dir if it is not specified
-    if tmpdir is None:
-        MAX_LEN = 512
-        # 32 is whitespace
-        dir_tensor = torch.full((MAX_LEN, ),
-                                32,
-                                dtype=torch.uint8,
-                                device='cuda')
-        if rank == 0:
-            tmpdir = tempfile.mkdtemp()
-            tmpdir = torch.tensor(
-                bytearray(tmpdir.encode()), dtype=torch.uint8, device='cuda')
-            dir_tensor[:len(tmpdir)] = tmpdir
-        dist.broadcast(dir_tensor, 0)
-        tmpdir = dir_tensor.cpu().numpy().tobytes().decode().rstrip()
-    else:
-        mmcv.mkdir_or_exist(tmpdir)
-    # dump the part result to the dir
-    mmcv.dump(result_part, osp.join(tmpdir, 'part_{}.pkl'.format(rank)))
-    dist.barrier()
-    # collect all parts
-    if rank != 0:
-        return None
-    else:
-        # load results of all parts from tmp dir
-        part_list = []
-        for i in range(world_size):
-            part_file = osp.join(tmpdir, 'part_{}.pkl'.format(i))
-            part_list.append(mmcv.load(part_file))
-        # sort the results
-        ordered_results = []
-        for res in zip(*part_list):
-            ordered_results.extend(list(res))
-        # the dataloader may pad some samples
-        ordered_results = ordered_results[:size]
-        # remove tmp dir
-        shutil.rmtree(tmpdir)
-        return ordered_results
-
-
 def parse_args():
     parser = argparse.ArgumentParser(description='MMDet test detector')
     parser.add_argument('config', help='test config file path')
@@ -171,6 +183,23 @@ def parse_args():
         help='eval types')
     parser.add_argument('--show', action='store_true', help='show results')
     parser.add_argument('--tmpdir', help='tmp dir for writing some results')
+    parser.add_argument(
+        '--collect',
+        choices=['file', 'shm', 'tensor'],
+        default='file',
+        help='how the results are gathered on rank 0: pickle files in tmpdir, '
+        'shared memory (single node) or CPU tensors sent through gloo')
+    parser.add_argument(
+        '--seq_nms_window',
+        type=int,
+        default=None,
+        help='run seq-nms online with a window of this many frames')
+    parser.add_argument(
+        '--seq_nms_workers',
+        type=int,
+        default=0,
+        help='number of processes running seq-nms on the classes of all '
+        'the videos, started once after testing')
     parser.add_argument(
         '--launcher',
         choices=['none', 'pytorch', 'slurm', 'mpi'],
@@ -218,7 +247,8 @@ def main():
         imgs_per_gpu=1,
         workers_per_gpu=cfg.data.workers_per_gpu,
         dist=distributed,
-        shuffle=False)
+        shuffle=False,
+        by_video=True)
 
     # build the model and load checkpoint
     model = build_detector(cfg.model, train_cfg=None, test_cfg=cfg.test_cfg)
@@ -235,10 +265,12 @@ def main():
 
     if not distributed:
         model = MMDataParallel(model, device_ids=[0])
-        outputs = single_gpu_test(model, data_loader, args.show)
+        outputs = single_gpu_test(model, data_loader, args.show,
+                                  args.seq_nms_window, args.seq_nms_workers)
     else:
         model = MMDistributedDataParallel(model.cuda())
-        outputs = multi_gpu_test(model, data_loader, args.tmpdir)
+        outputs = multi_gpu_test(model, data_loader, args.tmpdir,
+                                 args.collect)
 
     rank, _ = get_dist_info()
     if args.out and rank == 0:
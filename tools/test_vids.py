@@ -4,17 +4,17 @@ import glob
 import argparse
 import os
 import os.path as osp
-import shutil
-import tempfile
+import pickle
 
 import mmcv
+import numpy as np
 import torch
-import torch.distributed as dist
 from mmcv.parallel import MMDataParallel, MMDistributedDataParallel
 from mmcv.runner import get_dist_info, load_checkpoint
 
 from mmdet.apis import init_dist
-from mmdet.core import coco_eval, results2json, wrap_fp16_model
+from mmdet.core import (DetResults, coco_eval, collect_results_by_index,
+                        results2json, wrap_fp16_model)
 from mmdet.datasets import build_dataloader, build_dataset
 from mmdet.models import build_detector
 
@@ -38,14 +38,21 @@ def single_gpu_test(model, data_loader, show=False):
     return results
 
 
-def multi_gpu_test(model, data_loader, tmpdir=None):
+def multi_gpu_test(model, data_loader, tmpdir=None, collect='file'):
     model.eval()
     results = []
     dataset = data_loader.dataset
+    sampler = data_loader.sampler
     rank, world_size = get_dist_info()
     if rank == 0:
         prog_bar = mmcv.ProgressBar(len(dataset))
-    for i, data in enumerate(data_loader):
+    # every rank tests whole videos, see DistributedVideoSampler
+    video_starts = set(sampler.video_ranges[i][0] for i in sampler.videos)
+    indices = list(sampler)
+    for idx, data in zip(indices, data_loader):
+        if idx in video_starts:
+            if hasattr(model.module, 'reset_tracking_state'):
+                model.module.reset_tracking_state()
         with torch.no_grad():
             result = model(return_loss=False, rescale=True, **data)
         results.append(result)
@@ -56,58 +63,20 @@ def multi_gpu_test(model, data_loader, tmpdir=None):
                 prog_bar.update()
 
     # collect results from all ranks
-    results = collect_results(results, len(dataset), tmpdir)
+    results = collect_results_by_index(results, indices, len(dataset), tmpdir,
+                                       collect)
 
     return results
 
 
-def collect_results(result_part, size, tmpdir=None):
-    rank, world_size = get_dist_info()
-    # create a tmp dir if it is not specified
-    if tmpdir is None:
-        MAX_LEN = 512
-        # 32 is whitespace
-        dir_tensor = torch.full((MAX_LEN, ),
-                                32,
-                                dtype=torch.uint8,
-                                device='cuda')
-        if rank == 0:
-            tmpdir = tempfile.mkdtemp()
-            tmpdir = torch.tensor(
-                bytearray(tmpdir.encode()), dtype=torch.uint8, device='cuda')
-            dir_tensor[:len(tmpdir)] = tmpdir
-        dist.broadcast(dir_tensor, 0)
-        tmpdir = dir_tensor.cpu().numpy().tobytes().decode().rstrip()
-    else:
-        mmcv.mkdir_or_exist(tmpdir)
-    # dump the part result to the dir
-    mmcv.dump(result_part, osp.join(tmpdir, 'part_{}.pkl'.format(rank)))
-    dist.barrier()
-    # collect all parts
-    if rank != 0:
-        return None
-    else:
-        # load results of all parts from tmp dir
-        part_list = []
-        for i in range(world_size):
-            part_file = osp.join(tmpdir, 'part_{}.pkl'.format(i))
-            part_list.append(mmcv.load(part_file))
-        # sort the results
-        ordered_results = []
-        for res in zip(*part_list):
-            ordered_results.extend(list(res))
-        # the dataloader may pad some samples
-        ordered_results = ordered_results[:size]
-        # remove tmp dir
-        shutil.rmtree(tmpdir)
-        return ordered_results
-
-
 def parse_args():
     parser = argparse.ArgumentParser(description='MMDet test detector')
     parser.add_argument('config', help='test config file path')
     parser.add_argument('checkpoint', help='checkpoint file')
-    parser.add_argument('--out', help='output result file')
+    parser.add_argument(
+        '--out',
+        help='output result file, or a directory receiving one file per video '
+        'when the test ann_file is a directory of videos')
     parser.add_argument(
         '--json_out',
         help='output result file name without extension',
@@ -120,6 +89,12 @@ def parse_args():
         help='eval types')
     parser.add_argument('--show', action='store_true', help='show results')
     parser.add_argument('--tmpdir', help='tmp dir for writing some results')
+    parser.add_argument(
+        '--collect',
+        choices=['file', 'shm', 'tensor'],
+        default='file',
+        help='how the results are gathered on rank 0: pickle files in tmpdir, '
+        'shared memory (single node) or CPU tensors sent through gloo')
     parser.add_argument(
         '--launcher',
         choices=['none', 'pytorch', 'slurm', 'mpi'],
@@ -131,40 +106,156 @@ def parse_args():
         os.environ['LOCAL_RANK'] = str(args.local_rank)
     return args
 
-def process_dataset(cfg, cfg_data_test, args,distributed,json_out, args_out):
-  dataset = build_dataset(cfg_data_test)
-  data_loader = build_dataloader(
-    dataset,
-    imgs_per_gpu=1,
-    workers_per_gpu=cfg.data.workers_per_gpu,
-    dist=distributed,
-    shuffle=False)
 
-  # build the model and load checkpoint
-  model = build_detector(cfg.model, train_cfg=None, test_cfg=cfg.test_cfg)
-  fp16_cfg = cfg.get('fp16', None)
-  if fp16_cfg is not None:
-    wrap_fp16_model(model)
-  checkpoint = load_checkpoint(model, args.checkpoint, map_location='cpu')
-  # old versions did not save class info in checkpoints, this walkaround is
-  # for backward compatibility
-  if 'CLASSES' in checkpoint['meta']:
-    model.CLASSES = checkpoint['meta']['CLASSES']
-  else:
-    model.CLASSES = dataset.CLASSES
+def build_test_model(cfg, checkpoint_file, classes, distributed):
+    model = build_detector(cfg.model, train_cfg=None, test_cfg=cfg.test_cfg)
+    fp16_cfg = cfg.get('fp16', None)
+    if fp16_cfg is not None:
+        wrap_fp16_model(model)
+    checkpoint = load_checkpoint(model, checkpoint_file, map_location='cpu')
+    # old versions did not save class info in checkpoints, this walkaround is
+    # for backward compatibility
+    if 'CLASSES' in checkpoint['meta']:
+        model.CLASSES = checkpoint['meta']['CLASSES']
+    else:
+        model.CLASSES = classes
+    if not distributed:
+        model = MMDataParallel(model, device_ids=[0])
+    else:
+        model = MMDistributedDataParallel(model.cuda())
+    return model
 
-  if not distributed:
-    model = MMDataParallel(model, device_ids=[0])
-    outputs = single_gpu_test(model, data_loader, args.show)
-  else:
-    model = MMDistributedDataParallel(model.cuda())
-    outputs = multi_gpu_test(model, data_loader, args.tmpdir)
 
-  rank, _ = get_dist_info()
-  if args_out and rank == 0:
-    print('\nwriting results to {}'.format(args_out))
+def video_test(model, data_loader, video_ids, video_done, show=False):
+    """Test a sequence of videos concatenated in one data loader.
+
+    The frames must be loaded in order and one at a time. The tracking state
+    of the model is reset at every video boundary, and
+    ``video_done(video_id, dataset, outputs)`` is called once the last frame
+    of a video is tested, so only the results of the current video are kept
+    in memory.
+
+    Args:
+        model (nn.Module): wrapped detector.
+        data_loader (DataLoader): loader of a :obj:`ConcatDataset` holding
+            one dataset per video. A :obj:`DistributedVideoSampler` restricts
+            the test to the videos of this rank.
+        video_ids (list[int]): id of every video of the concatenated dataset.
+        video_done (callable): consumer of the results of a video.
+        show (bool): show the results.
+    """
+    model.eval()
+    dataset = data_loader.dataset
+    videos = getattr(data_loader.sampler, 'videos',
+                     range(len(dataset.datasets)))
+    prog_bar = mmcv.ProgressBar(
+        sum(len(dataset.datasets[i]) for i in videos))
+    data_iter = iter(data_loader)
+    for video_idx in videos:
+        video = dataset.datasets[video_idx]
+        if hasattr(model.module, 'reset_tracking_state'):
+            model.module.reset_tracking_state()
+        outputs = []
+        for _ in range(len(video)):
+            data = next(data_iter)
+            assert data['img'][0].size(0) == 1, \
+                'videos are tested one frame at a time'
+            with torch.no_grad():
+                result = model(return_loss=False, rescale=not show, **data)
+            outputs.append(result)
+
+            if show:
+                model.module.show_result(data, result, video.img_norm_cfg)
+            prog_bar.update()
+        video_done(video_ids[video_idx], video, outputs)
+
+
+def load_video_results(filename):
+    """Iterate over the ``(video_id, outputs)`` records of a merged result
+    file written by :class:`VideoResultWriter`."""
+    with open(filename, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def pack_video_outputs(outputs):
+    """The outputs of the frames of a video as recorded by
+    :class:`VideoResultWriter`.
+
+    Bbox results become a :obj:`DetResults`. When every frame gives a tuple,
+    e.g. the (detection, tracking, merged) bbox results of
+    :class:`SiameseRCNN` or the (bbox, segm) results of a mask model, the
+    record is a tuple with the packed results of every component.
+    """
+    if len(outputs) == 0:
+        return outputs
+    if isinstance(outputs[0], tuple):
+        return tuple(
+            pack_video_outputs(list(component))
+            for component in zip(*outputs))
+    if isinstance(outputs[0], list) and all(
+            isinstance(dets, np.ndarray) for dets in outputs[0]):
+        return DetResults.from_list(outputs)
+    return outputs
+
+
+class VideoResultWriter(object):
+    """Write the results of every video as soon as it is tested.
+
+    Args:
+        out (str, optional): a directory receiving one ``%06d.pkl`` per video,
+            or a pkl file to which the results are appended as
+            ``(video_id, outputs)`` records, see :func:`load_video_results`.
+            The outputs of a record are packed by
+            :func:`pack_video_outputs`.
+        json_out (str, optional): a directory receiving the COCO style json
+            results of every video.
+        eval_types (list[str], optional): evaluate every video.
+    """
+
+    def __init__(self, out=None, json_out=None, eval_types=None):
+        self.out_dir = None
+        self.out_file = None
+        if out is not None:
+            if osp.isdir(out):
+                self.out_dir = out
+            else:
+                if not out.endswith(('.pkl', '.pickle')):
+                    raise ValueError('The output file must be a pkl file.')
+                self.out_file = open(out, 'wb')
+        if json_out is not None:
+            assert osp.isdir(json_out), \
+                'Directory "{}" does not exists.'.format(json_out)
+        self.json_out = json_out
+        self.eval_types = eval_types
+
+    def __call__(self, video_id, dataset, outputs):
+        if self.out_file is not None:
+            pickle.dump((video_id, pack_video_outputs(outputs)),
+                        self.out_file,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+            self.out_file.flush()
+        out = None
+        if self.out_dir is not None:
+            out = osp.join(self.out_dir, '%06d.pkl' % (video_id))
+        json_out = None
+        if self.json_out is not None:
+            json_out = osp.join(self.json_out, '%06d' % (video_id))
+        if len(outputs) > 0:
+            save_results(dataset, outputs, out, json_out, self.eval_types)
+
+    def close(self):
+        if self.out_file is not None:
+            self.out_file.close()
+            self.out_file = None
+
+
+def save_results(dataset, outputs, args_out, json_out, eval_types=None):
+  if args_out:
     mmcv.dump(outputs, args_out)
-    eval_types = args.eval
     if eval_types:
       print('Starting evaluate {}'.format(' and '.join(eval_types)))
       if eval_types == ['proposal_fast']:
@@ -184,7 +275,7 @@ def process_dataset(cfg, cfg_data_test, args,distributed,json_out, args_out):
             coco_eval(result_files, eval_types, dataset.coco)
 
   # Save predictions in the COCO json format
-  if json_out and rank == 0:
+  if json_out:
     if not isinstance(outputs[0], dict):
       results2json(dataset, outputs, json_out)
     else:
@@ -193,6 +284,68 @@ def process_dataset(cfg, cfg_data_test, args,distributed,json_out, args_out):
         result_file = json_out + '.{}'.format(name)
         results2json(dataset, outputs_, result_file)
 
+
+def process_dataset(cfg, cfg_data_test, args,distributed,json_out, args_out):
+  dataset = build_dataset(cfg_data_test)
+  data_loader = build_dataloader(
+    dataset,
+    imgs_per_gpu=1,
+    workers_per_gpu=cfg.data.workers_per_gpu,
+    dist=distributed,
+    shuffle=False,
+    by_video=True)
+
+  # build the model and load checkpoint
+  model = build_test_model(cfg, args.checkpoint, dataset.CLASSES, distributed)
+
+  if not distributed:
+    outputs = single_gpu_test(model, data_loader, args.show)
+  else:
+    outputs = multi_gpu_test(model, data_loader, args.tmpdir, args.collect)
+
+  rank, _ = get_dist_info()
+  if rank == 0:
+    if args_out:
+      print('\nwriting results to {}'.format(args_out))
+    save_results(dataset, outputs, args_out, json_out, args.eval)
+
+
+def process_videos(cfg, args, distributed):
+  """Test all the videos of an annotation directory with a single model.
+
+  The model is loaded once and the frames of all videos stream through the
+  workers of one data loader. In distributed mode every rank tests whole
+  videos, so the tracking state is never split across ranks.
+  """
+  vid_jsons_dir = cfg.data.test['ann_file']
+  num_videos = len(glob.glob1(vid_jsons_dir, "*.json"))
+  video_ids = list(range(num_videos))
+  cfg_data_test = cfg.data.test.copy()
+  cfg_data_test['ann_file'] = [osp.join(vid_jsons_dir, '%06d.json' % (i)) for i in video_ids]
+  dataset = build_dataset(cfg_data_test)
+  # frames are loaded in order by the workers of a single loader, which
+  # keeps prefetching across video boundaries.
+  data_loader = build_dataloader(
+    dataset,
+    imgs_per_gpu=1,
+    workers_per_gpu=cfg.data.workers_per_gpu,
+    dist=distributed,
+    shuffle=False,
+    by_video=True)
+
+  model = build_test_model(cfg, args.checkpoint, dataset.CLASSES, distributed)
+
+  rank, world_size = get_dist_info()
+  out = args.out
+  if out is not None and not osp.isdir(out) and world_size > 1:
+    out = '{}.{}'.format(out, rank)
+  writer = VideoResultWriter(out, args.json_out, args.eval)
+  try:
+    video_test(model, data_loader, video_ids, writer, args.show)
+  finally:
+    writer.close()
+
+
 def main():
     args = parse_args()
 
@@ -217,27 +370,7 @@ def main():
     # build the dataloader
     # TODO: support multiple images per gpu (only minor changes are needed)
     if osp.isdir(cfg.data.test['ann_file']):
-      if args.json_out:
-        json_out = args.json_out
-        assert osp.isdir(json_out), 'Directory "{}" does not exists.'.format(json_out)
-      if args.out:
-        args_out = args.out
-        assert osp.isdir(args_out), 'Directory "{}" does not exists.'.format(args_out)
-      VID_jsons_dir = cfg.data.test['ann_file']
-      fList = glob.glob1(VID_jsons_dir, "*.json")
-      fCounter = len(fList)
-      for i in range(fCounter):
-        annfname = osp.join(VID_jsons_dir, '%06d.json'%(i))
-        cfg.data.test['ann_file'] = annfname
-        json_out_path = json_out
-        if json_out:
-          json_out_path = osp.join(json_out, '%06d' % (i))
-          print(json_out_path)
-        args_out_path = args_out
-        if args_out:
-          args_out_path = osp.join(args_out, '%06d.pkl' % (i))
-          print(args_out_path)
-        process_dataset(cfg, cfg.data.test, args, distributed, json_out_path, args_out_path)
+      process_videos(cfg, args, distributed)
     else:
       if args.out is not None and not args.out.endswith(('.pkl', '.pickle')):
         raise ValueError('The output file must be a pkl file.')
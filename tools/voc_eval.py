@@ -4,11 +4,19 @@ import mmcv
 import numpy as np
 
 from mmdet import datasets
-from mmdet.core import eval_map
+from mmdet.core import (DetResults, ResultStore, is_det_results_dir,
+                        is_result_store)
+from mmdet.core.evaluation import fast_mean_ap
 
 
-def voc_eval(result_file, dataset, iou_thr=0.5):
-    det_results = mmcv.load(result_file)
+def voc_eval(result_file, dataset, iou_thr=0.5, nproc=4):
+    if is_det_results_dir(result_file):
+        det_results = DetResults.load(result_file)
+    elif is_result_store(result_file):
+        # written by tools/merge_vid_results.py
+        det_results = ResultStore(result_file).to_det_results()
+    else:
+        det_results = mmcv.load(result_file)
     gt_bboxes = []
     gt_labels = []
     gt_ignore = []
@@ -32,7 +40,7 @@ def voc_eval(result_file, dataset, iou_thr=0.5):
         dataset_name = 'voc07'
     else:
         dataset_name = dataset.CLASSES
-    eval_map(
+    fast_mean_ap.eval_map(
         det_results,
         gt_bboxes,
         gt_labels,
@@ -40,22 +48,31 @@ def voc_eval(result_file, dataset, iou_thr=0.5):
         scale_ranges=None,
         iou_thr=iou_thr,
         dataset=dataset_name,
-        print_summary=True)
+        print_summary=True,
+        nproc=nproc)
 
 
 def main():
     parser = ArgumentParser(description='VOC Evaluation')
-    parser.add_argument('result', help='result file path')
+    parser.add_argument(
+        'result',
+        help='result file path: a pkl file, a DetResults directory or a '
+        'ResultStore directory')
     parser.add_argument('config', help='config file path')
     parser.add_argument(
         '--iou-thr',
         type=float,
         default=0.5,
         help='IoU threshold for evaluation')
+    parser.add_argument(
+        '--nproc',
+        type=int,
+        default=4,
+        help='number of processes evaluating the classes')
     args = parser.parse_args()
     cfg = mmcv.Config.fromfile(args.config)
     test_dataset = mmcv.runner.obj_from_dict(cfg.data.test, datasets)
-    voc_eval(args.result, test_dataset, args.iou_thr)
+    voc_eval(args.result, test_dataset, args.iou_thr, args.nproc)
 
 
 if __name__ == '__main__':